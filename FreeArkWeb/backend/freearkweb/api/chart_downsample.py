@@ -0,0 +1,97 @@
+"""
+历史图表服务端降采样
+
+get_device_param_history 紧凑格式（compact=true）按参数返回平行数组 t[] / v[]，
+指定 points 时在服务端把每条曲线压到点数预算以内，前端只负责绘制：
+
+  - lttb：Largest-Triangle-Three-Buckets，保留视觉形状（首尾点必保留），适合温湿度等连续曲线；
+  - minmax：每个桶保留最小值与最大值（按时间先后），不漏掉尖峰，适合告警排查。
+
+输入为已按时间升序的 t（epoch 秒）与 v（数值）两个列表，纯 Python 实现，
+O(n) 单遍扫描，10 万点约数十毫秒。
+"""
+DOWNSAMPLE_LTTB = 'lttb'
+DOWNSAMPLE_MINMAX = 'minmax'
+DOWNSAMPLE_METHODS = (DOWNSAMPLE_LTTB, DOWNSAMPLE_MINMAX)
+
+
+def _endpoints(ts, vs, threshold):
+    """预算不足以分桶（1 或 2 个点）：只保留首点，或首尾两点"""
+    idx = [0] if threshold < 2 else [0, len(ts) - 1]
+    return [ts[i] for i in idx], [vs[i] for i in idx]
+
+
+def lttb(ts, vs, threshold):
+    """LTTB 降采样到 threshold 个点；点数不超过预算时原样返回，预算小于 3 时只保留首尾点"""
+    n = len(ts)
+    if threshold >= n:
+        return ts, vs
+    if threshold < 3:
+        return _endpoints(ts, vs, threshold)
+
+    out_t = [ts[0]]
+    out_v = [vs[0]]
+    # 首尾点单独保留，中间 n-2 个点均分为 threshold-2 个桶
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点，作为三角形第三个顶点
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_t = sum(ts[next_start:next_end]) / span
+        avg_v = sum(vs[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        at, av = ts[a], vs[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((at - avg_t) * (vs[j] - av) - (at - ts[j]) * (avg_v - av))
+            if area > best_area:
+                best_area = area
+                best = j
+        out_t.append(ts[best])
+        out_v.append(vs[best])
+        a = best
+
+    out_t.append(ts[-1])
+    out_v.append(vs[-1])
+    return out_t, out_v
+
+
+def minmax(ts, vs, threshold):
+    """每桶保留最小 / 最大值两个点（按时间先后），结果不超过 threshold 个点"""
+    n = len(ts)
+    buckets = threshold // 2
+    if threshold >= n:
+        return ts, vs
+    if buckets < 1:
+        return _endpoints(ts, vs, threshold)
+
+    out_t = []
+    out_v = []
+    every = n / buckets
+    for i in range(buckets):
+        start = int(i * every)
+        end = min(int((i + 1) * every), n)
+        lo = hi = start
+        for j in range(start + 1, end):
+            if vs[j] < vs[lo]:
+                lo = j
+            elif vs[j] > vs[hi]:
+                hi = j
+        for j in sorted({lo, hi}):
+            out_t.append(ts[j])
+            out_v.append(vs[j])
+    return out_t, out_v
+
+
+def downsample(ts, vs, threshold, method=DOWNSAMPLE_LTTB):
+    """按 method 降采样；threshold 为空或 0 时不处理"""
+    if not threshold:
+        return ts, vs
+    if method == DOWNSAMPLE_MINMAX:
+        return minmax(ts, vs, threshold)
+    return lttb(ts, vs, threshold)
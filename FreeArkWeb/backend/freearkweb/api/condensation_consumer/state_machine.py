@@ -30,6 +30,10 @@ RISK-CW-ARCH-01 闭环说明（OD-CW-ARCH-01 已确认）：
   - 每次 DB 操作前调用 close_old_connections()（长进程连接保活）
   - IntegrityError 兜底：INSERT 冲突改为 UPDATE last_seen_at，不崩溃
   - OperationalError：记录 ERROR 日志，不崩溃（systemd 托管进程）
+
+批量落库（write_behind，镜像 fault_consumer，见 fault_consumer/write_behind.py）：
+CondensationProcessor 启动写入线程后 T1/T2/T3 只更新内存并入队；T1 的 room 反查与
+system_switch 兜底（PLCLatestData 方案 A）改在写入线程执行。未启动时走逐条同步写库路径。
 """
 
 import logging
@@ -45,7 +49,8 @@ from django.db import (
     OperationalError,
 )
 
-from api.fault_consumer.room_lookup import get_room_for_device
+from api.fault_consumer.room_lookup import get_room_for_device, get_rooms_for_devices
+from api.fault_consumer.write_behind import EventWriteBehind
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +70,7 @@ _CW_T2_PERSIST_THROTTLE_SECONDS: int = int(
 @dataclass
 class CondensationState:
     """进程内结露预警状态条目。"""
-    event_id: int        # condensation_warning_event.id，用于 UPDATE 定位行
+    event_id: int        # condensation_warning_event.id，用于 UPDATE 定位行（批量落库模式下 INSERT 落库前为 None）
     is_active: bool      # True=活跃，False=已恢复
     last_seen_at: datetime  # 最近一次 MQTT 上报（内存中维护）
     # 已落库的 last_seen_at 值，用于 T2 节流判断；初始等于 INSERT/重建时的 last_seen_at
@@ -116,6 +121,38 @@ def _force_close_connection() -> None:
         pass
 
 
+def _cw_event_model():
+    from api.models import CondensationWarningEvent
+    return CondensationWarningEvent
+
+
+def _prepare_insert_fields(rows: list) -> None:
+    """批量 T1：一次查询补全 room，逐行补全缺失的 system_switch（写入线程调用）。"""
+    rooms = get_rooms_for_devices({row['device_sn'] for row in rows})
+    for row in rows:
+        row['room_name'], row['room_id_id'] = rooms.get(row['device_sn'], (None, None))
+        if row['system_switch'] is None:
+            row['system_switch'] = _get_system_switch_for_specific_part(row['specific_part'])
+
+
+def _discard_state(key: tuple, state: 'CondensationState') -> None:
+    """批量 T1 落库失败：移除内存状态（若未被更新的状态替换），下一条预警报文重新走 T1。"""
+    if _cw_state_machine.get(key) is state:
+        del _cw_state_machine[key]
+
+
+# 批量落库队列：CondensationProcessor.start() 启动写入线程；未启动时逐条同步写库
+write_behind = EventWriteBehind(
+    name='condensation',
+    get_model=_cw_event_model,
+    identity_fields=('specific_part', 'device_sn'),
+    counters=_counters,
+    prepare=_prepare_insert_fields,
+    discard=_discard_state,
+    flush_ms=int(getattr(settings, 'CW_WRITE_BEHIND_FLUSH_MS', 500)),
+)
+
+
 # ---------------------------------------------------------------------------
 # 公共接口
 # ---------------------------------------------------------------------------
@@ -173,6 +210,7 @@ def process_condensation_alarm(
 
     此函数在 on_message 回调中调用，需尽量快；
     仅在 T1/T3 路径执行 DB 操作，T2 只更新内存。
+    批量落库写入线程运行时不执行任何 DB 操作，写操作入队 write_behind。
 
     Args:
         specific_part:            房号标识，如 "1-1-16-1601"
@@ -193,10 +231,16 @@ def process_condensation_alarm(
         if state is None or not state.is_active:
             # T1: 首次出现预警，INSERT
             _counters['t1_attempt'] += 1
-            _t1_insert(
-                key, specific_part, device_sn, product_code, received_at,
-                condensation_alarm_value, dew_point_temp, ntc_temp, humidity, system_switch,
-            )
+            if write_behind.running:
+                _t1_enqueue(
+                    key, specific_part, device_sn, product_code, received_at,
+                    condensation_alarm_value, dew_point_temp, ntc_temp, humidity, system_switch,
+                )
+            else:
+                _t1_insert(
+                    key, specific_part, device_sn, product_code, received_at,
+                    condensation_alarm_value, dew_point_temp, ntc_temp, humidity, system_switch,
+                )
         else:
             # T2: 预警持续。先更新内存 last_seen_at；再按节流策略低频写回 DB，
             # 使活跃预警的 last_seen_at 不至于长期停留在 first_seen_at（修复"发生=最后活跃"）。
@@ -205,11 +249,18 @@ def process_condensation_alarm(
             last_persisted = st.last_persisted_at
             if (last_persisted is None
                     or (received_at - last_persisted).total_seconds() >= _CW_T2_PERSIST_THROTTLE_SECONDS):
-                _t2_persist_last_seen(key, st, received_at)
+                if write_behind.running:
+                    write_behind.touch(st, received_at)
+                else:
+                    _t2_persist_last_seen(key, st, received_at)
     else:
         if state is not None and state.is_active:
             # T3: 预警恢复，UPDATE DB
-            _t3_recover(key, state, received_at)
+            if write_behind.running:
+                state.is_active = False
+                write_behind.recover(state, received_at)
+            else:
+                _t3_recover(key, state, received_at)
         # else: 状态机 miss 且收到正常报文，无需操作
 
 
@@ -297,6 +348,47 @@ def _t1_insert(
         logger.exception('T1 未预期异常: %s key=%s', exc, key)
 
 
+def _t1_enqueue(
+    key: tuple,
+    specific_part: str,
+    device_sn: str,
+    product_code: str,
+    received_at: datetime,
+    condensation_alarm_value: 'str | None',
+    dew_point_temp: 'str | None',
+    ntc_temp: 'str | None',
+    humidity: 'str | None',
+    system_switch: 'str | None',
+) -> None:
+    """T1 转移（批量落库模式）：内存立即记为活跃，INSERT 入队。
+
+    room 反查与 system_switch 兜底（入参为 None 时）由写入线程在刷新时完成。
+    """
+    state = CondensationState(
+        event_id=None,
+        is_active=True,
+        last_seen_at=received_at,
+        last_persisted_at=received_at,
+    )
+    _cw_state_machine[key] = state
+    write_behind.insert(key, state, dict(
+        specific_part=specific_part,
+        device_sn=device_sn,
+        product_code=product_code,
+        warning_type='结露预警',
+        warning_message='结露报警',
+        condensation_alarm_value=condensation_alarm_value,
+        dew_point_temp=dew_point_temp,
+        ntc_temp=ntc_temp,
+        humidity=humidity,
+        system_switch=system_switch,
+        first_seen_at=received_at,
+        last_seen_at=received_at,
+        recovered_at=None,
+        is_active=True,
+    ))
+
+
 def _t1_fallback_update(
     key: tuple,
     specific_part: str,
@@ -58,6 +58,7 @@ from api.chat_backend import get_chat_adapter
 from api import chat_memory
 # v1.5.0 多模态提问（MOD-MQ-04）：VLM 异常类型
 from api.vision_service import ImageExpiredError, ImageAccessDeniedError, VisionServiceError
+from api.realtime_push import current_params, group_name, resolve_subscription
 
 logger = logging.getLogger('api.consumers')
 
@@ -954,3 +955,117 @@ class MiniAppChatConsumer(ChatConsumer):
                 'code': 'INTERNAL_ERROR',
                 'message': '服务出现内部错误，请稍后重试',
             }))
+
+
+# ── 实时参数推送：按专有部分订阅 PLCLatestData 变化（见 api/realtime_push.py）──────
+
+class RealtimeParamsConsumer(AsyncWebsocketConsumer):
+    """实时参数订阅 Consumer（/ws/devices/realtime/?token=<token>）。
+
+    协议（JSON 文本帧）：
+      客户端 → {"type": "subscribe", "specific_part": "9-1-31-3104"}
+               {"type": "unsubscribe", "specific_part": "9-1-31-3104"}
+      服务端 → {"type": "subscribed", "specific_part": ..., "params": [当前全量值]}
+               {"type": "params_update", "specific_part": ..., "params": [变化的参数]}
+               {"type": "error", "code": "FORBIDDEN" | "INVALID" | "TOO_MANY", "message": ...}
+
+    params 元素为 {param_name, value, collected_at}，与 realtime-params 接口的参数字段一致，
+    客户端按 param_name 原地更新。运维 / 管理员可订阅任意专有部分；业主（role=user）仅限
+    active 绑定的专有部分（与 miniapp_owner_realtime_params 一致）。
+    """
+
+    MAX_SUBSCRIPTIONS = 20
+
+    async def connect(self):
+        # 订阅的专有部分 → 实际加入的推送组（业主 3 段 / 4 段格式可能对应多户）
+        self.subscriptions = {}
+        # 推送组中的 specific_part → 客户端订阅时使用的 specific_part
+        self._requested_by_part = {}
+
+        params = parse_qs(self.scope.get('query_string', b''))
+        token_bytes = params.get(b'token', [None])[0]
+        user = None
+        if token_bytes is not None:
+            user = await self._get_user_by_token(token_bytes.decode('utf-8', errors='replace'))
+        if user is None:
+            logger.warning('RealtimeParamsConsumer: token 缺失或无效，拒绝连接')
+            await self.close(code=4001)
+            return
+
+        self.user = user
+        await self.accept()
+        await self.send(json.dumps({'type': 'connected'}))
+
+    async def disconnect(self, close_code):
+        for parts in getattr(self, 'subscriptions', {}).values():
+            for part in parts:
+                await self.channel_layer.group_discard(group_name(part), self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            return
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            logger.warning('RealtimeParamsConsumer: 收到无效 JSON，忽略')
+            return
+        if not isinstance(data, dict):
+            return
+
+        specific_part = str(data.get('specific_part') or '').strip()
+        msg_type = data.get('type')
+        if msg_type not in ('subscribe', 'unsubscribe'):
+            return
+        if not specific_part:
+            await self._send_error('INVALID', 'specific_part 为必填项')
+            return
+
+        if msg_type == 'unsubscribe':
+            await self._unsubscribe(specific_part)
+        else:
+            await self._subscribe(specific_part)
+
+    async def _subscribe(self, specific_part):
+        if specific_part not in self.subscriptions and len(self.subscriptions) >= self.MAX_SUBSCRIPTIONS:
+            await self._send_error('TOO_MANY', f'单个连接最多订阅 {self.MAX_SUBSCRIPTIONS} 个专有部分')
+            return
+
+        parts = await sync_to_async(resolve_subscription)(self.user, specific_part)
+        if parts is None:
+            logger.warning('RealtimeParamsConsumer: 越权订阅 specific_part=%s user=%s',
+                           specific_part, self.user.username)
+            await self._send_error('FORBIDDEN', '无权访问该专有部分')
+            return
+
+        # 先入组再取全量值：两者之间到达的变化至多重复一次，不会丢失
+        for part in parts:
+            await self.channel_layer.group_add(group_name(part), self.channel_name)
+            self._requested_by_part[part] = specific_part
+        self.subscriptions[specific_part] = parts
+        snapshot = await sync_to_async(current_params)(parts)
+        await self.send(json.dumps({
+            'type': 'subscribed',
+            'specific_part': specific_part,
+            'params': snapshot,
+        }, ensure_ascii=False))
+
+    async def _unsubscribe(self, specific_part):
+        for part in self.subscriptions.pop(specific_part, []):
+            await self.channel_layer.group_discard(group_name(part), self.channel_name)
+            self._requested_by_part.pop(part, None)
+
+    async def params_update(self, event):
+        """channel 组消息（type=params.update）→ 客户端 params_update 帧"""
+        part = event['specific_part']
+        await self.send(json.dumps({
+            'type': 'params_update',
+            'specific_part': self._requested_by_part.get(part, part),
+            'params': event['params'],
+        }, ensure_ascii=False))
+
+    async def _send_error(self, code, message):
+        await self.send(json.dumps({'type': 'error', 'code': code, 'message': message},
+                                   ensure_ascii=False))
+
+    # 与 ChatConsumer 共用 DRF Token 鉴权
+    _get_user_by_token = ChatConsumer._get_user_by_token
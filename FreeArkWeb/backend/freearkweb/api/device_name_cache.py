@@ -11,6 +11,8 @@ device_name_cache.py — 设备名称进程内缓存（MOD-BE-UX-01, v0.6.1-FM-U
   - 懒加载：首次调用 get_device_name_by_sn 时触发 _load_cache()（AQ-01 裁决：方案A）
   - 多 worker 说明：若 uvicorn workers > 1，各进程各自维护独立 dict，
     数据一致（DeviceNode 不变），仅各自首次构建，不影响正确性
+  - 跨进程失效：订阅 tiered_cache 的 'device_name' 命名空间，
+    device_tree_sync 提交后广播，所有进程下次查询时重建
   - 线程安全：依赖 CPython GIL 保障基本 dict 操作原子性；不加锁（幂等重建）
     ADR-UX-06：最坏情况两个并发请求同时触发 TTL 过期重建——结果幂等，可接受
 """
@@ -19,6 +21,8 @@ import time
 import logging
 from typing import Optional
 
+from .tiered_cache import ensure_listener, subscribe
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -46,6 +50,7 @@ def get_device_name_by_sn(sn: int) -> Optional[str]:
     Returns:
         device_name 字符串（如 "新风机"），或 None（未命中）
     """
+    ensure_listener()
     _ensure_cache_fresh()
     return _cache.get(sn)
 
@@ -54,11 +59,8 @@ def invalidate_device_name_cache() -> None:
     """手动失效钩子。
 
     执行后，下次 get_device_name_by_sn 调用将触发 _load_cache() 重建。
-    本期（v0.6.1-FM-UX）不接入触发器；预留供未来 device_tree_sync 完成后调用。
-
-    用法示例（device_tree_sync.py 完成后接入）：
-        from api.device_name_cache import invalidate_device_name_cache
-        invalidate_device_name_cache()
+    只作用于本进程；跨进程失效经 tiered_cache.publish_invalidation('device_name')
+    广播（device_tree_sync.upsert_tree 提交后触发），由模块加载时的订阅回调调用本函数。
     """
     global _cache_loaded_at
     _cache_loaded_at = 0.0
@@ -98,3 +100,6 @@ def _load_cache() -> None:
         logger.error('device_name_cache 加载失败: %s', exc, exc_info=True)
         # 失败不崩溃；_cache 保留旧值（可能为空），下次请求再试
         # _cache_loaded_at 保持旧值，使下次请求仍可重试（不设置为 now，避免长时间空缓存）
+
+
+subscribe('device_name', lambda _keys: invalidate_device_name_cache())
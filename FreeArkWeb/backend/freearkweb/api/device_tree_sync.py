@@ -303,9 +303,18 @@ def upsert_tree(owner: OwnerInfo, data_payload: List[dict], prune: bool = False)
             owner=owner
         ).exclude(id__in=seen_floor_ids).delete()
 
+    # 提交后广播失效：房型过滤 / 户型 / 设备名称缓存在所有进程（含 MQTT 消费者）生效
+    transaction.on_commit(lambda: _publish_tree_changed(owner.specific_part))
     return stats
 
 
+def _publish_tree_changed(specific_part: str) -> None:
+    from .tiered_cache import publish_invalidation
+    from .utils_room_filter import invalidate_room_filter_cache
+    invalidate_room_filter_cache(specific_part)
+    publish_invalidation('device_name')
+
+
 # ---------------------------------------------------------------------------
 # 3. 单户同步入口
 # ---------------------------------------------------------------------------
@@ -51,3 +51,37 @@ def get_room_for_device(device_sn: str) -> tuple[str | None, int | None]:
     except Exception as exc:
         logger.error('get_room_for_device 异常: %s device_sn=%s', exc, device_sn)
         return None, None
+
+
+def get_rooms_for_devices(device_sns) -> dict:
+    """批量版 get_room_for_device：一次查询返回 {device_sn: (ori_room_name, room_id)}。
+
+    供 write-behind 批量 T1 INSERT 使用；查不到或 device_sn 非法的设备返回 (None, None)。
+    """
+    result = {sn: (None, None) for sn in device_sns}
+    sn_map = {}
+    for sn in result:
+        try:
+            sn_map[int(sn)] = sn
+        except (ValueError, TypeError):
+            logger.debug('get_rooms_for_devices: device_sn 无法转为 int: %s', sn)
+    if not sn_map:
+        return result
+    try:
+        from api.models import DeviceNode
+        nodes = (
+            DeviceNode.objects
+            .select_related('room')
+            .filter(device_sn__in=list(sn_map))
+        )
+        seen = set()
+        for dn in nodes:
+            # 与 get_room_for_device 的 .first() 一致：同一 device_sn 只取第一条
+            if dn.device_sn in seen:
+                continue
+            seen.add(dn.device_sn)
+            if dn.room:
+                result[sn_map[dn.device_sn]] = (dn.room.ori_room_name, dn.room_id)
+    except Exception as exc:
+        logger.error('get_rooms_for_devices 异常: %s', exc)
+    return result
@@ -11,6 +11,10 @@ fault_consumer/state_machine.py — 进程内故障状态机（MOD-BE-FM-03，v0
   - 每次 DB 操作前调用 close_old_connections()（长进程连接保活）
   - IntegrityError 兜底：INSERT 冲突改为 UPDATE last_seen_at，不崩溃
   - OperationalError：记录 ERROR 日志，不崩溃（systemd 托管进程）
+
+批量落库（write_behind，见 write_behind.py）：统一接入服务 FaultProcessor 启动写入线程后，
+T1/T2/T3 只更新内存并入队，由写入线程批量 bulk_create / UPDATE，paho 回调线程不再等待数据库；
+写入线程未启动时仍走下方逐条同步写库路径。
 """
 
 import logging
@@ -26,7 +30,8 @@ from django.db import (
     OperationalError,
 )
 
-from .room_lookup import get_room_for_device
+from .room_lookup import get_room_for_device, get_rooms_for_devices
+from .write_behind import EventWriteBehind
 
 logger = logging.getLogger(__name__)
 
@@ -86,7 +91,7 @@ _T2_PERSIST_THROTTLE_SECONDS: int = int(
 @dataclass
 class FaultState:
     """进程内故障状态条目。"""
-    event_id: int       # fault_event.id，用于 UPDATE 定位行
+    event_id: int       # fault_event.id，用于 UPDATE 定位行（批量落库模式下 INSERT 落库前为 None）
     is_active: bool     # True=活跃，False=已恢复
     last_seen_at: datetime  # 最近一次 MQTT 上报（内存中维护）
     # 已落库的 last_seen_at 值，用于 T2 节流判断；初始等于 INSERT/重建时的 last_seen_at
@@ -99,6 +104,36 @@ class FaultState:
 _state_machine: dict = {}
 
 
+def _fault_event_model():
+    from api.models import FaultEvent
+    return FaultEvent
+
+
+def _prepare_insert_fields(rows: list) -> None:
+    """批量 T1：一次查询补全 room_name / room_id（写入线程调用）。"""
+    rooms = get_rooms_for_devices({row['device_sn'] for row in rows})
+    for row in rows:
+        row['room_name'], row['room_id_id'] = rooms.get(row['device_sn'], (None, None))
+
+
+def _discard_state(key: tuple, state: 'FaultState') -> None:
+    """批量 T1 落库失败：移除内存状态（若未被更新的状态替换），下一条故障报文重新走 T1。"""
+    if _state_machine.get(key) is state:
+        del _state_machine[key]
+
+
+# 批量落库队列：FaultProcessor.start() 启动写入线程；未启动时 process_fault_field 逐条同步写库
+write_behind = EventWriteBehind(
+    name='fault',
+    get_model=_fault_event_model,
+    identity_fields=('specific_part', 'device_sn', 'fault_code'),
+    counters=_counters,
+    prepare=_prepare_insert_fields,
+    discard=_discard_state,
+    flush_ms=int(getattr(settings, 'FAULT_WRITE_BEHIND_FLUSH_MS', 500)),
+)
+
+
 # ---------------------------------------------------------------------------
 # 公共接口
 # ---------------------------------------------------------------------------
@@ -153,6 +188,7 @@ def process_fault_field(
 
     实现 ADR-FM-03 的 T1/T2/T3 转移逻辑。
     此函数在 on_message 回调中调用，需尽量快；仅在 T1/T3 路径执行 DB 操作。
+    批量落库写入线程运行时不执行任何 DB 操作，写操作入队 write_behind。
 
     Args:
         specific_part:  房号标识，如 "3-1-7-702"
@@ -172,8 +208,12 @@ def process_fault_field(
         if state is None or not state.is_active:
             # T1: 首次出现故障，INSERT
             _counters['t1_attempt'] += 1
-            _t1_insert(key, specific_part, device_sn, product_code,
-                       fault_code, fault_type, severity, fault_message, received_at)
+            if write_behind.running:
+                _t1_enqueue(key, specific_part, device_sn, product_code,
+                            fault_code, fault_type, severity, fault_message, received_at)
+            else:
+                _t1_insert(key, specific_part, device_sn, product_code,
+                           fault_code, fault_type, severity, fault_message, received_at)
         else:
             # T2: 故障持续。先更新内存 last_seen_at；再按节流策略低频写回 DB，
             # 使活跃故障的 last_seen_at 不至于长期停留在 first_seen_at（修复"首次=最后活跃"）。
@@ -182,11 +222,18 @@ def process_fault_field(
             last_persisted = st.last_persisted_at
             if (last_persisted is None
                     or (received_at - last_persisted).total_seconds() >= _T2_PERSIST_THROTTLE_SECONDS):
-                _t2_persist_last_seen(key, st, received_at)
+                if write_behind.running:
+                    write_behind.touch(st, received_at)
+                else:
+                    _t2_persist_last_seen(key, st, received_at)
     else:
         if state is not None and state.is_active:
             # T3: 故障恢复，UPDATE DB
-            _t3_recover(key, state, received_at)
+            if write_behind.running:
+                state.is_active = False
+                write_behind.recover(state, received_at)
+            else:
+                _t3_recover(key, state, received_at)
         # else: 状态机 miss 且收到正常报文，无需操作
 
 
@@ -260,6 +307,40 @@ def _t1_insert(
         logger.exception('T1 未预期异常: %s key=%s', exc, key)
 
 
+def _t1_enqueue(
+    key: tuple,
+    specific_part: str,
+    device_sn: str,
+    product_code: str,
+    fault_code: str,
+    fault_type: str,
+    severity: str,
+    fault_message: str,
+    received_at: datetime,
+) -> None:
+    """T1 转移（批量落库模式）：内存立即记为活跃，INSERT 入队（room 由写入线程批量反查）。"""
+    state = FaultState(
+        event_id=None,
+        is_active=True,
+        last_seen_at=received_at,
+        last_persisted_at=received_at,
+    )
+    _state_machine[key] = state
+    write_behind.insert(key, state, dict(
+        specific_part=specific_part,
+        device_sn=device_sn,
+        product_code=product_code,
+        fault_code=fault_code,
+        fault_type=fault_type,
+        fault_message=fault_message,
+        severity=severity,
+        first_seen_at=received_at,
+        last_seen_at=received_at,
+        recovered_at=None,
+        is_active=True,
+    ))
+
+
 def _t1_fallback_update(
     key: tuple,
     specific_part: str,
@@ -0,0 +1,422 @@
+"""
+fault_consumer/write_behind.py — 故障 / 结露状态机批量落库队列（write-behind）
+
+原先 process_fault_field / process_condensation_alarm 在 paho 回调线程内逐字段写库：
+T1 一条 INSERT（外加一次 room 反查）、T2 节流 UPDATE、T3 UPDATE。整栋楼通讯中断时
+一条报文即带出几十个故障字段，回调线程被数据库往返拖住，消息积压，看门狗随之误判失速。
+
+启用后（统一接入服务处理器 start() 时启动写入线程），状态机只更新内存并把写操作放入本队列：
+
+  - insert(key, state, fields)：T1，内存立即建立 state（event_id=None，待落库）；
+  - touch(state, last_seen_at)：T2 节流落库；
+  - recover(state, recovered_at)：T3，内存 is_active 立即置 False。
+
+写入线程每 flush_ms 毫秒（或待写 INSERT 达到 batch_size 条时提前）刷新一次，顺序固定：
+
+  1. 同批内 T1 之后的 T2/T3 直接并入 INSERT 行（新故障在一个刷新周期内已恢复 → 直接插入已恢复行）；
+  2. 所有 T1 一次 bulk_create（room 反查合并为一次查询），回填 state.event_id；
+  3. 所有 T2 一条 UPDATE … CASE（只更新仍活跃的行）；
+  4. 所有 T3 一条 UPDATE … CASE。
+
+跨批次时，T3 入队时对应 INSERT 可能仍在写库；刷新串行执行，下一批处理 T3 时 event_id 已回填。
+
+失败处理与逐条路径保持一致：
+  - bulk_create 撞唯一约束 → 本批逐条 INSERT，冲突行走原 IntegrityError 兜底（更新已有活跃行）；
+  - 连接错误 → 计入 t1_db_error、关闭连接，丢弃这些 state，下一条故障报文重新走 T1；
+  - T2 失败不更新 last_persisted_at（下次 T2 越阈值重试）；T3 失败放回队列下轮重试。
+
+计数器沿用状态机的 t1_success / t2_persist / t3_recover 等（在刷新成功后累加），看门狗判活逻辑不变。
+写入线程未启动时（单元测试、保留回滚的旧命令）状态机走原逐条同步写库路径。
+"""
+
+import logging
+import threading
+import time
+
+from django.db import (
+    close_old_connections,
+    connection,
+    IntegrityError,
+    InterfaceError,
+    OperationalError,
+    transaction,
+)
+from django.db.models import Case, DateTimeField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# 最早一条待写操作的最长等待时间（毫秒）
+DEFAULT_FLUSH_MS = 500
+# 待写 INSERT 达到该条数立即刷新；同时是 bulk_create / 批量 UPDATE 的分块大小
+DEFAULT_BATCH_SIZE = 500
+
+
+def _force_close_connection() -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class _PendingInsert:
+    __slots__ = ('key', 'state', 'fields')
+
+    def __init__(self, key, state, fields):
+        self.key = key
+        self.state = state
+        self.fields = fields
+
+
+class EventWriteBehind:
+    """状态机批量落库队列（故障 / 结露各一个实例）。
+
+    Args:
+        name: 日志与线程名前缀（'fault' / 'condensation'）
+        get_model: 无参，返回事件模型类（延迟导入）
+        identity_fields: 状态机 key 对应的模型字段；加上 first_seen_at 即表唯一约束
+        counters: 状态机运行计数器 dict（原地累加）
+        prepare: (fields_list) -> None，刷新时在写入线程补全 INSERT 字段（room 反查等）
+        discard: (key, state) -> None，INSERT 失败时从状态机移除该 state
+        flush_ms / batch_size: 见模块级默认值
+    """
+
+    def __init__(self, name, get_model, identity_fields, counters, prepare=None, discard=None,
+                 flush_ms=DEFAULT_FLUSH_MS, batch_size=DEFAULT_BATCH_SIZE):
+        self.name = name
+        self.get_model = get_model
+        self.identity_fields = tuple(identity_fields)
+        self.counters = counters
+        self.prepare = prepare
+        self.discard = discard
+        self.flush_ms = max(1, int(flush_ms))
+        self.batch_size = max(1, int(batch_size))
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._inserts = []
+        # id(state) -> (state, last_seen_at)
+        self._touches = {}
+        # id(state) -> (state, recovered_at)
+        self._recoveries = {}
+        self._oldest_ts = None
+        self._thread = None
+        self._stopping = False
+
+        self.stats = {
+            'flushes': 0,
+            'flush_errors': 0,
+            'inserts_flushed': 0,
+            'touches_flushed': 0,
+            'recoveries_flushed': 0,
+            'folded': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动写入线程（重复调用无副作用）"""
+        with self._cond:
+            if self.running:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-write-behind', daemon=True)
+            self._thread.start()
+        logger.info('%s 批量落库线程已启动: flush_ms=%d batch_size=%d',
+                    self.name, self.flush_ms, self.batch_size)
+
+    def stop(self, timeout=30):
+        """停止写入线程并写完剩余操作"""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning('%s 批量落库线程未在 %ss 内退出', self.name, timeout)
+        self._thread = None
+        logger.info('%s 批量落库线程已停止: %s', self.name, self.snapshot())
+
+    # ------------------------------------------------------------------
+    # 入队（paho 回调线程调用，只持锁追加，不触碰数据库）
+    # ------------------------------------------------------------------
+
+    def insert(self, key, state, fields):
+        with self._cond:
+            self._inserts.append(_PendingInsert(key, state, fields))
+            self._mark_dirty()
+            if len(self._inserts) >= self.batch_size:
+                self._cond.notify_all()
+
+    def touch(self, state, last_seen_at):
+        with self._cond:
+            self._touches[id(state)] = (state, last_seen_at)
+            self._mark_dirty()
+
+    def recover(self, state, recovered_at):
+        with self._cond:
+            self._recoveries[id(state)] = (state, recovered_at)
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        if self._oldest_ts is None:
+            # 队列由空变为非空：唤醒写入线程开始按 flush_ms 计时
+            self._oldest_ts = time.monotonic()
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # 刷新（写入线程）
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """取出当前队列并按 INSERT → T2 → T3 顺序写库；返回本批操作数"""
+        with self._cond:
+            inserts, touches, recoveries = self._inserts, self._touches, self._recoveries
+            self._inserts, self._touches, self._recoveries = [], {}, {}
+            self._oldest_ts = None
+        total = len(inserts) + len(touches) + len(recoveries)
+        if not total:
+            return 0
+
+        with self._flush_lock:
+            t_start = time.monotonic()
+            close_old_connections()
+            model = self.get_model()
+
+            # 同批内新故障后续的 T2/T3 并入 INSERT 行
+            for pending in inserts:
+                state = pending.state
+                pending.fields['last_seen_at'] = state.last_seen_at
+                touches.pop(id(state), None)
+                recovery = recoveries.pop(id(state), None)
+                if recovery is not None:
+                    pending.fields.update(is_active=False, recovered_at=recovery[1])
+                    self.stats['folded'] += 1
+            # 同一 state 既有 T2 又有 T3：T3 会写回 last_seen_at，T2 省略
+            for state_id in recoveries:
+                touches.pop(state_id, None)
+
+            if inserts:
+                self._write_inserts(model, inserts)
+            if touches:
+                self._write_touches(model, list(touches.values()))
+            if recoveries:
+                self._write_recoveries(model, list(recoveries.values()))
+
+            elapsed_ms = (time.monotonic() - t_start) * 1000
+            stats = self.stats
+            stats['flushes'] += 1
+            stats['last_batch_size'] = total
+            stats['max_batch_size'] = max(stats['max_batch_size'], total)
+            stats['last_flush_ms'] = round(elapsed_ms, 1)
+            stats['max_flush_ms'] = max(stats['max_flush_ms'], stats['last_flush_ms'])
+        logger.debug('%s 批量落库完成: insert=%d touch=%d recover=%d 耗时=%.1fms',
+                     self.name, len(inserts), len(touches), len(recoveries), elapsed_ms)
+        return total
+
+    def _write_inserts(self, model, inserts):
+        if self.prepare is not None:
+            try:
+                self.prepare([p.fields for p in inserts])
+            except Exception as exc:
+                logger.error('%s T1 字段补全失败（按缺省值写入）: %s', self.name, exc)
+
+        objs = [model(**p.fields) for p in inserts]
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(objs, batch_size=self.batch_size)
+        except IntegrityError:
+            logger.warning('%s T1 批量 INSERT 撞唯一约束，本批 %d 条改为逐条写入', self.name, len(inserts))
+            self._write_inserts_one_by_one(model, inserts)
+            return
+        except (OperationalError, InterfaceError) as exc:
+            self._fail_inserts(inserts, 't1_db_error', exc)
+            _force_close_connection()
+            return
+        except Exception as exc:
+            self._fail_inserts(inserts, 't1_unexpected', exc)
+            return
+
+        # MySQL 的 bulk_create 不回填自增主键：按唯一约束字段反查
+        if any(obj.pk is None for obj in objs):
+            self._resolve_ids(model, objs)
+        for pending, obj in zip(inserts, objs):
+            self._bind(pending, obj.pk)
+        self.stats['inserts_flushed'] += len(inserts)
+
+    def _resolve_ids(self, model, objs):
+        unique_fields = self.identity_fields + ('first_seen_at',)
+        rows = model.objects.filter(
+            first_seen_at__in={obj.first_seen_at for obj in objs},
+            specific_part__in={obj.specific_part for obj in objs},
+        ).values_list('id', *unique_fields)
+        ids = {tuple(row[1:]): row[0] for row in rows}
+        for obj in objs:
+            obj.pk = ids.get(tuple(getattr(obj, f) for f in unique_fields))
+
+    def _bind(self, pending, event_id):
+        state = pending.state
+        if event_id is None:
+            logger.warning('%s T1 落库后未取得 event_id，丢弃内存状态以便下次重新 INSERT: key=%s',
+                           self.name, pending.key)
+            self._discard(pending)
+            return
+        state.event_id = event_id
+        state.last_persisted_at = pending.fields['last_seen_at']
+        self.counters['t1_success'] += 1
+
+    def _write_inserts_one_by_one(self, model, inserts):
+        for pending in inserts:
+            try:
+                with transaction.atomic():
+                    obj = model.objects.create(**pending.fields)
+                self._bind(pending, obj.pk)
+                self.stats['inserts_flushed'] += 1
+            except IntegrityError:
+                self.counters['t1_integrity'] += 1
+                self._fallback_update(model, pending)
+            except (OperationalError, InterfaceError) as exc:
+                self._fail_inserts([pending], 't1_db_error', exc)
+                _force_close_connection()
+            except Exception as exc:
+                self._fail_inserts([pending], 't1_unexpected', exc)
+
+    def _fallback_update(self, model, pending):
+        """IntegrityError 兜底：state 绑定到已有活跃行并更新其 last_seen_at（同逐条路径）。"""
+        fields = pending.fields
+        try:
+            existing = model.objects.filter(
+                is_active=True, **{f: fields[f] for f in self.identity_fields},
+            ).order_by('-first_seen_at').first()
+            if existing is None:
+                logger.warning('%s T1 兜底未找到活跃行（IntegrityError 但无 active 行，异常信号）: key=%s，'
+                               '关闭连接以便重连', self.name, pending.key)
+                self._discard(pending)
+                _force_close_connection()
+                return
+            existing.last_seen_at = fields['last_seen_at']
+            existing.save(update_fields=['last_seen_at', 'updated_at'])
+            pending.state.event_id = existing.id
+            pending.state.last_persisted_at = fields['last_seen_at']
+            if not fields.get('is_active', True):
+                # 同批内已恢复：兜底行也要落恢复
+                self._write_recoveries(model, [(pending.state, fields['recovered_at'])])
+        except Exception as exc:
+            logger.error('%s T1 fallback UPDATE 失败: %s key=%s', self.name, exc, pending.key)
+            self._discard(pending)
+
+    def _fail_inserts(self, inserts, counter, exc):
+        self.counters[counter] += len(inserts)
+        self.stats['flush_errors'] += 1
+        logger.error('%s T1 批量 INSERT 失败，丢弃 %d 条内存状态（下条故障报文重新 INSERT）: %s',
+                     self.name, len(inserts), exc)
+        for pending in inserts:
+            self._discard(pending)
+
+    def _discard(self, pending):
+        if self.discard is not None:
+            self.discard(pending.key, pending.state)
+
+    def _write_touches(self, model, items):
+        items = [(state, ts) for state, ts in items if state.event_id is not None]
+        for chunk in self._chunks(items):
+            try:
+                model.objects.filter(
+                    id__in=[state.event_id for state, _ in chunk], is_active=True,
+                ).update(last_seen_at=self._case(chunk))
+            except Exception as exc:
+                # 不更新 last_persisted_at：下次 T2 越过节流阈值会重新入队
+                self.stats['flush_errors'] += 1
+                logger.error('%s T2 批量落库失败（%d 条）: %s', self.name, len(chunk), exc)
+                if isinstance(exc, (OperationalError, InterfaceError)):
+                    _force_close_connection()
+                continue
+            for state, ts in chunk:
+                state.last_persisted_at = ts
+            self.counters['t2_persist'] += len(chunk)
+            self.stats['touches_flushed'] += len(chunk)
+
+    def _write_recoveries(self, model, items):
+        items = [(state, ts) for state, ts in items if state.event_id is not None]
+        for chunk in self._chunks(items):
+            try:
+                model.objects.filter(id__in=[state.event_id for state, _ in chunk]).update(
+                    is_active=False,
+                    recovered_at=self._case(chunk),
+                    # 写回内存中的最后活跃时间
+                    last_seen_at=self._case([(state, state.last_seen_at) for state, _ in chunk]),
+                )
+            except Exception as exc:
+                self.stats['flush_errors'] += 1
+                logger.error('%s T3 批量落库失败，%d 条放回队列下轮重试: %s', self.name, len(chunk), exc)
+                if isinstance(exc, (OperationalError, InterfaceError)):
+                    _force_close_connection()
+                with self._cond:
+                    for state, ts in chunk:
+                        self._recoveries.setdefault(id(state), (state, ts))
+                    self._mark_dirty()
+                continue
+            self.counters['t3_recover'] += len(chunk)
+            self.stats['recoveries_flushed'] += len(chunk)
+
+    @staticmethod
+    def _case(items):
+        return Case(
+            *[When(id=state.event_id, then=Value(ts)) for state, ts in items],
+            output_field=DateTimeField(),
+        )
+
+    def _chunks(self, items):
+        for i in range(0, len(items), self.batch_size):
+            yield items[i:i + self.batch_size]
+
+    def _due_in(self):
+        if self._oldest_ts is None:
+            return None
+        return self._oldest_ts + self.flush_ms / 1000.0 - time.monotonic()
+
+    def _run(self):
+        close_old_connections()
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopping and len(self._inserts) < self.batch_size:
+                        due_in = self._due_in()
+                        if due_in is not None and due_in <= 0:
+                            break
+                        self._cond.wait(timeout=due_in)
+                    stopping = self._stopping
+                try:
+                    self.flush()
+                except Exception as exc:
+                    self.stats['flush_errors'] += 1
+                    logger.exception('%s 批量落库异常: %s', self.name, exc)
+                if stopping:
+                    self.flush()
+                    return
+        finally:
+            connection.close()
+
+    def snapshot(self):
+        """落库统计 + 当前待写 INSERT / T2 / T3 数与最早待写操作等待秒数"""
+        with self._cond:
+            snapshot = dict(self.stats)
+            snapshot['pending_inserts'] = len(self._inserts)
+            snapshot['pending_touches'] = len(self._touches)
+            snapshot['pending_recoveries'] = len(self._recoveries)
+            oldest_ts = self._oldest_ts
+        snapshot['oldest_pending_seconds'] = (
+            round(time.monotonic() - oldest_ts, 1) if oldest_ts is not None else 0.0
+        )
+        snapshot['running'] = self.running
+        return snapshot
@@ -1,10 +1,9 @@
 # DONE(AB-001) Redis（perf-P2，2026-05-31 commit d02d38a）: settings.py CACHES 已从
 #              LocMemCache 迁移至 Django 内置 RedisCache（db=1）；本模块所有 cache.get/set/delete
-#              透明走该后端无需改动，并已加 _safe_cache_* 降级兜底（Redis 不可用时降级直查 DB）。
+#              透明走该后端无需改动；Redis 不可用时降级直查 DB（降级兜底现由 tiered_cache 统一提供）。
 #              详见 architecture_design_v0.5.3_fault_count_column.md §12 AB-001 与 ADR-P2-001。
-# TODO(AB-002) MQTT 驱动失效: 未来如需更低延迟可在 PLCLatestDataHandler._bulk_upsert()
-#              末尾追加 invalidate_fault_count_cache(specific_part)；本期保留钩子不调用。
-#              详见 architecture_design_v0.5.3_fault_count_column.md §12 AB-002。
+# DONE(AB-002) MQTT 驱动失效: PLCLatestDataHandler._persist() 写库后调用 note_fault_values(records)，
+#              故障字段取值变化的 specific_part 经 tiered_cache 删除 L2 条目并广播各进程丢弃 L1。
 """
 fault_utils.py — 故障数量计算与缓存（v0.5.3-FCC）
 
@@ -28,9 +27,10 @@ import logging
 from collections import defaultdict
 from typing import Optional, Iterable
 
-from django.core.cache import cache
 from django.db.models import Q
 
+from .tiered_cache import TieredCache
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -83,45 +83,13 @@ _ERROR_N_PATTERN = re.compile(r'^error_\d+$')
 # 缓存配置（ADR-FC-001 / ADR-FC-005）
 # ---------------------------------------------------------------------------
 
-_FAULT_CACHE_PREFIX: str = 'fault_count:'
 #: 缓存 TTL = 60 秒（ADR-FC-005 修订值；满足 US-FC-05 AC-FC-05-01 的 ≤60s 延迟要求）
 _FAULT_CACHE_TTL: int = 60
+#: 进程内 L1 TTL：跨进程失效消息丢失时的最大陈旧时间
+_FAULT_CACHE_L1_TTL: int = 5
 
-
-# ---------------------------------------------------------------------------
-# Redis 降级兜底（perf-P2）
-# ---------------------------------------------------------------------------
-# 缓存后端为 Django 内置 RedisCache（settings.py CACHES，db=1），其不支持
-# IGNORE_EXCEPTIONS，Redis 不可用时 cache.get/set/delete 会抛 redis.exceptions.*。
-# 本模块的缓存被设备列表/故障数量等接口调用，且不在 views.cache_dashboard 装饰器
-# 保护范围内，故在此对所有缓存读写加 try/except，口径与 cache_dashboard 一致：
-#   - 读失败：视为缓存未命中（返回 None），调用方降级为直查 DB。
-#   - 写/删失败：静默忽略，不影响响应。
-# 任何一种失败都只记 WARNING 日志，不向上抛出，确保 Redis 故障不导致 HTTP 500。
-
-def _safe_cache_get(key):
-    """Redis 降级兜底：读失败视为缓存未命中（返回 None），不中断请求。"""
-    try:
-        return cache.get(key)
-    except Exception as exc:
-        logger.warning('fault_utils: Redis get 失败（降级为直查）: %s', exc)
-        return None
-
-
-def _safe_cache_set(key, value, ttl) -> None:
-    """Redis 降级兜底：写失败静默忽略，不影响调用方。"""
-    try:
-        cache.set(key, value, ttl)
-    except Exception as exc:
-        logger.warning('fault_utils: Redis set 失败（降级为无缓存）: %s', exc)
-
-
-def _safe_cache_delete(key) -> None:
-    """Redis 降级兜底：删除失败静默忽略。"""
-    try:
-        cache.delete(key)
-    except Exception as exc:
-        logger.warning('fault_utils: Redis delete 失败（忽略）: %s', exc)
+#: 故障数两级缓存（L1 进程内 LRU + L2 Redis），写入端按故障字段取值变化主动失效
+fault_count_cache = TieredCache('fault_count', ttl=_FAULT_CACHE_TTL, l1_ttl=_FAULT_CACHE_L1_TTL)
 
 
 # ---------------------------------------------------------------------------
@@ -219,21 +187,14 @@ def get_fault_count_cached(specific_part: str) -> Optional[int]:
     Returns:
         int（≥0）：故障数量，或 None（PLCLatestData 无该 specific_part 记录）
     """
-    key = f'{_FAULT_CACHE_PREFIX}{specific_part}'
-    cached = _safe_cache_get(key)
-    if cached is not None:
-        return cached
-    result = _compute_from_db_batch([specific_part])
-    count = result.get(specific_part)
-    if count is not None:
-        _safe_cache_set(key, count, _FAULT_CACHE_TTL)
-    return count
+    return get_fault_count_batch_cached([specific_part]).get(specific_part)
 
 
 def get_fault_count_batch_cached(specific_parts: list) -> dict:
     """批量获取多个 specific_part 的故障数量（带缓存）。
 
-    优先从缓存读取，未命中的 specific_part 批量查 DB 后填充缓存。
+    L1 命中零 IO；L1 未命中的 specific_part 一次 L2 get_many（一次 Redis 往返），
+    仍未命中的批量查 DB 后一次 set_many 回填（并发未命中只查一次，见 tiered_cache）。
 
     Args:
         specific_parts: specific_part 字符串列表
@@ -241,34 +202,43 @@ def get_fault_count_batch_cached(specific_parts: list) -> dict:
     Returns:
         dict: {specific_part: fault_count_or_none}
     """
-    result = {}
-    miss_list = []
+    return fault_count_cache.get_many(specific_parts, _compute_from_db_batch)
 
-    for sp in specific_parts:
-        key = f'{_FAULT_CACHE_PREFIX}{sp}'
-        val = _safe_cache_get(key)
-        if val is not None:
-            result[sp] = val
-        else:
-            miss_list.append(sp)
 
-    if miss_list:
-        db_counts = _compute_from_db_batch(miss_list)
-        for sp, count in db_counts.items():
-            result[sp] = count
-            if count is not None:
-                _safe_cache_set(f'{_FAULT_CACHE_PREFIX}{sp}', count, _FAULT_CACHE_TTL)
+def invalidate_fault_count_cache(specific_part: str) -> None:
+    """主动清除指定 specific_part 的故障数量缓存条目（L2 删除 + 各进程 L1 失效）。"""
+    fault_count_cache.invalidate([specific_part])
 
-    return result
 
+# 写入端变化检测：(specific_part, param_name) -> 最近一次写库的故障字段取值（MQTT 消费者进程内）
+_last_fault_values: dict = {}
+_MISSING_VALUE = object()
 
-def invalidate_fault_count_cache(specific_part: str) -> None:
-    """（备用）主动清除指定 specific_part 的故障数量缓存条目。
 
-    OQ-01 裁决后，mqtt_handlers.py 不调用此函数（缓存由 TTL=60s 自动过期）。
-    保留供未来切换至写入端钩子（ADR-FC-005 方案 B / AB-002）时直接启用，无需修改接口。
+def note_fault_values(records) -> set:
+    """写入端钩子（AB-002）：故障字段取值相对上次写库发生变化的 specific_part 立即失效。
+
+    只在取值变化时失效，避免每轮周期上报都清掉缓存；进程启动后首次见到的字段视为变化。
+
+    Args:
+        records: PLCLatestData 记录 dict 列表（specific_part / param_name / value）
+
+    Returns:
+        set: 本次失效的 specific_part 集合
     """
-    _safe_cache_delete(f'{_FAULT_CACHE_PREFIX}{specific_part}')
+    changed = set()
+    for rec in records:
+        pn = rec['param_name']
+        if pn != 'fresh_air_fault_status' and not is_fault_param(pn):
+            continue
+        key = (rec['specific_part'], pn)
+        value = rec.get('value')
+        if _last_fault_values.get(key, _MISSING_VALUE) != value:
+            _last_fault_values[key] = value
+            changed.add(rec['specific_part'])
+    if changed:
+        fault_count_cache.invalidate(changed)
+    return changed
 
 
 # ---------------------------------------------------------------------------
@@ -340,9 +310,11 @@ def get_fault_details_updated_at(specific_part: str):
 # 内部函数 — DeviceConfig 映射缓存（hotfix BUG-FCC-001）
 # ---------------------------------------------------------------------------
 
-_PARAM_SUBTYPE_CACHE_KEY: str = 'fault_count:param_to_subtypes'
+_PARAM_SUBTYPE_CACHE_KEY: str = 'param_to_subtypes'
 _PARAM_SUBTYPE_CACHE_TTL: int = 60
 
+_param_subtype_cache = TieredCache('fault_param_subtypes', ttl=_PARAM_SUBTYPE_CACHE_TTL, max_entries=1)
+
 
 def _get_param_to_subtypes() -> dict:
     """获取 {param_name: frozenset[sub_type]} 映射。
@@ -352,17 +324,15 @@ def _get_param_to_subtypes() -> dict:
 
     缓存 60s（与故障数缓存对齐），DeviceConfig 极少变更。
     """
-    cached = _safe_cache_get(_PARAM_SUBTYPE_CACHE_KEY)
-    if cached is not None:
-        return cached
+    return _param_subtype_cache.get(_PARAM_SUBTYPE_CACHE_KEY, _load_param_to_subtypes)
 
+
+def _load_param_to_subtypes(_key=None) -> dict:
     from .models import DeviceConfig
     mapping: dict = defaultdict(set)
     for pn, st in DeviceConfig.objects.filter(is_active=True).values_list('param_name', 'sub_type'):
         mapping[pn].add(st)
-    result = {k: frozenset(v) for k, v in mapping.items()}
-    _safe_cache_set(_PARAM_SUBTYPE_CACHE_KEY, result, _PARAM_SUBTYPE_CACHE_TTL)
-    return result
+    return {k: frozenset(v) for k, v in mapping.items()}
 
 
 def _is_param_visible_for_section(param_name: str, specific_part: str, param_to_subtypes: dict) -> bool:
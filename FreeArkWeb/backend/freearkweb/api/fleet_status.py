@@ -0,0 +1,244 @@
+"""
+设备群状态聚合（看板计数）
+
+dashboard_power_status / dashboard_plc_online_rate / dashboard_screen_online_rate 原先每次请求
+都对 PLCConnectionStatus、PLCLatestData、ScreenConnectivityStatus 做多条 COUNT / 子查询。
+本模块在写入侧维护聚合，看板只读一个缓存键：
+
+  - PLCFleetAggregate（MQTT 消费者进程）：每户 connection_status、system_switch、operation_mode；
+    ConnectionStatusHandler 在状态变化提交后、PLCLatestDataHandler 在 upsert 后更新；
+  - ScreenFleetAggregate（大屏心跳消费者进程）：每户 last_seen_at，心跳写库后更新；
+  - FleetStatusPublisher 后台线程：启动时及每 reconcile_seconds 从数据库全量对账
+    （覆盖 plc_connection_monitor 等其他进程直接改库的情况），每 publish_seconds 把计数快照
+    写入 Django 缓存（生产为 Redis，跨进程共享），TTL 为 SNAPSHOT_TTL；
+  - 看板接口 read_fleet_snapshot() 读取快照；快照缺失（消费者未运行 / Redis 不可用）时
+    回退原有数据库查询，口径不变。
+
+计数口径与看板原查询一致：
+  PLC 总数 = PLCConnectionStatus 行数；开机 = 在线且 system_switch 非空非零；
+  运行模式只统计开机设备，1=制冷 / 2=制热 / 3=通风 / 4=除湿，其余计入 unknown；
+  大屏在线 = last_seen_at 距今不超过 threshold_minutes 分钟（看板阈值不一致时不使用快照）。
+
+对账与增量更新之间的极短窗口内发生的变化可能被对账结果覆盖，最迟下一轮对账修正。
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PLC_FLEET_CACHE_KEY = 'fleet:plc'
+SCREEN_FLEET_CACHE_KEY = 'fleet:screen'
+# 快照 TTL：发布线程停止后快照最多保留这么久，之后看板回退数据库查询
+SNAPSHOT_TTL = 60
+DEFAULT_PUBLISH_SECONDS = 5
+DEFAULT_RECONCILE_SECONDS = 60
+# 与 views.ONLINE_THRESHOLD_MINUTES 一致
+SCREEN_ONLINE_THRESHOLD_MINUTES = 15
+
+SWITCH_PARAM = 'system_switch'
+MODE_PARAM = 'operation_mode'
+TRACKED_PARAMS = frozenset([SWITCH_PARAM, MODE_PARAM])
+MODE_NAMES = {1: 'cooling', 2: 'heating', 3: 'ventilation', 4: 'dehumidification'}
+
+
+def _rate(part, total):
+    return round((part / total) * 100, 2) if total > 0 else 0.0
+
+
+class PLCFleetAggregate:
+    """PLC 在线 / 开机 / 运行模式计数（线程安全，供多个 handler worker 并发更新）"""
+
+    cache_key = PLC_FLEET_CACHE_KEY
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}  # specific_part -> 'online' | 'offline'
+        self._params = {SWITCH_PARAM: {}, MODE_PARAM: {}}  # param_name -> {specific_part: value}
+        self.reconciled = False
+
+    def clear(self):
+        with self._lock:
+            self._status = {}
+            self._params = {SWITCH_PARAM: {}, MODE_PARAM: {}}
+            self.reconciled = False
+
+    def set_connection(self, specific_part, status):
+        with self._lock:
+            self._status[specific_part] = status
+
+    def update_params(self, records):
+        """PLCLatestData 记录（dict）中的 system_switch / operation_mode 写入聚合"""
+        tracked = [r for r in records if r['param_name'] in TRACKED_PARAMS]
+        if not tracked:
+            return
+        with self._lock:
+            for r in tracked:
+                self._params[r['param_name']][r['specific_part']] = r['value']
+
+    def reconcile(self):
+        """从数据库全量重建"""
+        from .models import PLCConnectionStatus, PLCLatestData
+
+        status = dict(PLCConnectionStatus.objects.values_list('specific_part', 'connection_status'))
+        params = {SWITCH_PARAM: {}, MODE_PARAM: {}}
+        rows = PLCLatestData.objects.filter(param_name__in=TRACKED_PARAMS).values_list(
+            'param_name', 'specific_part', 'value',
+        )
+        for param_name, specific_part, value in rows:
+            params[param_name][specific_part] = value
+        with self._lock:
+            self._status = status
+            self._params = params
+            self.reconciled = True
+
+    def snapshot(self):
+        with self._lock:
+            status = dict(self._status)
+            switch = dict(self._params[SWITCH_PARAM])
+            mode = dict(self._params[MODE_PARAM])
+
+        online = [sp for sp, s in status.items() if s == 'online']
+        powered_on = [sp for sp in online if switch.get(sp)]
+        modes = dict.fromkeys(MODE_NAMES.values(), 0)
+        for sp in powered_on:
+            name = MODE_NAMES.get(mode.get(sp))
+            if name:
+                modes[name] += 1
+        modes['unknown'] = len(powered_on) - sum(modes.values())
+        total = len(status)
+        return {
+            'total_count': total,
+            'online_count': len(online),
+            'offline_count': total - len(online),
+            'online_rate': _rate(len(online), total),
+            'powered_on_count': len(powered_on),
+            'power_on_rate': _rate(len(powered_on), total),
+            'mode_distribution': modes,
+            'computed_at': time.time(),
+        }
+
+
+class ScreenFleetAggregate:
+    """大屏在线计数：每户最近心跳时间，快照时按阈值计数"""
+
+    cache_key = SCREEN_FLEET_CACHE_KEY
+
+    def __init__(self, threshold_minutes=SCREEN_ONLINE_THRESHOLD_MINUTES):
+        self.threshold_minutes = threshold_minutes
+        self._lock = threading.Lock()
+        self._last_seen = {}  # specific_part -> datetime
+        self.reconciled = False
+
+    def clear(self):
+        with self._lock:
+            self._last_seen = {}
+            self.reconciled = False
+
+    def touch(self, specific_part, seen_at):
+        with self._lock:
+            self._last_seen[specific_part] = seen_at
+
+    def reconcile(self):
+        from .models import ScreenConnectivityStatus
+
+        last_seen = dict(ScreenConnectivityStatus.objects.values_list('specific_part', 'last_seen_at'))
+        with self._lock:
+            self._last_seen = last_seen
+            self.reconciled = True
+
+    def snapshot(self):
+        cutoff = timezone.now() - timedelta(minutes=self.threshold_minutes)
+        with self._lock:
+            seen = list(self._last_seen.values())
+        online = sum(1 for at in seen if at is not None and at >= cutoff)
+        return {
+            'total_count': len(seen),
+            'online_count': online,
+            'rate': _rate(online, len(seen)),
+            'threshold_minutes': self.threshold_minutes,
+            'computed_at': time.time(),
+        }
+
+
+# 进程内单例：同一进程的所有 handler 共用
+plc_fleet = PLCFleetAggregate()
+screen_fleet = ScreenFleetAggregate()
+
+
+def publish_snapshot(aggregate):
+    """把聚合快照写入缓存；未完成首次对账时不发布（避免发布残缺计数）"""
+    if not aggregate.reconciled:
+        return None
+    snap = aggregate.snapshot()
+    try:
+        cache.set(aggregate.cache_key, snap, SNAPSHOT_TTL)
+    except Exception as exc:
+        logger.warning('fleet_status: 快照发布失败 %s: %s', aggregate.cache_key, exc)
+        return None
+    return snap
+
+
+def read_fleet_snapshot(key):
+    """看板读取快照；不存在或缓存不可用时返回 None（调用方回退数据库查询）"""
+    try:
+        return cache.get(key)
+    except Exception as exc:
+        logger.warning('fleet_status: 快照读取失败（回退数据库查询）%s: %s', key, exc)
+        return None
+
+
+class FleetStatusPublisher:
+    """后台线程：定期对账并发布聚合快照"""
+
+    def __init__(self, aggregates, publish_seconds=DEFAULT_PUBLISH_SECONDS,
+                 reconcile_seconds=DEFAULT_RECONCILE_SECONDS):
+        self.aggregates = list(aggregates)
+        self.publish_seconds = publish_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._last_reconcile = None
+        self.stats = {'publishes': 0, 'reconciles': 0, 'errors': 0}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='fleet-status-publisher', daemon=True)
+        self._thread.start()
+        logger.info(f"🚀 FleetStatusPublisher 启动：发布间隔 {self.publish_seconds}s，"
+                    f"对账间隔 {self.reconcile_seconds}s")
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def run_once(self, now=None):
+        """对账（到期时）并发布一轮"""
+        now = time.monotonic() if now is None else now
+        if self._last_reconcile is None or now - self._last_reconcile >= self.reconcile_seconds:
+            close_old_connections()
+            for aggregate in self.aggregates:
+                aggregate.reconcile()
+            self._last_reconcile = now
+            self.stats['reconciles'] += 1
+        for aggregate in self.aggregates:
+            if publish_snapshot(aggregate) is not None:
+                self.stats['publishes'] += 1
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:
+                self.stats['errors'] += 1
+                logger.error(f"❌ FleetStatusPublisher 对账/发布失败: {exc}", exc_info=True)
+            self._stop_event.wait(self.publish_seconds)
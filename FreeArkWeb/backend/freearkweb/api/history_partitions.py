@@ -0,0 +1,246 @@
+"""
+device_param_history 按时间分区管理
+
+device_param_history 是只追加的大表（数千万行），按保留期清理原先只能分批 DELETE
+（dph_cleanup_service，单轮数小时，需把连接超时放大到 600s）。本模块改为 MySQL 原生
+RANGE 分区：
+
+  - 分区键 TO_DAYS(collected_at)，粒度按天（pYYYYMMDD）或按月（pYYYYMM），
+    末尾保留 pmax（MAXVALUE）兜底；
+  - dph_partitions 命令提前创建未来分区（从 pmax 中 REORGANIZE 拆出，pmax 为空时只改元数据）；
+  - 保留期清理改为 DROP PARTITION，只删元数据，秒级完成；
+    只有整个分区都早于截止时间才会被删除，实际保留期最多多出一个分区粒度；
+  - 按 collected_at 范围查询（get_device_param_history 的 start_time/end_time）自动分区裁剪。
+
+MySQL 要求分区键包含在每个唯一键中，首次分区化（convert）会把主键改为 (id, collected_at)。
+ORM 仍以 id 为主键（自增值全局唯一），模型与迁移无需改动。首次分区化会重建整表，
+应在低峰期执行，且最好先用 dph_cleanup_service 清掉超期积压以减少拷贝量。
+
+非 MySQL 数据库（测试 / USE_SQLITE 模式）没有原生分区，使用 EmulatedPartitionBackend：
+分区按数据中的时间范围推算，删除分区退化为按 collected_at 范围 DELETE，接口与语义一致。
+"""
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'device_param_history'
+GRANULARITY_DAY = 'day'
+GRANULARITY_MONTH = 'month'
+GRANULARITIES = (GRANULARITY_DAY, GRANULARITY_MONTH)
+MAXVALUE_PARTITION = 'pmax'
+# 首次分区化时早于保留窗口的行全部归入该分区，随后一次 drop 即可整体删除
+HISTORY_PARTITION = 'phist'
+
+# lower / upper 为分区覆盖的 [lower, upper) 日期范围；lower=None 表示无下界，upper=None 表示 MAXVALUE
+Partition = namedtuple('Partition', ['name', 'lower', 'upper', 'rows'])
+
+
+def to_days(day):
+    """与 MySQL TO_DAYS() 一致的天数（date.toordinal 以 0001-01-01 为 1，MySQL 以 0000-01-01 为 1）"""
+    return day.toordinal() + 365
+
+
+def from_days(days):
+    return date.fromordinal(days - 365)
+
+
+def granule_start(day, granularity):
+    """day 所在分区粒度的起始日期"""
+    return day.replace(day=1) if granularity == GRANULARITY_MONTH else day
+
+
+def next_granule(day, granularity):
+    """下一个分区粒度的起始日期"""
+    if granularity == GRANULARITY_MONTH:
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def partition_name(day, granularity):
+    return f"p{day:%Y%m}" if granularity == GRANULARITY_MONTH else f"p{day:%Y%m%d}"
+
+
+def plan_partitions(start, end, granularity):
+    """[start, end] 范围内每个粒度一个分区：[(name, lower, upper), ...]"""
+    plan = []
+    day = granule_start(start, granularity)
+    while day <= end:
+        upper = next_granule(day, granularity)
+        plan.append((partition_name(day, granularity), day, upper))
+        day = upper
+    return plan
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+class MySQLPartitionBackend:
+    """MySQL 原生 RANGE 分区"""
+
+    native = True
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def list_partitions(self):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                'SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS '
+                'FROM information_schema.PARTITIONS '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL '
+                'ORDER BY PARTITION_ORDINAL_POSITION',
+                [TABLE_NAME],
+            )
+            rows = cur.fetchall()
+        partitions = []
+        lower = None
+        for name, description, table_rows in rows:
+            upper = None if description == 'MAXVALUE' else from_days(int(description))
+            partitions.append(Partition(name, lower, upper, table_rows))
+            lower = upper
+        return partitions
+
+    def convert(self, plan):
+        """首次分区化：主键加入 collected_at，按 plan 建分区（phist 兜住更早的行，pmax 兜住未来）"""
+        definitions = [f"PARTITION {HISTORY_PARTITION} VALUES LESS THAN ({to_days(plan[0][1])})"]
+        definitions += [f"PARTITION {name} VALUES LESS THAN ({to_days(upper)})" for name, _, upper in plan]
+        definitions.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE")
+        with self.conn.cursor() as cur:
+            cur.execute(f'ALTER TABLE {TABLE_NAME} DROP PRIMARY KEY, ADD PRIMARY KEY (id, collected_at)')
+            cur.execute(
+                f'ALTER TABLE {TABLE_NAME} PARTITION BY RANGE (TO_DAYS(collected_at)) ('
+                + ', '.join(definitions) + ')'
+            )
+
+    def add_partitions(self, plan):
+        """从 pmax 中拆出 plan 中的新分区"""
+        definitions = [f"PARTITION {name} VALUES LESS THAN ({to_days(upper)})" for name, _, upper in plan]
+        definitions.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE")
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f'ALTER TABLE {TABLE_NAME} REORGANIZE PARTITION {MAXVALUE_PARTITION} INTO ('
+                + ', '.join(definitions) + ')'
+            )
+
+    def drop_partitions(self, partitions):
+        with self.conn.cursor() as cur:
+            cur.execute(f'ALTER TABLE {TABLE_NAME} DROP PARTITION ' + ', '.join(p.name for p in partitions))
+        return sum(p.rows or 0 for p in partitions)
+
+
+class EmulatedPartitionBackend:
+    """无原生分区的数据库：分区按数据时间范围推算，删除分区退化为范围 DELETE"""
+
+    native = False
+
+    def __init__(self, conn, granularity):
+        self.conn = conn
+        self.granularity = granularity
+
+    def list_partitions(self):
+        from .models import DeviceParamHistory
+        from django.db.models import Max, Min
+
+        bounds = DeviceParamHistory.objects.using(self.conn.alias).aggregate(
+            lo=Min('collected_at'), hi=Max('collected_at'),
+        )
+        partitions = []
+        if bounds['lo'] is not None:
+            for name, lower, upper in plan_partitions(_as_date(bounds['lo']), _as_date(bounds['hi']),
+                                                      self.granularity):
+                partitions.append(Partition(name, lower, upper, None))
+        # 与原生分区保持一致：末尾总有一个 MAXVALUE 分区
+        partitions.append(Partition(MAXVALUE_PARTITION, partitions[-1].upper if partitions else None, None, None))
+        return partitions
+
+    def convert(self, plan):
+        logger.info(f"{self.conn.vendor} 不支持原生分区，使用按时间范围模拟的分区")
+
+    def add_partitions(self, plan):
+        """模拟分区由数据范围推算，无需预建"""
+
+    def drop_partitions(self, partitions):
+        from .models import DeviceParamHistory
+
+        deleted = 0
+        for p in partitions:
+            qs = DeviceParamHistory.objects.using(self.conn.alias).filter(collected_at__lt=p.upper)
+            if p.lower is not None:
+                qs = qs.filter(collected_at__gte=p.lower)
+            deleted += qs.delete()[0]
+        return deleted
+
+
+class HistoryPartitionManager:
+    """device_param_history 分区的创建、查询与按保留期删除
+
+    Args:
+        granularity: 新建分区的粒度，'day' 或 'month'
+        using: 数据库别名
+    """
+
+    def __init__(self, granularity=GRANULARITY_DAY, using='default'):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的分区粒度: {granularity}，可选 {GRANULARITIES}")
+        self.granularity = granularity
+        conn = connections[using]
+        if conn.vendor == 'mysql':
+            self.backend = MySQLPartitionBackend(conn)
+        else:
+            self.backend = EmulatedPartitionBackend(conn, granularity)
+
+    def list_partitions(self):
+        return self.backend.list_partitions()
+
+    def is_partitioned(self):
+        """表是否已按本方案分区（模拟后端视为始终已分区）"""
+        if not self.backend.native:
+            return True
+        return any(p.name == MAXVALUE_PARTITION for p in self.list_partitions())
+
+    def convert(self, retention_days, ahead, today=None, dry_run=False):
+        """首次分区化：为保留窗口内及未来 ahead 个粒度建分区；返回计划 [(name, lower, upper), ...]"""
+        if self.backend.native and self.is_partitioned():
+            raise ValueError(f"{TABLE_NAME} 已分区，无需重复转换")
+        today = today or date.today()
+        plan = plan_partitions(today - timedelta(days=retention_days), self._ahead_end(today, ahead),
+                               self.granularity)
+        if not dry_run:
+            self.backend.convert(plan)
+        return plan
+
+    def ensure_ahead(self, ahead, today=None, dry_run=False):
+        """确保从现有最后一个分区到 today 之后 ahead 个粒度都已建好分区；返回新建计划"""
+        today = today or date.today()
+        partitions = self.list_partitions()
+        if self.backend.native and not partitions:
+            raise ValueError(f"{TABLE_NAME} 尚未分区，请先执行 dph_partitions --convert")
+        bounded = [p.upper for p in partitions if p.upper is not None]
+        start = max(bounded) if bounded else granule_start(today, self.granularity)
+        plan = plan_partitions(start, self._ahead_end(today, ahead), self.granularity)
+        if plan and not dry_run:
+            self.backend.add_partitions(plan)
+        return plan
+
+    def drop_expired(self, cutoff, dry_run=False):
+        """删除上界不晚于 cutoff（整个分区都早于截止时间）的分区；返回 (分区列表, 删除行数)"""
+        cutoff_day = _as_date(cutoff)
+        expired = [
+            p for p in self.list_partitions()
+            if p.upper is not None and p.upper <= cutoff_day
+        ]
+        if not expired or dry_run:
+            return expired, sum(p.rows or 0 for p in expired)
+        return expired, self.backend.drop_partitions(expired)
+
+    def _ahead_end(self, today, ahead):
+        """today 之后第 ahead 个粒度的起始日期（该粒度也会建分区）"""
+        day = granule_start(today, self.granularity)
+        for _ in range(ahead):
+            day = next_granule(day, self.granularity)
+        return day
@@ -0,0 +1,189 @@
+"""
+设备参数小时 / 日汇总（device_param_rollup）
+
+device_param_history 每个 (specific_part, param_name) 每小时保留一条样本，长时间窗口的图表
+（一个月 × 数十个参数）要逐行扫描上万行再在前端聚合。本模块维护预聚合的汇总表：
+
+  - 每个时间桶（小时 / 日）一行：sample_count、value_sum、min、max、last（avg = sum / count）；
+  - PLCLatestDataHandler._write_history 每批写历史时调用 apply_rollups() 增量合并，
+    合并在数据库侧原子完成（MySQL ON DUPLICATE KEY UPDATE / SQLite、PostgreSQL ON CONFLICT），
+    多个 handler 线程并发写同一时间桶也不会丢样本；
+  - 增量汇总基于本批全部采集样本（不受历史表「每小时一条」去重影响），
+    rebuild_rollups() 从 device_param_history 回填时每小时只有去重后的样本，二者 min/max/last 一致，
+    sample_count / avg 的样本口径不同；
+  - get_device_param_history 的 resolution 参数按查询窗口选择最粗的可用粒度（choose_resolution）。
+
+delta 发布模式下未变化的参数不会逐条到达：PLCLatestDataHandler 对每条 delta 消息以 PLCLatestData
+当前值为本轮读取成功但未变化的参数补一条样本（见 _unchanged_records），汇总口径与全量消息一致。
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = 'device_param_rollup'
+RESOLUTION_RAW = 'raw'
+RESOLUTION_HOUR = 'hour'
+RESOLUTION_DAY = 'day'
+RESOLUTION_AUTO = 'auto'
+ROLLUP_RESOLUTIONS = (RESOLUTION_HOUR, RESOLUTION_DAY)
+RESOLUTIONS = (RESOLUTION_RAW, RESOLUTION_HOUR, RESOLUTION_DAY, RESOLUTION_AUTO)
+
+# resolution=auto 时：窗口不超过 RAW_MAX_SPAN 用原始历史，不超过 HOUR_MAX_SPAN 用小时汇总，否则用日汇总
+RAW_MAX_SPAN = timedelta(days=2)
+HOUR_MAX_SPAN = timedelta(days=31)
+
+_COLUMNS = ('specific_part', 'param_name', 'resolution', 'bucket_start',
+            'sample_count', 'value_sum', 'min_value', 'max_value', 'last_value', 'last_at')
+_UNIQUE = ('specific_part', 'param_name', 'resolution', 'bucket_start')
+# 单条 INSERT 的行数上限（SQLite 变量上限 999 / 10 列）
+_UPSERT_CHUNK = 90
+
+
+def bucket_start(ts, resolution):
+    """ts 所在时间桶的起点"""
+    if resolution == RESOLUTION_DAY:
+        return datetime.combine(ts.date(), time.min)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def choose_resolution(start, end):
+    """按查询窗口选择最粗的汇总粒度；窗口不完整时返回 raw（保持原始历史查询行为）"""
+    if start is None or end is None:
+        return RESOLUTION_RAW
+    span = end - start
+    if span <= RAW_MAX_SPAN:
+        return RESOLUTION_RAW
+    if span <= HOUR_MAX_SPAN:
+        return RESOLUTION_HOUR
+    return RESOLUTION_DAY
+
+
+def aggregate_samples(samples, resolutions=ROLLUP_RESOLUTIONS):
+    """(specific_part, param_name, value, collected_at) 样本 → {唯一键: [count, sum, min, max, last, last_at]}
+
+    value / collected_at 为 None 或 value 不是整数的样本跳过。
+    """
+    buckets = {}
+    for specific_part, param_name, value, collected_at in samples:
+        if collected_at is None or not isinstance(value, int) or isinstance(value, bool):
+            continue
+        for resolution in resolutions:
+            key = (specific_part, param_name, resolution, bucket_start(collected_at, resolution))
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, value, value, value, value, collected_at]
+                continue
+            agg[0] += 1
+            agg[1] += value
+            if value < agg[2]:
+                agg[2] = value
+            if value > agg[3]:
+                agg[3] = value
+            if collected_at >= agg[5]:
+                agg[4] = value
+                agg[5] = collected_at
+    return buckets
+
+
+def apply_rollups(records, using='default'):
+    """把一批 PLCLatestData 记录（dict：specific_part / param_name / value / collected_at）合并进汇总表
+
+    Returns:
+        int: 写入（新增或合并）的时间桶数
+    """
+    buckets = aggregate_samples(
+        (r['specific_part'], r['param_name'], r['value'], r['collected_at']) for r in records
+    )
+    if buckets:
+        _upsert_buckets(buckets, using)
+    return len(buckets)
+
+
+def _upsert_sql(vendor, rows):
+    placeholders = '(' + ', '.join(['%s'] * len(_COLUMNS)) + ')'
+    sql = (f"INSERT INTO {TABLE_NAME} ({', '.join(_COLUMNS)}) VALUES "
+           + ', '.join([placeholders] * rows))
+    if vendor == 'mysql':
+        # MySQL 按书写顺序求值且后面的赋值能看到前面的新值：last_value 必须在 last_at 之前更新
+        return sql + (
+            ' ON DUPLICATE KEY UPDATE'
+            ' last_value = IF(VALUES(last_at) >= last_at, VALUES(last_value), last_value),'
+            ' last_at = GREATEST(last_at, VALUES(last_at)),'
+            ' sample_count = sample_count + VALUES(sample_count),'
+            ' value_sum = value_sum + VALUES(value_sum),'
+            ' min_value = LEAST(min_value, VALUES(min_value)),'
+            ' max_value = GREATEST(max_value, VALUES(max_value))'
+        )
+    least, greatest = ('MIN', 'MAX') if vendor == 'sqlite' else ('LEAST', 'GREATEST')
+    t = TABLE_NAME
+    return sql + (
+        f" ON CONFLICT ({', '.join(_UNIQUE)}) DO UPDATE SET"
+        f' sample_count = {t}.sample_count + excluded.sample_count,'
+        f' value_sum = {t}.value_sum + excluded.value_sum,'
+        f' min_value = {least}({t}.min_value, excluded.min_value),'
+        f' max_value = {greatest}({t}.max_value, excluded.max_value),'
+        f' last_value = CASE WHEN excluded.last_at >= {t}.last_at'
+        f' THEN excluded.last_value ELSE {t}.last_value END,'
+        f' last_at = {greatest}({t}.last_at, excluded.last_at)'
+    )
+
+
+def _upsert_buckets(buckets, using):
+    conn = connections[using]
+    adapt = conn.ops.adapt_datetimefield_value
+    rows = [
+        (sp, pn, res, adapt(bucket), count, total, lo, hi, last, adapt(last_at))
+        for (sp, pn, res, bucket), (count, total, lo, hi, last, last_at) in buckets.items()
+    ]
+    with conn.cursor() as cur:
+        for i in range(0, len(rows), _UPSERT_CHUNK):
+            chunk = rows[i:i + _UPSERT_CHUNK]
+            cur.execute(_upsert_sql(conn.vendor, len(chunk)), [v for row in chunk for v in row])
+
+
+def rebuild_rollups(start, end, using='default', chunk_size=5000):
+    """从 device_param_history 重算 [start, end) 内的小时 / 日汇总（按天处理，start / end 为 date）
+
+    每天先删除该天已有的汇总再整体写入，可重复执行；返回 (处理天数, 读取样本数, 写入时间桶数)。
+    """
+    from .models import DeviceParamHistory, DeviceParamRollup, parse_history_value
+
+    days = samples = written = 0
+    day = start
+    while day < end:
+        lower = datetime.combine(day, time.min)
+        upper = lower + timedelta(days=1)
+        rows = (
+            DeviceParamHistory.objects.using(using)
+            .filter(collected_at__gte=lower, collected_at__lt=upper)
+            .values_list('specific_part', 'param_name', 'num_value', 'value', 'collected_at')
+            .iterator(chunk_size=chunk_size)
+        )
+        day_samples = []
+        for sp, pn, num_value, text, collected_at in rows:
+            value = num_value if num_value is not None else parse_history_value(text)
+            day_samples.append((sp, pn, value, collected_at))
+        buckets = aggregate_samples(day_samples)
+        with transaction.atomic(using=using):
+            DeviceParamRollup.objects.using(using).filter(
+                bucket_start__gte=lower, bucket_start__lt=upper,
+            ).delete()
+            if buckets:
+                _upsert_buckets(buckets, using)
+        days += 1
+        samples += len(day_samples)
+        written += len(buckets)
+        day += timedelta(days=1)
+    return days, samples, written
+
+
+def prune_rollups(resolution, cutoff, using='default'):
+    """删除 bucket_start 早于 cutoff 的某粒度汇总，返回删除行数"""
+    from .models import DeviceParamRollup
+
+    return DeviceParamRollup.objects.using(using).filter(
+        resolution=resolution, bucket_start__lt=cutoff,
+    ).delete()[0]
@@ -134,8 +134,8 @@ class SemanticRouter:
         self._ensure_loaded()
         if not self._exemplars:
             return None
-        from api.rag_service import RagEmbedder
-        qv = RagEmbedder().embed_query(query)
+        from api.query_embedding import embed_query
+        qv = embed_query(query)  # 与 search_rag 共用查询向量缓存（同一问题只 embed 一次）
         return self.route_with_vector(qv)
 
     async def route(self, query: str) -> Optional[str]:
@@ -0,0 +1,251 @@
+"""
+PLCLatestData 合并写入阶段（MQTTConsumer 的 energy/general worker 与数据库之间）。
+
+原先每个 worker 处理完一条消息立即执行一次 upsert + 历史写入，9 个 worker 各自持有连接、
+各写各的小批量。本模块把写库从 worker 中拆出：
+
+  - worker 只负责解析与校验，把 PLCLatestData 记录交给 LatestDataWriter.submit()；
+  - 写入线程在缓冲区达到 batch_size 条记录或最早一条记录等待超过 flush_ms 毫秒时刷新；
+  - 缓冲区按 (specific_part, param_name) 去重，同一参数只保留最新一条，
+    刷新时整批执行一次 upsert、一次 delta 采集时间刷新和一次历史写入；
+  - 非连接类错误（个别消息的 DataError / IntegrityError 等）按设备二分重试，只丢弃出错设备的记录；
+  - 刷新耗时、批大小等统计由 snapshot() 提供，并入 MQTTConsumer.health_snapshot()。
+
+写入线程未启动时（单元测试、未 start 的消费者）submit() 直接同步写库，行为与合并前一致。
+"""
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# 缓冲区达到该记录数（去重后）立即刷新
+DEFAULT_BATCH_SIZE = 2000
+# 最早一条待写记录的最长等待时间（毫秒）
+DEFAULT_FLUSH_MS = 500
+
+
+class LatestDataWriter:
+    """合并 PLCLatestData upsert 的后台写入器。
+
+    Args:
+        handler: 执行实际写库的 PLCLatestDataHandler（自身不带 writer）
+        batch_size: 去重后待写记录数达到该值立即刷新
+        flush_ms: 最早一条待写记录等待超过该毫秒数即刷新
+        is_connection_error: (exc) -> bool，判断刷新失败是否为连接类错误
+        reconnect: 连接类错误后调用的重建连接钩子；重建后本批重试一次
+    """
+
+    def __init__(self, handler, batch_size=DEFAULT_BATCH_SIZE, flush_ms=DEFAULT_FLUSH_MS,
+                 is_connection_error=None, reconnect=None):
+        self.handler = handler
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = max(1, int(flush_ms))
+        self.is_connection_error = is_connection_error or (lambda exc: False)
+        self.reconnect = reconnect or connection.close
+
+        self._cond = threading.Condition()
+        # (specific_part, param_name) -> 最新记录
+        self._records = {}
+        # specific_part -> delta 设备描述（见 PLCLatestDataHandler._delta_device）
+        self._delta_devices = {}
+        self._oldest_ts = None
+        self._thread = None
+        self._stopping = False
+        self._flush_lock = threading.Lock()
+
+        self.stats = {
+            'flushes': 0,
+            'records_in': 0,
+            'records_merged': 0,
+            'records_flushed': 0,
+            'flush_errors': 0,
+            'records_dropped': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动写入线程（重复调用无副作用）"""
+        with self._cond:
+            if self.running:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="plc-latest-writer", daemon=True)
+            self._thread.start()
+        logger.info(f"PLCLatestData 合并写入线程已启动: batch_size={self.batch_size}, flush_ms={self.flush_ms}")
+
+    def stop(self, timeout=30):
+        """停止写入线程并刷新剩余记录"""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning(f"PLCLatestData 合并写入线程未在 {timeout}s 内退出")
+        self._thread = None
+        logger.info(f"PLCLatestData 合并写入线程已停止: {self.snapshot()}")
+
+    # ------------------------------------------------------------------
+    # 提交与刷新
+    # ------------------------------------------------------------------
+
+    def submit(self, records, delta_devices=()):
+        """worker 调用：提交一条消息解析出的记录与 delta 设备，立即返回"""
+        if not self.running:
+            self.handler._persist(list(records), list(delta_devices))
+            return
+
+        with self._cond:
+            before = len(self._records)
+            for rec in records:
+                self._records[(rec['specific_part'], rec['param_name'])] = rec
+            for device in delta_devices:
+                self._delta_devices[device[0]] = device
+            self.stats['records_in'] += len(records)
+            self.stats['records_merged'] += len(records) - (len(self._records) - before)
+            if self._oldest_ts is None and (self._records or self._delta_devices):
+                # 缓冲区由空变为非空：唤醒写入线程开始按 flush_ms 计时
+                self._oldest_ts = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._records) >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self):
+        """取出当前缓冲区并写库；返回写入的记录数"""
+        with self._cond:
+            records, delta_devices = self._take()
+        if not records and not delta_devices:
+            return 0
+        with self._flush_lock:
+            self._write(records, delta_devices)
+        return len(records)
+
+    def _take(self):
+        records = list(self._records.values())
+        delta_devices = list(self._delta_devices.values())
+        self._records = {}
+        self._delta_devices = {}
+        self._oldest_ts = None
+        return records, delta_devices
+
+    def _due_in(self):
+        """距离下一次按时间刷新的秒数；缓冲区为空时返回 None"""
+        if self._oldest_ts is None:
+            return None
+        return self._oldest_ts + self.flush_ms / 1000.0 - time.monotonic()
+
+    def _run(self):
+        close_old_connections()
+        try:
+            while True:
+                with self._cond:
+                    while not self._stopping and len(self._records) < self.batch_size:
+                        due_in = self._due_in()
+                        if due_in is not None and due_in <= 0:
+                            break
+                        self._cond.wait(timeout=due_in)
+                    stopping = self._stopping
+                self.flush()
+                if stopping:
+                    # 退出前把 stop 期间仍在提交的记录一并写完
+                    self.flush()
+                    return
+        finally:
+            connection.close()
+
+    def _write(self, records, delta_devices):
+        t_start = time.monotonic()
+        try:
+            close_old_connections()
+            try:
+                self.handler._persist(records, delta_devices)
+            except Exception as e:
+                if not self.is_connection_error(e):
+                    raise
+                logger.warning(f"PLCLatestData 合并写入遇到连接错误，重建连接后重试: {e}")
+                self.reconnect()
+                self.handler._persist(records, delta_devices)
+        except Exception as e:
+            self.stats['flush_errors'] += 1
+            if self.is_connection_error(e):
+                self.stats['records_dropped'] += len(records)
+                logger.error(
+                    f"PLCLatestData 合并写入失败，丢弃本批 {len(records)} 条记录: {e}", exc_info=True
+                )
+                return
+            # 数据类错误（DataError / IntegrityError 等）通常只来自个别消息：按设备二分重试，只丢弃出错设备
+            logger.warning(f"PLCLatestData 合并写入失败，按设备拆分重试: {e}")
+            records = self._write_isolated(self._group_by_device(records, delta_devices))
+            if not records:
+                return
+
+        elapsed_ms = (time.monotonic() - t_start) * 1000
+        stats = self.stats
+        stats['flushes'] += 1
+        stats['records_flushed'] += len(records)
+        stats['last_batch_size'] = len(records)
+        stats['max_batch_size'] = max(stats['max_batch_size'], len(records))
+        stats['last_flush_ms'] = round(elapsed_ms, 1)
+        stats['max_flush_ms'] = max(stats['max_flush_ms'], stats['last_flush_ms'])
+        stats['total_flush_ms'] += elapsed_ms
+        logger.debug(
+            f"PLCLatestData 合并写入完成: 记录={len(records)}, delta设备={len(delta_devices)}, "
+            f"耗时={elapsed_ms:.1f}ms"
+        )
+
+    @staticmethod
+    def _group_by_device(records, delta_devices):
+        """按 specific_part 拆分为 [(records, delta_devices)]，二分重试的最小单位是一台设备"""
+        groups = {}
+        for rec in records:
+            groups.setdefault(rec['specific_part'], ([], []))[0].append(rec)
+        for device in delta_devices:
+            groups.setdefault(device[0], ([], []))[1].append(device)
+        return list(groups.values())
+
+    def _write_isolated(self, groups):
+        """二分写入设备分组，返回写入成功的记录；单台设备仍失败时丢弃其记录并计入 records_dropped"""
+        records = [rec for group in groups for rec in group[0]]
+        delta_devices = [device for group in groups for device in group[1]]
+        try:
+            self.handler._persist(records, delta_devices)
+            return records
+        except Exception as e:
+            if len(groups) > 1:
+                mid = len(groups) // 2
+                return self._write_isolated(groups[:mid]) + self._write_isolated(groups[mid:])
+            self.stats['records_dropped'] += len(records)
+            specific_part = records[0]['specific_part'] if records else delta_devices[0][0]
+            logger.error(
+                f"PLCLatestData 合并写入失败，丢弃设备 {specific_part} 的 {len(records)} 条记录: {e}",
+                exc_info=True,
+            )
+            return []
+
+    def snapshot(self):
+        """写入统计（累计计数 + 当前待写记录数、平均批大小与平均刷新耗时）"""
+        with self._cond:
+            snapshot = dict(self.stats)
+            snapshot['pending'] = len(self._records)
+            snapshot['pending_delta_devices'] = len(self._delta_devices)
+        flushes = snapshot['flushes']
+        snapshot['avg_batch_size'] = round(snapshot['records_flushed'] / flushes, 1) if flushes else 0
+        snapshot['avg_flush_ms'] = round(snapshot.pop('total_flush_ms') / flushes, 1) if flushes else 0.0
+        snapshot['running'] = self.running
+        return snapshot
@@ -0,0 +1,189 @@
+"""
+bench_mqtt_dispatch — MQTTConsumer._dispatch 解析吞吐基准
+
+用途：
+  把一份 MQTT 消息语料逐条重放给 MQTTConsumer._dispatch，报告每秒消息数与 MB/s，
+  用于衡量解析快速路径（orjson 直接解析 bytes、按需生成 DEBUG 摘要）的收益。
+  安装了 orjson 时额外跑一遍标准库 json 作对照。
+
+只读保证：
+  重放时所有 handler 替换为计数用空 handler，不写任何表；--capture 只订阅不发布。
+
+语料格式（JSONL，每行一条）：
+  {"topic": "/datacollection/plc/to/collector/3-1", "payload": "<JSON 文本>"}
+  {"topic": "...", "payload_b64": "<base64，紧凑格式等二进制负载>"}
+
+用法：
+  python manage.py bench_mqtt_dispatch                                # 合成语料
+  python manage.py bench_mqtt_dispatch --capture corpus.jsonl --count 500
+  python manage.py bench_mqtt_dispatch --corpus corpus.jsonl --rounds 5
+"""
+import base64
+import json
+import logging
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+from django.core.management.base import BaseCommand, CommandError
+
+from api import mqtt_consumer as consumer_module
+from api.mqtt_handlers import MessageHandler
+
+ENERGY_PARAMS = ('total_hot_quantity', 'total_cold_quantity')
+
+
+class _CountingHandler(MessageHandler):
+    """替换真实 handler：只计数，不访问数据库"""
+
+    def __init__(self):
+        self.count = 0
+
+    def handle(self, topic, payload, building_file=None):
+        self.count += 1
+
+    def handle_batch(self, topic, devices, building_file=None):
+        self.count += len(devices)
+
+
+def _synthetic_corpus(devices, params):
+    """按采集端格式合成语料：每台设备一条 energy 消息 + 一条 general 消息"""
+    rng = random.Random(42)
+    ts = '2026-04-18 10:42:55'
+    corpus = []
+    for i in range(devices):
+        device_id = f'3-1-{i // 40 + 1}-{i % 40 + 101}'
+        for names in (ENERGY_PARAMS, [f'param_{j:03d}' for j in range(params)]):
+            data = {}
+            for name in names:
+                success = rng.random() > 0.05
+                data[name] = {
+                    'value': rng.randint(0, 65535) if success else None,
+                    'success': success,
+                    'message': '读取成功' if success else '读取失败：连接超时',
+                    'timestamp': ts,
+                }
+            payload = {device_id: {'PLC IP地址': f'192.168.{i // 250}.{i % 250 + 1}',
+                                   'timestamp': ts, 'data': data}}
+            corpus.append(('/datacollection/plc/to/collector/3-1',
+                           json.dumps(payload, ensure_ascii=False).encode('utf-8')))
+    return corpus
+
+
+def _load_corpus(path):
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if 'payload_b64' in item:
+                    payload = base64.b64decode(item['payload_b64'])
+                else:
+                    payload = item['payload'].encode('utf-8')
+                corpus.append((item['topic'], payload))
+            except (ValueError, KeyError, TypeError) as e:
+                raise CommandError(f'语料第 {line_no} 行格式错误: {e}')
+    return corpus
+
+
+class Command(BaseCommand):
+    help = '重放 MQTT 消息语料，测量 MQTTConsumer._dispatch 每秒处理消息数（不写库）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='JSONL 语料文件（缺省时合成语料）')
+        parser.add_argument('--capture', help='从 broker 订阅消息写入该 JSONL 文件后退出')
+        parser.add_argument('--count', type=int, default=500, help='--capture 采集的消息条数')
+        parser.add_argument('--timeout', type=int, default=600, help='--capture 最长等待秒数')
+        parser.add_argument('--devices', type=int, default=300, help='合成语料的设备数')
+        parser.add_argument('--params', type=int, default=89, help='合成语料 general 消息的参数数')
+        parser.add_argument('--rounds', type=int, default=5, help='重放轮数，取最佳值')
+
+    def handle(self, *args, **options):
+        if options.get('capture'):
+            self._capture(options['capture'], options['count'], options['timeout'])
+            return
+
+        if options.get('corpus'):
+            corpus = _load_corpus(options['corpus'])
+            source = options['corpus']
+        else:
+            corpus = _synthetic_corpus(options['devices'], options['params'])
+            source = f"合成（{options['devices']} 台设备 × energy/general）"
+        if not corpus:
+            raise CommandError('语料为空')
+
+        consumer = consumer_module.MQTTConsumer()
+        counter = _CountingHandler()
+        consumer.energy_handlers = consumer.general_handlers = [counter]
+        total_bytes = sum(len(payload) for _, payload in corpus)
+        debug = consumer_module.logger.isEnabledFor(logging.DEBUG)
+
+        self.stdout.write(f'语料: {source}，{len(corpus)} 条，{total_bytes / 1024:.1f} KB，'
+                          f'DEBUG 日志={"开启" if debug else "关闭"}')
+        decoders = [('orjson' if consumer_module.orjson is not None else 'json', consumer_module.orjson)]
+        if consumer_module.orjson is not None:
+            decoders.append(('json', None))
+
+        for name, module in decoders:
+            saved = consumer_module.orjson
+            consumer_module.orjson = module
+            try:
+                best = self._replay(consumer, corpus, options['rounds'])
+            finally:
+                consumer_module.orjson = saved
+            self.stdout.write(
+                f'  {name:<7} {len(corpus) / best:>10.0f} msg/s  '
+                f'{total_bytes / best / 1024 / 1024:>7.1f} MB/s  （单轮 {best * 1000:.1f} ms）'
+            )
+        self.stdout.write(f'handler 收到设备数: {counter.count}')
+
+    @staticmethod
+    def _replay(consumer, corpus, rounds):
+        best = float('inf')
+        for _ in range(max(1, rounds)):
+            start = time.perf_counter()
+            for topic, payload in corpus:
+                consumer._dispatch(topic, payload, is_general=len(payload) >= 2000)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def _capture(self, path, count, timeout):
+        """只读订阅 PLC 数据主题，把原始负载写成 JSONL 语料"""
+        config = consumer_module.load_mqtt_config()
+        topic = config.get('topic', '/datacollection/plc/to/collector/#')
+        captured = []
+        done = threading.Event()
+
+        def on_connect(client, userdata, flags, rc):
+            client.subscribe(topic, qos=0)
+
+        def on_message(client, userdata, msg):
+            if len(captured) < count:
+                captured.append((msg.topic, bytes(msg.payload)))
+            if len(captured) >= count:
+                done.set()
+
+        client = mqtt.Client(client_id=f'bench-capture-{int(time.time())}', clean_session=True)
+        client.on_connect = on_connect
+        client.on_message = on_message
+        if config.get('username') and config.get('password'):
+            client.username_pw_set(config['username'], config['password'])
+        client.connect(config.get('host', '192.168.31.98'), int(config.get('port', 32788)), 60)
+        client.loop_start()
+        try:
+            done.wait(timeout)
+        finally:
+            client.loop_stop()
+            client.disconnect()
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for msg_topic, payload in captured:
+                try:
+                    item = {'topic': msg_topic, 'payload': payload.decode('utf-8')}
+                except UnicodeDecodeError:
+                    item = {'topic': msg_topic, 'payload_b64': base64.b64encode(payload).decode('ascii')}
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self.stdout.write(f'已采集 {len(captured)} 条消息（主题 {topic}）→ {path}')
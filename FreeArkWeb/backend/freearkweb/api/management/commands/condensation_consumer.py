@@ -16,6 +16,9 @@ Django Management Command，由 freeark-condensation-consumer.service 管理。
         → value 为整数（0=off，非0=on）
       * 均无 → "unknown"
 
+已由统一接入服务 screen_uplink_consumer（CondensationProcessor）取代，本命令保留用于回滚；
+两者不要同时运行。
+
 功能：
   1. 加载配置（复用 heartbeat_broker_config.json，独立 client_id）
   2. 启动时从 DB 重建进程内状态机
@@ -27,12 +30,16 @@ Django Management Command，由 freeark-condensation-consumer.service 管理。
 import json
 import logging
 import os
-import time
-from typing import Optional
 
 from django.core.management.base import BaseCommand
-from django.db import close_old_connections
-from django.utils import timezone
+
+from api.screen_uplink.message import CACHE_REFRESH_INTERVAL, MacCache, UplinkMessage  # noqa: F401
+from api.screen_uplink.processors import (
+    CONDENSATION_ALARM_TAG as _CONDENSATION_ALARM_TAG,  # noqa: F401
+    SNAPSHOT_TAGS as _SNAPSHOT_TAGS,  # noqa: F401
+    normalize_system_switch_from_mqtt,
+    process_condensation_status,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -65,21 +72,6 @@ _FALLBACK_CONFIG: dict = {
     'fault_consumer_use_mac_list': False,
 }
 
-# MAC → specific_part 缓存刷新间隔（秒），与 fault_consumer 一致
-CACHE_REFRESH_INTERVAL = 300
-
-# condensation_alarm attrTag 名称
-_CONDENSATION_ALARM_TAG = 'condensation_alarm'
-
-# 快照字段 attrTag 映射（attrTag → Python 字段名）
-_SNAPSHOT_TAGS = {
-    'dew_point_temp': 'dew_point_temp',
-    'NTC_temp': 'ntc_temp',       # 大屏上报 NTC_temp（大写 NTC），映射到 ntc_temp 字段
-    'ntc_temp': 'ntc_temp',       # 容错兼容小写
-    'humidity': 'humidity',
-}
-
-
 # ---------------------------------------------------------------------------
 # 配置加载
 # ---------------------------------------------------------------------------
@@ -108,70 +100,11 @@ def _load_condensation_consumer_config() -> dict:
 
 
 # ---------------------------------------------------------------------------
-# MAC → specific_part 缓存（独立于 fault_consumer，不共享状态）
-# ---------------------------------------------------------------------------
-
-class _MacCache:
-    """内存缓存：mac_str → specific_part，定期从 DB 刷新。"""
-
-    def __init__(self):
-        self._cache: dict = {}
-        self._last_refresh: float = 0.0
-
-    def _refresh(self):
-        from api.models import OwnerInfo
-        close_old_connections()
-        try:
-            mapping = {
-                row['unique_id']: row['specific_part']
-                for row in OwnerInfo.objects.filter(
-                    unique_id__isnull=False
-                ).exclude(unique_id='').values('unique_id', 'specific_part')
-            }
-            self._cache = mapping
-            self._last_refresh = time.time()
-            logger.info('_MacCache: 刷新完成，共 %d 条映射', len(self._cache))
-        except Exception as exc:
-            logger.warning('_MacCache: 刷新失败，继续使用旧缓存: %s', exc)
-
-    def get_specific_part(self, mac: str) -> Optional[str]:
-        if time.time() - self._last_refresh > CACHE_REFRESH_INTERVAL:
-            self._refresh()
-        return self._cache.get(mac)
-
-
-# ---------------------------------------------------------------------------
-# system_switch 规范化（MQTT 直取路径，RISK-CW-ARCH-01 闭环）
+# MAC → specific_part 缓存 / system_switch 规范化（与统一接入服务共用实现）
 # ---------------------------------------------------------------------------
 
-def _normalize_system_switch_from_mqtt(raw_value) -> str:
-    """将 MQTT items[] 中直取的 system_switch attrValue 规范化为 "on"/"off"/"unknown"。
-
-    生产抓包已核实（sniff_2860fae9a34ab8a9_20260525_235217.ndjson）：
-      - 260001 等水力模块同报文含 system_switch 时，attrValue 已是字符串 "on" 或 "off"
-      - 做 lower() 容错（防止 "ON"/"OFF" 大写变体）
-
-    规范化规则：
-      - None / "" / 空白 → "unknown"
-      - lower() == "off" → "off"
-      - lower() == "on"  → "on"
-      - 其他非空字符串   → "on"（保守处理：非 off 即 on，记 WARNING）
-    """
-    if raw_value is None:
-        return 'unknown'
-    s = str(raw_value).strip().lower()
-    if not s:
-        return 'unknown'
-    if s == 'off':
-        return 'off'
-    if s == 'on':
-        return 'on'
-    # 非预期值（如 "0"/"1"）：非 "off" 非空 → "on"，记警告
-    logger.warning(
-        '_normalize_system_switch_from_mqtt: 非预期值 %r，按 "on" 处理（已核实生产格式为 on/off）',
-        raw_value,
-    )
-    return 'on'
+_MacCache = MacCache
+_normalize_system_switch_from_mqtt = normalize_system_switch_from_mqtt
 
 
 # ---------------------------------------------------------------------------
@@ -182,149 +115,27 @@ def _handle_message(msg, mac_cache: _MacCache) -> None:
     """解析单条 MQTT 消息并驱动结露预警状态机。
 
     解析流程：
-      1. JSON 解析，验证 header.name == "DeviceStatusUpdate"
+      1. JSON 解析，验证 header.name == "DeviceStatusUpdate"，提取 deviceSn / productCode / items
+         （api.screen_uplink.message.UplinkMessage）
       2. topic 末段取 MAC → mac_cache.get_specific_part(mac) → specific_part
-      3. 提取 payload.data: deviceSn, productCode, items[]
-      4. 扫描 items[]，寻找 condensation_alarm attrTag
-         → 未找到 → 跳过本报文（非结露预警相关报文）
-      5. 提取同 deviceSn 的快照字段（dew_point_temp, NTC_temp, humidity, system_switch）
-      6. system_switch 优先级（RISK-CW-ARCH-01）：
-         a. items[] 中有 system_switch attrTag → MQTT 直取（已是 on/off 字符串），做规范化
-         b. items[] 中无 system_switch → state_machine 内部调 _get_system_switch_for_specific_part
-            （PLCLatestData 方案 A，整数 0/非0 转 off/on）
-         c. 均无 → "unknown"（由 state_machine 内部处理，此处传 None 触发路径 b）
-      7. is_active_now = int(condensation_alarm_value) != 0
-      8. 调用 process_condensation_alarm(...)
+      3. 扫描 items[]：condensation_alarm（未找到则跳过）、快照字段、system_switch 优先级
+         （RISK-CW-ARCH-01），驱动状态机（api.screen_uplink.processors.process_condensation_status）
     """
-    from api.condensation_consumer.state_machine import process_condensation_alarm
-
-    received_at = timezone.now()
-
-    # 1. JSON 解析
-    try:
-        root = json.loads(msg.payload.decode('utf-8', errors='replace'))
-    except (json.JSONDecodeError, Exception) as exc:
-        logger.warning('JSON 解析失败，跳过: topic=%s err=%s', msg.topic, exc)
-        return
-
-    # 2. 验证报文类型
-    header = root.get('header') or {}
-    if header.get('name') != 'DeviceStatusUpdate':
-        logger.debug('非 DeviceStatusUpdate 报文，跳过: topic=%s name=%s',
-                     msg.topic, header.get('name'))
+    message = UplinkMessage(msg.topic, msg.payload)
+    status = message.device_status
+    if status is None:
         return
 
-    # 3. MAC → specific_part（优先 topic 末段，回退 header.screenMac）
-    topic_parts = msg.topic.rstrip('/').split('/')
-    mac = topic_parts[-1] if topic_parts else ''
-    if not mac:
-        mac = str(header.get('screenMac', '') or '')
+    mac = message.mac
     if not mac:
         logger.warning('无法解析 MAC: topic=%s', msg.topic)
         return
-
     specific_part = mac_cache.get_specific_part(mac)
     if specific_part is None:
         logger.debug('未找到 mac=%s 对应的 specific_part，跳过', mac)
         return
 
-    # 4. 提取设备信息（嵌套在 root.payload.data 中）
-    payload_obj = root.get('payload') or {}
-    data = payload_obj.get('data') or {}
-    # 兼容旧测试结构
-    if not data and 'data' in root:
-        data = root.get('data') or {}
-    device_sn = str(data.get('deviceSn', '') or '')
-    product_code = str(data.get('productCode', '') or '')
-    items = data.get('items') or []
-
-    if not device_sn:
-        logger.debug('报文缺少 deviceSn，跳过: topic=%s', msg.topic)
-        return
-
-    # 5. 扫描 items[]，收集 condensation_alarm 及快照字段
-    condensation_alarm_value = None
-    dew_point_temp = None
-    ntc_temp = None
-    humidity = None
-    system_switch_raw = None       # None 表示 items[] 中未找到 system_switch
-    system_switch_found = False    # 标记是否从 MQTT 直取到 system_switch
-
-    for item in items:
-        if not isinstance(item, dict):
-            continue
-        attr_tag = str(item.get('attrTag') or item.get('paramName') or '')
-        attr_value = item.get('attrValue') if 'attrValue' in item else item.get('value')
-
-        if attr_tag == _CONDENSATION_ALARM_TAG:
-            condensation_alarm_value = str(attr_value) if attr_value is not None else None
-        elif attr_tag in _SNAPSHOT_TAGS:
-            field = _SNAPSHOT_TAGS[attr_tag]
-            if field == 'dew_point_temp' and attr_value is not None:
-                dew_point_temp = str(attr_value)
-            elif field == 'ntc_temp' and attr_value is not None:
-                ntc_temp = str(attr_value)
-            elif field == 'humidity' and attr_value is not None:
-                humidity = str(attr_value)
-        elif attr_tag == 'system_switch':
-            # MQTT 直取路径（RISK-CW-ARCH-01 闭环）：
-            # 生产抓包核实 260001 同报文 system_switch attrValue 为 "on"/"off" 字符串
-            system_switch_raw = attr_value
-            system_switch_found = True
-
-    # 6. 检查是否有 condensation_alarm 字段（不含此字段则跳过）
-    if condensation_alarm_value is None:
-        logger.debug(
-            '报文不含 condensation_alarm，跳过: topic=%s device_sn=%s product_code=%s',
-            msg.topic, device_sn, product_code,
-        )
-        return
-
-    # 7. 计算 is_active_now
-    try:
-        is_active_now = int(float(condensation_alarm_value)) != 0
-    except (ValueError, TypeError):
-        logger.warning(
-            'condensation_alarm_value 无法转为数字，按正常态处理: value=%r device_sn=%s',
-            condensation_alarm_value, device_sn,
-        )
-        is_active_now = False
-
-    # 8. system_switch 规范化（MQTT 直取路径）
-    # RISK-CW-ARCH-01：MQTT 直取的 attrValue 是 "on"/"off" 字符串，做 lower() 容错
-    # 若 items[] 中无 system_switch → 传 None，state_machine 内部走 PLCLatestData 方案 A
-    system_switch = None
-    if system_switch_found:
-        system_switch = _normalize_system_switch_from_mqtt(system_switch_raw)
-        logger.debug(
-            'system_switch MQTT 直取: device_sn=%s raw=%r normalized=%s',
-            device_sn, system_switch_raw, system_switch,
-        )
-    # system_switch_found=False 时传 None，state_machine._t1_insert 内部调用 _get_system_switch_for_specific_part
-
-    # 9. 驱动状态机
-    logger.debug(
-        '_handle_message: specific_part=%s device_sn=%s product_code=%s '
-        'condensation_alarm=%s is_active=%s system_switch=%s',
-        specific_part, device_sn, product_code,
-        condensation_alarm_value, is_active_now, system_switch,
-    )
-
-    try:
-        process_condensation_alarm(
-            specific_part=specific_part,
-            device_sn=device_sn,
-            product_code=product_code,
-            is_active_now=is_active_now,
-            received_at=received_at,
-            condensation_alarm_value=condensation_alarm_value,
-            dew_point_temp=dew_point_temp,
-            ntc_temp=ntc_temp,
-            humidity=humidity,
-            system_switch=system_switch,
-        )
-    except Exception as exc:
-        logger.exception('process_condensation_alarm 异常: device_sn=%s err=%s', device_sn, exc)
+    process_condensation_status(specific_part, status, message.received_at)
 
 
 # ---------------------------------------------------------------------------
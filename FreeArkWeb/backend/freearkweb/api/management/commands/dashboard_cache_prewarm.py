@@ -0,0 +1,92 @@
+"""
+dashboard_cache_prewarm — 看板接口缓存预热服务
+
+背景：
+  看板接口经 cache_dashboard 装饰器缓存（软 TTL 30s + 硬 TTL，软过期后返回旧值并单飞后台刷新，
+  见 api/views.py）。墙面大屏与多个浏览器同时轮询时，缓存缺失的第一个请求仍需同步等待聚合查询。
+  本服务常驻，按固定间隔把已登记（@cache_dashboard）且近期有人读取（DASHBOARD_IDLE_SECONDS 内）
+  的看板键在软过期前提前重算，轮询请求基本只命中新鲜值；无人观看的键不预热。
+  提前量取检查间隔且不超过 ttl - 间隔，刚刷新的键下一轮不会再次重算。
+  与请求触发的后台刷新共用同一把 Redis 锁，不会重复计算。
+
+  vary_params 的接口（如 dashboard_trend / dashboard_total_energy）按看板默认请求（无查询参数）预热。
+
+用法：
+  # 预热一次并退出（不看读取记录，部署后冷启动时使用）
+  python manage.py dashboard_cache_prewarm --once
+
+  # 常驻：每 10 秒检查一次，提前刷新 10 秒内将软过期、且近期有人读取的键（推荐生产模式）
+  python manage.py dashboard_cache_prewarm --interval-seconds 10
+
+  # 只预热指定接口
+  python manage.py dashboard_cache_prewarm --once --keys dashboard_power_status,dashboard_trend
+"""
+import time
+
+import schedule
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api import views
+
+from .common import get_service_logger, log_error, log_service_start, log_service_stop
+
+logger = get_service_logger('dashboard_cache_prewarm')
+
+
+class Command(BaseCommand):
+    help = '看板接口缓存预热：在软过期前提前重算已登记的看板缓存键'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='只预热一轮就退出')
+        parser.add_argument('--interval-seconds', type=int, default=10,
+                            help='常驻模式下每多少秒检查一轮（默认 10s，应不超过看板软 TTL 30s 的一半）')
+        parser.add_argument('--keys', default='',
+                            help='只预热这些接口（逗号分隔的视图名），默认全部已登记接口')
+
+    def handle(self, *args, **options):
+        interval = max(1, options['interval_seconds'])
+        names = {k.strip() for k in options['keys'].split(',') if k.strip()}
+        unknown = names - set(views.DASHBOARD_CACHE_REGISTRY)
+        if unknown:
+            raise CommandError(f'未登记的看板接口: {", ".join(sorted(unknown))}；'
+                               f'可选 {", ".join(sorted(views.DASHBOARD_CACHE_REGISTRY))}')
+
+        def _job(horizon, only_read=True):
+            try:
+                started = time.monotonic()
+                stats = views.prewarm_dashboard_cache(names or None, horizon=horizon, only_read=only_read)
+                logger.info('🔥 看板预热：刷新 %s，跳过 %s，失败 %s，耗时 %.0fms',
+                            stats['refreshed'], stats['skipped'], stats['failed'],
+                            (time.monotonic() - started) * 1000)
+                return stats
+            except Exception as exc:
+                log_error(logger, '看板预热异常', exc)
+                return None
+            finally:
+                # 长驻进程：每轮结束关闭连接，避免 MySQL wait_timeout 断开后复用失效连接
+                connection.close()
+
+        if options['once']:
+            stats = _job(horizon=0, only_read=False) or {}
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ 预热完成：刷新 {stats.get('refreshed', 0)}，跳过 {stats.get('skipped', 0)}，"
+                f"失败 {stats.get('failed', 0)}"
+            ))
+            return
+
+        log_service_start(logger, '看板缓存预热服务', {
+            'interval_seconds': interval,
+            'keys': ', '.join(sorted(names)) or '全部',
+        })
+        schedule.every(interval).seconds.do(_job, horizon=interval)
+        self.stdout.write(self.style.WARNING(f'🔁 常驻模式启动，每 {interval}s 一轮；Ctrl+C 退出'))
+        _job(horizon=interval)
+        try:
+            while True:
+                schedule.run_pending()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info('🛑 收到 Ctrl+C，退出 schedule 循环')
+        finally:
+            log_service_stop(logger, '看板缓存预热服务')
@@ -0,0 +1,106 @@
+"""
+dph_backfill_numeric — device_param_history 存量文本值迁入 num_value
+
+背景：
+  migration 0048 给 DeviceParamHistory 加了 BIGINT 列 num_value，新写入只填 num_value；
+  存量行的值仍是 TEXT（value）。本命令按主键区间分批把能解析为整数的文本值写入 num_value
+  并置空 value（--keep-text 时保留），无法转为整数的旧值（如 "正常"、"26.5"）原样保留，
+  读取侧经 DeviceParamHistory.native_value 统一处理。
+
+  只处理 num_value 为空且 value 非空的行，可随时中断后重跑（幂等、可续跑）。
+  置空 value 后表空间需 OPTIMIZE TABLE（或分区轮转删除旧分区）才会真正回收。
+
+用法：
+  python manage.py dph_backfill_numeric --dry-run
+  python manage.py dph_backfill_numeric --batch-size 5000 --sleep-ms 100
+  python manage.py dph_backfill_numeric --max-batches 200      # 分多次逐步迁移
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from api.models import DeviceParamHistory, parse_history_value
+
+from .common import get_service_logger, log_task_completion
+from .dph_cleanup_service import _apply_cleanup_db_timeout
+
+logger = get_service_logger('dph_cleanup_service')
+
+# BIGINT 有符号范围
+_BIGINT_MIN = -(1 << 63)
+_BIGINT_MAX = (1 << 63) - 1
+
+
+def numeric_for_backfill(text):
+    """文本值 → 可写入 num_value 的整数；不能无损转换时返回 None"""
+    value = parse_history_value(text)
+    if isinstance(value, int) and _BIGINT_MIN <= value <= _BIGINT_MAX:
+        return value
+    return None
+
+
+class Command(BaseCommand):
+    help = '把 device_param_history 存量文本值分批迁入 num_value（BIGINT）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批扫描的主键区间大小（默认 5000）')
+        parser.add_argument('--sleep-ms', type=int, default=100, help='两批之间的休眠毫秒数（默认 100ms）')
+        parser.add_argument('--max-batches', type=int, default=0, help='最多执行的批次数，0 表示不限制')
+        parser.add_argument('--start-id', type=int, default=0, help='从该主键开始扫描（默认从最小 id）')
+        parser.add_argument('--keep-text', action='store_true', help='迁移后保留 value 文本（默认置空以缩小表）')
+        parser.add_argument('--dry-run', action='store_true', help='只统计可迁移行数，不写库')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        sleep_ms = options['sleep_ms']
+        max_batches = options['max_batches']
+        keep_text = options['keep_text']
+        dry_run = options['dry_run']
+        prefix = '[dph_backfill][DRY-RUN]' if dry_run else '[dph_backfill]'
+
+        _apply_cleanup_db_timeout()
+        bounds = DeviceParamHistory.objects.aggregate(lo=Min('id'), hi=Max('id'))
+        if bounds['lo'] is None:
+            self.stdout.write(f'{prefix} device_param_history 为空，无需迁移')
+            return
+        current = max(bounds['lo'], options['start_id'])
+        max_id = bounds['hi']
+        self.stdout.write(f'{prefix} 扫描 id 区间 [{current}, {max_id}]，batch_size={batch_size}')
+
+        converted = skipped = batches = 0
+        while current <= max_id:
+            if max_batches and batches >= max_batches:
+                self.stdout.write(f'{prefix} 已达 max_batches={max_batches}，下次用 --start-id {current} 续跑')
+                break
+            batches += 1
+            rows = DeviceParamHistory.objects.filter(
+                id__gte=current, id__lt=current + batch_size,
+                num_value__isnull=True, value__isnull=False,
+            ).values_list('id', 'value')
+
+            updates = []
+            for row_id, text in rows:
+                number = numeric_for_backfill(text)
+                if number is None:
+                    skipped += 1
+                    continue
+                updates.append(DeviceParamHistory(
+                    id=row_id, num_value=number, value=text if keep_text else None,
+                ))
+            if updates and not dry_run:
+                DeviceParamHistory.objects.bulk_update(updates, ['num_value', 'value'], batch_size=1000)
+            converted += len(updates)
+            current += batch_size
+
+            if batches % 20 == 0:
+                self.stdout.write(f'{prefix} 进度: id<{current}，已迁移 {converted} 行，保留文本 {skipped} 行')
+            if sleep_ms > 0 and not dry_run:
+                time.sleep(sleep_ms / 1000.0)
+
+        self.stdout.write(f'{prefix} 完成：迁移 {converted} 行，无法转为整数保留文本 {skipped} 行，'
+                          f'共 {batches} 批')
+        log_task_completion(logger, 'dph_backfill_numeric', {
+            'converted': converted, 'skipped': skipped, 'batches': batches,
+            'next_id': current, 'dry_run': dry_run,
+        })
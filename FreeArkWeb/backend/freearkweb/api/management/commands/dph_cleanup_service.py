@@ -17,6 +17,11 @@ device_param_history 定时清理服务
   # 以 cron 模式持续运行（每天凌晨 3:00 执行）
   python manage.py dph_cleanup_service --days 7 --cron "0 3 * * *"
 
+分区模式（见 api/history_partitions.py、dph_partitions 命令）：
+  表已按 collected_at 分区时（--mode auto 自动识别，或 --mode partition 强制），
+  每轮清理改为 DROP 整个早于保留期的分区（只删元数据，秒级完成），
+  并顺带提前创建未来 --ahead 个粒度的分区；未分区时仍走下面的分批 DELETE。
+
 索引说明（安全性）：
   device_param_history 表在 collected_at 上有单列索引（db_index=True），
   在 created_at 上无独立索引。边界查询统一使用 collected_at，
@@ -38,6 +43,8 @@ import schedule
 from django.core.management.base import BaseCommand
 from django.db import connection, connections, OperationalError, close_old_connections
 
+from api.history_partitions import GRANULARITIES, GRANULARITY_DAY, HistoryPartitionManager
+
 from .common import (
     get_service_logger,
     log_error,
@@ -55,6 +62,9 @@ logger = get_service_logger('dph_cleanup_service')
 # 能跑到完，而不被 mysqlclient 客户端 socket 超时掐断。仅在本进程内生效。
 DPH_CLEANUP_DB_TIMEOUT = 600
 
+# 清理方式：auto=已分区则删分区否则分批 DELETE；partition=强制删分区；delete=强制分批 DELETE
+CLEANUP_MODES = ('auto', 'partition', 'delete')
+
 
 def _apply_cleanup_db_timeout():
     """
@@ -136,6 +146,24 @@ class Command(BaseCommand):
             help='单轮清理最多执行的批次数，0 表示不限制（默认 0）。'
                  '用于把大量历史积压分多次/多天逐步清理',
         )
+        parser.add_argument(
+            '--mode',
+            choices=CLEANUP_MODES,
+            default='auto',
+            help='清理方式：auto（默认，表已分区则删分区，否则分批 DELETE）/ partition / delete',
+        )
+        parser.add_argument(
+            '--granularity',
+            choices=GRANULARITIES,
+            default=GRANULARITY_DAY,
+            help='分区模式下提前创建分区的粒度（默认 day，需与 dph_partitions --convert 一致）',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=7,
+            help='分区模式下每轮提前创建今天之后多少个粒度的分区（默认 7）',
+        )
 
     def handle(self, *args, **options):
         days = options['days']
@@ -145,6 +173,11 @@ class Command(BaseCommand):
         run_once = options['once']
         dry_run = options['dry_run']
         max_batches = options.get('max_batches', 0)
+        partition_options = {
+            'mode': options.get('mode', 'auto'),
+            'granularity': options.get('granularity', GRANULARITY_DAY),
+            'ahead': options.get('ahead', 7),
+        }
 
         # 放大本进程的 DB 读写超时，避免大表慢查询被 settings.py 的 60s
         # 客户端超时掐断（详见 _apply_cleanup_db_timeout 文档）。
@@ -160,15 +193,17 @@ class Command(BaseCommand):
             'sleep_ms': sleep_ms,
             'dry_run': dry_run,
             'max_batches': max_batches,
+            **partition_options,
         })
 
         if run_once:
             log_task_start(logger, '执行一次性清理')
-            self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches)
+            self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches, **partition_options)
             return
 
         # 常驻模式：按 cron 调度
-        self._setup_schedule(cron_expr, days, batch_size, sleep_ms, dry_run, max_batches)
+        self._setup_schedule(cron_expr, days, batch_size, sleep_ms, dry_run, max_batches,
+                             **partition_options)
         try:
             self.stdout.write(f'[dph_cleanup] 常驻模式启动，cron={cron_expr}，按 Ctrl+C 退出')
             while True:
@@ -189,9 +224,10 @@ class Command(BaseCommand):
     # ------------------------------------------------------------------
 
     def _run_cleanup(self, days: int, batch_size: int, sleep_ms: int,
-                     dry_run: bool, max_batches: int = 0):
+                     dry_run: bool, max_batches: int = 0, mode: str = 'auto',
+                     granularity: str = GRANULARITY_DAY, ahead: int = 7):
         """
-        按主键 id 小步分批删除超出保留窗口的记录。
+        按主键 id 小步分批删除超出保留窗口的记录（表已分区时改为删分区，见 _run_partition_cleanup）。
 
         策略：
           1. 用 collected_at 索引（单列，db_index=True）确定待删截止 id，
@@ -219,6 +255,10 @@ class Command(BaseCommand):
         """
         close_old_connections()
 
+        if self._use_partitions(mode, granularity):
+            self._run_partition_cleanup(days, dry_run, granularity, ahead)
+            return
+
         cutoff_dt = datetime.now() - timedelta(days=days)
         cutoff_str = cutoff_dt.strftime('%Y-%m-%d %H:%M:%S')
 
@@ -368,12 +408,55 @@ class Command(BaseCommand):
             self.stderr.write(err_msg)
             connection.close()
 
+    # ------------------------------------------------------------------
+    # 分区模式
+    # ------------------------------------------------------------------
+
+    def _use_partitions(self, mode: str, granularity: str) -> bool:
+        """auto 模式下仅当 MySQL 表已按本方案分区时才走删分区；探测失败按未分区处理"""
+        if mode != 'auto':
+            return mode == 'partition'
+        try:
+            manager = HistoryPartitionManager(granularity=granularity)
+            return manager.backend.native and manager.is_partitioned()
+        except Exception as exc:
+            log_warning(logger, f'分区探测失败，按未分区处理（分批 DELETE）: {exc}')
+            return False
+
+    def _run_partition_cleanup(self, days: int, dry_run: bool, granularity: str, ahead: int):
+        """删除整个早于保留期的分区，并提前创建未来分区。异常处理与分批 DELETE 模式一致：只记录不重抛。"""
+        cutoff_dt = datetime.now() - timedelta(days=days)
+        prefix = '[dph_cleanup][DRY-RUN]' if dry_run else '[dph_cleanup]'
+        try:
+            manager = HistoryPartitionManager(granularity=granularity)
+            expired, rows = manager.drop_expired(cutoff_dt, dry_run=dry_run)
+            names = ', '.join(p.name for p in expired) or '无'
+            self.stdout.write(
+                f'{prefix} 分区模式：删除早于 {cutoff_dt:%Y-%m-%d %H:%M:%S} 的分区 {len(expired)} 个'
+                f'（约 {rows} 行）：{names}'
+            )
+            created = manager.ensure_ahead(ahead, dry_run=dry_run) if manager.backend.native else []
+            if created:
+                self.stdout.write(f'{prefix} 提前创建分区 {len(created)} 个：'
+                                  f'{created[0][0]} … {created[-1][0]}')
+            log_task_completion(logger, 'dph_cleanup partition', {
+                'dropped_partitions': len(expired),
+                'rows': rows,
+                'created_partitions': len(created),
+                'cutoff_collected_at': cutoff_dt.strftime('%Y-%m-%d %H:%M:%S'),
+                'dry_run': dry_run,
+            })
+        except Exception as exc:
+            log_error(logger, 'dph_cleanup partition error', exc)
+            self.stderr.write(f'[dph_cleanup] 分区清理异常: {exc}，本次清理轮次中止。')
+            connection.close()
+
     # ------------------------------------------------------------------
     # 调度配置
     # ------------------------------------------------------------------
 
     def _setup_schedule(self, cron_expr: str, days: int, batch_size: int,
-                        sleep_ms: int, dry_run: bool, max_batches: int = 0):
+                        sleep_ms: int, dry_run: bool, max_batches: int = 0, **partition_options):
         """解析 cron 表达式，注册调度任务。仅支持简单数字 + * 通配格式。"""
         try:
             parts = cron_expr.strip().split()
@@ -391,7 +474,7 @@ class Command(BaseCommand):
             }
 
             def job():
-                self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches)
+                self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches, **partition_options)
 
             if weekday_s == '*':
                 schedule.every().day.at(scheduled_time).do(job)
@@ -408,6 +491,6 @@ class Command(BaseCommand):
             self.stdout.write(f'[dph_cleanup] cron 解析失败: {e}，使用默认每天 03:00')
 
             def job():
-                self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches)
+                self._run_cleanup(days, batch_size, sleep_ms, dry_run, max_batches, **partition_options)
 
             schedule.every().day.at('03:00').do(job)
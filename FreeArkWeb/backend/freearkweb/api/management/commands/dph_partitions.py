@@ -0,0 +1,88 @@
+"""
+dph_partitions — device_param_history 时间分区管理
+
+用途：
+  device_param_history 按 collected_at 做 RANGE 分区后，保留期清理变为 DROP PARTITION（只删元数据），
+  不再需要数小时的分批 DELETE。本命令负责首次分区化、提前创建未来分区、查看分区与按保留期删除分区。
+  分区方案与 MySQL 限制说明见 api/history_partitions.py。
+
+用法：
+  # 查看当前分区
+  python manage.py dph_partitions --list
+
+  # 首次分区化（重建整表，低峰期执行；先加 --dry-run 看计划）
+  python manage.py dph_partitions --convert --days 7 --ahead 7 --dry-run
+  python manage.py dph_partitions --convert --days 7 --ahead 7
+
+  # 提前创建未来 7 天的分区（dph_cleanup_service 每轮清理时也会自动执行）
+  python manage.py dph_partitions --ensure --ahead 7
+
+  # 删除整个早于保留期的分区
+  python manage.py dph_partitions --drop-expired --days 7
+
+  # 按月分区
+  python manage.py dph_partitions --convert --granularity month --days 62 --ahead 2
+"""
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.history_partitions import GRANULARITIES, GRANULARITY_DAY, HistoryPartitionManager
+
+from .common import get_service_logger, log_task_completion
+
+logger = get_service_logger('dph_cleanup_service')
+
+
+class Command(BaseCommand):
+    help = 'device_param_history 时间分区管理：首次分区化、提前建分区、按保留期删除分区'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='列出当前分区')
+        parser.add_argument('--convert', action='store_true', help='首次分区化（重建整表）')
+        parser.add_argument('--ensure', action='store_true', help='提前创建未来分区')
+        parser.add_argument('--drop-expired', action='store_true', help='删除整个早于保留期的分区')
+        parser.add_argument('--granularity', choices=GRANULARITIES, default=GRANULARITY_DAY,
+                            help='分区粒度（默认 day）')
+        parser.add_argument('--days', type=int, default=7, help='保留最近多少天的数据（默认 7 天）')
+        parser.add_argument('--ahead', type=int, default=7,
+                            help='提前创建今天之后多少个粒度的分区（默认 7）')
+        parser.add_argument('--dry-run', action='store_true', help='只打印计划，不执行 DDL')
+
+    def handle(self, *args, **options):
+        if not any(options.get(k) for k in ('list', 'convert', 'ensure', 'drop_expired')):
+            raise CommandError('必须指定 --list / --convert / --ensure / --drop-expired 之一')
+
+        manager = HistoryPartitionManager(granularity=options['granularity'])
+        dry_run = options['dry_run']
+        prefix = '[dph_partitions][DRY-RUN]' if dry_run else '[dph_partitions]'
+        if not manager.backend.native:
+            self.stdout.write(f'{prefix} 当前数据库不支持原生分区，使用按时间范围模拟的分区')
+
+        try:
+            if options['convert']:
+                plan = manager.convert(options['days'], options['ahead'], dry_run=dry_run)
+                self.stdout.write(f'{prefix} 分区化完成：新建 {len(plan)} 个分区 '
+                                  f'{plan[0][0]} … {plan[-1][0]}（另含 phist / pmax）')
+            if options['ensure']:
+                plan = manager.ensure_ahead(options['ahead'], dry_run=dry_run)
+                names = ', '.join(name for name, _, _ in plan) or '无'
+                self.stdout.write(f'{prefix} 新建未来分区 {len(plan)} 个：{names}')
+            if options['drop_expired']:
+                cutoff = datetime.now() - timedelta(days=options['days'])
+                expired, rows = manager.drop_expired(cutoff, dry_run=dry_run)
+                names = ', '.join(p.name for p in expired) or '无'
+                self.stdout.write(f'{prefix} 删除早于 {cutoff:%Y-%m-%d %H:%M:%S} 的分区 {len(expired)} 个'
+                                  f'（约 {rows} 行）：{names}')
+                log_task_completion(logger, 'dph_partitions drop-expired', {
+                    'dropped_partitions': len(expired), 'rows': rows, 'dry_run': dry_run,
+                })
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['list']:
+            for p in manager.list_partitions():
+                lower = p.lower.isoformat() if p.lower else '-'
+                upper = p.upper.isoformat() if p.upper else 'MAXVALUE'
+                rows = '?' if p.rows is None else p.rows
+                self.stdout.write(f'{p.name:<10} [{lower}, {upper})  rows≈{rows}')
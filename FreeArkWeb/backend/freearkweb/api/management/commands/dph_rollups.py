@@ -0,0 +1,77 @@
+"""
+dph_rollups — device_param_rollup 小时 / 日汇总回填与清理
+
+背景：
+  汇总表由 PLCLatestDataHandler 写历史时增量维护（api/history_rollups.py），
+  上线前的存量历史、或采集服务停机期间补录的历史需要本命令从 device_param_history 回填。
+  回填按天重算：先删该天已有汇总再整体写入，可重复执行。
+  回填数据来自每小时去重后的历史样本，count / avg 的样本口径与增量汇总不同（min/max/last 一致）。
+
+  日汇总体积很小长期保留；小时汇总可用 --prune-hourly-days 清理超期部分。
+
+用法：
+  # 回填最近 7 天（含今天）
+  python manage.py dph_rollups --backfill --days 7
+
+  # 回填指定日期区间 [start, end]
+  python manage.py dph_rollups --backfill --start 2026-09-01 --end 2026-09-30
+
+  # 删除 90 天前的小时汇总
+  python manage.py dph_rollups --prune-hourly-days 90
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.history_rollups import RESOLUTION_HOUR, prune_rollups, rebuild_rollups
+
+from .common import get_service_logger, log_task_completion
+from .dph_cleanup_service import _apply_cleanup_db_timeout
+
+logger = get_service_logger('dph_cleanup_service')
+
+
+def _parse_date(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'日期格式错误: {text}，应为 YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'device_param_rollup 小时 / 日汇总：从 device_param_history 回填、清理超期小时汇总'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='从 device_param_history 重算汇总')
+        parser.add_argument('--days', type=int, default=7, help='回填最近多少天（含今天，默认 7）')
+        parser.add_argument('--start', help='回填起始日期 YYYY-MM-DD（指定后忽略 --days）')
+        parser.add_argument('--end', help='回填结束日期 YYYY-MM-DD（含，默认今天）')
+        parser.add_argument('--prune-hourly-days', type=int, default=0,
+                            help='删除早于该天数的小时汇总，0 表示不清理')
+
+    def handle(self, *args, **options):
+        if not options['backfill'] and not options['prune_hourly_days']:
+            raise CommandError('必须指定 --backfill 或 --prune-hourly-days')
+
+        _apply_cleanup_db_timeout()
+        if options['backfill']:
+            end = _parse_date(options['end']) if options['end'] else date.today()
+            if options['start']:
+                start = _parse_date(options['start'])
+            else:
+                start = end - timedelta(days=max(1, options['days']) - 1)
+            if start > end:
+                raise CommandError(f'起始日期 {start} 晚于结束日期 {end}')
+
+            self.stdout.write(f'[dph_rollups] 回填 {start} ~ {end}')
+            days, samples, buckets = rebuild_rollups(start, end + timedelta(days=1))
+            self.stdout.write(f'[dph_rollups] 回填完成：{days} 天，读取历史 {samples} 条，写入汇总 {buckets} 行')
+            log_task_completion(logger, 'dph_rollups backfill', {
+                'start': str(start), 'end': str(end), 'samples': samples, 'buckets': buckets,
+            })
+
+        if options['prune_hourly_days']:
+            cutoff = datetime.combine(date.today() - timedelta(days=options['prune_hourly_days']), time.min)
+            deleted = prune_rollups(RESOLUTION_HOUR, cutoff)
+            self.stdout.write(f'[dph_rollups] 删除 {cutoff:%Y-%m-%d} 之前的小时汇总 {deleted} 行')
+            log_task_completion(logger, 'dph_rollups prune-hourly', {'deleted': deleted})
@@ -11,6 +11,9 @@ Django Management Command，由 freeark-fault-consumer.service 管理。
   4. 解析 DeviceStatusUpdate 报文，驱动故障状态机（T1/T2/T3）
   5. loop_forever(retry_first_connection=True) 持续运行，systemd 托管重启
 
+已由统一接入服务 screen_uplink_consumer（FaultProcessor）取代，本命令保留用于回滚；
+两者不要同时运行（状态机各自一份，会重复写 T1/T3）。
+
 设计约束（ADR-FM-01）：
   - 独立于 freeark-screen-heartbeat，client_id='freeark-fault-consumer'
   - paho-mqtt 1.x API（与 screen_heartbeat_consumer 相同模式）
@@ -21,12 +24,11 @@ Django Management Command，由 freeark-fault-consumer.service 管理。
 import json
 import logging
 import os
-import time
-from typing import Optional
 
 from django.core.management.base import BaseCommand
-from django.db import close_old_connections
-from django.utils import timezone
+
+from api.screen_uplink.message import CACHE_REFRESH_INTERVAL, MacCache, UplinkMessage  # noqa: F401
+from api.screen_uplink.processors import process_fault_status
 
 logger = logging.getLogger(__name__)
 
@@ -59,9 +61,6 @@ _FALLBACK_CONFIG: dict = {
     'fault_consumer_use_mac_list': False,
 }
 
-# MAC → specific_part 缓存刷新间隔（秒），与心跳服务一致
-CACHE_REFRESH_INTERVAL = 300
-
 
 # ---------------------------------------------------------------------------
 # 配置加载
@@ -91,36 +90,10 @@ def _load_fault_consumer_config() -> dict:
 
 
 # ---------------------------------------------------------------------------
-# MAC → specific_part 缓存（独立于心跳服务，不共享状态）
+# MAC → specific_part 缓存（与统一接入服务共用实现，进程内各自一份）
 # ---------------------------------------------------------------------------
 
-class _MacCache:
-    """内存缓存：mac_str → specific_part，定期从 DB 刷新。"""
-
-    def __init__(self):
-        self._cache: dict = {}
-        self._last_refresh: float = 0.0
-
-    def _refresh(self):
-        from api.models import OwnerInfo
-        close_old_connections()
-        try:
-            mapping = {
-                row['unique_id']: row['specific_part']
-                for row in OwnerInfo.objects.filter(
-                    unique_id__isnull=False
-                ).exclude(unique_id='').values('unique_id', 'specific_part')
-            }
-            self._cache = mapping
-            self._last_refresh = time.time()
-            logger.info('_MacCache: 刷新完成，共 %d 条映射', len(self._cache))
-        except Exception as exc:
-            logger.warning('_MacCache: 刷新失败，继续使用旧缓存: %s', exc)
-
-    def get_specific_part(self, mac: str) -> Optional[str]:
-        if time.time() - self._last_refresh > CACHE_REFRESH_INTERVAL:
-            self._refresh()
-        return self._cache.get(mac)
+_MacCache = MacCache
 
 
 # ---------------------------------------------------------------------------
@@ -131,100 +104,27 @@ def _handle_message(msg, mac_cache: _MacCache) -> None:
     """解析单条 MQTT 消息并驱动故障状态机。
 
     解析流程（ADR-FM-04 §4.1，hotfix BUG-FM-002 后实际报文字段）：
-      1. JSON 解析，验证 header.name == "DeviceStatusUpdate"
+      1. JSON 解析，验证 header.name == "DeviceStatusUpdate"，提取 deviceSn / productCode / items
+         （api.screen_uplink.message.UplinkMessage）
       2. MAC → specific_part 映射（topic 末段或 header.screenMac）
-      3. 从 payload.data 提取 deviceSn, productCode
-      4. 遍历 items[]，对每个 fault_candidate 字段（attrTag）调用状态机
-
-    实际报文结构（生产 EMQX 实测）：
-      {"header": {"name": "DeviceStatusUpdate", "screenMac": "<mac>"},
-       "payload": {"code": 200,
-                   "data": {"deviceSn": <int>, "productCode": <int>,
-                            "items": [{"attrTag": "<name>", "attrValue": "<v>"}]}}}
+      3. 遍历 items[]，对每个 fault_candidate 字段（attrTag）调用状态机
+         （api.screen_uplink.processors.process_fault_status）
     """
-    from api.fault_consumer.fault_classifier import (
-        is_fault_candidate,
-        is_fault_active,
-        get_fault_type_and_severity,
-        get_fault_message,
-    )
-    from api.fault_consumer.state_machine import process_fault_field
-
-    received_at = timezone.now()
-
-    # 1. JSON 解析
-    try:
-        root = json.loads(msg.payload.decode('utf-8', errors='replace'))
-    except (json.JSONDecodeError, Exception) as exc:
-        logger.warning('JSON 解析失败，跳过: topic=%s err=%s', msg.topic, exc)
+    message = UplinkMessage(msg.topic, msg.payload)
+    status = message.device_status
+    if status is None:
         return
 
-    # 2. 验证报文类型
-    header = root.get('header') or {}
-    if header.get('name') != 'DeviceStatusUpdate':
-        logger.debug('非 DeviceStatusUpdate 报文，跳过: topic=%s name=%s',
-                     msg.topic, header.get('name'))
-        return
-
-    # 3. MAC → specific_part（优先 topic 末段，回退 header.screenMac）
-    topic_parts = msg.topic.rstrip('/').split('/')
-    mac = topic_parts[-1] if topic_parts else ''
-    if not mac:
-        mac = str(header.get('screenMac', '') or '')
+    mac = message.mac
     if not mac:
         logger.warning('无法解析 MAC: topic=%s', msg.topic)
         return
-
     specific_part = mac_cache.get_specific_part(mac)
     if specific_part is None:
         logger.debug('未找到 mac=%s 对应的 specific_part，跳过', mac)
         return
 
-    # 4. 提取设备信息（嵌套在 root.payload.data 中，非 root.data）
-    payload_obj = root.get('payload') or {}
-    data = payload_obj.get('data') or {}
-    # 兼容旧测试结构：若 root.data 存在则回退使用（仅老格式有效）
-    if not data and 'data' in root:
-        data = root.get('data') or {}
-    device_sn = str(data.get('deviceSn', '') or '')
-    product_code = str(data.get('productCode', '') or '')
-    items = data.get('items') or []
-
-    if not device_sn:
-        logger.debug('报文缺少 deviceSn，跳过: topic=%s', msg.topic)
-        return
-
-    # 5. 遍历 items，处理故障字段（实际字段名 attrTag/attrValue）
-    for item in items:
-        if not isinstance(item, dict):
-            continue
-        # 优先 attrTag/attrValue（生产实际格式），回退 paramName/value（旧测试格式）
-        param_name = str(item.get('attrTag') or item.get('paramName') or '')
-        value = item.get('attrValue') if 'attrValue' in item else item.get('value')
-
-        if not param_name:
-            continue
-        if not is_fault_candidate(param_name):
-            continue
-
-        active_now = is_fault_active(param_name, value)
-        fault_type, severity = get_fault_type_and_severity(param_name)
-        fault_msg = get_fault_message(param_name)
-
-        try:
-            process_fault_field(
-                specific_part=specific_part,
-                device_sn=device_sn,
-                product_code=product_code,
-                fault_code=param_name,
-                fault_type=fault_type,
-                severity=severity,
-                fault_message=fault_msg,
-                is_active_now=active_now,
-                received_at=received_at,
-            )
-        except Exception as exc:
-            logger.exception('process_fault_field 异常: param=%s err=%s', param_name, exc)
+    process_fault_status(specific_part, status, message.received_at)
 
 
 # ---------------------------------------------------------------------------
@@ -164,6 +164,14 @@ class Command(BaseCommand):
                 f'qsize(e/g/o)={snap.get("energy_qsize")}/'
                 f'{snap.get("general_qsize")}/{snap.get("ondemand_qsize")}'
             )
+            writer = snap.get('latest_writer')
+            if writer:
+                msg += (
+                    f' writer(pending={writer.get("pending")} '
+                    f'batch last/avg={writer.get("last_batch_size")}/{writer.get("avg_batch_size")} '
+                    f'flush_ms last/max={writer.get("last_flush_ms")}/{writer.get("max_flush_ms")} '
+                    f'errors={writer.get("flush_errors")})'
+                )
             logger.info(msg)
         except Exception as exc:
             log_error(logger, '健康快照采集异常（不影响主流程）', exc)
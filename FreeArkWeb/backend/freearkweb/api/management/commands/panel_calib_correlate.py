@@ -141,7 +141,7 @@ class Command(BaseCommand):
 
         qs = DeviceParamHistory.objects.filter(
             specific_part=specific_part, param_name__in=wanted,
-        )
+        ).only('param_name', 'value', 'num_value')
         if window:
             qs = qs.filter(
                 collected_at__gte=window[0] - _WINDOW_PAD,
@@ -156,7 +156,10 @@ class Command(BaseCommand):
                 sfx = rec.param_name[len(prefix):]
                 if sfx not in suffixes:
                     continue
-                val = to_float(rec.value, discrete=(sfx in discrete))
+                if rec.num_value is not None:
+                    val = float(rec.num_value)
+                else:
+                    val = to_float(rec.value, discrete=(sfx in discrete))
                 if val is not None:
                     series[prefix].setdefault(sfx, []).append(val)
                     count += 1
@@ -0,0 +1,67 @@
+"""
+rag_resume_ingest — 从检查点续跑中断的 RAG 文档入库
+
+背景：
+  RagIngestor 在 web 进程的守护线程中入库，进程重启（部署 / 崩溃 / 断电）会打断入库，
+  文档停留在 pending / parsing。入库检查点（RAG_INGEST_WORK_DIR/<doc_id>/，见 api/rag_ingest.py）
+  保存了原始文件与已解析的页，已向量化的 chunk 已逐批落库；本命令在当前进程同步续跑，
+  只补做未完成的页与批次。failed 文档默认不处理（管理员可在页面点重试，或加 --include-failed）。
+
+用法：
+  # 列出可续跑的文档
+  python manage.py rag_resume_ingest --dry-run
+
+  # 续跑全部中断的文档（部署脚本在 web 服务启动后执行一次）
+  python manage.py rag_resume_ingest
+
+  # 只续跑指定文档，含 failed
+  python manage.py rag_resume_ingest --doc-id 12 --include-failed
+"""
+from django.core.management.base import BaseCommand
+
+from api.models_rag import RagDocument
+from api.rag_ingest import resumable_document_ids
+from api.rag_service import resume_ingest
+
+from .common import get_service_logger
+
+logger = get_service_logger('rag_resume_ingest')
+
+
+class Command(BaseCommand):
+    help = '从入库检查点续跑中断（pending / parsing）的 RAG 文档'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doc-id', type=int, action='append', default=[],
+                            help='只续跑指定文档（可重复）')
+        parser.add_argument('--include-failed', action='store_true', help='同时续跑 failed 状态的文档')
+        parser.add_argument('--dry-run', action='store_true', help='只列出可续跑的文档，不执行')
+
+    def handle(self, *args, **options):
+        statuses = [RagDocument.STATUS_PENDING, RagDocument.STATUS_PARSING]
+        if options['include_failed']:
+            statuses.append(RagDocument.STATUS_FAILED)
+
+        ids = resumable_document_ids()
+        if options['doc_id']:
+            ids = [i for i in ids if i in set(options['doc_id'])]
+        docs = list(RagDocument.objects.filter(id__in=ids, status__in=statuses).order_by('id'))
+        if not docs:
+            self.stdout.write('没有可续跑的文档')
+            return
+
+        for doc in docs:
+            self.stdout.write(f'{doc.id}\t{doc.status}\t{doc.file_name}\t'
+                              f'页 {doc.pages_done}/{doc.pages_total}\t'
+                              f'chunk {doc.chunks_embedded}/{doc.chunks_total}')
+        if options['dry_run']:
+            return
+
+        for doc in docs:
+            logger.info('▶️ 续跑文档 %s（%s）', doc.id, doc.file_name)
+            resume_ingest(doc.id, background=False)
+            doc.refresh_from_db(fields=['status', 'chunk_count', 'error_message'])
+            if doc.status == RagDocument.STATUS_INDEXED:
+                self.stdout.write(self.style.SUCCESS(f'✅ {doc.file_name}：{doc.chunk_count} 条 chunk'))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ {doc.file_name}：{doc.status} {doc.error_message}'))
@@ -8,6 +8,8 @@ ScreenConnectivityStatus.last_seen_at。
 运行方式（由 freeark-screen-heartbeat.service 管理）：
     python manage.py screen_heartbeat_consumer
 
+已由统一接入服务 screen_uplink_consumer（HeartbeatProcessor）取代，本命令保留用于回滚。
+
 设计约束：
 - 每次 DB 操作前调用 django.db.close_old_connections()，防止长进程连接超时。
 - 使用 loop_forever(retry_first_connection=True) 实现自动重连。
@@ -15,18 +17,25 @@ ScreenConnectivityStatus.last_seen_at。
 - v0.5.9: 连接参数从 heartbeat_broker_config.json 读取，支持 mqtt（TCP）和
   wss（WebSocket over TLS）两种传输协议。文件不存在时降级使用 fallback 常量。
 - paho-mqtt 版本固定为 >=1.6.1,<2.0（requirements.txt），使用 1.x API。
+- 心跳写库后同步更新进程内大屏在线聚合（api.fleet_status.screen_fleet），
+  由 FleetStatusPublisher 发布到缓存，看板大屏在线率直接读取。
+- 心跳经 HeartbeatWriter 合并，每 heartbeat_flush_seconds 秒（默认 30）一条 bulk upsert
+  写库，不再每条消息一次 update_or_create（见 api/screen_uplink/heartbeat_writer.py）。
 """
 
 import json
 import logging
 import os
-import time
-from typing import Optional
 
 from django.core.management.base import BaseCommand
-from django.db import close_old_connections
+
 from django.utils import timezone
 
+from api.fleet_status import FleetStatusPublisher, screen_fleet
+from api.screen_uplink.heartbeat_writer import DEFAULT_FLUSH_SECONDS, HeartbeatWriter
+from api.screen_uplink.message import CACHE_REFRESH_INTERVAL, MacCache  # noqa: F401
+from api.screen_uplink.processors import upsert_last_seen
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -67,10 +76,6 @@ _FALLBACK_CONFIG: dict = {
     'keepalive': 60,
 }
 
-# MAC → specific_part 缓存刷新间隔（秒）
-CACHE_REFRESH_INTERVAL = 300  # 5 分钟
-
-
 # ---------------------------------------------------------------------------
 # 配置加载
 # ---------------------------------------------------------------------------
@@ -103,58 +108,10 @@ def _load_heartbeat_config() -> dict:
 
 
 # ---------------------------------------------------------------------------
-# 缓存管理
+# 缓存管理 / 心跳处理（与统一接入服务共用实现，见 api/screen_uplink/）
 # ---------------------------------------------------------------------------
 
-class MacCache:
-    """内存缓存：mac_str → specific_part，定期从 DB 刷新。"""
-
-    def __init__(self):
-        self._cache: dict = {}
-        self._last_refresh: float = 0.0
-
-    def _refresh(self):
-        """从 OwnerInfo 全量加载 unique_id → specific_part 映射。"""
-        from api.models import OwnerInfo
-        close_old_connections()
-        try:
-            mapping = {
-                row['unique_id']: row['specific_part']
-                for row in OwnerInfo.objects.filter(
-                    unique_id__isnull=False
-                ).exclude(unique_id='').values('unique_id', 'specific_part')
-            }
-            self._cache = mapping
-            self._last_refresh = time.time()
-            logger.info('MacCache: 刷新完成，共 %d 条映射', len(self._cache))
-        except Exception as exc:
-            logger.warning('MacCache: 刷新失败，继续使用旧缓存: %s', exc)
-
-    def get_specific_part(self, mac: str) -> Optional[str]:
-        """查询 mac 对应的 specific_part，必要时刷新缓存。"""
-        if time.time() - self._last_refresh > CACHE_REFRESH_INTERVAL:
-            self._refresh()
-        return self._cache.get(mac)
-
-    def invalidate(self):
-        """强制使缓存失效（下次 get 时重新加载）。"""
-        self._last_refresh = 0.0
-
-
-# ---------------------------------------------------------------------------
-# 心跳处理
-# ---------------------------------------------------------------------------
-
-def _upsert_last_seen(specific_part: str) -> None:
-    """upsert ScreenConnectivityStatus.last_seen_at = now()。"""
-    from api.models import ScreenConnectivityStatus
-    close_old_connections()
-    now = timezone.now()
-    ScreenConnectivityStatus.objects.update_or_create(
-        specific_part=specific_part,
-        defaults={'last_seen_at': now},
-    )
-    logger.debug('心跳写入: specific_part=%s, last_seen_at=%s', specific_part, now)
+_upsert_last_seen = upsert_last_seen
 
 
 # ---------------------------------------------------------------------------
@@ -180,6 +137,7 @@ class Command(BaseCommand):
         keepalive = int(cfg.get('keepalive', 60))
 
         mac_cache = MacCache()
+        writer = HeartbeatWriter(int(cfg.get('heartbeat_flush_seconds', DEFAULT_FLUSH_SECONDS)))
 
         # --- 回调（topic / host / port 引用局部变量，而非硬编码常量）---
 
@@ -207,7 +165,7 @@ class Command(BaseCommand):
                     logger.debug('未找到 mac=%s 对应的 specific_part，跳过', mac)
                     return
 
-                _upsert_last_seen(specific_part)
+                writer.touch(specific_part, timezone.now())
 
             except Exception as exc:
                 logger.exception('on_message 处理异常: %s', exc)
@@ -243,5 +201,14 @@ class Command(BaseCommand):
             host, port, topic,
         )
 
+        # 看板大屏在线计数：后台线程定期对账并发布快照（见 api/fleet_status.py）
+        fleet_publisher = FleetStatusPublisher([screen_fleet])
+        fleet_publisher.start()
+        writer.start()
+
         # loop_forever 内置断线重连（retry_first_connection=True 确保首次连接也重试）
-        client.loop_forever(retry_first_connection=True)
+        try:
+            client.loop_forever(retry_first_connection=True)
+        finally:
+            # 退出前刷新合并缓冲中的心跳
+            writer.stop()
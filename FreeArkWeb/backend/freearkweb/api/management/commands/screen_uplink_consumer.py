@@ -0,0 +1,147 @@
+"""
+screen_uplink_consumer — 大屏上行统一接入服务
+
+取代 screen_heartbeat_consumer / fault_consumer / condensation_consumer 三个并行进程：
+原先三者各自建立一条 WSS 连接订阅同一主题、各自刷新 MAC 缓存、各自 JSON 解析同一条
+DeviceStatusUpdate。本命令只建立一条连接，每条消息接收一次、解析一次、MAC→specific_part
+解析一次，再分发给可插拔处理器（见 api/screen_uplink/）：
+
+  heartbeat    — ScreenConnectivityStatus.last_seen_at（订阅 topic，默认 .../cloud/#）
+  fault        — 故障事件状态机 T1/T2/T3（fault_consumer_topic，默认 .../cloud/+）
+  condensation — 结露预警状态机（fault_consumer_topic，默认 .../cloud/+）
+
+每个处理器独立计数（received / processed / skipped / errors），启动钩子各自重建状态机、
+启动各自的自愈看门狗；看门狗判定卡死时整个进程退出，由 systemd 拉起后全部重建。
+
+运行方式（由 freeark-screen-uplink.service 管理）：
+    python manage.py screen_uplink_consumer
+    # 只启用部分处理器（例如灰度期间故障仍由旧进程处理）
+    python manage.py screen_uplink_consumer --processors heartbeat,condensation
+
+配置：复用 heartbeat_broker_config.json（见 screen_heartbeat_consumer），可选键：
+  uplink_client_id（默认 freeark-screen-uplink）、uplink_topic（默认同 topic）、
+  heartbeat_flush_seconds（心跳合并写库间隔，默认 30 秒，上限 90 秒，见 api/screen_uplink/heartbeat_writer.py）。
+上线后停用旧的三个服务；同一处理器不要在新旧进程中同时运行（状态机会重复写库）。
+"""
+
+import logging
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.screen_uplink.heartbeat_writer import DEFAULT_FLUSH_SECONDS
+from api.screen_uplink.processors import CondensationProcessor, FaultProcessor, HeartbeatProcessor
+from api.screen_uplink.service import ScreenUplinkService
+
+from .screen_heartbeat_consumer import _load_heartbeat_config
+
+logger = logging.getLogger(__name__)
+
+PROCESSOR_NAMES = ('heartbeat', 'fault', 'condensation')
+
+
+def build_processors(names, cfg: dict) -> list:
+    """按名称构造处理器；topic 过滤器与原独立消费者各自的订阅主题一致。"""
+    heartbeat_topic = cfg.get('topic', '/screen/upload/screen/to/cloud/#')
+    device_status_topic = cfg.get('fault_consumer_topic', '/screen/upload/screen/to/cloud/+')
+    flush_seconds = int(cfg.get('heartbeat_flush_seconds', DEFAULT_FLUSH_SECONDS))
+    factories = {
+        'heartbeat': lambda: HeartbeatProcessor(heartbeat_topic, flush_seconds=flush_seconds),
+        'fault': lambda: FaultProcessor(device_status_topic),
+        'condensation': lambda: CondensationProcessor(device_status_topic),
+    }
+    return [factories[name]() for name in PROCESSOR_NAMES if name in names]
+
+
+class Command(BaseCommand):
+    help = '大屏上行统一接入服务（freeark-screen-uplink）：心跳 / 故障 / 结露单连接分发'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processors', default=','.join(PROCESSOR_NAMES),
+                            help=f'启用的处理器（逗号分隔），默认全部：{",".join(PROCESSOR_NAMES)}')
+        parser.add_argument('--health-interval', type=int, default=60,
+                            help='健康日志（各处理器计数）输出间隔秒数，0 表示不输出（默认 60）')
+
+    def handle(self, *args, **options):
+        import paho.mqtt.client as mqtt
+
+        names = {n.strip() for n in options['processors'].split(',') if n.strip()}
+        unknown = names - set(PROCESSOR_NAMES)
+        if unknown or not names:
+            raise CommandError(f'未知处理器: {", ".join(sorted(unknown)) or "（空）"}；'
+                               f'可选 {", ".join(PROCESSOR_NAMES)}')
+
+        # 1. 加载配置
+        cfg = _load_heartbeat_config()
+        protocol  = cfg.get('protocol', 'mqtt')
+        host      = cfg.get('host', '47.117.41.184')
+        port      = int(cfg.get('port', 11883))
+        path      = cfg.get('path', '/mqtt')
+        username  = cfg.get('username', 'admin')
+        password  = cfg.get('password', 'public')
+        keepalive = int(cfg.get('keepalive', 60))
+        client_id = cfg.get('uplink_client_id', 'freeark-screen-uplink')
+        # 只订阅一个覆盖所有处理器的过滤器：重叠订阅会让 broker 对同一消息投递多份
+        topic     = cfg.get('uplink_topic', cfg.get('topic', '/screen/upload/screen/to/cloud/#'))
+
+        # 2. 处理器启动钩子：重建状态机、启动看门狗
+        service = ScreenUplinkService(build_processors(names, cfg))
+        service.start()
+        logger.info(
+            'screen_uplink_consumer 启动: protocol=%s host=%s port=%s topic=%s processors=%s',
+            protocol, host, port, topic, ','.join(p.name for p in service.processors),
+        )
+
+        # 3. 周期性健康日志
+        interval = options['health_interval']
+        if interval > 0:
+            def _health_loop():
+                while True:
+                    time.sleep(interval)
+                    service.log_health()
+            threading.Thread(target=_health_loop, name='screen-uplink-health', daemon=True).start()
+
+        # 4. paho-mqtt 回调
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                logger.info('已连接 Broker %s:%d，订阅 %s', host, port, topic)
+                client.subscribe(topic)
+            else:
+                logger.warning('Broker 连接失败，rc=%d', rc)
+
+        def on_message(client, userdata, msg):
+            try:
+                service.handle(msg.topic, msg.payload)
+            except Exception as exc:
+                logger.exception('on_message 未处理异常: %s', exc)
+
+        def on_disconnect(client, userdata, rc):
+            if rc != 0:
+                logger.warning('与 Broker 断开连接，rc=%d，paho 将自动重连', rc)
+
+        # 5. 初始化 paho client（paho 1.x API，与原三个消费者相同模式）
+        if protocol == 'wss':
+            client = mqtt.Client(client_id=client_id, transport='websockets')
+            client.tls_set()
+            client.ws_set_options(path=path)
+            logger.info('使用 wss 传输: %s:%d%s', host, port, path)
+        else:
+            client = mqtt.Client(client_id=client_id, transport='tcp')
+            logger.info('使用 mqtt TCP 传输: %s:%d', host, port)
+
+        if username:
+            client.username_pw_set(username, password)
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.on_disconnect = on_disconnect
+
+        client.connect(host, port, keepalive=keepalive)
+
+        # 6. 持续运行（自动重连）
+        logger.info('screen_uplink_consumer loop_forever 启动')
+        try:
+            client.loop_forever(retry_first_connection=True)
+        finally:
+            # 退出前刷新心跳合并写入缓冲
+            service.stop()
@@ -0,0 +1,24 @@
+"""
+0048 — DeviceParamHistory 新增 num_value（BIGINT）数值列。
+
+背景：PLCLatestDataHandler 写历史前已把参数值转为整数，却以 TEXT 存入 value，
+图表查询拿到字符串再逐条解析。新写入改填 num_value、value 留空；
+存量数值行由 dph_backfill_numeric 命令分批迁移（迁移本身只加可空列，MySQL 8 为 INSTANT 操作）。
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0047_fix_humidification_limit_display_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deviceparamhistory',
+            name='num_value',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='参数数值'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+"""
+0049 — 新增 DeviceParamRollup（device_param_rollup）小时 / 日汇总表。
+
+背景：长时间窗口的历史图表逐行扫描 device_param_history。汇总表由 PLCLatestDataHandler
+写历史时增量合并（api/history_rollups.py），存量历史由 dph_rollups --backfill 回填。
+"""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0048_deviceparamhistory_num_value'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceParamRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specific_part', models.CharField(max_length=50, verbose_name='专有部分')),
+                ('param_name', models.CharField(max_length=100, verbose_name='参数名称')),
+                ('resolution', models.CharField(choices=[('hour', '小时'), ('day', '日')], max_length=8, verbose_name='汇总粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间桶起点')),
+                ('sample_count', models.IntegerField(default=0, verbose_name='样本数')),
+                ('value_sum', models.BigIntegerField(default=0, verbose_name='样本值之和')),
+                ('min_value', models.BigIntegerField(blank=True, null=True, verbose_name='最小值')),
+                ('max_value', models.BigIntegerField(blank=True, null=True, verbose_name='最大值')),
+                ('last_value', models.BigIntegerField(blank=True, null=True, verbose_name='最后值')),
+                ('last_at', models.DateTimeField(blank=True, null=True, verbose_name='最后样本时间')),
+            ],
+            options={
+                'verbose_name': '设备参数汇总',
+                'verbose_name_plural': '设备参数汇总',
+                'db_table': 'device_param_rollup',
+                'constraints': [models.UniqueConstraint(fields=('specific_part', 'param_name', 'resolution', 'bucket_start'), name='uniq_dev_rollup_bucket')],
+            },
+        ),
+    ]
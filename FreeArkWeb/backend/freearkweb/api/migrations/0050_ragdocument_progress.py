@@ -0,0 +1,38 @@
+"""
+0050 — RagDocument 新增入库进度列（pages_total / pages_done / chunks_total / chunks_embedded）。
+
+背景：RagIngestor 改为分阶段流水线（进程池解析 → 并发向量化 → 逐批写入 + 检查点续跑），
+进度随阶段写入台账，供 GET /api/rag/documents/ 展示。只加带默认值的整型列。
+"""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0049_deviceparamrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ragdocument',
+            name='pages_total',
+            field=models.IntegerField(default=0, verbose_name='总页数'),
+        ),
+        migrations.AddField(
+            model_name='ragdocument',
+            name='pages_done',
+            field=models.IntegerField(default=0, verbose_name='已解析页数'),
+        ),
+        migrations.AddField(
+            model_name='ragdocument',
+            name='chunks_total',
+            field=models.IntegerField(default=0, verbose_name='待向量化 Chunk 数'),
+        ),
+        migrations.AddField(
+            model_name='ragdocument',
+            name='chunks_embedded',
+            field=models.IntegerField(default=0, verbose_name='已向量化并写入 Chunk 数'),
+        ),
+    ]
@@ -332,6 +332,14 @@ class OwnerInfo(models.Model):
         return f"{self.specific_part} - {self.location_name}"
 
 
+@receiver(post_save, sender=OwnerInfo)
+def _owner_info_saved(sender, instance, **kwargs):
+    """OwnerInfo 变更（如大屏 MAC 改绑）后广播失效，各消费者进程的 MacCache 立即重载。"""
+    from .tiered_cache import publish_invalidation
+    from django.db import transaction
+    transaction.on_commit(lambda: publish_invalidation('owner_mac'))
+
+
 class PLCLatestData(models.Model):
     """PLC最新参数数据表，每个设备每个参数只保留最新一条记录（非时序）"""
     # 专有部分，格式为 "3-1-7-702"
@@ -409,8 +417,12 @@ class DeviceParamHistory(models.Model):
     specific_part = models.CharField(max_length=50, verbose_name='专有部分')
     # 参数名称，与 PLCLatestData.param_name 对应
     param_name = models.CharField(max_length=100, verbose_name='参数名称')
-    # 参数值（TextField 兼容整数和字符串，如 "正常"、"关闭"、"26.0"）
+    # 参数值（旧存储，TextField 兼容整数和字符串，如 "正常"、"关闭"、"26.0"）。
+    # 新写入只填 num_value，本字段留空；存量数值行由 dph_backfill_numeric 迁入 num_value 后置空，
+    # 仅无法转为整数的旧值保留在此。读取统一用 native_value。
     value = models.TextField(null=True, blank=True, verbose_name='参数值')
+    # 参数数值（与 PLCLatestData.value 同为 BIGINT，PLCLatestDataHandler 写入前已转为整数）
+    num_value = models.BigIntegerField(null=True, blank=True, verbose_name='参数数值')
     # 采集时间戳（来自 MQTT 消息）
     collected_at = models.DateTimeField(verbose_name='采集时间', db_index=True)
     # 记录写入时间
@@ -426,7 +438,73 @@ class DeviceParamHistory(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.specific_part} - {self.param_name} = {self.value} @ {self.collected_at}"
+        return f"{self.specific_part} - {self.param_name} = {self.native_value} @ {self.collected_at}"
+
+    @property
+    def native_value(self):
+        """参数值的原生类型：优先 num_value；旧文本值能解析为数字时返回数字，否则原样返回"""
+        if self.num_value is not None:
+            return self.num_value
+        return parse_history_value(self.value)
+
+
+def parse_history_value(text):
+    """把 device_param_history 旧文本值解析为 int / float；无法解析（如 "正常"）时原样返回"""
+    if text is None:
+        return None
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        pass
+    try:
+        number = float(text)
+    except (TypeError, ValueError):
+        return text
+    return int(number) if number.is_integer() else number
+
+
+class DeviceParamRollup(models.Model):
+    """设备参数小时 / 日汇总表（由 api.history_rollups 增量维护，dph_rollups 命令回填）
+
+    每个 (specific_part, param_name, resolution, bucket_start) 一行，汇总该时间桶内全部采集样本
+    （含未写入 device_param_history 的小时内后续样本）。平均值 = value_sum / sample_count。
+    """
+    RESOLUTION_HOUR = 'hour'
+    RESOLUTION_DAY = 'day'
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_HOUR, '小时'),
+        (RESOLUTION_DAY, '日'),
+    ]
+
+    specific_part = models.CharField(max_length=50, verbose_name='专有部分')
+    param_name = models.CharField(max_length=100, verbose_name='参数名称')
+    resolution = models.CharField(max_length=8, choices=RESOLUTION_CHOICES, verbose_name='汇总粒度')
+    # 时间桶起点：小时桶为整点，日桶为当日 00:00
+    bucket_start = models.DateTimeField(verbose_name='时间桶起点')
+    sample_count = models.IntegerField(default=0, verbose_name='样本数')
+    value_sum = models.BigIntegerField(default=0, verbose_name='样本值之和')
+    min_value = models.BigIntegerField(null=True, blank=True, verbose_name='最小值')
+    max_value = models.BigIntegerField(null=True, blank=True, verbose_name='最大值')
+    last_value = models.BigIntegerField(null=True, blank=True, verbose_name='最后值')
+    last_at = models.DateTimeField(null=True, blank=True, verbose_name='最后样本时间')
+
+    class Meta:
+        db_table = 'device_param_rollup'
+        verbose_name = '设备参数汇总'
+        verbose_name_plural = '设备参数汇总'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['specific_part', 'param_name', 'resolution', 'bucket_start'],
+                name='uniq_dev_rollup_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.specific_part} - {self.param_name} [{self.resolution} {self.bucket_start}] n={self.sample_count}"
+
+    @property
+    def avg_value(self):
+        return self.value_sum / self.sample_count if self.sample_count else None
 
 
 class ScreenConnectivityStatus(models.Model):
@@ -67,6 +67,11 @@ class RagDocument(models.Model):
         default=0,
         verbose_name='Chunk 数量',
     )
+    # 入库进度（RagIngestor 分阶段更新，列表接口轮询展示；重试续跑时从检查点继续累加）
+    pages_total = models.IntegerField(default=0, verbose_name='总页数')
+    pages_done = models.IntegerField(default=0, verbose_name='已解析页数')
+    chunks_total = models.IntegerField(default=0, verbose_name='待向量化 Chunk 数')
+    chunks_embedded = models.IntegerField(default=0, verbose_name='已向量化并写入 Chunk 数')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
 
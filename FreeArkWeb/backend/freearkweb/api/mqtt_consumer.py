@@ -8,6 +8,10 @@ import threading
 from datetime import datetime
 import paho.mqtt.client as mqtt
 import MySQLdb
+try:
+    import orjson
+except ImportError:  # 可选依赖：未安装时快速路径回退标准库 json（同样直接解析 bytes）
+    orjson = None
 from django.conf import settings
 from django.db import connection as django_connection
 from django.db import transaction, close_old_connections
@@ -15,6 +19,10 @@ from django.db.utils import OperationalError as DjangoOperationalError
 from django.utils import timezone
 from .models import PLCData, PLCWriteRecord, PLCLatestData
 from .mqtt_handlers import PLCDataHandler, ConnectionStatusHandler, PLCLatestDataHandler, ScreenConnectivityHandler, OndemandPLCLatestDataHandler
+from .latest_data_writer import DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_MS, LatestDataWriter
+from .fleet_status import DEFAULT_PUBLISH_SECONDS, DEFAULT_RECONCILE_SECONDS, FleetStatusPublisher, plc_fleet
+from .realtime_push import realtime_publisher
+from .telemetry_codec import BATCH_ENVELOPE_KEY, CompactPayloadError, decode_compact, is_compact, is_energy
 
 # 获取logger
 logger = logging.getLogger(__name__)
@@ -51,6 +59,13 @@ NUM_GENERAL_WORKERS = 6
 NUM_ONDEMAND_WORKERS = 1
 ONDEMAND_RESULT_TOPIC_PREFIX = '/datacollection/plc/ondemand/result/'
 ONDEMAND_DONE_TOPIC_PREFIX = '/datacollection/plc/ondemand/done/'
+# 批量发布信封（datacollection output_config 中 mqtt.publish_mode='batch'）：
+#   主题 {prefix}batch/{energy|general}/{楼栋}，
+#   负载 {"__batch__": 1, "building": ..., "seq": i, "total": n, "devices": {device_id: device_info, ...}}
+# 信封按主题中的 energy/general 路由到对应队列（不再按大小判断），handler 整批入库。
+# 紧凑格式（mqtt.payload_format='compact'，见 telemetry_codec）按头部标志位路由。
+BATCH_TOPIC_MARKER = '/batch/'
+BATCH_ENERGY_TOPIC_MARKER = '/batch/energy/'
 # 每个 worker 每处理 N 条消息才调用一次 close_old_connections，避免频繁 MySQL 握手
 _CLOSE_CONN_EVERY_N = 50
 
@@ -72,6 +87,41 @@ _DB_CONN_ERROR_MARKERS = (
 )
 
 
+def _batch_devices(payload):
+    """payload 为批量信封时返回其 devices 字典，否则返回 None"""
+    if isinstance(payload, dict) and payload.get(BATCH_ENVELOPE_KEY):
+        devices = payload.get('devices')
+        return devices if isinstance(devices, dict) else {}
+    return None
+
+
+def _loads_bytes(payload_bytes):
+    """bytes 直接解析为对象，不经过 str 解码；非法 UTF-8 / 非法 JSON 抛 ValueError 子类"""
+    if orjson is not None:
+        return orjson.loads(payload_bytes)
+    return json.loads(payload_bytes)
+
+
+def _log_payload_summary(payload):
+    """DEBUG 级 payload 摘要（需遍历全部参数，仅在 DEBUG 开启时由 _dispatch 调用）"""
+    batch_devices = _batch_devices(payload)
+    if batch_devices is not None:
+        logger.debug(
+            "[dispatch] 批量信封摘要: building=%s, seq=%s/%s, device_count=%d",
+            payload.get('building'), payload.get('seq'), payload.get('total'), len(batch_devices),
+        )
+    elif isinstance(payload, dict) and len(payload) == 1:
+        device_id = next(iter(payload))
+        device_info = payload[device_id]
+        if isinstance(device_info, dict) and isinstance(device_info.get('data'), dict):
+            params = device_info['data']
+            success = sum(1 for p in params.values() if isinstance(p, dict) and p.get('success'))
+            logger.debug(
+                "[dispatch] payload 解析摘要: device_id=%s, param_count=%d, success=%d, failed=%d",
+                device_id, len(params), success, len(params) - success,
+            )
+
+
 def _is_db_connection_error(exc):
     """判断异常是否为数据库连接/事务中毒类错误（需强制重建连接才能恢复）。
 
@@ -125,15 +175,41 @@ class MQTTConsumer:
         self.db_maintenance_thread = None
         self.db_maintenance_running = False
 
+        # PLCLatestData 合并写入：worker 只解析校验，upsert 由单独写入线程按
+        # batch_size 条 / flush_ms 毫秒合并刷新（见 latest_data_writer）；enabled=false 时 worker 直接写库
+        writer_config = mqtt_config.get('latest_writer', {})
+        self.latest_writer = None
+        if writer_config.get('enabled', True):
+            self.latest_writer = LatestDataWriter(
+                PLCLatestDataHandler(),
+                batch_size=writer_config.get('batch_size', DEFAULT_BATCH_SIZE),
+                flush_ms=writer_config.get('flush_ms', DEFAULT_FLUSH_MS),
+                is_connection_error=_is_db_connection_error,
+                reconnect=lambda: self._check_and_reconnect_db(with_diagnostic=False),
+            )
+
+        # 看板设备群计数：handler 写库后更新进程内聚合，后台线程定期对账并发布到缓存（见 fleet_status）
+        fleet_config = mqtt_config.get('fleet_status', {})
+        self.fleet_publisher = None
+        if fleet_config.get('enabled', True):
+            self.fleet_publisher = FleetStatusPublisher(
+                [plc_fleet],
+                publish_seconds=fleet_config.get('publish_seconds', DEFAULT_PUBLISH_SECONDS),
+                reconcile_seconds=fleet_config.get('reconcile_seconds', DEFAULT_RECONCILE_SECONDS),
+            )
+
+        # 实时参数推送：upsert 后按户把变化发往 channel 组（见 realtime_push）
+        realtime_publisher.enabled = mqtt_config.get('realtime_push', {}).get('enabled', True)
+
         # 消息处理器：energy 消息含连接状态更新，general 消息跳过（节省 ~150ms/条）
         self.energy_handlers = [
             PLCDataHandler(),
             ConnectionStatusHandler(),
-            PLCLatestDataHandler(),
+            PLCLatestDataHandler(writer=self.latest_writer),
         ]
         self.general_handlers = [
             PLCDataHandler(),
-            PLCLatestDataHandler(),
+            PLCLatestDataHandler(writer=self.latest_writer),
         ]
 
         # 双队列 + 专用 Worker 线程池 ---
@@ -309,6 +385,7 @@ class MQTTConsumer:
         从而能持续发送 PINGREQ，避免 EMQX rc=16 断连。
 
         路由规则：screen/connectivity → general_queue（避免被 PLC 消息挤满的 energy 队列丢弃）；
+        批量信封按主题 batch/energy、batch/general 路由；紧凑格式按头部 energy 标志位路由；
         其余 payload < 2000B → energy_queue，否则 → general_queue。
         """
         payload_size = len(msg.payload)
@@ -322,6 +399,14 @@ class MQTTConsumer:
         elif msg.topic.startswith(self.WRITE_ACK_TOPIC_PREFIX):
             target_queue = self._general_queue
             queue_name = 'general'
+        elif BATCH_TOPIC_MARKER in msg.topic:
+            is_general = BATCH_ENERGY_TOPIC_MARKER not in msg.topic
+            target_queue = self._general_queue if is_general else self._energy_queue
+            queue_name = 'general' if is_general else 'energy'
+        elif is_compact(msg.payload):
+            is_general = not is_energy(msg.payload)
+            target_queue = self._general_queue if is_general else self._energy_queue
+            queue_name = 'general' if is_general else 'energy'
         else:
             is_general = payload_size >= _ENERGY_PAYLOAD_MAX_SIZE
             target_queue = self._general_queue if is_general else self._energy_queue
@@ -344,58 +429,62 @@ class MQTTConsumer:
 
         close_old_connections/ensure_connection 由调用方 _worker_loop 负责，
         已在进入此方法前完成，无需在此重复调用。
+
+        快速路径：JSON 直接从 bytes 解析（orjson，未安装时标准库 json），不再先解码为 str；
+        解析失败（非 UTF-8、格式错误）才走 _parse_text_fallback 的文本解码 + 手动修复。
+        payload 摘要需遍历全部参数，仅在 DEBUG 开启时生成。
         """
-        logger.info(f"[dispatch] 处理消息: 主题={topic}, 长度={len(payload_bytes)}字节")
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            logger.debug("[dispatch] 处理消息: 主题=%s, 长度=%d字节", topic, len(payload_bytes))
 
-        # 解码
-        payload_str = None
-        try:
+        # 紧凑格式：解码为与 JSON 等价的结构，跳过文本解码与 JSON 解析
+        if is_compact(payload_bytes):
             try:
-                payload_str = payload_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                payload_str = payload_bytes.decode('latin-1')
-            logger.debug(f"消息内容: {payload_str[:500]}{'...' if len(payload_str) > 500 else ''}")
-        except UnicodeDecodeError as e:
-            logger.error(f"消息解码错误: {e}，原始字节: {str(payload_bytes[:100])}")
-            return
+                payload = decode_compact(payload_bytes)
+            except CompactPayloadError as e:
+                logger.error(f"[dispatch] 紧凑负载解码失败: 主题={topic}, {e}")
+                return
+        else:
+            try:
+                payload = _loads_bytes(payload_bytes)
+            except ValueError:
+                payload = self._parse_text_fallback(payload_bytes)
+                if payload is None:
+                    return
 
-        # JSON 解析
         try:
-            payload = self._safe_json_parse(payload_str)
-            logger.debug(f"成功解析JSON，数据类型: {type(payload).__name__}")
-
-            # 记录 payload 摘要（与原 on_message 保持一致）
-            if isinstance(payload, dict) and len(payload) == 1:
-                _dbg_device_id = next(iter(payload))
-                _dbg_device_info = payload[_dbg_device_id]
-                if isinstance(_dbg_device_info, dict) and 'data' in _dbg_device_info:
-                    _dbg_params = _dbg_device_info['data']
-                    _dbg_total = len(_dbg_params) if isinstance(_dbg_params, dict) else 0
-                    _dbg_success = sum(
-                        1 for p in _dbg_params.values()
-                        if isinstance(p, dict) and p.get('success')
-                    ) if isinstance(_dbg_params, dict) else 0
-                    _dbg_failed = _dbg_total - _dbg_success
-                    logger.debug(
-                        f"[dispatch] payload 解析摘要: device_id={_dbg_device_id}, "
-                        f"param_count={_dbg_total}, success={_dbg_success}, failed={_dbg_failed}"
-                    )
-
+            if debug_enabled:
+                _log_payload_summary(payload)
             # 调用原有的 process_message（含重试 + handler 分发）
             self.process_message(topic, payload, is_general=is_general)
+        except Exception as e:
+            logger.error(f"[dispatch] 处理消息时发生意外错误: {e}", exc_info=True)
+
+    def _parse_text_fallback(self, payload_bytes: bytes):
+        """快速路径解析失败时的兜底：UTF-8 / latin-1 解码后交给 _safe_json_parse 手动修复。
+
+        返回解析结果；仍无法解析时记录错误并返回 None。
+        """
+        try:
+            payload_str = payload_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            payload_str = payload_bytes.decode('latin-1')
+        logger.debug("消息内容: %s%s", payload_str[:500], '...' if len(payload_str) > 500 else '')
 
+        try:
+            return self._safe_json_parse(payload_str)
         except json.JSONDecodeError as e:
-            content_preview = payload_str[:200] if payload_str else "无法解码"
-            logger.error(f"JSON解析错误: {e}，消息内容前200字节: {content_preview}")
-            error_pos = min(e.pos, len(payload_str) - 1) if payload_str and hasattr(e, 'pos') else 0
+            logger.error(f"JSON解析错误: {e}，消息内容前200字节: {payload_str[:200]}")
+            error_pos = min(e.pos, len(payload_str) - 1) if payload_str else 0
             context_start = max(0, error_pos - 20)
-            context_end = min(len(payload_str), error_pos + 20) if payload_str else 0
+            context_end = min(len(payload_str), error_pos + 20)
             if payload_str:
                 logger.error(f"错误位置上下文: '{payload_str[context_start:context_end]}' (位置: {error_pos})")
-                logger.debug(f"完整消息内容: {payload_str}")
-
+                logger.debug("完整消息内容: %s", payload_str)
         except Exception as e:
-            logger.error(f"[dispatch] 处理消息时发生意外错误: {e}", exc_info=True)
+            logger.error(f"[dispatch] 解析消息时发生意外错误: {e}", exc_info=True)
+        return None
 
     # ------------------------------------------------------------------
     # 新增：_worker_loop — worker 线程入口
@@ -453,8 +542,8 @@ class MQTTConsumer:
                         )
             finally:
                 msg_queue.task_done()
-                elapsed_ms = (time.monotonic() - t_start) * 1000
-                logger.info(f"[{thread_name}] 消息处理完成: topic={topic}, 耗时={elapsed_ms:.1f}ms")
+                logger.debug("[%s] 消息处理完成: topic=%s, 耗时=%.1fms",
+                             thread_name, topic, (time.monotonic() - t_start) * 1000)
 
         logger.info(f"[{thread_name}] Worker 线程退出")
 
@@ -576,7 +665,7 @@ class MQTTConsumer:
 
     def process_message(self, topic, payload, is_general: bool = False):
         """处理接收到的消息并保存到数据库"""
-        logger.debug(f"开始处理消息: 主题={topic}, 消息大小={len(str(payload))}字节")
+        logger.debug("开始处理消息: 主题=%s", topic)
 
         # FR4/FR5: PLC 写入回执 topic，更新 plc_write_record 状态
         if topic.startswith(self.WRITE_ACK_TOPIC_PREFIX):
@@ -596,32 +685,38 @@ class MQTTConsumer:
 
         # general 消息跳过 ConnectionStatusHandler，节省约 150ms/条
         handlers = self.general_handlers if is_general else self.energy_handlers
+        batch_devices = _batch_devices(payload)
 
         max_retries = 3  # 最大重试次数
         retry_count = 0
 
         while retry_count <= max_retries:
             try:
-                logger.debug(f" 开始处理消息内容: 主题={topic}, 重试次数={retry_count}")
+                logger.debug("开始处理消息内容: 主题=%s, 重试次数=%d", topic, retry_count)
 
                 # 从topic中提取楼栋文件名（如果存在）
                 building_file = None
                 topic_parts = topic.split('/')
-                logger.debug(f"主题解析: 部分数量={len(topic_parts)}, 内容={topic_parts}")
+                logger.debug("主题解析: 部分数量=%d, 内容=%s", len(topic_parts), topic_parts)
 
-                if len(topic_parts) > 4:
+                if batch_devices is not None:
+                    building_file = payload.get('building')
+                elif len(topic_parts) > 4:
                     building_file = topic_parts[4]  # 假设格式为 /datacollection/plc/to/collector/[building_file]
-                    logger.debug(f"从主题提取楼栋文件名: {building_file}")
+                    logger.debug("从主题提取楼栋文件名: %s", building_file)
 
-                # 使用Handler机制处理消息
+                # 使用Handler机制处理消息（批量信封整批交给 handle_batch）
                 for handler in handlers:
                     try:
-                        handler.handle(topic, payload, building_file)
+                        if batch_devices is not None:
+                            handler.handle_batch(topic, batch_devices, building_file)
+                        else:
+                            handler.handle(topic, payload, building_file)
                     except Exception as e:
                         logger.error(f"处理器 {handler.__class__.__name__} 处理消息时发生错误: {e}", exc_info=True)
 
-                # 处理成功
-                logger.info(f"✅ 消息处理完成: 主题={topic}")
+                # 处理成功（逐条 INFO 日志在高吞吐下开销可观，降为 DEBUG）
+                logger.debug("✅ 消息处理完成: 主题=%s", topic)
                 break  # 成功处理，跳出循环
 
             except (MySQLdb.OperationalError, MySQLdb.InterfaceError,
@@ -966,6 +1061,9 @@ class MQTTConsumer:
             # 重置停止信号（支持重启场景）
             self.stop_event.clear()
 
+            if self.latest_writer is not None:
+                self.latest_writer.start()
+
             # 启动 worker 线程（在 paho loop_start 之前，确保 worker 就绪）
             self._worker_threads = []
             for i in range(self._num_energy_workers):
@@ -1014,6 +1112,12 @@ class MQTTConsumer:
             )
             self.db_maintenance_thread.start()
 
+            if self.fleet_publisher is not None:
+                self.fleet_publisher.start()
+
+            if realtime_publisher.enabled:
+                realtime_publisher.start()
+
             return True
         except Exception as e:
             logger.error(f"启动MQTT客户端时发生错误: {e}")
@@ -1021,7 +1125,10 @@ class MQTTConsumer:
 
     # MQTT 消费者健康状态快照（供 mqtt_consumer_service._monitor_service 调用）
     # 返回 dict: is_running, client_connected, seconds_since_last_msg, seconds_since_connect,
-    #            energy_qsize, general_qsize, ondemand_qsize, max_idle_deadline_seconds
+    #            energy_qsize, general_qsize, ondemand_qsize, max_idle_deadline_seconds,
+    #            latest_writer（合并写入统计：批大小、刷新耗时、待写记录数，未启用时为 None）
+    #            fleet_publisher（看板计数快照的发布 / 对账 / 失败次数，未启用时为 None）
+    #            realtime_push（实时参数推送的消息数 / 参数数 / 失败 / 丢弃次数、待发批次，未启用时为 None）
     def health_snapshot(self) -> dict:
         """返回 MQTT 消费者内部存活与积压状态的只读快照（线程安全）。"""
         snap = {
@@ -1033,6 +1140,9 @@ class MQTTConsumer:
             'energy_qsize': self._energy_queue.qsize(),
             'general_qsize': self._general_queue.qsize(),
             'ondemand_qsize': self._ondemand_queue.qsize(),
+            'latest_writer': self.latest_writer.snapshot() if self.latest_writer is not None else None,
+            'fleet_publisher': dict(self.fleet_publisher.stats) if self.fleet_publisher is not None else None,
+            'realtime_push': realtime_publisher.snapshot() if realtime_publisher.enabled else None,
         }
         try:
             # paho client.is_connected() 是内部原子 flag，不需要额外加锁
@@ -1063,7 +1173,9 @@ class MQTTConsumer:
         2. 停止 paho 网络线程（不再产生新消息入队）
         3. 等待队列中剩余消息全部消费完毕（queue.join，最长 30s）
         4. 等待 worker 线程退出
-        5. 停止 db_maintenance_thread
+        5. 停止 PLCLatestData 合并写入线程（退出前刷新剩余记录）
+        6. 停止 db_maintenance_thread
+        7. 停止看板计数发布线程
         """
         try:
             logger.info("开始优雅关闭 MQTT 消费者...")
@@ -1105,7 +1217,11 @@ class MQTTConsumer:
                     logger.warning(f"worker 线程 {t.name} 未在 5s 内退出")
             logger.info("所有 worker 线程已退出")
 
-            # 5. 停止数据库连接维护线程
+            # 5. worker 已全部退出，不再有新提交：刷新剩余记录后停止合并写入线程
+            if self.latest_writer is not None:
+                self.latest_writer.stop()
+
+            # 6. 停止数据库连接维护线程
             logger.info("停止数据库连接维护线程")
             self.db_maintenance_running = False
             if self.db_maintenance_thread:
@@ -1113,6 +1229,13 @@ class MQTTConsumer:
                 if self.db_maintenance_thread.is_alive():
                     logger.warning("数据库连接维护线程未能在超时内停止")
 
+            # 7. 停止看板计数发布线程（快照在 SNAPSHOT_TTL 后过期，看板回退数据库查询）
+            if self.fleet_publisher is not None:
+                self.fleet_publisher.stop()
+
+            # 8. 停止实时参数推送发送线程（合并写入线程已停止，退出前发送剩余差异）
+            realtime_publisher.stop()
+
             logger.info("MQTT 消费者已完全停止")
             return True
         except Exception as e:
@@ -4,6 +4,10 @@ from abc import ABC, abstractmethod
 from django.db import transaction, connection
 from django.utils import timezone
 from .models import PLCData, PLCConnectionStatus, PLCStatusChangeHistory, PLCLatestData, DeviceParamHistory, ScreenConnectivityStatus
+from .fault_utils import note_fault_values
+from .fleet_status import plc_fleet
+from .realtime_push import realtime_publisher
+from .history_rollups import apply_rollups
 from .utils_room_filter import get_panel_param_blocklist  # v0.5.7 M4: 落库侧房型过滤
 
 # 获取logger
@@ -18,6 +22,14 @@ class MessageHandler(ABC):
         """处理消息的抽象方法"""
         pass
 
+    def handle_batch(self, topic, devices, building_file=None):
+        """处理批量信封中的多设备数据 {device_id: device_info, ...}。
+
+        默认逐设备拆成单设备 payload 调用 handle()；需要整批入库的处理器覆盖此方法。
+        """
+        for device_id, device_info in devices.items():
+            self.handle(topic, {device_id: device_info}, building_file)
+
 
 class PLCDataHandler(MessageHandler):
     """PLC数据处理器，处理PLC用量数据更新"""
@@ -38,58 +50,8 @@ class PLCDataHandler(MessageHandler):
                 device_id = list(payload.keys())[0]
                 device_info = payload[device_id]
                 logger.debug(f"PLCDataHandler: 处理improved_data_collection_manager发送的数据格式: device_id={device_id}")
-                
-                # device_id就是PLCData的specific_part
-                specific_part = device_id
-                plc_ip = device_info.get('PLC IP地址', '') or device_info.get('IP地址', '')
-                logger.debug(f"PLCDataHandler: 提取信息: specific_part={specific_part}, plc_ip={plc_ip}")
-                
-                # 检查是否包含data字段
-                if 'data' in device_info and isinstance(device_info['data'], dict):
-                    logger.debug(f"PLCDataHandler: 处理data字段，包含{len(device_info['data'])}个数据项")
-                    
-                    # 参数名到energy_mode的映射
-                    param_to_energy_mode = {
-                        'total_hot_quantity': '制热',
-                        'total_cold_quantity': '制冷'
-                    }
-                    
-                    for param_key, param_data in device_info['data'].items():
-                        if isinstance(param_data, dict):
-                            # 只处理能耗参数，其余参数由 PLCLatestDataHandler 负责
-                            if param_key not in param_to_energy_mode:
-                                logger.debug(f"PLCDataHandler: 跳过非能耗参数: {param_key}")
-                                continue
-
-                            success = param_data.get('success', False)
-
-                            # 对于success为false的数据，只记录日志不保存
-                            if not success:
-                                message = param_data.get('message', '未知错误')
-                                logger.warning(f"PLCDataHandler: 跳过失败的数据: specific_part={specific_part}, param_key={param_key}, message={message}")
-                                continue
-
-                            # 处理success为true的数据
-                            logger.debug(f"PLCDataHandler: 处理数据项: param_key={param_key}, 数据={param_data}")
-
-                            # 映射参数名到energy_mode
-                            energy_mode = param_to_energy_mode[param_key]
-                            logger.debug(f"PLCDataHandler: 参数映射: {param_key} -> {energy_mode}")
-                            
-                            # 构建数据点
-                            data_point = {
-                                'specific_part': specific_part,
-                                'energy_mode': energy_mode,
-                                'plc_ip': plc_ip,
-                                'param_value': param_data.get('value'),
-                                'success': success,
-                                'message': param_data.get('message', ''),
-                                'timestamp': param_data.get('timestamp')
-                            }
-                            
-                            # 添加到批量数据列表
-                            batch_data.append(data_point)
-                    logger.debug(f"PLCDataHandler: improved_data_collection_manager数据处理完成，收集了{len(batch_data)}个数据点")
+                batch_data.extend(self._collect_device_points(device_id, device_info))
+                logger.debug(f"PLCDataHandler: improved_data_collection_manager数据处理完成，收集了{len(batch_data)}个数据点")
             # 检查是否是新格式的消息，包含data字段
             elif 'data' in payload and isinstance(payload['data'], dict):
                 logger.debug(f"PLCDataHandler: 处理新格式消息: 包含data字段，data包含{len(payload['data'])}个数据项")
@@ -236,6 +198,71 @@ class PLCDataHandler(MessageHandler):
         else:
             logger.warning(f"PLCDataHandler: 没有数据点需要保存: 主题={topic}")
     
+    def _collect_device_points(self, device_id, device_info):
+        """从 improved_data_collection_manager 格式的单设备数据中提取能耗数据点"""
+        points = []
+        # device_id就是PLCData的specific_part
+        specific_part = device_id
+        plc_ip = device_info.get('PLC IP地址', '') or device_info.get('IP地址', '')
+        logger.debug(f"PLCDataHandler: 提取信息: specific_part={specific_part}, plc_ip={plc_ip}")
+
+        # 检查是否包含data字段
+        if 'data' in device_info and isinstance(device_info['data'], dict):
+            logger.debug(f"PLCDataHandler: 处理data字段，包含{len(device_info['data'])}个数据项")
+
+            # 参数名到energy_mode的映射
+            param_to_energy_mode = {
+                'total_hot_quantity': '制热',
+                'total_cold_quantity': '制冷'
+            }
+
+            for param_key, param_data in device_info['data'].items():
+                if isinstance(param_data, dict):
+                    # 只处理能耗参数，其余参数由 PLCLatestDataHandler 负责
+                    if param_key not in param_to_energy_mode:
+                        logger.debug(f"PLCDataHandler: 跳过非能耗参数: {param_key}")
+                        continue
+
+                    success = param_data.get('success', False)
+
+                    # 对于success为false的数据，只记录日志不保存
+                    if not success:
+                        message = param_data.get('message', '未知错误')
+                        logger.warning(f"PLCDataHandler: 跳过失败的数据: specific_part={specific_part}, param_key={param_key}, message={message}")
+                        continue
+
+                    # 处理success为true的数据
+                    logger.debug(f"PLCDataHandler: 处理数据项: param_key={param_key}, 数据={param_data}")
+
+                    # 映射参数名到energy_mode
+                    energy_mode = param_to_energy_mode[param_key]
+                    logger.debug(f"PLCDataHandler: 参数映射: {param_key} -> {energy_mode}")
+
+                    # 构建数据点
+                    data_point = {
+                        'specific_part': specific_part,
+                        'energy_mode': energy_mode,
+                        'plc_ip': plc_ip,
+                        'param_value': param_data.get('value'),
+                        'success': success,
+                        'message': param_data.get('message', ''),
+                        'timestamp': param_data.get('timestamp')
+                    }
+
+                    # 添加到批量数据列表
+                    points.append(data_point)
+        return points
+
+    def handle_batch(self, topic, devices, building_file=None):
+        """处理批量信封：汇总所有设备的能耗数据点后一次性批量保存"""
+        batch_data = []
+        for device_id, device_info in devices.items():
+            if isinstance(device_info, dict):
+                batch_data.extend(self._collect_device_points(device_id, device_info))
+        logger.debug(f"PLCDataHandler: 批量信封共{len(devices)}个设备，收集了{len(batch_data)}个数据点")
+        if batch_data:
+            self.batch_save_plc_data(batch_data, building_file)
+
     def batch_save_plc_data(self, batch_data, building_file=None):
         """批量保存PLC数据点到数据库"""
         if not batch_data:
@@ -473,8 +500,12 @@ class ConnectionStatusHandler(MessageHandler):
                 # 解析建筑信息
                 building, unit, room_number = self._parse_building_info(specific_part)
                 
+                # delta 消息只含变化参数，在线状态以采集端给出的 online 为准
+                if device_info.get('delta'):
+                    status = 'online' if device_info.get('online') else 'offline'
+                    self._update_connection_status(specific_part, status, building, unit, room_number)
                 # 检查是否包含data字段
-                if 'data' in device_info and isinstance(device_info['data'], dict):
+                elif 'data' in device_info and isinstance(device_info['data'], dict):
                     # 检查是否有任何成功的数据项
                     has_success = any(data.get('success', False) for data in device_info['data'].values())
                     
@@ -644,6 +675,7 @@ class ConnectionStatusHandler(MessageHandler):
 
             # 事务提交成功后更新缓存（放在 with 块外，确保事务已提交）
             _conn_status_cache[specific_part] = status
+            plc_fleet.set_connection(specific_part, status)
             logger.debug(f"ConnectionStatusHandler: ✅ 慢路径完成，缓存更新 - {specific_part}: {status}")
 
         except Exception as e:
@@ -719,8 +751,12 @@ class PLCLatestDataHandler(MessageHandler):
     - total_hot_quantity / total_cold_quantity 同时也由 PLCDataHandler 写能耗表，此处照常写入
     - success=false 的参数丢弃，不写入
     - 以 (specific_part, param_name) 为唯一键执行 update-or-create
+    - 传入 writer（LatestDataWriter）时只解析校验，写库交给合并写入线程
     """
 
+    def __init__(self, writer=None):
+        self.writer = writer
+
     def handle(self, topic, payload, building_file=None):
         logger.debug(f"PLCLatestDataHandler: 处理消息 - 主题={topic}")
 
@@ -735,12 +771,120 @@ class PLCLatestDataHandler(MessageHandler):
             logger.debug("PLCLatestDataHandler: payload 不符合目标格式，跳过")
             return
 
-        device_id = next(iter(payload))
-        device_info = payload[device_id]
+        self._process_devices(topic, payload)
+
+    def handle_batch(self, topic, devices, building_file=None):
+        """处理批量信封：汇总所有设备的有效参数，整批只执行一次 upsert 和一次历史写入。"""
+        logger.debug(f"PLCLatestDataHandler: 处理批量信封 - 主题={topic}, 设备数={len(devices)}")
+        self._process_devices(topic, devices)
+
+    def _process_devices(self, topic, devices):
+        """{device_id: device_info} → upsert PLCLatestData + 追加历史；delta 设备另行刷新未变化参数。"""
+        records = []
+        delta_devices = []
+        for device_id, device_info in devices.items():
+            records.extend(self._collect_records(topic, device_id, device_info))
+            if isinstance(device_info, dict) and device_info.get('delta'):
+                delta_devices.append(self._delta_device(device_id, device_info))
+        if not records and not delta_devices:
+            return
 
+        if self.writer is not None:
+            self.writer.submit(records, delta_devices)
+        else:
+            self._persist(records, delta_devices)
+
+    def _persist(self, records, delta_devices):
+        """写库：upsert 最新值 → 刷新 delta 设备未变化参数的采集时间 → 追加历史与汇总。
+
+        delta 设备本轮未变化的参数以 PLCLatestData 当前值补为本轮样本，与变化参数一同写历史
+        （按小时去重）并计入汇总，sample_count / sum / min / max 与全量消息一致。
+
+        写库在同一事务内完成；历史小时游标、故障数缓存失效、设备群计数与实时推送登记为
+        on_commit，事务回滚（合并写入线程重试 / 按设备二分）时不会重复合并汇总、
+        提前推进游标而漏写历史，也不会为未落库的记录推送变化。
+        """
+        cursors = {}
+        with transaction.atomic():
+            if records:
+                self._bulk_upsert(records)
+            history = records
+            if delta_devices:
+                self._touch_unchanged(delta_devices)
+                history = records + self._unchanged_records(records, delta_devices)
+            self._write_history(history, cursors)
+            transaction.on_commit(lambda: self._after_commit(records, cursors))
+
+    @staticmethod
+    def _after_commit(records, cursors):
+        """事务提交后：推进历史小时游标；故障字段变化即失效故障数缓存、更新设备群计数并按户推送变化。"""
+        for cache, staged in cursors.values():
+            cache.update(staged)
+        if records:
+            note_fault_values(records)
+            plc_fleet.update_params(records)
+            realtime_publisher.publish(records)
+
+    @staticmethod
+    def _staged_cursor(cursors, cache):
+        """cache（小时游标 dict）在本次写库中的暂存更新，提交后由 _after_commit 并入；查重时先查暂存再查 cache"""
+        return cursors.setdefault(id(cache), (cache, {}))[1]
+
+    @staticmethod
+    def _delta_device(device_id, device_info):
+        """delta 设备描述：(specific_part, 采集时间, 本轮失败的参数名集合)"""
+        data = device_info.get('data')
+        failed = frozenset(
+            name for name, p in data.items() if not (isinstance(p, dict) and p.get('success'))
+        ) if isinstance(data, dict) else frozenset()
+        return device_id, _parse_timestamp(device_info.get('timestamp')), failed
+
+    def _touch_unchanged(self, delta_devices):
+        """delta 消息中未出现的参数视为本轮读取成功且未变化：只刷新其 collected_at。
+
+        本轮失败的参数不刷新，保持与全量消息一致的过期判定；失败集合相同的设备合并为一条 UPDATE。
+        """
+        groups = {}
+        for specific_part, collected_at, failed in delta_devices:
+            if collected_at is not None:
+                groups.setdefault((collected_at, failed), []).append(specific_part)
+        now = timezone.now()
+        for (collected_at, failed), parts in groups.items():
+            qs = PLCLatestData.objects.filter(specific_part__in=parts)
+            if failed:
+                qs = qs.exclude(param_name__in=failed)
+            touched = qs.update(collected_at=collected_at, updated_at=now)
+            logger.debug(f"PLCLatestDataHandler: delta 刷新采集时间 {touched} 条（设备数={len(parts)}）")
+
+    @staticmethod
+    def _unchanged_records(records, delta_devices):
+        """delta 设备本轮读取成功但未变化的参数：以 PLCLatestData 当前值生成本轮样本。
+
+        本轮失败的参数与已在 records 中的变化参数不补；一批 delta 设备共用一次查询。
+        """
+        due = {
+            specific_part: (collected_at, failed)
+            for specific_part, collected_at, failed in delta_devices
+            if collected_at is not None
+        }
+        if not due:
+            return []
+        changed = {(r['specific_part'], r['param_name']) for r in records}
+
+        rows = PLCLatestData.objects.filter(specific_part__in=list(due)).values_list(
+            'specific_part', 'param_name', 'value'
+        )
+        return [
+            {'specific_part': sp, 'param_name': name, 'value': value, 'collected_at': due[sp][0]}
+            for sp, name, value in rows
+            if name not in due[sp][1] and (sp, name) not in changed
+        ]
+
+    def _collect_records(self, topic, device_id, device_info):
+        """将单个设备的 device_info 转换为 PLCLatestData 记录列表（已过滤失败 / 黑名单参数）。"""
         if not isinstance(device_info, dict) or 'data' not in device_info:
             logger.debug(f"PLCLatestDataHandler: device_info 缺少 data 字段，跳过: {device_id}")
-            return
+            return []
 
         specific_part = device_id
         plc_ip = device_info.get('PLC IP地址', '') or device_info.get('IP地址', '')
@@ -748,7 +892,7 @@ class PLCLatestDataHandler(MessageHandler):
 
         data_dict = device_info['data']
         if not isinstance(data_dict, dict):
-            return
+            return []
 
         # v0.5.7 M4: 获取该专有部分不应落库的参数黑名单（带 300s 缓存）
         # 兜底防御层：覆盖所有 MQTT 消息来源（定时采集、按需采集、其他）
@@ -834,12 +978,10 @@ class PLCLatestDataHandler(MessageHandler):
                 )
             else:
                 logger.debug(f"PLCLatestDataHandler: {specific_part} 无有效参数需要写入")
-            return
 
-        self._bulk_upsert(records)
-        self._write_history(records)
+        return records
 
-    def _write_history(self, records):
+    def _write_history(self, records, cursors):
         """追加写入 DeviceParamHistory（时序历史，append-only）。
 
         Energy 与 General 参数均按「每小时保留第一条」去重（v0.5.4 P1-1 起一致）：
@@ -847,7 +989,10 @@ class PLCLatestDataHandler(MessageHandler):
           （约 6 分钟采集 → 每小时 1 条，写入量降约 10 倍）。
         - General 参数：经 _general_hist_last_hour 去重（10 分钟采集 → 每小时 1 条）。
         两者去重算法相同，仅使用各自的缓存。
+        小时 / 日汇总（device_param_rollup）基于去重前的全部样本增量合并，见 _write_rollups。
+        去重游标的更新暂存在 cursors 中，事务提交后才生效（见 _persist）；写入失败向上抛出，整批回滚。
         """
+        self._write_rollups(records)
         hist_objs = []
         for r in records:
             param_name = r['param_name']
@@ -862,14 +1007,15 @@ class PLCLatestDataHandler(MessageHandler):
                 continue
             hour_key = collected_at.strftime('%Y-%m-%d-%H')
             cache_key = (r['specific_part'], param_name)
-            if hist_cache.get(cache_key) == hour_key:
+            staged = self._staged_cursor(cursors, hist_cache)
+            if staged.get(cache_key, hist_cache.get(cache_key)) == hour_key:
                 continue  # 本小时已有样本，跳过
-            hist_cache[cache_key] = hour_key
+            staged[cache_key] = hour_key
 
             hist_objs.append(DeviceParamHistory(
                 specific_part=r['specific_part'],
                 param_name=param_name,
-                value=str(r['value']) if r['value'] is not None else None,
+                num_value=r['value'],
                 collected_at=collected_at,
             ))
 
@@ -881,6 +1027,17 @@ class PLCLatestDataHandler(MessageHandler):
             logger.debug(f"PLCLatestDataHandler: 历史追加 {len(hist_objs)} 条")
         except Exception as e:
             logger.error(f"PLCLatestDataHandler: 历史写入失败: {e}", exc_info=True)
+            raise
+
+    @staticmethod
+    def _write_rollups(records):
+        """把本批样本合并进小时 / 日汇总；失败向上抛出，与历史写入一同回滚。"""
+        try:
+            buckets = apply_rollups(records)
+            logger.debug("PLCLatestDataHandler: 汇总合并 %d 个时间桶", buckets)
+        except Exception as e:
+            logger.error(f"PLCLatestDataHandler: 汇总写入失败: {e}", exc_info=True)
+            raise
 
     def _bulk_upsert(self, records):
         """批量 upsert PLCLatestData 记录（单条 INSERT … ON DUPLICATE KEY UPDATE）。"""
@@ -924,7 +1081,7 @@ class OndemandPLCLatestDataHandler(PLCLatestDataHandler):
     防止 device_param_history 因按需采集（每 30 秒）大量膨胀（OQ-003 决议）。
     """
 
-    def _write_history(self, records):
+    def _write_history(self, records, cursors):
         """按需采集不写历史（ADR-004，OQ-003 用户已确认）。"""
         logger.debug('OndemandPLCLatestDataHandler: 跳过历史写入（按需采集不写 device_param_history）')
 
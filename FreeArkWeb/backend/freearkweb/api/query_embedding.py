@@ -0,0 +1,233 @@
+"""
+api.query_embedding — 进程级查询向量服务（语义路由 / RAG 检索共用）
+
+一轮聊天中同一用户问题会被 embed 两次：SemanticRouter._route_sync 与 search_rag
+各自 new 一个 RagEmbedder 走一次远端调用。本模块统一为：
+
+  QueryEmbeddingService.embed_query(text)
+    - 归一化文本（NFKC + 折叠空白）作 key，键内含 embedding 风格与模型名（换模型不串向量）；
+    - 缓存：tiered_cache.TieredCache —— L1 进程内 LRU，L2 Redis（可选持久化，TTL 默认 7 天）；
+    - 合并：同一文本的并发未命中只发一次请求（TieredCache single-flight）；
+    - 微批：不同文本的并发未命中在 RAG_QUERY_EMBED_BATCH_WINDOW_MS 窗口内合并为
+      一次 embed_texts（OpenAI 风格一次 HTTP）。后端无批量端点（embedder.supports_batch 为假，
+      如 doubao 多模态逐条接口）时不做微批：各请求线程自行逐条 embed_query（查询侧短超时、少重试），
+      不把多条慢请求串在领头线程上、让跟随者等待。
+
+  离线测试 / 无凭据开发：RAG_EMBEDDING_API_STYLE='fake' 使用 rag_service 的哈希伪向量，
+  或直接向 QueryEmbeddingService(embedder=...) 注入任意实现 embed_query / embed_texts 的对象。
+
+fail-open 口径不变：embedding 异常向上抛出，由 search_rag / SemanticRouter.route 捕获降级。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+from .tiered_cache import TieredCache
+
+logger = logging.getLogger("api.query_embedding")
+
+# 微批跟随者等待领头线程结果的最长时间（秒），应大于单次 embedding 超时
+_BATCH_WAIT_SECONDS = 60
+
+
+def normalize_query(text: str) -> str:
+    """缓存 key 用的归一化文本：NFKC（全角→半角）+ 去首尾空白 + 连续空白折叠为一个空格。"""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class _BatchRequest:
+    __slots__ = ("texts", "vectors", "error", "event")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.vectors: Optional[List[np.ndarray]] = None
+        self.error: Optional[BaseException] = None
+        self.event = threading.Event()
+
+
+class _MicroBatcher:
+    """领头-跟随式微批：首个到达的线程等待窗口期后，把期间到达的请求合并为一次 embed 调用。
+
+    不启后台线程：领头线程循环取走待处理请求直到队列为空，期间新到达的请求进入下一批。
+    """
+
+    def __init__(self, embed_fn, window_ms: int, max_batch: int):
+        self._embed_fn = embed_fn
+        self._window = max(window_ms, 0) / 1000.0
+        self._max_batch = max(max_batch, 1)
+        self._lock = threading.Lock()
+        self._pending: List[_BatchRequest] = []
+        self._leading = False
+        self.stats = {"batches": 0, "texts": 0, "max_batch_seen": 0}
+
+    def submit(self, texts: List[str]) -> List[np.ndarray]:
+        req = _BatchRequest(texts)
+        with self._lock:
+            self._pending.append(req)
+            lead = not self._leading
+            self._leading = True
+        if lead:
+            if self._window:
+                time.sleep(self._window)
+            self._drain()
+        if not req.event.wait(_BATCH_WAIT_SECONDS):
+            raise TimeoutError("query_embedding: 等待微批结果超时")
+        if req.error is not None:
+            raise req.error
+        return req.vectors
+
+    def _take_batch(self) -> List[_BatchRequest]:
+        with self._lock:
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0].texts) <= self._max_batch):
+                req = self._pending.pop(0)
+                batch.append(req)
+                size += len(req.texts)
+            if not batch:
+                self._leading = False
+            return batch
+
+    def _drain(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            texts = [t for req in batch for t in req.texts]
+            try:
+                vectors = self._embed_fn(texts)
+                pos = 0
+                for req in batch:
+                    req.vectors = vectors[pos:pos + len(req.texts)]
+                    pos += len(req.texts)
+            except Exception as exc:  # noqa: BLE001
+                for req in batch:
+                    req.error = exc
+            finally:
+                for req in batch:
+                    req.event.set()
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(texts))
+
+
+class QueryEmbeddingService:
+    """查询向量服务：归一化 LRU + 可选 Redis 持久缓存 + 同文本合并 + 并发微批。
+
+    Args:
+        embedder: 实现 embed_query(text) / embed_texts(texts) 的对象；None 时每批新建
+                  rag_service.RagEmbedder()（按调用时的 settings 选择后端，测试 patch 生效）。
+                  可选属性 supports_batch（缺省为真）为假时不走微批
+        max_entries: L1 LRU 条目上限
+        ttl: 缓存秒数（L2 持久缓存 TTL；persist=False 时为 L1 TTL）
+        persist: 是否写 L2（Django 默认缓存，生产为 Redis），进程重启 / 多 worker 共享
+        batch_window_ms: 微批窗口（0 表示不等待，仍合并已排队的请求）
+        max_batch: 单次 embed_texts 最多文本数
+    """
+
+    def __init__(self, embedder=None, max_entries: int = 2048, ttl: int = 7 * 86400,
+                 persist: bool = True, batch_window_ms: int = 5, max_batch: int = 16):
+        self._embedder = embedder
+        self._cache = TieredCache("query_embedding", ttl=ttl, max_entries=max_entries, l2=persist)
+        self._batcher = _MicroBatcher(self._embed_batch, batch_window_ms, max_batch)
+        self.stats = {"requests": 0, "remote_texts": 0}
+
+    @classmethod
+    def from_settings(cls) -> "QueryEmbeddingService":
+        from django.conf import settings
+        return cls(
+            max_entries=getattr(settings, "RAG_QUERY_EMBED_CACHE_SIZE", 2048),
+            ttl=getattr(settings, "RAG_QUERY_EMBED_CACHE_TTL", 7 * 86400),
+            persist=getattr(settings, "RAG_QUERY_EMBED_PERSIST", True),
+            batch_window_ms=getattr(settings, "RAG_QUERY_EMBED_BATCH_WINDOW_MS", 5),
+            max_batch=getattr(settings, "RAG_QUERY_EMBED_MAX_BATCH", 16),
+        )
+
+    # ------------------------------------------------------------------
+    # 公开接口
+    # ------------------------------------------------------------------
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """单条查询向量（float32）。异常向上抛出，由调用方 fail-open。"""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """批量查询向量，顺序与 texts 一致；归一化后相同的文本只 embed 一次。"""
+        self.stats["requests"] += len(texts)
+        keys = [self._key(t) for t in texts]
+        key_to_text = {k: normalize_query(t) for k, t in zip(keys, texts)}
+        found = self._cache.get_many(keys, lambda missing: self._load(missing, key_to_text))
+        return [found[k] for k in keys]
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "cache": self._cache.snapshot(), "batcher": dict(self._batcher.stats)}
+
+    def clear(self) -> None:
+        """只清空本进程 L1（测试 / 调试用）。"""
+        self._cache.clear_local()
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(text: str) -> str:
+        from django.conf import settings
+        style = getattr(settings, "RAG_EMBEDDING_API_STYLE", "openai")
+        model = getattr(settings, "RAG_EMBEDDING_MODEL", "")
+        raw = f"{style}\x00{model}\x00{normalize_query(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _load(self, keys: List[str], key_to_text: dict) -> dict:
+        texts = [key_to_text[k] for k in keys]
+        embedder = self._get_embedder()
+        if getattr(embedder, "supports_batch", True):
+            vectors = self._batcher.submit(texts)
+        else:
+            vectors = self._embed_each(embedder, texts)
+        return dict(zip(keys, vectors))
+
+    def _get_embedder(self):
+        if self._embedder is not None:
+            return self._embedder
+        from . import rag_service
+        return rag_service.RagEmbedder()
+
+    def _embed_each(self, embedder, texts: List[str]) -> List[np.ndarray]:
+        """逐条 embed_query（查询热路径超时短）。"""
+        self.stats["remote_texts"] += len(texts)
+        return [np.asarray(embedder.embed_query(t), dtype=np.float32) for t in texts]
+
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """微批领头线程调用：单条走 embed_query（查询热路径超时短），多条走 embed_texts。"""
+        embedder = self._get_embedder()
+        if len(texts) == 1:
+            return self._embed_each(embedder, texts)
+        self.stats["remote_texts"] += len(texts)
+        return [np.asarray(v, dtype=np.float32) for v in embedder.embed_texts(texts)]
+
+
+_service: Optional[QueryEmbeddingService] = None
+_service_lock = threading.Lock()
+
+
+def get_query_embedding_service() -> QueryEmbeddingService:
+    """进程级单例（首次调用时按 settings 构造）。"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = QueryEmbeddingService.from_settings()
+    return _service
+
+
+def embed_query(text: str) -> np.ndarray:
+    """便捷入口：get_query_embedding_service().embed_query(text)。"""
+    return get_query_embedding_service().embed_query(text)
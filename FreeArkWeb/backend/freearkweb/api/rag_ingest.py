@@ -0,0 +1,147 @@
+"""
+api.rag_ingest — RAG 入库检查点（RagIngestor 分阶段流水线的落盘状态）
+
+目录布局（RAG_INGEST_WORK_DIR/<doc_id>/）：
+  source<ext>        原始上传文件（入库成功后删除；失败 / 进程崩溃时保留供续跑）
+  pages/<n>.pkl      PDF 第 n 页（0-based）解析结果：List[ParsedChunk]，逐页原子写入
+  parsed.pkl         整份解析结果（.docx 一次性解析，或 PDF 全部页完成后）
+
+向量化 / 写库阶段的检查点就是 DB 本身：RagChunk 按批（chunk_index 连续区间）在事务内写入，
+续跑时跳过已落库的批次；RagImage 以 image_index 确定性复用。
+
+RAG_INGEST_WORK_DIR 为空串时检查点关闭（测试默认），入库行为退化为一次性流程。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("api.rag_ingest")
+
+_SOURCE_PREFIX = 'source'
+
+
+def _work_root() -> str:
+    from django.conf import settings
+    return str(getattr(settings, 'RAG_INGEST_WORK_DIR', '') or '')
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class IngestCheckpoint:
+    """单个文档的入库检查点。所有写入 fail-open：落盘失败只记日志，不影响本次入库。"""
+
+    def __init__(self, root: str, doc_id: int):
+        self.doc_id = doc_id
+        self.path = os.path.join(root, str(doc_id)) if root else ''
+
+    @classmethod
+    def for_document(cls, doc_id: int) -> 'IngestCheckpoint':
+        return cls(_work_root(), doc_id)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    # ── 原始文件 ─────────────────────────────────────────────────────────────
+
+    def save_source(self, file_bytes: bytes, file_ext: str) -> None:
+        """新一轮入库：清掉旧检查点后保存原始文件。"""
+        if not self.enabled:
+            return
+        try:
+            self.clear()
+            os.makedirs(os.path.join(self.path, 'pages'), exist_ok=True)
+            _atomic_write(os.path.join(self.path, _SOURCE_PREFIX + file_ext), file_bytes)
+        except OSError as e:
+            logger.warning("rag_ingest: 文档 %s 保存原始文件失败（本次入库不可续跑）: %s", self.doc_id, e)
+
+    def source_path(self) -> Optional[str]:
+        if not self.enabled or not os.path.isdir(self.path):
+            return None
+        for name in os.listdir(self.path):
+            if name.startswith(_SOURCE_PREFIX) and not name.endswith('.tmp'):
+                return os.path.join(self.path, name)
+        return None
+
+    def load_source(self) -> Optional[Tuple[bytes, str]]:
+        """返回 (file_bytes, file_ext)；无检查点时返回 None。"""
+        path = self.source_path()
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read(), os.path.basename(path)[len(_SOURCE_PREFIX):]
+
+    # ── 解析结果 ─────────────────────────────────────────────────────────────
+
+    def save_page(self, page_num: int, chunks: List) -> None:
+        self._dump(os.path.join(self.path, 'pages', f'{page_num}.pkl'), chunks)
+
+    def load_pages(self) -> Dict[int, List]:
+        """已完成解析的 PDF 页：{page_num: List[ParsedChunk]}。损坏的页文件忽略（重新解析）。"""
+        pages: Dict[int, List] = {}
+        directory = os.path.join(self.path, 'pages') if self.enabled else ''
+        if not directory or not os.path.isdir(directory):
+            return pages
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext != '.pkl' or not stem.isdigit():
+                continue
+            chunks = self._load(os.path.join(directory, name))
+            if chunks is not None:
+                pages[int(stem)] = chunks
+        return pages
+
+    def save_parsed(self, chunks: List) -> None:
+        self._dump(os.path.join(self.path, 'parsed.pkl'), chunks)
+
+    def load_parsed(self) -> Optional[List]:
+        if not self.enabled:
+            return None
+        return self._load(os.path.join(self.path, 'parsed.pkl'))
+
+    def clear(self) -> None:
+        if self.enabled:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    # ── 内部 ─────────────────────────────────────────────────────────────────
+
+    def _dump(self, path: str, obj) -> None:
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            logger.warning("rag_ingest: 文档 %s 检查点写入失败（忽略）: %s", self.doc_id, e)
+
+    def _load(self, path: str):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:  # noqa: BLE001 — 半截 / 旧版本文件按缺失处理
+            logger.warning("rag_ingest: 检查点 %s 读取失败（重新解析）: %s", path, e)
+            return None
+
+
+def resumable_document_ids() -> List[int]:
+    """工作目录中保存了原始文件的文档 id（入库中断 / 失败后可续跑）。"""
+    root = _work_root()
+    if not root or not os.path.isdir(root):
+        return []
+    ids = []
+    for name in os.listdir(root):
+        if name.isdigit() and IngestCheckpoint(root, int(name)).source_path() is not None:
+            ids.append(int(name))
+    return sorted(ids)
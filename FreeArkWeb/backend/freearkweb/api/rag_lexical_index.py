@@ -0,0 +1,160 @@
+"""
+api.rag_lexical_index — RagVectorCache 的本地倒排索引（BM25），行号与 VectorIndex 对齐
+
+故障码（E12 / F-03）、参数名（indoor_temperature）这类精确标记在 embedding 空间里区分度差，
+且纯向量检索每次都要一次远端 embed。本模块提供字面通道：
+
+  tokenize(text)
+    - NFKC + 小写；
+    - ASCII 标记（字母数字，可含 _ - . 连接符）整体成词；含连接符时另出去掉连接符的合并形
+      与各分段（"e-12" → e-12 / e12 / e / 12），使 E-12、E12、e_12 互相命中；
+    - 中文：装了 jieba 时用 jieba.lcut_for_search，否则按字二元组（单字片段保留单字）。
+
+  LexicalIndex（不可变快照，随 RagVectorCache 每次换 VectorIndex 重建，墓碑行不入倒排）
+    - build(...)：按 chunk id 复用上一快照的分词结果，增量同步只对新增 chunk 分词；
+    - search(query, k) → [(行号, BM25 分)]；
+    - rows_with_codes(codes)：包含全部代码型标记的行（search_rag 判断字面命中是否足以直接作答）。
+
+jieba 为可选依赖（未列入 requirements）：未安装时自动退化为字二元组，不影响功能。
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("api.rag_service")
+
+_HAS_JIEBA = False
+try:
+    import jieba as _jieba
+    _jieba.setLogLevel(logging.WARNING)
+    _HAS_JIEBA = True
+except ImportError:
+    pass
+
+# BM25 参数（常用默认值）
+_K1 = 1.2
+_B = 0.75
+
+_ASCII_RE = re.compile(r"[a-z0-9]+(?:[_\-.][a-z0-9]+)*")
+_SEP_RE = re.compile(r"[_\-.]")
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]+")
+_LETTER_RE = re.compile(r"[a-z]")
+_DIGIT_RE = re.compile(r"[0-9]")
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """文本 → 词项列表（含重复，用于词频）。"""
+    text = _normalize(text)
+    tokens: List[str] = []
+    for tok in _ASCII_RE.findall(text):
+        tokens.append(tok)
+        if _SEP_RE.search(tok) and _LETTER_RE.search(tok):   # 26.5 等数值不拆
+            parts = [p for p in _SEP_RE.split(tok) if p]
+            tokens.append("".join(parts))
+            tokens.extend(parts)
+    for run in _CJK_RE.findall(text):
+        if _HAS_JIEBA:
+            tokens.extend(_jieba.lcut_for_search(run))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def code_tokens(text: str) -> set:
+    """
+    查询中的代码型标记（去连接符的合并形）：同时含字母与数字（E12、F-03、P1），
+    或含下划线（error_1、indoor_temperature）。纯数字 / 纯英文单词不算。
+    """
+    codes = set()
+    for tok in _ASCII_RE.findall(_normalize(text)):
+        merged = _SEP_RE.sub("", tok)
+        if "_" in tok or (_LETTER_RE.search(merged) and _DIGIT_RE.search(merged)):
+            codes.add(merged)
+    return codes
+
+
+class LexicalIndex:
+    """不可变 BM25 倒排索引：词项 → (行号数组, 词频数组)，行号与所属 VectorIndex 一致。"""
+
+    def __init__(self, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], doc_len: np.ndarray,
+                 docs: Dict[int, Tuple[str, Counter]]):
+        self.postings = postings
+        self.doc_len = doc_len
+        self.docs = docs            # chunk_id -> (原文, 词频)，供下一次 build 复用分词
+        self.n_docs = len(docs)
+        self.avgdl = float(doc_len.sum()) / self.n_docs if self.n_docs else 0.0
+
+    @classmethod
+    def empty(cls) -> "LexicalIndex":
+        return cls({}, np.zeros(0, dtype=np.float32), {})
+
+    @classmethod
+    def build(cls, chunk_ids: Iterable[int], texts: Sequence[str],
+              alive: Optional[np.ndarray] = None,
+              previous: Optional["LexicalIndex"] = None) -> "LexicalIndex":
+        reuse = previous.docs if previous is not None else {}
+        docs: Dict[int, Tuple[str, Counter]] = {}
+        rows_by_tok: Dict[str, List[int]] = defaultdict(list)
+        tf_by_tok: Dict[str, List[int]] = defaultdict(list)
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for row, (cid, text) in enumerate(zip(chunk_ids, texts)):
+            if alive is not None and not alive[row]:
+                continue
+            cached = reuse.get(cid)
+            counts = cached[1] if cached is not None and cached[0] == text else Counter(tokenize(text))
+            docs[cid] = (text, counts)
+            doc_len[row] = sum(counts.values())
+            for tok, tf in counts.items():
+                rows_by_tok[tok].append(row)
+                tf_by_tok[tok].append(tf)
+        postings = {
+            tok: (np.asarray(rows, dtype=np.int32), np.asarray(tf_by_tok[tok], dtype=np.float32))
+            for tok, rows in rows_by_tok.items()
+        }
+        return cls(postings, doc_len, docs)
+
+    def search(self, query: str, k: int,
+               candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """BM25 top-k：[(行号, 分数)] 按分数降序；candidates 给定时只在这些行中取。"""
+        if not self.n_docs or k <= 0:
+            return []
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        for tok in set(tokenize(query)):
+            posting = self.postings.get(tok)
+            if posting is None:
+                continue
+            rows, tf = posting
+            idf = math.log(1.0 + (self.n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tf + _K1 * (1.0 - _B + _B * self.doc_len[rows] / self.avgdl)
+            scores[rows] += idf * tf * (_K1 + 1.0) / norm
+        hit = np.flatnonzero(scores) if candidates is None else candidates[scores[candidates] > 0]
+        if not len(hit):
+            return []
+        k = min(k, len(hit))
+        top = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(r), float(scores[r])) for r in top]
+
+    def rows_with_codes(self, codes: Iterable[str]) -> np.ndarray:
+        """同时包含全部 codes 的行号（codes 为空时返回空数组）。"""
+        rows: Optional[np.ndarray] = None
+        for code in codes:
+            posting = self.postings.get(code)
+            if posting is None:
+                return np.zeros(0, dtype=np.int32)
+            rows = posting[0] if rows is None else np.intersect1d(rows, posting[0], assume_unique=True)
+        return np.zeros(0, dtype=np.int32) if rows is None else rows
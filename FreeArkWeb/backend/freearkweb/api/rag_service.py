@@ -2,10 +2,11 @@
 api.rag_service — RAG 核心服务模块（v1.4.1_rag_image_citation）
 
 组件：
-  RagVectorCache  — 进程内向量缓存单例（threading.Lock 保护）
-  RagEmbedder     — langchain-openai OpenAIEmbeddings 封装，带 fail-open
+  RagVectorCache  — 进程内向量缓存单例（预归一化 / 可持久化的 VectorIndex 快照，见 rag_vector_index；
+                    同行号 BM25 倒排见 rag_lexical_index，混合检索 + 字面短路）
+  RagEmbedder     — langchain-openai OpenAIEmbeddings 封装，带 fail-open（查询侧经 api.query_embedding 缓存）
   RagParser       — .docx（python-docx）+ .pdf（PyMuPDF）解析 + 图片 OCR
-  RagIngestor     — 后台线程入库调度（解析→向量化→写DB→刷缓存）
+  RagIngestor     — 后台线程入库调度（进程池解析→并发向量化→逐批写DB→刷缓存，检查点续跑见 api.rag_ingest）
   search_rag()    — 对外检索入口（fail-open，供 fa_tools 调用）
 
 v1.4.1 新增：
@@ -45,6 +46,9 @@ from typing import List, Optional
 
 import numpy as np
 
+from .rag_lexical_index import LexicalIndex, code_tokens
+from .rag_vector_index import SUPPORTED_DTYPES, VectorIndex
+
 logger = logging.getLogger("api.rag_service")
 
 # ── OCR 可用性探测（aarch64 纪律）─────────────────────────────────────────
@@ -103,19 +107,30 @@ def _detect_image_format(img_bytes: bytes) -> str:
 
 class RagVectorCache:
     """
-    进程内向量缓存单例。
-    _vectors: shape=(N, 1024), float32，首次 search 时懒加载。
-    threading.Lock 保护写操作（load/refresh），读操作（search）使用快照。
+    进程内向量缓存单例，底层为 rag_vector_index.VectorIndex 不可变快照。
+    写（load/sync）构建新快照后整体替换引用；search 直接读当前引用，无锁、无拷贝。
+
+    settings：
+      RAG_VECTOR_INDEX_DIR   — 持久化目录（空串关闭）：启动时映射索引文件，只从 DB 取差量
+      RAG_VECTOR_INDEX_DTYPE — 存储精度 float32 / float16 / int8
+      RAG_VECTOR_ANN_MIN_ROWS / RAG_VECTOR_ANN_NPROBE — 行数达到阈值时启用 IVF 近似检索（0 关闭）
+      RAG_LEXICAL_WEIGHT     — 混合检索中 BM25（归一化到 0~1）叠加到余弦分上的权重（0 关闭融合）
+      RAG_LEXICAL_SHORT_CIRCUIT — 查询中的故障码 / 参数名在 chunk 中精确出现时直接返回字面结果，不调 embedding
+
+    每个 VectorIndex 快照配一份同行号的 LexicalIndex（BM25 倒排，见 rag_lexical_index），
+    随 load / sync 一并重建（分词结果按 chunk id 复用）。
     """
 
     _instance: Optional['RagVectorCache'] = None
     _class_lock = threading.Lock()
 
     def __init__(self):
-        self._vectors: Optional[np.ndarray] = None   # (N, dim)
-        self._meta: List[dict] = []                   # [{doc_name, source, is_image_ocr, content}]
+        self._index: VectorIndex = VectorIndex.empty()
+        self._lexical = (self._index, LexicalIndex.empty())   # (所属 VectorIndex, 倒排索引)
+        self._lexical_lock = threading.Lock()
+        self._manifest: Optional[dict] = None
         self._loaded = False
-        self._rw_lock = threading.Lock()
+        self._rw_lock = threading.Lock()      # 串行化 load / sync（写侧）
 
     @classmethod
     def get_instance(cls) -> 'RagVectorCache':
@@ -123,82 +138,257 @@ class RagVectorCache:
             with cls._class_lock:
                 if cls._instance is None:
                     cls._instance = cls()
+                    # 其他进程（web worker / 入库线程所在进程）文档变更后广播，本进程增量同步
+                    from .tiered_cache import subscribe
+                    subscribe('rag_index', lambda _keys: cls._instance._sync_async())
         return cls._instance
 
+    # ── 兼容旧属性：_vectors / _meta（测试直接注入未归一化向量）──────────────
+    @property
+    def _vectors(self) -> Optional[np.ndarray]:
+        return self._index.vectors
+
+    @_vectors.setter
+    def _vectors(self, vectors) -> None:
+        n = 0 if vectors is None else len(vectors)
+        self._index = VectorIndex.from_raw(vectors, np.arange(n), self._index.meta, self._dtype())
+
+    @property
+    def _meta(self) -> List[dict]:
+        return self._index.meta
+
+    @_meta.setter
+    def _meta(self, meta) -> None:
+        idx = self._index
+        self._index = VectorIndex(idx.vectors, idx.chunk_ids, list(meta), idx.scale, idx.alive, idx.ivf)
+
+    @staticmethod
+    def _settings():
+        from django.conf import settings
+        return settings
+
+    def _dtype(self) -> str:
+        dtype = getattr(self._settings(), 'RAG_VECTOR_INDEX_DTYPE', 'float32')
+        return dtype if dtype in SUPPORTED_DTYPES else 'float32'
+
+    def _index_dir(self) -> str:
+        return str(getattr(self._settings(), 'RAG_VECTOR_INDEX_DIR', '') or '')
+
+    # ── 加载 / 增量同步 ─────────────────────────────────────────────────────
+
     def load(self) -> None:
-        """从 DB 全量加载所有 indexed 文档的 chunks。线程安全。"""
-        from .models_rag import RagChunk
+        """加载索引：有持久化文件则映射后增量对齐 DB，否则从 DB 全量构建。线程安全。"""
         try:
-            # v1.4.1：追加 select_related('image') 以避免 N+1（IFC-141-304）
-            qs = (RagChunk.objects
-                  .filter(document__status='indexed')
-                  .select_related('document', 'image')
-                  .order_by('id'))
-            vectors, meta = [], []
-            for c in qs:
-                raw = bytes(c.embedding)  # Django BinaryField 返回 memoryview，转 bytes
-                vec = np.frombuffer(raw, dtype=np.float32).copy()
-                vectors.append(vec)
-                meta.append({
-                    'doc_name': c.document.file_name,
-                    'source': c.page_or_section,
-                    'is_image_ocr': c.is_image_ocr,
-                    'content': c.content,
-                    'image_id': c.image_id,   # v1.4.1 新增：整型 FK id 或 None（不存图片字节，IFC-141-304）
-                })
             with self._rw_lock:
-                self._vectors = np.array(vectors, dtype=np.float32) if vectors else None
-                self._meta = meta
+                index, manifest = None, None
+                directory = self._index_dir()
+                if directory:
+                    index, manifest = VectorIndex.open(directory)
+                    if index is not None and index.rows and index.dtype != self._dtype():
+                        logger.info("rag_service: 索引精度 %s → %s，全量重建", index.dtype, self._dtype())
+                        index, manifest = None, None
+                if index is None:
+                    index = self._build_from_db(None)
+                    manifest = self._persist(index, None)
+                self._manifest = manifest
+                self._apply(index)
+                self._sync_locked()
                 self._loaded = True
-            logger.info("rag_service: 向量缓存加载完成，共 %d 条 chunk", len(vectors))
+            logger.info("rag_service: 向量缓存加载完成，共 %d 条 chunk（%s）",
+                        self._index.live_rows, self._index.dtype)
         except Exception as e:
             logger.error("rag_service: 向量缓存加载失败: %s", e)
 
+    def sync(self) -> None:
+        """增量同步：新增 indexed 文档的 chunk 追加，已删除 / 非 indexed 的打墓碑。未加载时等同 load()。"""
+        if not self._loaded:
+            self.load()
+            return
+        try:
+            with self._rw_lock:
+                self._sync_locked()
+        except Exception as e:
+            logger.error("rag_service: 向量缓存增量同步失败: %s", e)
+
     def refresh(self) -> None:
-        """在后台线程中异步触发 load()。文档新增/删除后调用。"""
-        t = threading.Thread(target=self.load, daemon=True, name="rag-cache-refresh")
+        """文档新增/删除后调用：本进程后台增量同步，并广播其他进程同步。"""
+        from .tiered_cache import publish_invalidation
+        if RagVectorCache._instance is not self:
+            self._sync_async()
+        publish_invalidation('rag_index')
+
+    def _sync_async(self) -> None:
+        t = threading.Thread(target=self.sync, daemon=True, name="rag-cache-refresh")
         t.start()
 
+    def _sync_locked(self) -> None:
+        from .models_rag import RagChunk
+        db_ids = set(RagChunk.objects
+                     .filter(document__status='indexed')
+                     .values_list('id', flat=True))
+        current = self._index.live_chunk_ids()
+        removed = current - db_ids
+        added_ids = db_ids - current
+        if not removed and not added_ids:
+            return
+        added = self._build_from_db(added_ids) if added_ids else None
+        index = self._index.with_changes(removed, added)
+        self._manifest = self._persist(index, self._manifest)
+        self._apply(index)
+        logger.info("rag_service: 向量缓存增量同步 +%d / -%d，当前 %d 条",
+                    len(added_ids), len(removed), index.live_rows)
+
+    def _build_from_db(self, chunk_ids: Optional[set]) -> VectorIndex:
+        """从 DB 读取 chunk（None 为全部 indexed），一次拼接解码为矩阵后归一化 / 量化。"""
+        from .models_rag import RagChunk
+        # v1.4.1：image_id 以整型 FK 读出，不取图片字节（IFC-141-304）
+        qs = (RagChunk.objects
+              .filter(document__status='indexed')
+              .order_by('id')
+              .values_list('id', 'embedding', 'document__file_name', 'page_or_section',
+                           'is_image_ocr', 'content', 'image_id'))
+        if chunk_ids is not None:
+            qs = qs.filter(id__in=chunk_ids)
+        ids, blobs, meta = [], [], []
+        dim_bytes = None
+        for cid, emb, doc_name, source, is_ocr, content, image_id in qs.iterator(chunk_size=2000):
+            raw = bytes(emb)  # Django BinaryField 返回 memoryview，转 bytes
+            if dim_bytes is None:
+                dim_bytes = self._index.vectors.shape[1] * 4 if chunk_ids is not None and self._index.rows else len(raw)
+            if len(raw) != dim_bytes:
+                logger.warning("rag_service: chunk %s 向量维度与索引不一致，跳过", cid)
+                continue
+            ids.append(cid)
+            blobs.append(raw)
+            meta.append({
+                'doc_name': doc_name,
+                'source': source,
+                'is_image_ocr': is_ocr,
+                'content': content,
+                'image_id': image_id,   # v1.4.1 新增：整型 FK id 或 None（不存图片字节，IFC-141-304）
+            })
+        raw_vectors = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(ids), -1) if ids else None
+        return VectorIndex.from_raw(raw_vectors, ids, meta, self._dtype())
+
+    def _persist(self, index: VectorIndex, previous: Optional[dict]) -> Optional[dict]:
+        """写持久化文件并换成内存映射（save 在目录锁内完成映射）；未配置目录或写失败时保持内存索引。"""
+        directory = self._index_dir()
+        if not directory:
+            return None
+        try:
+            return index.save(directory, previous)
+        except Exception as e:
+            logger.warning("rag_service: 向量索引写盘失败（继续使用内存索引）: %s", e)
+            return None
+
+    def _apply(self, index: VectorIndex) -> None:
+        settings = self._settings()
+        self._index = index.with_ann(
+            getattr(settings, 'RAG_VECTOR_ANN_MIN_ROWS', 0),
+            getattr(settings, 'RAG_VECTOR_ANN_NPROBE', 8),
+        )
+        self._lexical_for(self._index)   # 与向量快照同步建好倒排，不留给首个查询
+
+    def _lexical_for(self, index: VectorIndex) -> LexicalIndex:
+        """index 对应的倒排索引；快照已更换（含测试直接注入 _vectors / _meta）时重建。"""
+        source, lexical = self._lexical
+        if source is index:
+            return lexical
+        with self._lexical_lock:
+            source, previous = self._lexical
+            if source is not index:
+                lexical = LexicalIndex.build(
+                    index.chunk_ids.tolist(), [m.get('content') or '' for m in index.meta],
+                    index.alive, previous,
+                )
+                self._lexical = (index, lexical)
+            return self._lexical[1]
+
     def _ensure_loaded(self) -> None:
         """懒加载：首次 search 时若未加载则同步加载（避免启动时拖慢冷启动）。"""
         if not self._loaded:
             self.load()
 
+    # 混合检索时向量 / 字面两路各取 k * 该倍数个候选再融合
+    _HYBRID_CANDIDATES = 4
+
     def search(self, query_vec: np.ndarray, k: int = 5,
-               threshold: float = 0.3) -> List[dict]:
+               threshold: float = 0.3, query_text: Optional[str] = None) -> List[dict]:
         """
-        余弦相似度 top-k 检索。
+        余弦相似度 top-k 检索（行向量已预归一化，argpartition 取 top-k）。
+        给定 query_text 且 RAG_LEXICAL_WEIGHT > 0 时做混合检索：两路候选取并集，
+        分数 = 余弦 + 权重 × BM25/本次最高 BM25（字面零命中的 chunk 分数即余弦，纯向量结果不变）。
         返回按分数降序的 dict 列表，score < threshold 的结果丢弃。
-        线程安全（读取快照）。
+        线程安全（读取当前快照引用）。
         """
         self._ensure_loaded()
-        with self._rw_lock:
-            if self._vectors is None or len(self._vectors) == 0:
-                return []
-            vectors = self._vectors.copy()
-            meta = list(self._meta)
-
-        # 余弦相似度计算
-        query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-9)
-        norms = np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
-        normed = vectors / norms
-        scores = normed @ query_norm    # shape=(N,)
-
-        top_idx = np.argsort(scores)[::-1][:k]
+        index = self._index
+        if index.rows == 0:
+            return []
+
+        query_norm = np.asarray(query_vec, dtype=np.float32)
+        query_norm = query_norm / (np.linalg.norm(query_norm) + 1e-9)
+
+        weight = float(getattr(self._settings(), 'RAG_LEXICAL_WEIGHT', 0.0)) if query_text else 0.0
+        lexical_hits = (self._lexical_for(index).search(query_text, k * self._HYBRID_CANDIDATES)
+                        if weight > 0 else [])
+        if lexical_hits:
+            hits = self._fuse(index, query_norm, index.top_k(query_norm, k * self._HYBRID_CANDIDATES),
+                              lexical_hits, weight)[:k]
+        else:
+            hits = index.top_k(query_norm, k)
+
         results = []
-        for i in top_idx:
-            if float(scores[i]) < threshold:
+        for i, score in hits:
+            if score < threshold:
                 break
-            m = meta[i]
-            results.append({
-                'content': m['content'],
-                'source': f"{m['doc_name']} · {m['source']}",
-                'is_image_ocr': m['is_image_ocr'],
-                'score': float(scores[i]),
-                'image_id': m.get('image_id'),   # v1.4.1 新增：int | None（IFC-141-305）
-            })
+            results.append(self._result(index.meta[i], score))
         return results
 
+    def lexical_lookup(self, query: str, k: int = 5) -> Optional[List[dict]]:
+        """
+        字面短路：查询含代码型标记（故障码 E12 / 参数名 indoor_temperature 等）且有 chunk
+        同时精确包含全部这些标记时，按 BM25 返回这些 chunk（score 为相对最高分的比值，首条 1.0）；
+        否则返回 None，由调用方走 embedding + 混合检索。RAG_LEXICAL_SHORT_CIRCUIT=False 时恒为 None。
+        """
+        if not getattr(self._settings(), 'RAG_LEXICAL_SHORT_CIRCUIT', False):
+            return None
+        codes = code_tokens(query)
+        if not codes:
+            return None
+        self._ensure_loaded()
+        index = self._index
+        lexical = self._lexical_for(index)
+        rows = lexical.rows_with_codes(codes)
+        if not len(rows):
+            return None
+        hits = lexical.search(query, k, candidates=rows)
+        top = hits[0][1]
+        return [self._result(index.meta[i], score / top) for i, score in hits]
+
+    @staticmethod
+    def _fuse(index: VectorIndex, query_norm: np.ndarray, vector_hits: List[tuple],
+              lexical_hits: List[tuple], weight: float) -> List[tuple]:
+        """融合两路候选：字面候选缺余弦分的补算（只取这几行），返回 [(行号, 融合分)] 降序。"""
+        scores = dict(vector_hits)
+        missing = [i for i, _ in lexical_hits if i not in scores]
+        if missing:
+            scores.update(zip(missing, (index.dense(np.asarray(missing)) @ query_norm).tolist()))
+        top = lexical_hits[0][1]
+        for i, bm25 in lexical_hits:
+            scores[i] += weight * bm25 / top
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+    @staticmethod
+    def _result(m: dict, score: float) -> dict:
+        return {
+            'content': m['content'],
+            'source': f"{m['doc_name']} · {m['source']}",
+            'is_image_ocr': m['is_image_ocr'],
+            'score': float(score),
+            'image_id': m.get('image_id'),   # v1.4.1 新增：int | None（IFC-141-305）
+        }
+
 
 # 进程级单例
 rag_vector_cache = RagVectorCache.get_instance()
@@ -217,6 +407,9 @@ class _DoubaoMultimodalEmbeddings:
     无法用 langchain OpenAIEmbeddings，这里用裸 HTTP 实现，接口对齐 embed_documents/embed_query。
     """
 
+    # 无批量端点：查询侧不做微批（见 api.query_embedding）
+    supports_batch = False
+
     def __init__(self, base_url: str, model: str, api_key: str, timeout: float = 20.0):
         self._url = (base_url or '').rstrip('/') + '/embeddings/multimodal'
         self._model = model
@@ -272,14 +465,48 @@ class _DoubaoMultimodalEmbeddings:
         return self._embed_one(text, attempts=2, timeout=min(self._timeout, 12.0))
 
 
+# ── 离线伪 embedding ──────────────────────────────────────────────────────
+
+class _HashingEmbeddings:
+    """
+    离线伪 embedding（RAG_EMBEDDING_API_STYLE='fake'）：字符 1-gram / 2-gram 哈希计数到固定维度后归一化。
+    确定性、无网络、无凭据；字面相近的文本余弦相近，足以驱动检索 / 语义路由的离线测试与本地开发。
+    """
+
+    def __init__(self, dim: int = 1024):
+        self._dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self._dim, dtype=np.float32)
+        grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+        for g in grams:
+            h = int.from_bytes(hashlib.md5(g.encode("utf-8")).digest()[:4], "little")
+            vec[h % self._dim] += 1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
 # ── RagEmbedder ───────────────────────────────────────────────────────────
 
+# 进程内复用的 embedding 客户端：(style, base_url, model, api_key) -> client
+# OpenAIEmbeddings 构造会新建 HTTP 客户端与连接池，原先每次 embed 都重建一遍
+_embedding_clients: dict = {}
+
+
 class RagEmbedder:
     """
     embedding 封装，从 django.conf.settings 读取 RAG_EMBEDDING_* 配置（凭据仅走 .env）。
     按 RAG_EMBEDDING_API_STYLE 选择后端：
       'openai'            → langchain-openai OpenAIEmbeddings（标准 /embeddings，支持批量）
       'doubao_multimodal' → 火山方舟多模态 /embeddings/multimodal（逐条，非批量）
+      'fake'              → 离线哈希伪向量（测试 / 无凭据开发）
+    客户端按配置在进程内复用；查询侧缓存 / 合并 / 微批见 api.query_embedding。
     """
 
     def _get_client(self):
@@ -289,6 +516,18 @@ class RagEmbedder:
         api_key = getattr(settings, 'RAG_EMBEDDING_API_KEY', '') or 'sk-noop'
         style = getattr(settings, 'RAG_EMBEDDING_API_STYLE', 'openai')
 
+        key = (style, base_url, model, api_key)
+        client = _embedding_clients.get(key)
+        if client is None:
+            client = self._build_client(style, base_url, model, api_key)
+            _embedding_clients[key] = client
+        return client
+
+    @staticmethod
+    def _build_client(style: str, base_url: str, model: str, api_key: str):
+        if style == 'fake':
+            return _HashingEmbeddings()
+
         if style == 'doubao_multimodal':
             # 火山方舟多模态 embedding（doubao-embedding-vision）：逐条调用、非批量。
             return _DoubaoMultimodalEmbeddings(base_url, model, api_key, timeout=15.0)
@@ -307,6 +546,11 @@ class RagEmbedder:
             check_embedding_ctx_length=False,
         )
 
+    @property
+    def supports_batch(self) -> bool:
+        """后端是否有真正的批量端点（embed_texts 一次请求）；doubao 多模态为逐条调用。"""
+        return getattr(self._get_client(), 'supports_batch', True)
+
     def embed_texts(self, texts: List[str]) -> List[np.ndarray]:
         """批量 embed，返回 list[np.ndarray(float32, shape=(dim,))]。"""
         client = self._get_client()
@@ -534,7 +778,8 @@ class RagParser:
     # 整页渲染后图片字节大小上限（防止超大图纸耗尽内存）：50MB
     _SCAN_MAX_IMG_BYTES = 50 * 1024 * 1024
 
-    def parse_pdf(self, file_bytes: bytes) -> List[ParsedChunk]:
+    def parse_pdf(self, file_bytes: bytes, workers: int = 0,
+                  done_pages: Optional[dict] = None, on_page=None) -> List[ParsedChunk]:
         """
         PyMuPDF 解析 .pdf（AGPL v3，内部平台合规，见 ADR-003）：
         - 页面文字按 chunk_size 分块，来源标注"第 N 页"
@@ -546,153 +791,189 @@ class RagParser:
         方案1（图文同 chunk）：页末令本页「页面文字 chunk」继承本页代表图片字节
         （见 _inherit_page_image），使"描述图的文字"与"图"落到同一可检索 chunk——
         修复"问图时命中文字 chunk 却取不到图"（图自身 OCR 多为碎片，语义匹配不上）。
+
+        分阶段入库（RagIngestor）参数：
+          workers    — >1 时各页在进程池（spawn）中并行解析 / OCR（OCR 为 CPU 密集，线程受 GIL 限制）
+          done_pages — {page_num: List[ParsedChunk]} 检查点中已解析的页，直接复用不再解析
+          on_page    — on_page(page_num, chunks, page_count)，每页完成后在调用线程回调（写检查点 / 进度）
+        返回结果始终按页序拼接，与并行完成顺序无关。
         """
         import io
         import fitz  # PyMuPDF
 
         doc = fitz.open(stream=io.BytesIO(file_bytes), filetype="pdf")
-        chunks: List[ParsedChunk] = []
+        page_count = len(doc)
+        pages = {p: c for p, c in (done_pages or {}).items() if 0 <= p < page_count}
+        todo = [p for p in range(page_count) if p not in pages]
+
+        if workers > 1 and len(todo) > 1:
+            doc.close()
+            results = self._parse_pdf_pages_in_pool(file_bytes, todo, workers)
+        else:
+            results = ((p, self._parse_pdf_page(doc, p)) for p in todo)
+        for page_num, page_chunks in results:
+            pages[page_num] = page_chunks
+            if on_page is not None:
+                on_page(page_num, page_chunks, page_count)
+
+        return [c for p in range(page_count) for c in pages.get(p, [])]
+
+    def _parse_pdf_pages_in_pool(self, file_bytes: bytes, page_nums: List[int], workers: int):
+        """进程池逐页解析：每个子进程在 initializer 中打开一次文档，按完成顺序产出 (page_num, chunks)。"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # spawn：入库线程所在的 web 进程有多个线程持锁（日志 / DB 连接），fork 子进程可能死锁
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(page_nums)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_pdf_worker_init,
+            initargs=(file_bytes, self.chunk_size, self.chunk_overlap),
+        ) as pool:
+            futures = {pool.submit(_pdf_worker_parse_page, p): p for p in page_nums}
+            for fut in as_completed(futures):
+                yield futures[fut], fut.result()
+
+    def _parse_pdf_page(self, doc, page_num: int) -> List[ParsedChunk]:
+        """解析单页（路径1 文字层 / 路径2 内嵌图片 OCR / 路径3 扫描件整页 OCR），返回本页 chunk（文字先、图后）。"""
+        import fitz  # PyMuPDF
 
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_label = f"第 {page_num + 1} 页"
-            # 方案1（图文同 chunk）：按页收集，便于页末让文字 chunk 继承本页代表图。
-            page_text_chunks: List[ParsedChunk] = []
-            page_image_chunks: List[ParsedChunk] = []
-            page_images: List[tuple] = []   # 本页已存图片 [(bytes, fmt, size)]，供文字 chunk 继承
-
-            # ── 路径1：页面文字层 ──────────────────────────────────────────
-            text = page.get_text().strip()
-            if text:
-                page_text_chunks.extend(self._split_text(text, page_label))
-
-            # ── 路径2：页面内嵌 XObject 图片 OCR ──────────────────────────
-            img_list = page.get_images(full=True)
-            for img_idx, img_info in enumerate(img_list):
-                xref = img_info[0]
+        page = doc[page_num]
+        page_label = f"第 {page_num + 1} 页"
+        # 方案1（图文同 chunk）：按页收集，便于页末让文字 chunk 继承本页代表图。
+        page_text_chunks: List[ParsedChunk] = []
+        page_image_chunks: List[ParsedChunk] = []
+        page_images: List[tuple] = []   # 本页已存图片 [(bytes, fmt, size)]，供文字 chunk 继承
+
+        # ── 路径1：页面文字层 ──────────────────────────────────────────
+        text = page.get_text().strip()
+        if text:
+            page_text_chunks.extend(self._split_text(text, page_label))
+
+        # ── 路径2：页面内嵌 XObject 图片 OCR ──────────────────────────
+        img_list = page.get_images(full=True)
+        for img_idx, img_info in enumerate(img_list):
+            xref = img_info[0]
+            try:
+                base_image = doc.extract_image(xref)
+                img_bytes_raw = base_image["image"]
+                # v1.4.1：PyMuPDF 提供 ext 字段（格式字符串），兜底用 _detect
+                raw_ext = (base_image.get("ext") or "").lower().strip(".")
+                if raw_ext in ("png", "jpeg", "jpg"):
+                    img_fmt = "jpeg" if raw_ext == "jpg" else raw_ext
+                else:
+                    img_fmt = _detect_image_format(img_bytes_raw)
+                source_hint = f"{page_label} 图片{img_idx + 1}"
+                saved_bytes, saved_fmt = self._try_save_image_bytes(
+                    img_bytes_raw, img_fmt, source_hint)
+                if saved_bytes is not None:
+                    # 方案1：登记本页图片，供页末文字 chunk 继承
+                    page_images.append((saved_bytes, saved_fmt, len(saved_bytes)))
+
+                ocr_text = self._ocr_image(img_bytes_raw)
+                if ocr_text:
+                    split_chunks = self._split_text(ocr_text, source_hint)
+                    for c in split_chunks:
+                        c.is_image_ocr = True
+                        c.img_bytes = saved_bytes
+                        c.img_format = saved_fmt
+                        c.img_size = len(saved_bytes) if saved_bytes else 0
+                    page_image_chunks.extend(split_chunks)
+                elif saved_bytes is not None:
+                    # 无 OCR 文字但有图片（OQ-IC-003）
+                    placeholder = ParsedChunk(
+                        content='',
+                        page_or_section=source_hint,
+                        is_image_ocr=True,
+                        img_bytes=saved_bytes,
+                        img_format=saved_fmt,
+                        img_size=len(saved_bytes),
+                    )
+                    page_image_chunks.append(placeholder)
+            except Exception as e:
+                logger.warning("rag_service: pdf 图片 OCR 失败，跳过: %s", e)
+
+        # ── 路径3：扫描件 fallback — 整页栅格化 OCR ───────────────────
+        # 触发条件：该页既无可提取文本，也无 XObject 图片（典型扫描件/图纸 PDF）。
+        # 原理：将整页渲染为 PNG pixmap，直接对 PNG bytes 调 rapidocr。
+        # get_text() 对扫描件始终返回 ""，get_images() 对"页面流位图"扫描件返回 []，
+        # 两者均为假时说明本页内容完全在光栅化页面流中，需此 fallback 才能提取文字。
+        if not text and not img_list:
+            if not _HAS_OCR:
+                logger.warning(
+                    "rag_service: 第 %d 页为扫描件但 OCR 未启用，跳过该页",
+                    page_num + 1,
+                )
+            else:
                 try:
-                    base_image = doc.extract_image(xref)
-                    img_bytes_raw = base_image["image"]
-                    # v1.4.1：PyMuPDF 提供 ext 字段（格式字符串），兜底用 _detect
-                    raw_ext = (base_image.get("ext") or "").lower().strip(".")
-                    if raw_ext in ("png", "jpeg", "jpg"):
-                        img_fmt = "jpeg" if raw_ext == "jpg" else raw_ext
-                    else:
-                        img_fmt = _detect_image_format(img_bytes_raw)
-                    source_hint = f"{page_label} 图片{img_idx + 1}"
-                    saved_bytes, saved_fmt = self._try_save_image_bytes(
-                        img_bytes_raw, img_fmt, source_hint)
-                    if saved_bytes is not None:
-                        # 方案1：登记本页图片，供页末文字 chunk 继承
-                        page_images.append((saved_bytes, saved_fmt, len(saved_bytes)))
+                    mat = fitz.Matrix(
+                        self._SCAN_RENDER_DPI / 72,
+                        self._SCAN_RENDER_DPI / 72,
+                    )
+                    pixmap = page.get_pixmap(matrix=mat, alpha=False)
+                    png_bytes = pixmap.tobytes("png")
+                    pixmap = None  # 及时释放，防止大图纸多页 OOM
 
-                    ocr_text = self._ocr_image(img_bytes_raw)
-                    if ocr_text:
-                        split_chunks = self._split_text(ocr_text, source_hint)
-                        for c in split_chunks:
-                            c.is_image_ocr = True
-                            c.img_bytes = saved_bytes
-                            c.img_format = saved_fmt
-                            c.img_size = len(saved_bytes) if saved_bytes else 0
-                        page_image_chunks.extend(split_chunks)
-                    elif saved_bytes is not None:
-                        # 无 OCR 文字但有图片（OQ-IC-003）
-                        placeholder = ParsedChunk(
-                            content='',
-                            page_or_section=source_hint,
-                            is_image_ocr=True,
-                            img_bytes=saved_bytes,
-                            img_format=saved_fmt,
-                            img_size=len(saved_bytes),
+                    if len(png_bytes) > self._SCAN_MAX_IMG_BYTES:
+                        logger.warning(
+                            "rag_service: 第 %d 页渲染后 %.1f MB，超过 %d MB 上限，跳过",
+                            page_num + 1,
+                            len(png_bytes) / 1024 / 1024,
+                            self._SCAN_MAX_IMG_BYTES // 1024 // 1024,
                         )
-                        page_image_chunks.append(placeholder)
-                except Exception as e:
-                    logger.warning("rag_service: pdf 图片 OCR 失败，跳过: %s", e)
-
-            # ── 路径3：扫描件 fallback — 整页栅格化 OCR ───────────────────
-            # 触发条件：该页既无可提取文本，也无 XObject 图片（典型扫描件/图纸 PDF）。
-            # 原理：将整页渲染为 PNG pixmap，直接对 PNG bytes 调 rapidocr。
-            # get_text() 对扫描件始终返回 ""，get_images() 对"页面流位图"扫描件返回 []，
-            # 两者均为假时说明本页内容完全在光栅化页面流中，需此 fallback 才能提取文字。
-            if not text and not img_list:
-                if not _HAS_OCR:
-                    logger.warning(
-                        "rag_service: 第 %d 页为扫描件但 OCR 未启用，跳过该页",
-                        page_num + 1,
-                    )
-                else:
-                    try:
-                        mat = fitz.Matrix(
-                            self._SCAN_RENDER_DPI / 72,
-                            self._SCAN_RENDER_DPI / 72,
+                    else:
+                        logger.info(
+                            "rag_service: 第 %d 页为扫描件，整页渲染 %.1f MB，执行 OCR",
+                            page_num + 1,
+                            len(png_bytes) / 1024 / 1024,
                         )
-                        pixmap = page.get_pixmap(matrix=mat, alpha=False)
-                        png_bytes = pixmap.tobytes("png")
-                        pixmap = None  # 及时释放，防止大图纸多页 OOM
-
-                        if len(png_bytes) > self._SCAN_MAX_IMG_BYTES:
+                        # v1.4.1：扫描件整页大图也纳入存储（OQ-IC-003），受 10MB 上限约束
+                        scan_source = f"{page_label} 扫描"
+                        saved_bytes, saved_fmt = self._try_save_image_bytes(
+                            png_bytes, 'png', scan_source)
+                        if saved_bytes is not None:
+                            # 方案1：登记本页整页图，供文字 chunk 继承（路径3 文字本就源自整页图，
+                            # 其文字 chunk 已自带 img_bytes，_inherit_page_image 不会覆盖）
+                            page_images.append((saved_bytes, saved_fmt, len(saved_bytes)))
+
+                        ocr_text = self._ocr_image(png_bytes)
+                        if ocr_text:
+                            split_chunks = self._split_text(ocr_text, scan_source)
+                            for c in split_chunks:
+                                c.is_image_ocr = True
+                                c.img_bytes = saved_bytes   # 可能为 None（超 10MB）
+                                c.img_format = saved_fmt
+                                c.img_size = len(saved_bytes) if saved_bytes else 0
+                            page_image_chunks.extend(split_chunks)
+                        elif saved_bytes is not None:
+                            # 扫描件 OCR 空 + 图片可存：创建占位 chunk（OQ-IC-003）
+                            placeholder = ParsedChunk(
+                                content='',
+                                page_or_section=scan_source,
+                                is_image_ocr=True,
+                                img_bytes=saved_bytes,
+                                img_format=saved_fmt,
+                                img_size=len(saved_bytes),
+                            )
+                            page_image_chunks.append(placeholder)
                             logger.warning(
-                                "rag_service: 第 %d 页渲染后 %.1f MB，超过 %d MB 上限，跳过",
+                                "rag_service: 第 %d 页扫描件 OCR 返回空（图纸无可识别文字或图像质量不足），图片仍存储",
                                 page_num + 1,
-                                len(png_bytes) / 1024 / 1024,
-                                self._SCAN_MAX_IMG_BYTES // 1024 // 1024,
                             )
                         else:
-                            logger.info(
-                                "rag_service: 第 %d 页为扫描件，整页渲染 %.1f MB，执行 OCR",
+                            logger.warning(
+                                "rag_service: 第 %d 页扫描件 OCR 返回空（图纸无可识别文字或图像质量不足）",
                                 page_num + 1,
-                                len(png_bytes) / 1024 / 1024,
                             )
-                            # v1.4.1：扫描件整页大图也纳入存储（OQ-IC-003），受 10MB 上限约束
-                            scan_source = f"{page_label} 扫描"
-                            saved_bytes, saved_fmt = self._try_save_image_bytes(
-                                png_bytes, 'png', scan_source)
-                            if saved_bytes is not None:
-                                # 方案1：登记本页整页图，供文字 chunk 继承（路径3 文字本就源自整页图，
-                                # 其文字 chunk 已自带 img_bytes，_inherit_page_image 不会覆盖）
-                                page_images.append((saved_bytes, saved_fmt, len(saved_bytes)))
-
-                            ocr_text = self._ocr_image(png_bytes)
-                            if ocr_text:
-                                split_chunks = self._split_text(ocr_text, scan_source)
-                                for c in split_chunks:
-                                    c.is_image_ocr = True
-                                    c.img_bytes = saved_bytes   # 可能为 None（超 10MB）
-                                    c.img_format = saved_fmt
-                                    c.img_size = len(saved_bytes) if saved_bytes else 0
-                                page_image_chunks.extend(split_chunks)
-                            elif saved_bytes is not None:
-                                # 扫描件 OCR 空 + 图片可存：创建占位 chunk（OQ-IC-003）
-                                placeholder = ParsedChunk(
-                                    content='',
-                                    page_or_section=scan_source,
-                                    is_image_ocr=True,
-                                    img_bytes=saved_bytes,
-                                    img_format=saved_fmt,
-                                    img_size=len(saved_bytes),
-                                )
-                                page_image_chunks.append(placeholder)
-                                logger.warning(
-                                    "rag_service: 第 %d 页扫描件 OCR 返回空（图纸无可识别文字或图像质量不足），图片仍存储",
-                                    page_num + 1,
-                                )
-                            else:
-                                logger.warning(
-                                    "rag_service: 第 %d 页扫描件 OCR 返回空（图纸无可识别文字或图像质量不足）",
-                                    page_num + 1,
-                                )
-                    except Exception as e:
-                        logger.warning(
-                            "rag_service: 第 %d 页扫描件整页 OCR 失败，跳过: %s",
-                            page_num + 1, e,
-                        )
-
-            # ── 方案1（图文同 chunk）：本页文字 chunk 继承本页代表图，再按"文字先、图后"汇入 ──
-            self._inherit_page_image(page_text_chunks, page_images, page_label)
-            chunks.extend(page_text_chunks)
-            chunks.extend(page_image_chunks)
+                except Exception as e:
+                    logger.warning(
+                        "rag_service: 第 %d 页扫描件整页 OCR 失败，跳过: %s",
+                        page_num + 1, e,
+                    )
 
-        return chunks
+        # ── 方案1（图文同 chunk）：本页文字 chunk 继承本页代表图，再按"文字先、图后"汇入 ──
+        self._inherit_page_image(page_text_chunks, page_images, page_label)
+        return page_text_chunks + page_image_chunks
 
     @staticmethod
     def _ocr_image(img_bytes: bytes) -> str:
@@ -716,49 +997,76 @@ class RagParser:
         return ""
 
 
+# ── PDF 逐页解析子进程（RagParser._parse_pdf_pages_in_pool）──────────────────
+# spawn 子进程只 import 本模块（不初始化 Django）；initializer 打开一次文档，之后逐页解析。
+_pdf_worker_state: dict = {}
+
+
+def _pdf_worker_init(file_bytes: bytes, chunk_size: int, chunk_overlap: int) -> None:
+    import io
+    import fitz  # PyMuPDF
+    _pdf_worker_state['doc'] = fitz.open(stream=io.BytesIO(file_bytes), filetype="pdf")
+    _pdf_worker_state['parser'] = RagParser(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _pdf_worker_parse_page(page_num: int) -> List[ParsedChunk]:
+    return _pdf_worker_state['parser']._parse_pdf_page(_pdf_worker_state['doc'], page_num)
+
+
 # ── RagIngestor ───────────────────────────────────────────────────────────
 
 class RagIngestor:
     """
-    后台线程入库调度。
+    后台线程入库调度，分阶段流水线：
+      1. 解析：PDF 各页在进程池中并行解析 / OCR（RAG_INGEST_PARSE_WORKERS），逐页写检查点
+      2. 图片：写 RagImage（image_index 按图片首次出现顺序确定，续跑时复用已写行）
+      3. 向量化 + 写库：每 BATCH_SIZE 条一批，最多 RAG_INGEST_EMBED_CONCURRENCY 批并发调用
+         embedding；每批完成即在事务内写入 RagChunk（续跑时跳过已落库批次）
+      4. 置 indexed → 刷新向量缓存 → 删除检查点
+    进度写入 RagDocument.pages_total / pages_done / chunks_total / chunks_embedded。
+    检查点（原始文件 + 逐页解析结果）见 api.rag_ingest；失败 / 进程崩溃后可经
+    views_rag retry 或 `manage.py rag_resume_ingest` 从检查点续跑。
+
     调用方（views_rag.py）在 transaction.on_commit 中启动 ingest() 守护线程。
     全程捕获异常，失败写 status=failed + error_message，不让线程静默崩溃。
     """
 
     BATCH_SIZE = 20  # 每批向量化 chunk 数（控制单次 API 调用规模）
 
-    def ingest(self, doc_id: int, file_bytes: bytes, file_ext: str) -> None:
+    def ingest(self, doc_id: int, file_bytes: bytes, file_ext: str, resume: bool = False) -> None:
         """
         入库主流程（在守护线程中运行）。
         file_ext: '.docx' 或 '.pdf'（小写）
+        resume:   True 时沿用检查点与已写入的 RagChunk / RagImage，只补做未完成部分；
+                  False 时清掉该文档上一轮残留后从头入库
         """
-        from .models_rag import RagDocument, RagChunk
-        from django.conf import settings
+        from .models_rag import RagDocument, RagChunk, RagImage
+        from .rag_ingest import IngestCheckpoint
 
         # 安全获取文档（可能已被并发删除）
         try:
             doc = RagDocument.objects.get(id=doc_id)
         except RagDocument.DoesNotExist:
             logger.info("rag_service: 文档 %s 已被删除，入库任务退出", doc_id)
+            IngestCheckpoint.for_document(doc_id).clear()
             return
 
+        checkpoint = IngestCheckpoint.for_document(doc_id)
         try:
             # Step 1: 更新状态为 parsing
             doc.status = RagDocument.STATUS_PARSING
             doc.error_message = ''
-            doc.save(update_fields=['status', 'error_message', 'updated_at'])
-
-            # Step 2: 解析文档
-            chunk_size = getattr(settings, 'RAG_CHUNK_SIZE', 500)
-            chunk_overlap = getattr(settings, 'RAG_CHUNK_OVERLAP', 50)
-            parser = RagParser(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-            if file_ext == '.docx':
-                parsed = parser.parse_docx(file_bytes)
-            elif file_ext == '.pdf':
-                parsed = parser.parse_pdf(file_bytes)
-            else:
-                raise ValueError(f"不支持的文件类型: {file_ext}")
+            update_fields = ['status', 'error_message', 'updated_at']
+            if not resume:
+                RagChunk.objects.filter(document_id=doc_id).delete()
+                RagImage.objects.filter(document_id=doc_id).delete()
+                checkpoint.save_source(file_bytes, file_ext)
+                doc.pages_total = doc.pages_done = doc.chunks_total = doc.chunks_embedded = 0
+                update_fields += ['pages_total', 'pages_done', 'chunks_total', 'chunks_embedded']
+            doc.save(update_fields=update_fields)
+
+            # Step 2: 解析文档（PDF 逐页检查点，续跑时只解析缺失页）
+            parsed = self._parse(doc_id, file_bytes, file_ext, checkpoint)
 
             # v1.4.1：分离有内容的 chunk（需向量化）与纯图片占位 chunk（不向量化）
             text_chunks = [c for c in parsed if c.content]   # 有文字内容，需向量化
@@ -774,106 +1082,31 @@ class RagIngestor:
             # 中途检查：文档是否已被删除
             if not RagDocument.objects.filter(id=doc_id).exists():
                 logger.info("rag_service: 文档 %s 入库期间被删除，安全退出", doc_id)
+                checkpoint.clear()
                 return
 
-            # Step 3: 批量向量化（仅针对有文字内容的 chunk，跳过纯图片占位 chunk）
-            embedder = RagEmbedder()
-            all_data: List[tuple] = []  # [(ParsedChunk, np.ndarray)]
-            for i in range(0, len(text_chunks), self.BATCH_SIZE):
-                batch = text_chunks[i:i + self.BATCH_SIZE]
-                texts = [c.content for c in batch]
-                try:
-                    vecs = embedder.embed_texts(texts)
-                except Exception as e:
-                    raise RuntimeError(f"向量化失败（批次 {i // self.BATCH_SIZE + 1}）: {e}") from e
-                for chunk, vec in zip(batch, vecs):
-                    all_data.append((chunk, vec))
-
-            # v1.4.1：将纯图片占位 chunk 也加入 all_data（用于 Step 4a 写 RagImage），
-            # 但不写向量（Step 4 过滤 content='' 的 chunk 不进 RagChunk 向量表）
-            # 用 None 作为向量占位（Step 4 中显式跳过 content='' 的 chunk）
-            all_data_with_img_only = list(all_data)   # 含向量的有文字 chunk
-            img_only_data = [(c, None) for c in image_only_chunks]  # 纯图片占位，无向量
+            # Step 3: 写入 RagImage，建立 img_bytes hash → image_id 映射（IFC-141-303）
+            # 先于 chunk 写入：每批 RagChunk 落库时即可带上 image_id
+            img_key_to_image_id = self._write_images(doc_id, text_chunks + image_only_chunks)
 
-            # 中途再次检查
-            if not RagDocument.objects.filter(id=doc_id).exists():
+            # Step 4: 并发向量化 + 逐批写入 RagChunk（仅有文字内容的 chunk）
+            if not self._embed_and_write(doc_id, text_chunks, img_key_to_image_id):
+                logger.info("rag_service: 文档 %s 入库期间被删除，安全退出", doc_id)
+                checkpoint.clear()
                 return
 
-            # ── v1.4.1 Step 4a：写入 RagImage，建立 chunk.image_id 映射（IFC-141-303）──
-            from .models_rag import RagImage   # 延迟 import 避免循环（与 RagDocument 同模块）
-            # 去重 key：img_bytes 前 256 字节 MD5（快速 hash，非密码学用途）
-            # 同一图片可能对应多个 split_text chunk，只写一次 RagImage 行
-            img_key_to_rag_image: dict = {}   # md5_hex → RagImage 对象
-            image_write_errors = 0
-            image_counter = 0
-
-            # 遍历所有含图片字节的 chunk（有文字 chunk + 纯图片占位 chunk）
-            combined_for_images = all_data_with_img_only + img_only_data
-            for chunk, _vec in combined_for_images:
-                if chunk.img_bytes is None:
-                    continue   # 无图片（纯文字 chunk 或超限跳过）
-                img_key = hashlib.md5(chunk.img_bytes[:256]).hexdigest()
-                if img_key in img_key_to_rag_image:
-                    continue   # 已写入（同一图片多个 OCR chunk 共享一个 RagImage 行）
-                try:
-                    rag_image = RagImage.objects.create(
-                        document_id=doc_id,
-                        image_index=image_counter,
-                        page_or_section=chunk.page_or_section,
-                        image_format=chunk.img_format,
-                        image_data=chunk.img_bytes,
-                        file_size=chunk.img_size,
-                    )
-                    img_key_to_rag_image[img_key] = rag_image
-                    image_counter += 1
-                except Exception as e:
-                    image_write_errors += 1
-                    logger.warning(
-                        "rag_service: 文档 %s 图片写入失败（跳过，文档继续入库，fail-open）: %s",
-                        doc_id, e)
-                    # fail-open：图片写入失败不阻断文档入库（REQ-NFR-003，C-008）
-
-            if image_write_errors > 0:
-                logger.warning(
-                    "rag_service: 文档 %s 共 %d 张图片写入失败，对应 chunk 的 image_id 为 None",
-                    doc_id, image_write_errors)
-            if image_counter > 0:
-                logger.info("rag_service: 文档 %s 成功写入 %d 张图片", doc_id, image_counter)
-            # ──────────────────────────────────────────────────────────────────────────
-
-            # Step 4: 写入 RagChunk DB（bulk_create，仅有文字内容的 chunk）
-            # 纯图片占位 chunk（content=''）已在 Step 4a 存了 RagImage，不进向量表
-            chunk_objs = []
-            for idx, (chunk, vec) in enumerate(all_data_with_img_only):
-                # v1.4.1：查找本 chunk 对应的 RagImage（按 img_bytes hash 匹配）
-                image_obj = None
-                if chunk.img_bytes is not None:
-                    img_key = hashlib.md5(chunk.img_bytes[:256]).hexdigest()
-                    image_obj = img_key_to_rag_image.get(img_key)   # 可能为 None（写入失败时）
-
-                chunk_objs.append(RagChunk(
-                    document_id=doc_id,
-                    chunk_index=idx,
-                    content=chunk.content,
-                    embedding=vec.tobytes(),
-                    page_or_section=chunk.page_or_section,
-                    is_image_ocr=chunk.is_image_ocr,
-                    image=image_obj,   # v1.4.1 新增：可为 None（纯文字 chunk 或图片写入失败）
-                ))
-            RagChunk.objects.bulk_create(chunk_objs)
-
-            # Step 5: 更新状态为 indexed
+            # Step 5: 更新状态为 indexed（chunk_count 以实际落库行数为准，含续跑前已写入的批次）
+            from django.utils import timezone
+            chunk_count = RagChunk.objects.filter(document_id=doc_id).count()
             RagDocument.objects.filter(id=doc_id).update(
                 status=RagDocument.STATUS_INDEXED,
-                chunk_count=len(chunk_objs),
+                chunk_count=chunk_count,
                 error_message='',
+                updated_at=timezone.now(),   # update() 不触发 auto_now
             )
-            # 手动更新 updated_at（update() 不触发 auto_now）
-            from django.utils import timezone
-            RagDocument.objects.filter(id=doc_id).update(updated_at=timezone.now())
+            checkpoint.clear()
 
-            logger.info("rag_service: 文档 %s 入库成功，共 %d 条 chunk",
-                        doc_id, len(chunk_objs))
+            logger.info("rag_service: 文档 %s 入库成功，共 %d 条 chunk", doc_id, chunk_count)
 
             # Step 6: 刷新内存向量缓存
             rag_vector_cache.refresh()
@@ -881,7 +1114,7 @@ class RagIngestor:
         except Exception as e:
             error_text = f"{type(e).__name__}: {e}"
             logger.error(
-                "rag_service: 文档 %s 入库失败: %s\n%s",
+                "rag_service: 文档 %s 入库失败（检查点保留，可重试续跑）: %s\n%s",
                 doc_id, error_text, traceback.format_exc()
             )
             try:
@@ -894,23 +1127,207 @@ class RagIngestor:
             except Exception as db_e:
                 logger.error("rag_service: 写 failed 状态失败: %s", db_e)
 
+    def _parse(self, doc_id: int, file_bytes: bytes, file_ext: str, checkpoint) -> List[ParsedChunk]:
+        """解析阶段：优先复用整份解析检查点；PDF 每页完成即写页检查点并更新 pages_done。"""
+        from django.conf import settings
+        from .models_rag import RagDocument
+
+        parsed = checkpoint.load_parsed()
+        if parsed is not None:
+            logger.info("rag_service: 文档 %s 复用检查点中的解析结果（%d 条）", doc_id, len(parsed))
+            return parsed
+
+        parser = RagParser(
+            chunk_size=getattr(settings, 'RAG_CHUNK_SIZE', 500),
+            chunk_overlap=getattr(settings, 'RAG_CHUNK_OVERLAP', 50),
+        )
+        if file_ext == '.docx':
+            parsed = parser.parse_docx(file_bytes)
+        elif file_ext == '.pdf':
+            done_pages = checkpoint.load_pages()
+            if done_pages:
+                logger.info("rag_service: 文档 %s 从检查点续跑，已解析 %d 页", doc_id, len(done_pages))
+            pages_done = len(done_pages)
+
+            def on_page(page_num: int, page_chunks: List[ParsedChunk], page_count: int) -> None:
+                nonlocal pages_done
+                checkpoint.save_page(page_num, page_chunks)
+                pages_done += 1
+                RagDocument.objects.filter(id=doc_id).update(pages_total=page_count, pages_done=pages_done)
+
+            parsed = parser.parse_pdf(
+                file_bytes,
+                workers=getattr(settings, 'RAG_INGEST_PARSE_WORKERS', 0),
+                done_pages=done_pages,
+                on_page=on_page,
+            )
+        else:
+            raise ValueError(f"不支持的文件类型: {file_ext}")
+
+        checkpoint.save_parsed(parsed)
+        return parsed
+
+    @staticmethod
+    def _write_images(doc_id: int, chunks: List[ParsedChunk]) -> dict:
+        """
+        写入 RagImage，返回 {img_key: image_id | None}。
+        去重 key：img_bytes 前 256 字节 MD5（快速 hash，非密码学用途）——同一图片可能对应
+        多个 split_text chunk，只写一次 RagImage 行。image_index 按图片首次出现顺序编号，
+        续跑时同一 image_index 的已有行直接复用（不重复写图片字节）。
+        """
+        from .models_rag import RagImage   # 延迟 import 避免循环（与 RagDocument 同模块）
+
+        existing = dict(RagImage.objects.filter(document_id=doc_id)
+                        .values_list('image_index', 'id'))
+        img_key_to_image_id: dict = {}
+        image_write_errors = 0
+        for chunk in chunks:
+            if chunk.img_bytes is None:
+                continue   # 无图片（纯文字 chunk 或超限跳过）
+            img_key = hashlib.md5(chunk.img_bytes[:256]).hexdigest()
+            if img_key in img_key_to_image_id:
+                continue   # 已写入（同一图片多个 OCR chunk 共享一个 RagImage 行）
+            image_index = len(img_key_to_image_id)
+            if image_index in existing:
+                img_key_to_image_id[img_key] = existing[image_index]
+                continue
+            try:
+                img_key_to_image_id[img_key] = RagImage.objects.create(
+                    document_id=doc_id,
+                    image_index=image_index,
+                    page_or_section=chunk.page_or_section,
+                    image_format=chunk.img_format,
+                    image_data=chunk.img_bytes,
+                    file_size=chunk.img_size,
+                ).id
+            except Exception as e:
+                # fail-open：图片写入失败不阻断文档入库（REQ-NFR-003，C-008），对应 chunk 的 image_id 为 None
+                img_key_to_image_id[img_key] = None
+                image_write_errors += 1
+                logger.warning(
+                    "rag_service: 文档 %s 图片写入失败（跳过，文档继续入库，fail-open）: %s",
+                    doc_id, e)
+
+        if image_write_errors > 0:
+            logger.warning(
+                "rag_service: 文档 %s 共 %d 张图片写入失败，对应 chunk 的 image_id 为 None",
+                doc_id, image_write_errors)
+        written = sum(1 for v in img_key_to_image_id.values() if v is not None)
+        if written > 0:
+            logger.info("rag_service: 文档 %s 共 %d 张图片（其中 %d 张续跑复用）",
+                        doc_id, written, len(existing))
+        return img_key_to_image_id
+
+    def _embed_and_write(self, doc_id: int, text_chunks: List[ParsedChunk],
+                         img_key_to_image_id: dict) -> bool:
+        """
+        向量化 + 写库阶段。chunk_index 为 text_chunks 中的位置（确定性），第 i 批覆盖
+        [i*BATCH_SIZE, (i+1)*BATCH_SIZE)；已完整落库的批次跳过。
+        embedding 调用在线程池中并发（网络 IO，不持有 DB 连接）；写库在本线程按完成顺序逐批进行。
+        返回 False 表示文档在入库期间被删除。
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from django.conf import settings
+        from .models_rag import RagDocument, RagChunk
+
+        written = set(RagChunk.objects.filter(document_id=doc_id)
+                      .values_list('chunk_index', flat=True))
+        pending = [
+            (start, text_chunks[start:start + self.BATCH_SIZE])
+            for start in range(0, len(text_chunks), self.BATCH_SIZE)
+            if not set(range(start, min(start + self.BATCH_SIZE, len(text_chunks)))) <= written
+        ]
+        embedded = len(text_chunks) - sum(len(batch) for _, batch in pending)
+        RagDocument.objects.filter(id=doc_id).update(chunks_total=len(text_chunks), chunks_embedded=embedded)
+        if not pending:
+            return True
+
+        embedder = RagEmbedder()
+        concurrency = max(1, int(getattr(settings, 'RAG_INGEST_EMBED_CONCURRENCY', 4)))
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(pending)),
+                                thread_name_prefix=f"rag-embed-{doc_id}") as pool:
+            futures = {
+                pool.submit(embedder.embed_texts, [c.content for c in batch]): (start, batch)
+                for start, batch in pending
+            }
+            try:
+                for fut in as_completed(futures):
+                    start, batch = futures[fut]
+                    try:
+                        vecs = fut.result()
+                    except Exception as e:
+                        raise RuntimeError(f"向量化失败（批次 {start // self.BATCH_SIZE + 1}）: {e}") from e
+                    if not RagDocument.objects.filter(id=doc_id).exists():
+                        return False
+                    self._write_batch(doc_id, start, batch, vecs, img_key_to_image_id)
+                    embedded += len(batch)
+                    RagDocument.objects.filter(id=doc_id).update(chunks_embedded=embedded)
+            finally:
+                for fut in futures:
+                    fut.cancel()   # 失败 / 文档删除时放弃尚未开始的批次
+        return True
+
+    @staticmethod
+    def _write_batch(doc_id: int, start: int, batch: List[ParsedChunk], vecs,
+                     img_key_to_image_id: dict) -> None:
+        """单批 RagChunk 在一个事务内写入：批次要么完整落库（续跑跳过），要么不落库（续跑重做）。"""
+        from django.db import transaction
+        from .models_rag import RagChunk
+
+        chunk_objs = []
+        for offset, (chunk, vec) in enumerate(zip(batch, vecs)):
+            image_id = None
+            if chunk.img_bytes is not None:
+                image_id = img_key_to_image_id.get(hashlib.md5(chunk.img_bytes[:256]).hexdigest())
+            chunk_objs.append(RagChunk(
+                document_id=doc_id,
+                chunk_index=start + offset,
+                content=chunk.content,
+                embedding=np.asarray(vec, dtype=np.float32).tobytes(),
+                page_or_section=chunk.page_or_section,
+                is_image_ocr=chunk.is_image_ocr,
+                image_id=image_id,   # v1.4.1：可为 None（纯文字 chunk 或图片写入失败）
+            ))
+        with transaction.atomic():
+            RagChunk.objects.filter(
+                document_id=doc_id, chunk_index__gte=start, chunk_index__lt=start + len(batch),
+            ).delete()
+            RagChunk.objects.bulk_create(chunk_objs)
+
 
 # 模块级单例
 _ingestor = RagIngestor()
 
 
-def start_ingest_thread(doc_id: int, file_bytes: bytes, file_ext: str) -> None:
+def start_ingest_thread(doc_id: int, file_bytes: bytes, file_ext: str, resume: bool = False) -> None:
     """
     在 transaction.on_commit 回调中调用本函数，启动守护线程执行入库。
     """
     t = threading.Thread(
         target=_ingestor.ingest,
-        args=(doc_id, file_bytes, file_ext),
+        args=(doc_id, file_bytes, file_ext, resume),
         daemon=True,
         name=f"rag-ingest-{doc_id}",
     )
     t.start()
-    logger.info("rag_service: 已启动入库线程 rag-ingest-%s", doc_id)
+    logger.info("rag_service: 已启动入库线程 rag-ingest-%s%s", doc_id, "（续跑）" if resume else "")
+
+
+def resume_ingest(doc_id: int, background: bool = True) -> bool:
+    """
+    从检查点续跑文档入库（原始文件取自 RAG_INGEST_WORK_DIR）。无检查点时返回 False。
+    background=False 时在当前线程同步执行（管理命令用）。
+    """
+    from .rag_ingest import IngestCheckpoint
+    source = IngestCheckpoint.for_document(doc_id).load_source()
+    if source is None:
+        return False
+    file_bytes, file_ext = source
+    if background:
+        start_ingest_thread(doc_id, file_bytes, file_ext, resume=True)
+    else:
+        _ingestor.ingest(doc_id, file_bytes, file_ext, resume=True)
+    return True
 
 
 # ── 对外检索入口 ──────────────────────────────────────────────────────────
@@ -923,12 +1340,19 @@ def search_rag(query: str, k: int = 5, threshold: float = 0.3) -> dict:
       {"chunks": [...], "degraded": False}   — 正常（chunks 可为空列表）
       {"chunks": [], "degraded": True}        — embedding API 不可达或异常
 
+    检索顺序：查询中的故障码 / 参数名在 chunk 中精确出现时直接返回字面（BM25）结果，
+    不调 embedding；否则 embedding 后做向量 + BM25 混合检索（RagVectorCache.search）。
+
     fail-open：任何异常均捕获，不抛出到调用方（不打挂聊天）。
     """
     try:
-        embedder = RagEmbedder()
-        query_vec = embedder.embed_query(query)
-        results = rag_vector_cache.search(query_vec, k=k, threshold=threshold)
+        # 故障码 / 参数名精确命中：直接返回字面结果，不调 embedding
+        results = rag_vector_cache.lexical_lookup(query, k=k)
+        if results:
+            return {"chunks": results, "degraded": False}
+        from .query_embedding import embed_query
+        query_vec = embed_query(query)   # 与语义路由共用缓存，同一轮聊天只 embed 一次
+        results = rag_vector_cache.search(query_vec, k=k, threshold=threshold, query_text=query)
         return {"chunks": results, "degraded": False}
     except Exception as e:
         logger.warning("rag_service: search_rag 失败（降级）: %s", e)
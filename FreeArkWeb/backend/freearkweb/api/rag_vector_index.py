@@ -0,0 +1,326 @@
+"""
+api.rag_vector_index — RagVectorCache 的预处理向量索引（持久化 / 内存映射 / 量化 / 可选 IVF）
+
+此前 RagVectorCache.search 每次查询都在锁内拷贝整张 (N, dim) 矩阵、重新归一化全部行、
+再对全部分数做 np.argsort；load() 逐行 np.frombuffer(...).copy() 从 ORM 全量重建。本模块：
+
+  VectorIndex（不可变快照，search 直接读引用，无锁无拷贝）
+    - 行向量入库前已 L2 归一化，余弦 = 点积；
+    - 存储精度 float32 / float16 / int8（int8 按 127 定标，行已归一化故无需逐行 scale）；
+    - top-k 用 np.argpartition，仅对 k 个候选排序；
+    - 删除文档只打墓碑（alive 掩码），墓碑占比超过 COMPACT_RATIO 时重写；
+    - 行数 ≥ ann_min_rows 时构建 IVF（球面 k-means 粗聚类），查询只扫描 nprobe 个簇。
+
+  持久化（目录由 settings.RAG_VECTOR_INDEX_DIR 指定，空串关闭）：
+    manifest.json             — 当前代：向量文件名 / 元数据文件名 / dtype / 墓碑 chunk id
+    vectors.<gen>.npy         — 预归一化（可量化）矩阵，np.load(mmap_mode='r') 映射，多 worker 共享页缓存
+    meta.<gen>.json           — chunk_ids 与 meta 列表
+  写入：新代文件写临时名后 os.replace，最后原子替换 manifest；旧代文件随后删除
+  （已映射旧文件的进程不受影响，Linux 下 unlink 后映射仍有效）。
+  多个 worker 共用同一目录：写入 + 清理 + 映射新文件在目录内 .lock 文件的 flock 排他锁下完成，
+  避免一个进程清理掉另一个进程刚写好、尚未映射的新代文件（无 fcntl 的平台不加锁，仅支持单进程）。
+
+IVF 索引只在内存构建（行数到阈值后每次重建约数秒），不落盘。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境：不加目录锁
+    fcntl = None
+
+logger = logging.getLogger("api.rag_service")
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+# 墓碑占比超过此值时压缩（去掉已删除行重写文件）
+COMPACT_RATIO = 0.25
+
+# 非 float32 存储时按块转换打分，限制临时内存
+_SCORE_BLOCK_ROWS = 65536
+
+_INT8_SCALE = 127.0
+
+_MANIFEST = "manifest.json"
+
+_LOCK_FILE = ".lock"
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
+    return vectors / norms
+
+
+def _quantize(normed: np.ndarray, dtype: str) -> Tuple[np.ndarray, float]:
+    """归一化 float32 → 存储精度，返回 (矩阵, 点积还原系数)。"""
+    if dtype == "int8":
+        return np.round(normed * _INT8_SCALE).astype(np.int8), 1.0 / _INT8_SCALE
+    if dtype == "float16":
+        return normed.astype(np.float16), 1.0
+    return np.ascontiguousarray(normed, dtype=np.float32), 1.0
+
+
+class _IVF:
+    """倒排文件粗聚类：球面 k-means 得到 nlist 个中心，每行归入最近中心。"""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, nprobe: int):
+        self.centroids = centroids     # (nlist, dim) 归一化
+        self.order = order             # 行号按簇排序
+        self.offsets = offsets         # 簇 c 的行号为 order[offsets[c]:offsets[c+1]]
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, index: "VectorIndex", nprobe: int, iters: int = 8, seed: int = 0) -> "_IVF":
+        n = index.rows
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        centroids = index.dense(rng.choice(n, size=nlist, replace=False))
+        assign = np.zeros(n, dtype=np.int32)
+        for _ in range(iters):
+            assign = index.nearest(centroids)
+            sums = np.zeros_like(centroids)
+            for start in range(0, n, _SCORE_BLOCK_ROWS):
+                stop = min(start + _SCORE_BLOCK_ROWS, n)
+                np.add.at(sums, assign[start:stop], index.dense(slice(start, stop)))
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]   # 空簇沿用旧中心
+            centroids = normalize_rows(sums)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        return cls(centroids, order, offsets, min(nprobe, nlist))
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        sims = self.centroids @ query
+        probe = np.argpartition(-sims, self.nprobe - 1)[:self.nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+
+class VectorIndex:
+    """不可变向量索引快照：预归一化（可量化）矩阵 + chunk_ids + meta + 墓碑掩码（+ 可选 IVF）。"""
+
+    def __init__(self, vectors: Optional[np.ndarray], chunk_ids: np.ndarray, meta: List[dict],
+                 scale: float = 1.0, alive: Optional[np.ndarray] = None, ivf: Optional[_IVF] = None):
+        self.vectors = vectors
+        self.chunk_ids = chunk_ids
+        self.meta = meta
+        self.scale = scale
+        self.alive = alive
+        self.ivf = ivf
+
+    # ------------------------------------------------------------------
+    # 构造
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def empty(cls) -> "VectorIndex":
+        return cls(None, np.zeros(0, dtype=np.int64), [])
+
+    @classmethod
+    def from_raw(cls, raw_vectors, chunk_ids, meta: List[dict], dtype: str = "float32") -> "VectorIndex":
+        """未归一化 float32 矩阵 → 索引（归一化 + 量化）。"""
+        if raw_vectors is None or len(raw_vectors) == 0:
+            return cls(None, np.asarray(chunk_ids, dtype=np.int64), list(meta))
+        stored, scale = _quantize(normalize_rows(raw_vectors), dtype)
+        return cls(stored, np.asarray(chunk_ids, dtype=np.int64), list(meta), scale)
+
+    @property
+    def rows(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    @property
+    def dtype(self) -> str:
+        return "float32" if self.vectors is None else str(self.vectors.dtype)
+
+    @property
+    def live_rows(self) -> int:
+        return self.rows if self.alive is None else int(self.alive.sum())
+
+    def live_chunk_ids(self) -> set:
+        ids = self.chunk_ids if self.alive is None else self.chunk_ids[self.alive]
+        return set(ids.tolist())
+
+    def with_changes(self, removed_ids: set, added: Optional["VectorIndex"]) -> "VectorIndex":
+        """增量更新：removed 打墓碑，added 追加到末尾；墓碑过多时压缩。返回新快照（不修改自身）。"""
+        alive = np.ones(self.rows, dtype=bool) if self.alive is None else self.alive.copy()
+        if removed_ids:
+            alive &= ~np.isin(self.chunk_ids, list(removed_ids))
+
+        vectors, chunk_ids, meta = self.vectors, self.chunk_ids, self.meta
+        if self.rows and (self.rows - int(alive.sum())) > COMPACT_RATIO * self.rows:
+            keep = np.flatnonzero(alive)
+            vectors = np.asarray(vectors[keep]) if len(keep) else None
+            chunk_ids = chunk_ids[keep]
+            meta = [meta[i] for i in keep]
+            alive = np.ones(len(keep), dtype=bool)
+
+        if added is not None and added.rows:
+            # 调用方保证 added 与本索引存储精度一致（精度变更走全量重建）
+            vectors = added.vectors if vectors is None else np.concatenate([np.asarray(vectors), added.vectors])
+            chunk_ids = np.concatenate([chunk_ids, added.chunk_ids])
+            meta = list(meta) + list(added.meta)
+            alive = np.concatenate([alive, np.ones(added.rows, dtype=bool)])
+        scale = self.scale if self.vectors is not None else (added.scale if added is not None else 1.0)
+        return VectorIndex(vectors, chunk_ids, meta, scale, None if alive.all() else alive)
+
+    def with_ann(self, min_rows: int, nprobe: int) -> "VectorIndex":
+        """行数达到 min_rows（>0）时附加 IVF，否则原样返回。"""
+        if not min_rows or self.rows < min_rows:
+            return self
+        started = time.monotonic()
+        ivf = _IVF.build(self, nprobe)
+        logger.info("rag_service: IVF 构建完成 rows=%d nlist=%d nprobe=%d 耗时=%.1fs",
+                    self.rows, len(ivf.centroids), ivf.nprobe, time.monotonic() - started)
+        return VectorIndex(self.vectors, self.chunk_ids, self.meta, self.scale, self.alive, ivf)
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def dense(self, rows) -> np.ndarray:
+        """取若干行还原为 float32（单位向量）。"""
+        block = np.asarray(self.vectors[rows])
+        return block.astype(np.float32) * self.scale if block.dtype != np.float32 else block
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            return self.dense(rows) @ query
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        out = np.empty(self.rows, dtype=np.float32)
+        for start in range(0, self.rows, _SCORE_BLOCK_ROWS):
+            stop = min(start + _SCORE_BLOCK_ROWS, self.rows)
+            out[start:stop] = self.dense(slice(start, stop)) @ query
+        return out
+
+    def nearest(self, centroids: np.ndarray) -> np.ndarray:
+        """每行最近的中心下标（IVF 训练用）。"""
+        out = np.empty(self.rows, dtype=np.int32)
+        for start in range(0, self.rows, _SCORE_BLOCK_ROWS):
+            stop = min(start + _SCORE_BLOCK_ROWS, self.rows)
+            out[start:stop] = np.argmax(self.dense(slice(start, stop)) @ centroids.T, axis=1)
+        return out
+
+    def top_k(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """query 须已归一化。返回 [(行号, 余弦)]，按分数降序，跳过墓碑行。"""
+        if self.rows == 0 or k <= 0:
+            return []
+        rows = self.ivf.candidates(query) if self.ivf is not None else None
+        scores = self._scores(query, rows)
+        if self.alive is not None:
+            live = self.alive if rows is None else self.alive[rows]
+            scores = np.where(live, scores, -np.inf)
+        k = min(k, len(scores))
+        part = np.argpartition(-scores, k - 1)[:k]
+        part = part[np.argsort(-scores[part])]
+        return [(int(i if rows is None else rows[i]), float(scores[i]))
+                for i in part if scores[i] != -np.inf]
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def save(self, directory: str, previous: Optional[dict] = None) -> dict:
+        """写入新一代索引并原子替换 manifest，随后把 self.vectors 换成新文件的内存映射。
+
+        向量未变（仅墓碑变化）且上一代文件仍在（未被其他进程清理）时复用上一代文件。
+        整个过程持有目录锁，其他进程的清理不会删掉本进程尚未映射的文件。
+        """
+        os.makedirs(directory, exist_ok=True)
+        with _dir_lock(directory):
+            manifest, reused = self._save_locked(directory, previous)
+            if not reused and self.vectors is not None:
+                self.vectors = np.load(os.path.join(directory, manifest["vectors"]), mmap_mode="r")
+        return manifest
+
+    def _save_locked(self, directory: str, previous: Optional[dict]) -> Tuple[dict, bool]:
+        gen = f"{int(time.time() * 1000)}-{os.getpid()}"
+        reuse = previous is not None and previous.get("rows") == self.rows and getattr(
+            self.vectors, "filename", None) is not None and all(
+            os.path.exists(os.path.join(directory, previous[key])) for key in ("vectors", "meta"))
+        manifest = {
+            "rows": self.rows,
+            "dtype": self.dtype,
+            "scale": self.scale,
+            "vectors": previous["vectors"] if reuse else f"vectors.{gen}.npy",
+            "meta": previous["meta"] if reuse else f"meta.{gen}.json",
+            "tombstones": [] if self.alive is None else self.chunk_ids[~self.alive].tolist(),
+        }
+        if not reuse:
+            if self.vectors is not None:
+                _atomic_write(os.path.join(directory, manifest["vectors"]),
+                              lambda f: np.save(f, np.asarray(self.vectors)))
+            _atomic_write(os.path.join(directory, manifest["meta"]), lambda f: f.write(json.dumps(
+                {"chunk_ids": self.chunk_ids.tolist(), "meta": self.meta}, ensure_ascii=False).encode("utf-8")))
+        _atomic_write(os.path.join(directory, _MANIFEST),
+                      lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        _remove_stale(directory, {manifest["vectors"], manifest["meta"], _MANIFEST})
+        return manifest, reuse
+
+    @classmethod
+    def open(cls, directory: str) -> Tuple[Optional["VectorIndex"], Optional[dict]]:
+        """按 manifest 映射当前代索引；不存在或损坏返回 (None, None)。"""
+        try:
+            with open(os.path.join(directory, _MANIFEST), "rb") as f:
+                manifest = json.loads(f.read())
+            with open(os.path.join(directory, manifest["meta"]), "rb") as f:
+                payload = json.loads(f.read())
+            chunk_ids = np.asarray(payload["chunk_ids"], dtype=np.int64)
+            vectors = None
+            if manifest["rows"]:
+                vectors = np.load(os.path.join(directory, manifest["vectors"]), mmap_mode="r")
+                if len(vectors) != len(chunk_ids):
+                    raise ValueError("向量行数与 chunk_ids 不一致")
+        except FileNotFoundError:
+            return None, None
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("rag_service: 向量索引文件损坏，将从 DB 重建: %s", exc)
+            return None, None
+        alive = None
+        if manifest.get("tombstones"):
+            alive = ~np.isin(chunk_ids, manifest["tombstones"])
+        return cls(vectors, chunk_ids, payload["meta"], manifest.get("scale", 1.0), alive), manifest
+
+
+@contextmanager
+def _dir_lock(directory: str):
+    """索引目录排他锁（flock，进程退出自动释放）。"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, _LOCK_FILE), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _atomic_write(path: str, write) -> None:
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _remove_stale(directory: str, keep: set) -> None:
+    for name in os.listdir(directory):
+        if name in keep or ".tmp-" in name:
+            continue
+        if name.startswith(("vectors.", "meta.")):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
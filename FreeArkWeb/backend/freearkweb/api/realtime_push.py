@@ -0,0 +1,239 @@
+"""
+PLCLatestData 实时推送（WebSocket，按专有部分分组）
+
+实时参数页（get_device_realtime_params / miniapp_owner_realtime_params）原先靠轮询，
+并通过 device_ondemand_refresh 触发 PLC 按需读取来保证新鲜度。本模块把入库侧的变化直接推给
+已订阅的客户端：
+
+  - PLCLatestDataHandler._persist 在 _bulk_upsert 成功后调用 realtime_publisher.publish(records)；
+  - 按 specific_part 聚合本批记录，只保留与上次推送值不同的参数（进程内记忆），
+    每户一条 params_update 消息发往 channel 组 group_name(specific_part)；
+  - 发送线程启动后（MQTT 消费者 start 时）publish 只把差异放入有界队列即返回，写库路径不等待 Redis；
+    发送线程合并队列中积压的差异，一批内各户的 group_send 在同一事件循环中并发执行。
+    队列满时丢弃该批并清空记忆（下一批按全量差异重推）；发送线程未启动时（单元测试）同步发送；
+  - RealtimeParamsConsumer（api/consumers.py，/ws/devices/realtime/）把连接加入所订阅户的组，
+    订阅成功时先下发一次当前全量值，之后只收增量。
+
+MQTT 消费者与 ASGI 进程是不同进程，生产 CHANNEL_LAYERS 须为 channels_redis（见 settings.py）；
+推送失败只记日志，不影响写库。
+"""
+import asyncio
+import logging
+import queue
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+GROUP_PREFIX = 'plc_rt.'
+# channel 组名只允许 ASCII 字母数字、-、_、.，且长度 < 100
+_GROUP_UNSAFE = re.compile(r'[^0-9A-Za-z_.-]')
+# 进程内“上次推送值”记忆上限（户数 × 参数数远小于此值；超限时整体清空重新开始）
+MAX_TRACKED_PARAMS = 500000
+# 待发送差异批次队列上限（发送线程跟不上时丢弃新批次，不阻塞写库）
+DEFAULT_QUEUE_SIZE = 1000
+
+
+def group_name(specific_part):
+    return (GROUP_PREFIX + _GROUP_UNSAFE.sub('_', str(specific_part)))[:99]
+
+
+def format_collected_at(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+
+def build_room_diffs(records, last_values=None):
+    """PLCLatestData 记录（dict）→ {specific_part: [{param_name, value, collected_at}, ...]}
+
+    同一批内相同键取最后一条；传入 last_values（{(specific_part, param_name): value}）时
+    跳过值未变化的参数并就地更新记忆。
+    """
+    keyed = {}
+    for rec in records:
+        keyed[(rec['specific_part'], rec['param_name'])] = rec
+
+    diffs = {}
+    for key, rec in keyed.items():
+        if last_values is not None:
+            if key in last_values and last_values[key] == rec['value']:
+                continue
+            last_values[key] = rec['value']
+        diffs.setdefault(key[0], []).append({
+            'param_name': key[1],
+            'value': rec['value'],
+            'collected_at': format_collected_at(rec.get('collected_at')),
+        })
+    return diffs
+
+
+def _merge_diffs(batches):
+    """多批差异合并为一批：同户同参数保留最后一次的值"""
+    merged = {}
+    for diffs in batches:
+        for specific_part, params in diffs.items():
+            room = merged.setdefault(specific_part, {})
+            for param in params:
+                room[param['param_name']] = param
+    return {specific_part: list(room.values()) for specific_part, room in merged.items()}
+
+
+async def _group_send_all(layer, diffs):
+    await asyncio.gather(*(
+        layer.group_send(group_name(specific_part), {
+            'type': 'params.update',
+            'specific_part': specific_part,
+            'params': params,
+        })
+        for specific_part, params in diffs.items()
+    ))
+
+
+class RealtimeParamsPublisher:
+    """入库后按户推送参数变化（线程安全，供 handler worker / 合并写入线程并发调用）"""
+
+    def __init__(self, enabled=True, queue_size=DEFAULT_QUEUE_SIZE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._last_values = {}
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.stats = {'messages': 0, 'params': 0, 'errors': 0, 'dropped': 0}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动发送线程（重复调用无副作用）"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='realtime-params-push', daemon=True)
+        self._thread.start()
+        logger.info(f"🚀 实时参数推送发送线程已启动：队列上限 {self._queue.maxsize} 批")
+
+    def stop(self, timeout=5):
+        """停止发送线程（退出前发送队列中剩余的差异）"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def snapshot(self):
+        """推送统计 + 当前待发批次数"""
+        return {**self.stats, 'pending': self._queue.qsize(), 'running': self.running}
+
+    def reset(self):
+        with self._lock:
+            self._last_values = {}
+
+    def publish(self, records):
+        """计算本批差异并交给发送线程（未启动时同步发送）；返回有变化的户数"""
+        if not self.enabled or not records:
+            return 0
+        with self._lock:
+            if len(self._last_values) > MAX_TRACKED_PARAMS:
+                self._last_values = {}
+            diffs = build_room_diffs(records, self._last_values)
+        if not diffs:
+            return 0
+
+        if not self.running:
+            return len(diffs) if self._send(diffs) else 0
+        try:
+            self._queue.put_nowait(diffs)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            # 丢弃的变化不在客户端上：清空记忆，下一批按全量差异重推
+            self.reset()
+            logger.warning(f"⚠️ 实时参数推送队列已满，丢弃本批 {len(diffs)} 户的变化（不影响写库）")
+            return 0
+        return len(diffs)
+
+    def _send(self, diffs, loop=None):
+        """一次性把各户差异并发发往 channel 组（loop 为发送线程的事件循环）；成功返回 True"""
+        try:
+            from channels.layers import get_channel_layer
+
+            layer = get_channel_layer()
+            if layer is None:
+                return False
+            if loop is None:
+                from asgiref.sync import async_to_sync
+                async_to_sync(_group_send_all)(layer, diffs)
+            else:
+                loop.run_until_complete(_group_send_all(layer, diffs))
+        except Exception as e:
+            self.stats['errors'] += 1
+            # 推送失败时丢弃记忆，下一批按全量差异重推
+            self.reset()
+            logger.warning(f"⚠️ 实时参数推送失败（不影响写库）: {e}")
+            return False
+        self.stats['messages'] += len(diffs)
+        self.stats['params'] += sum(len(params) for params in diffs.values())
+        return True
+
+    def _drain(self):
+        batches = []
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def _run(self):
+        # 发送线程独占一个事件循环：channels_redis 连接池按事件循环复用，避免每批重建
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    first = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self._send(_merge_diffs([first] + self._drain()), loop=loop)
+            remaining = self._drain()
+            if remaining:
+                self._send(_merge_diffs(remaining), loop=loop)
+        finally:
+            loop.close()
+
+
+# 进程内单例：MQTT 消费者进程内所有 PLCLatestDataHandler 共用
+realtime_publisher = RealtimeParamsPublisher()
+
+
+def resolve_subscription(user, specific_part):
+    """订阅鉴权并解析实际推送组：返回 PLCLatestData 中的 specific_part 列表，无权时返回 None。
+
+    运维 / 管理员与 get_device_realtime_params 一致按原值订阅；业主（role=user）须为 active 绑定的
+    专有部分，并与 miniapp_owner_realtime_params 一样按段数兼容 3 段 / 4 段格式。
+    """
+    if getattr(user, 'role', None) != 'user':
+        return [specific_part]
+
+    from .models import OwnerUserBinding, PLCLatestData
+    from .views_miniapp_device_settings import _apply_specific_part_segment_filter
+
+    allowed = OwnerUserBinding.objects.filter(
+        user=user, active=True, owner__specific_part=specific_part,
+    ).exists()
+    if not allowed:
+        return None
+    parts = set(_apply_specific_part_segment_filter(
+        PLCLatestData.objects.all(), specific_part,
+    ).values_list('specific_part', flat=True).distinct())
+    return sorted(parts) or [specific_part]
+
+
+def current_params(parts):
+    """订阅时下发的当前全量值：[{param_name, value, collected_at}, ...]"""
+    from .models import PLCLatestData
+
+    rows = PLCLatestData.objects.filter(specific_part__in=parts).values_list(
+        'param_name', 'value', 'collected_at',
+    )
+    return [
+        {'param_name': name, 'value': value, 'collected_at': format_collected_at(at)}
+        for name, value, at in rows
+    ]
@@ -1,7 +1,7 @@
 """
 WebSocket URL 路由配置（MOD-BE-04）
 
-将 ws/chat/ 路径映射到 ChatConsumer。
+将 ws/chat/ 路径映射到 ChatConsumer；ws/devices/realtime/ 映射到 RealtimeParamsConsumer。
 此文件由 asgi.py 中的 ProtocolTypeRouter 导入。
 
 项目: FreeArk_Openclaw
@@ -9,10 +9,12 @@ WebSocket URL 路由配置（MOD-BE-04）
 """
 
 from django.urls import re_path
-from api.consumers import ChatConsumer, MiniAppChatConsumer
+from api.consumers import ChatConsumer, MiniAppChatConsumer, RealtimeParamsConsumer
 
 websocket_urlpatterns = [
     re_path(r'^ws/chat/$', ChatConsumer.as_asgi()),
     # v1.8.0 新增：小程序业主端聊天 WebSocket（role=user 允许连接）
     re_path(r'^ws/miniapp/chat/$', MiniAppChatConsumer.as_asgi()),
+    # 实时参数推送：按专有部分订阅 PLCLatestData 变化（运维端与小程序共用，业主按绑定鉴权）
+    re_path(r'^ws/devices/realtime/$', RealtimeParamsConsumer.as_asgi()),
 ]
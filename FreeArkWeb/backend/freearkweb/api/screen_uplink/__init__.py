@@ -0,0 +1,12 @@
+# screen_uplink — 大屏上行报文统一接入包
+#
+# 原 fault_consumer / condensation_consumer / screen_heartbeat_consumer 三个进程各自建立
+# WSS 连接订阅同一主题、各自刷新 MAC 缓存并重复解析同一条 DeviceStatusUpdate。
+# 本包收敛为一个接入服务：每条消息只接收一次、解析一次、MAC→specific_part 只解析一次，
+# 再分发给可插拔处理器（心跳 / 故障状态机 / 结露状态机），每个处理器独立计数、独立看门狗。
+#
+#   message.py    — UplinkMessage（惰性一次解析）、MacCache
+#   processors.py — UplinkProcessor 基类与三个内置处理器
+#   service.py    — ScreenUplinkService：解析 → 解析 MAC → 分发，处理器间异常隔离
+#
+# 入口：python manage.py screen_uplink_consumer（freeark-screen-uplink.service）
@@ -0,0 +1,195 @@
+"""
+screen_uplink/heartbeat_writer.py — ScreenConnectivityStatus 心跳合并写入
+
+原先每条心跳执行一次 close_old_connections() + update_or_create（SELECT + UPDATE/INSERT），
+数百块大屏每几秒一次心跳即每分钟数千次小写入。本模块改为：
+
+  - touch()：只更新进程内 {specific_part: last_seen_at}（同一大屏只保留最新时间），
+    同时立即更新大屏在线聚合 screen_fleet（看板计数不受刷新间隔影响）；
+  - 写入线程每 flush_seconds 秒取出整张表，一条 bulk upsert 写库；
+  - 写库失败时本批放回待写表（较新的心跳优先），下一轮重试，不丢心跳。
+
+flush_seconds 即 last_seen_at 的最大写库延迟，上限 MAX_FLUSH_SECONDS
+（在线阈值 ONLINE_THRESHOLD_MINUTES 的 1/10），保证在线判定误差远小于阈值。
+进程被 SIGTERM 杀死时最多丢失一个刷新周期的心跳，大屏下一次心跳即恢复。
+
+统计（snapshot()）：刷新次数、批大小、刷新耗时、待写大屏数（backlog）、最早待写心跳的等待秒数。
+写入线程未启动时（单元测试、旧命令未 start）touch() 直接同步写库。
+"""
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+from api.fleet_status import SCREEN_ONLINE_THRESHOLD_MINUTES, screen_fleet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SECONDS = 30
+# 最大写库延迟不超过在线阈值的 1/10（15 分钟阈值 → 90 秒）
+MAX_FLUSH_SECONDS = SCREEN_ONLINE_THRESHOLD_MINUTES * 60 // 10
+
+
+class HeartbeatWriter:
+    """合并 ScreenConnectivityStatus.last_seen_at 写入的后台写入器。
+
+    Args:
+        flush_seconds: 刷新间隔（秒），超过 MAX_FLUSH_SECONDS 时按上限处理
+    """
+
+    def __init__(self, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        flush_seconds = max(1, int(flush_seconds))
+        if flush_seconds > MAX_FLUSH_SECONDS:
+            logger.warning(f"⚠️ 心跳刷新间隔 {flush_seconds}s 超过上限，按 {MAX_FLUSH_SECONDS}s 处理")
+            flush_seconds = MAX_FLUSH_SECONDS
+        self.flush_seconds = flush_seconds
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        # specific_part -> 最新 last_seen_at
+        self._pending = {}
+        # 待写表由空变为非空的时刻（monotonic），用于计算最早待写心跳的等待时间
+        self._oldest_ts = None
+        self._thread = None
+
+        self.stats = {
+            'heartbeats_in': 0,
+            'heartbeats_merged': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'flush_errors': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动写入线程（重复调用无副作用）"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='screen-heartbeat-writer', daemon=True)
+        self._thread.start()
+        logger.info(f"🚀 心跳合并写入线程已启动: flush_seconds={self.flush_seconds}")
+
+    def stop(self, timeout=30):
+        """停止写入线程并刷新剩余心跳"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.warning(f"心跳合并写入线程未在 {timeout}s 内退出")
+        self._thread = None
+        logger.info(f"🛑 心跳合并写入线程已停止: {self.snapshot()}")
+
+    # ------------------------------------------------------------------
+    # 提交与刷新
+    # ------------------------------------------------------------------
+
+    def touch(self, specific_part, seen_at):
+        """记录一次心跳，立即返回；写入线程未运行时同步写库"""
+        screen_fleet.touch(specific_part, seen_at)
+        if not self.running:
+            close_old_connections()
+            self._upsert({specific_part: seen_at})
+            return
+
+        with self._lock:
+            self.stats['heartbeats_in'] += 1
+            if specific_part in self._pending:
+                self.stats['heartbeats_merged'] += 1
+            elif not self._pending:
+                self._oldest_ts = time.monotonic()
+            self._pending[specific_part] = seen_at
+
+    def flush(self):
+        """取出当前待写表并写库；返回写入的大屏数"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            oldest_ts, self._oldest_ts = self._oldest_ts, None
+        if not batch:
+            return 0
+
+        with self._flush_lock:
+            t_start = time.monotonic()
+            try:
+                close_old_connections()
+                self._upsert(batch)
+            except Exception as e:
+                self.stats['flush_errors'] += 1
+                self._requeue(batch, oldest_ts)
+                logger.error(f"❌ 心跳合并写入失败，{len(batch)} 块大屏放回待写表下轮重试: {e}",
+                             exc_info=True)
+                return 0
+
+        elapsed_ms = (time.monotonic() - t_start) * 1000
+        stats = self.stats
+        stats['flushes'] += 1
+        stats['rows_flushed'] += len(batch)
+        stats['last_batch_size'] = len(batch)
+        stats['max_batch_size'] = max(stats['max_batch_size'], len(batch))
+        stats['last_flush_ms'] = round(elapsed_ms, 1)
+        stats['max_flush_ms'] = max(stats['max_flush_ms'], stats['last_flush_ms'])
+        stats['total_flush_ms'] += elapsed_ms
+        logger.debug(f"心跳合并写入完成: 大屏={len(batch)}, 耗时={elapsed_ms:.1f}ms")
+        return len(batch)
+
+    def _requeue(self, batch, oldest_ts):
+        with self._lock:
+            for specific_part, seen_at in batch.items():
+                current = self._pending.get(specific_part)
+                if current is None or current < seen_at:
+                    self._pending[specific_part] = seen_at
+            if oldest_ts is not None and (self._oldest_ts is None or oldest_ts < self._oldest_ts):
+                self._oldest_ts = oldest_ts
+
+    @staticmethod
+    def _upsert(batch):
+        """一条 INSERT … ON DUPLICATE KEY UPDATE / ON CONFLICT 写入整批 last_seen_at"""
+        from api.models import ScreenConnectivityStatus
+
+        objs = [ScreenConnectivityStatus(specific_part=sp, last_seen_at=at) for sp, at in batch.items()]
+        # MySQL 不支持 unique_fields（使用表约束自动冲突检测），SQLite/PostgreSQL 需要显式指定
+        kwargs = dict(update_conflicts=True, update_fields=['last_seen_at', 'updated_at'])
+        if connection.vendor != 'mysql':
+            kwargs['unique_fields'] = ['specific_part']
+        ScreenConnectivityStatus.objects.bulk_create(objs, **kwargs)
+
+    def _run(self):
+        close_old_connections()
+        try:
+            while not self._stop_event.wait(self.flush_seconds):
+                self.flush()
+            # 退出前写完剩余心跳
+            self.flush()
+        finally:
+            connection.close()
+
+    def snapshot(self):
+        """写入统计（累计计数 + 当前待写大屏数、最早待写心跳等待秒数、平均批大小与刷新耗时）"""
+        with self._lock:
+            snapshot = dict(self.stats)
+            snapshot['pending'] = len(self._pending)
+            oldest_ts = self._oldest_ts
+        snapshot['oldest_pending_seconds'] = (
+            round(time.monotonic() - oldest_ts, 1) if oldest_ts is not None else 0.0
+        )
+        flushes = snapshot['flushes']
+        snapshot['avg_batch_size'] = round(snapshot['rows_flushed'] / flushes, 1) if flushes else 0
+        snapshot['avg_flush_ms'] = round(snapshot.pop('total_flush_ms') / flushes, 1) if flushes else 0.0
+        snapshot['flush_seconds'] = self.flush_seconds
+        snapshot['running'] = self.running
+        return snapshot
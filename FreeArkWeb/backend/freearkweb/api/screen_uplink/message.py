@@ -0,0 +1,154 @@
+"""
+screen_uplink/message.py — 大屏上行报文与 MAC 映射缓存
+
+UplinkMessage 对 paho 消息做惰性、一次性解析：
+  - mac：topic 末段（/screen/upload/screen/to/cloud/{mac}），为空时回退 header.screenMac
+  - root：JSON 解析结果，解析失败为 None（只解析、只记录一次日志）
+  - device_status：DeviceStatusUpdate 报文的 (device_sn, product_code, items)，
+    非该类型或缺少 deviceSn 时为 None
+
+实际报文结构（生产 EMQX 实测，见 fault_consumer._handle_message）：
+  {"header": {"name": "DeviceStatusUpdate", "screenMac": "<mac>"},
+   "payload": {"code": 200,
+               "data": {"deviceSn": <int>, "productCode": <int>,
+                        "items": [{"attrTag": "<name>", "attrValue": "<v>"}]}}}
+"""
+
+import json
+import logging
+import time
+from collections import namedtuple
+from typing import Optional
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.tiered_cache import ensure_listener, subscribe
+
+logger = logging.getLogger(__name__)
+
+# MAC → specific_part 缓存刷新间隔（秒）
+CACHE_REFRESH_INTERVAL = 300  # 5 分钟
+
+DEVICE_STATUS_UPDATE = 'DeviceStatusUpdate'
+
+DeviceStatus = namedtuple('DeviceStatus', ['device_sn', 'product_code', 'items'])
+
+_UNPARSED = object()
+
+
+class UplinkMessage:
+    """一条大屏上行消息；root / device_status 首次访问时解析并缓存。"""
+
+    def __init__(self, topic: str, payload: bytes, received_at=None):
+        self.topic = topic
+        self.payload = payload
+        self.received_at = received_at or timezone.now()
+        self.specific_part: Optional[str] = None
+        self._root = _UNPARSED
+        self._device_status = _UNPARSED
+
+    @property
+    def topic_mac(self) -> str:
+        topic_parts = self.topic.rstrip('/').split('/')
+        return topic_parts[-1] if topic_parts else ''
+
+    @property
+    def mac(self) -> str:
+        """topic 末段优先，回退 header.screenMac（仅 topic 末段为空时才解析报文）"""
+        mac = self.topic_mac
+        if not mac and self.root is not None:
+            mac = str(self.header.get('screenMac', '') or '')
+        return mac
+
+    @property
+    def root(self) -> Optional[dict]:
+        if self._root is _UNPARSED:
+            try:
+                root = json.loads(self.payload.decode('utf-8', errors='replace'))
+                self._root = root if isinstance(root, dict) else None
+            except Exception as exc:
+                logger.warning('JSON 解析失败，跳过: topic=%s err=%s', self.topic, exc)
+                self._root = None
+        return self._root
+
+    @property
+    def header(self) -> dict:
+        return (self.root or {}).get('header') or {}
+
+    @property
+    def device_status(self) -> Optional[DeviceStatus]:
+        if self._device_status is _UNPARSED:
+            self._device_status = self._parse_device_status()
+        return self._device_status
+
+    def _parse_device_status(self) -> Optional[DeviceStatus]:
+        root = self.root
+        if root is None:
+            return None
+        if self.header.get('name') != DEVICE_STATUS_UPDATE:
+            logger.debug('非 DeviceStatusUpdate 报文，跳过: topic=%s name=%s',
+                         self.topic, self.header.get('name'))
+            return None
+
+        # 设备信息嵌套在 root.payload.data 中；兼容旧测试结构 root.data
+        payload_obj = root.get('payload') or {}
+        data = payload_obj.get('data') or {}
+        if not data and 'data' in root:
+            data = root.get('data') or {}
+        device_sn = str(data.get('deviceSn', '') or '')
+        if not device_sn:
+            logger.debug('报文缺少 deviceSn，跳过: topic=%s', self.topic)
+            return None
+
+        # 优先 attrTag/attrValue（生产实际格式），回退 paramName/value（旧测试格式）
+        items = []
+        for item in data.get('items') or []:
+            if not isinstance(item, dict):
+                continue
+            attr_tag = str(item.get('attrTag') or item.get('paramName') or '')
+            if not attr_tag:
+                continue
+            attr_value = item.get('attrValue') if 'attrValue' in item else item.get('value')
+            items.append((attr_tag, attr_value))
+        return DeviceStatus(device_sn, str(data.get('productCode', '') or ''), items)
+
+
+class MacCache:
+    """内存缓存：mac_str → specific_part，定期从 DB 刷新。
+
+    OwnerInfo 保存后经 tiered_cache 'owner_mac' 命名空间广播失效，各消费者进程下次查询即重载。
+    """
+
+    def __init__(self):
+        self._cache: dict = {}
+        self._last_refresh: float = 0.0
+        subscribe('owner_mac', lambda _keys: self.invalidate())
+
+    def _refresh(self):
+        """从 OwnerInfo 全量加载 unique_id → specific_part 映射。"""
+        from api.models import OwnerInfo
+        close_old_connections()
+        try:
+            mapping = {
+                row['unique_id']: row['specific_part']
+                for row in OwnerInfo.objects.filter(
+                    unique_id__isnull=False
+                ).exclude(unique_id='').values('unique_id', 'specific_part')
+            }
+            self._cache = mapping
+            self._last_refresh = time.time()
+            logger.info('MacCache: 刷新完成，共 %d 条映射', len(self._cache))
+        except Exception as exc:
+            logger.warning('MacCache: 刷新失败，继续使用旧缓存: %s', exc)
+
+    def get_specific_part(self, mac: str) -> Optional[str]:
+        """查询 mac 对应的 specific_part，必要时刷新缓存。"""
+        ensure_listener()
+        if time.time() - self._last_refresh > CACHE_REFRESH_INTERVAL:
+            self._refresh()
+        return self._cache.get(mac)
+
+    def invalidate(self):
+        """强制使缓存失效（下次 get 时重新加载）。"""
+        self._last_refresh = 0.0
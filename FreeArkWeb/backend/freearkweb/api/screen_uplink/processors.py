@@ -0,0 +1,317 @@
+"""
+screen_uplink/processors.py — 大屏上行报文处理器
+
+每个处理器：
+  - topic_filter：只处理匹配该 MQTT 订阅过滤器的消息（None 表示全部），
+    保持与原独立消费者各自订阅主题一致（心跳 #，故障 / 结露 +）；
+  - process(message)：消息已解析出 specific_part；返回 True 表示已处理，False 表示跳过；
+  - counters：received / processed / skipped / errors，由 ScreenUplinkService 维护；
+  - start()：看门狗钩子——启动时重建状态机、启动批量落库 / 合并写入线程与各自的自愈看门狗线程；
+    stop()：退出前写完缓冲；
+  - get_counters()：处理器计数 + 状态机计数（看门狗与健康日志读取）。
+
+故障 / 结露的判定逻辑即原 fault_consumer / condensation_consumer 命令中的 _handle_message
+后半段，原命令改为调用这里的 process_fault_status / process_condensation_status。
+"""
+
+import logging
+from typing import Optional
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.fleet_status import FleetStatusPublisher, screen_fleet
+
+from .heartbeat_writer import DEFAULT_FLUSH_SECONDS, HeartbeatWriter
+from .message import DeviceStatus, UplinkMessage
+
+logger = logging.getLogger(__name__)
+
+# condensation_alarm attrTag 名称
+CONDENSATION_ALARM_TAG = 'condensation_alarm'
+
+# 快照字段 attrTag 映射（attrTag → Python 字段名）
+SNAPSHOT_TAGS = {
+    'dew_point_temp': 'dew_point_temp',
+    'NTC_temp': 'ntc_temp',       # 大屏上报 NTC_temp（大写 NTC），映射到 ntc_temp 字段
+    'ntc_temp': 'ntc_temp',       # 容错兼容小写
+    'humidity': 'humidity',
+}
+
+
+# ---------------------------------------------------------------------------
+# 业务逻辑（原三个消费者命令的报文处理部分）
+# ---------------------------------------------------------------------------
+
+def upsert_last_seen(specific_part: str) -> None:
+    """upsert ScreenConnectivityStatus.last_seen_at = now()（逐条同步写库；统一接入服务走 HeartbeatWriter）。"""
+    from api.models import ScreenConnectivityStatus
+    close_old_connections()
+    now = timezone.now()
+    ScreenConnectivityStatus.objects.update_or_create(
+        specific_part=specific_part,
+        defaults={'last_seen_at': now},
+    )
+    screen_fleet.touch(specific_part, now)
+    logger.debug('心跳写入: specific_part=%s, last_seen_at=%s', specific_part, now)
+
+
+def process_fault_status(specific_part: str, status: DeviceStatus, received_at) -> int:
+    """遍历 items，对每个 fault_candidate 字段（attrTag）驱动故障状态机；返回处理的字段数。"""
+    from api.fault_consumer.fault_classifier import (
+        is_fault_candidate,
+        is_fault_active,
+        get_fault_type_and_severity,
+        get_fault_message,
+    )
+    from api.fault_consumer.state_machine import process_fault_field
+
+    handled = 0
+    for param_name, value in status.items:
+        if not is_fault_candidate(param_name):
+            continue
+
+        active_now = is_fault_active(param_name, value)
+        fault_type, severity = get_fault_type_and_severity(param_name)
+        fault_msg = get_fault_message(param_name)
+
+        try:
+            process_fault_field(
+                specific_part=specific_part,
+                device_sn=status.device_sn,
+                product_code=status.product_code,
+                fault_code=param_name,
+                fault_type=fault_type,
+                severity=severity,
+                fault_message=fault_msg,
+                is_active_now=active_now,
+                received_at=received_at,
+            )
+            handled += 1
+        except Exception as exc:
+            logger.exception('process_fault_field 异常: param=%s err=%s', param_name, exc)
+    return handled
+
+
+def normalize_system_switch_from_mqtt(raw_value) -> str:
+    """将 MQTT items[] 中直取的 system_switch attrValue 规范化为 "on"/"off"/"unknown"。
+
+    生产抓包已核实（sniff_2860fae9a34ab8a9_20260525_235217.ndjson）：
+      - 260001 等水力模块同报文含 system_switch 时，attrValue 已是字符串 "on" 或 "off"
+      - 做 lower() 容错（防止 "ON"/"OFF" 大写变体）
+
+    规范化规则：
+      - None / "" / 空白 → "unknown"
+      - lower() == "off" → "off"
+      - lower() == "on"  → "on"
+      - 其他非空字符串   → "on"（保守处理：非 off 即 on，记 WARNING）
+    """
+    if raw_value is None:
+        return 'unknown'
+    s = str(raw_value).strip().lower()
+    if not s:
+        return 'unknown'
+    if s == 'off':
+        return 'off'
+    if s == 'on':
+        return 'on'
+    # 非预期值（如 "0"/"1"）：非 "off" 非空 → "on"，记警告
+    logger.warning(
+        '_normalize_system_switch_from_mqtt: 非预期值 %r，按 "on" 处理（已核实生产格式为 on/off）',
+        raw_value,
+    )
+    return 'on'
+
+
+def process_condensation_status(specific_part: str, status: DeviceStatus, received_at) -> bool:
+    """提取 condensation_alarm 及快照字段并驱动结露预警状态机；报文不含 condensation_alarm 时返回 False。
+
+    system_switch 优先级（RISK-CW-ARCH-01）：
+      a. items[] 中有 system_switch attrTag → MQTT 直取（已是 on/off 字符串），做规范化
+      b. items[] 中无 system_switch → 传 None，state_machine 内部走 PLCLatestData 方案 A
+      c. 均无 → "unknown"（由 state_machine 内部处理）
+    """
+    from api.condensation_consumer.state_machine import process_condensation_alarm
+
+    condensation_alarm_value = None
+    snapshot = {'dew_point_temp': None, 'ntc_temp': None, 'humidity': None}
+    system_switch_raw = None       # None 表示 items[] 中未找到 system_switch
+    system_switch_found = False    # 标记是否从 MQTT 直取到 system_switch
+
+    for attr_tag, attr_value in status.items:
+        if attr_tag == CONDENSATION_ALARM_TAG:
+            condensation_alarm_value = str(attr_value) if attr_value is not None else None
+        elif attr_tag in SNAPSHOT_TAGS:
+            if attr_value is not None:
+                snapshot[SNAPSHOT_TAGS[attr_tag]] = str(attr_value)
+        elif attr_tag == 'system_switch':
+            system_switch_raw = attr_value
+            system_switch_found = True
+
+    if condensation_alarm_value is None:
+        logger.debug(
+            '报文不含 condensation_alarm，跳过: specific_part=%s device_sn=%s product_code=%s',
+            specific_part, status.device_sn, status.product_code,
+        )
+        return False
+
+    try:
+        is_active_now = int(float(condensation_alarm_value)) != 0
+    except (ValueError, TypeError):
+        logger.warning(
+            'condensation_alarm_value 无法转为数字，按正常态处理: value=%r device_sn=%s',
+            condensation_alarm_value, status.device_sn,
+        )
+        is_active_now = False
+
+    system_switch = None
+    if system_switch_found:
+        system_switch = normalize_system_switch_from_mqtt(system_switch_raw)
+        logger.debug(
+            'system_switch MQTT 直取: device_sn=%s raw=%r normalized=%s',
+            status.device_sn, system_switch_raw, system_switch,
+        )
+
+    logger.debug(
+        'process_condensation_status: specific_part=%s device_sn=%s product_code=%s '
+        'condensation_alarm=%s is_active=%s system_switch=%s',
+        specific_part, status.device_sn, status.product_code,
+        condensation_alarm_value, is_active_now, system_switch,
+    )
+
+    try:
+        process_condensation_alarm(
+            specific_part=specific_part,
+            device_sn=status.device_sn,
+            product_code=status.product_code,
+            is_active_now=is_active_now,
+            received_at=received_at,
+            condensation_alarm_value=condensation_alarm_value,
+            system_switch=system_switch,
+            **snapshot,
+        )
+    except Exception as exc:
+        logger.exception('process_condensation_alarm 异常: device_sn=%s err=%s', status.device_sn, exc)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# 处理器
+# ---------------------------------------------------------------------------
+
+class UplinkProcessor:
+    """处理器基类。子类实现 process()；按需覆盖 start() / get_counters()。"""
+
+    name = 'base'
+
+    def __init__(self, topic_filter: Optional[str] = None):
+        self.topic_filter = topic_filter
+        self.counters = {'received': 0, 'processed': 0, 'skipped': 0, 'errors': 0}
+
+    def accepts(self, topic: str) -> bool:
+        if self.topic_filter is None:
+            return True
+        from paho.mqtt.client import topic_matches_sub
+        return topic_matches_sub(self.topic_filter, topic)
+
+    def start(self, watchdog: bool = True) -> None:
+        """启动钩子（重建状态、启动看门狗等），默认无操作。"""
+
+    def stop(self) -> None:
+        """退出钩子（刷新缓冲等），默认无操作。"""
+
+    def process(self, message: UplinkMessage) -> bool:
+        raise NotImplementedError
+
+    def get_counters(self) -> dict:
+        return dict(self.counters)
+
+
+class HeartbeatProcessor(UplinkProcessor):
+    """大屏心跳：任意上行消息都视为该大屏在线，经 HeartbeatWriter 合并写入 last_seen_at。"""
+
+    name = 'heartbeat'
+
+    def __init__(self, topic_filter: Optional[str] = None, flush_seconds: int = DEFAULT_FLUSH_SECONDS):
+        super().__init__(topic_filter)
+        self.writer = HeartbeatWriter(flush_seconds)
+        self.fleet_publisher = None
+
+    def start(self, watchdog: bool = True) -> None:
+        self.writer.start()
+        # 看板大屏在线计数：后台线程定期对账并发布快照（见 api/fleet_status.py）
+        self.fleet_publisher = FleetStatusPublisher([screen_fleet])
+        self.fleet_publisher.start()
+
+    def stop(self) -> None:
+        self.writer.stop()
+        if self.fleet_publisher is not None:
+            self.fleet_publisher.stop()
+
+    def process(self, message: UplinkMessage) -> bool:
+        self.writer.touch(message.specific_part, message.received_at)
+        return True
+
+    def get_counters(self) -> dict:
+        return {**self.counters, 'writer': self.writer.snapshot()}
+
+
+class FaultProcessor(UplinkProcessor):
+    """故障事件状态机（T1/T2/T3，见 api/fault_consumer/state_machine.py）。"""
+
+    name = 'fault'
+
+    def start(self, watchdog: bool = True) -> None:
+        from api.fault_consumer.state_machine import rebuild_from_db, write_behind
+        count = rebuild_from_db()
+        logger.info('fault 处理器状态机重建完成，活跃故障 %d 条', count)
+        # T1/T2/T3 批量落库，paho 回调线程不等待数据库（见 api/fault_consumer/write_behind.py）
+        write_behind.start()
+        if watchdog:
+            # 自愈看门狗（P0 防复发，2026-06-16 静默停写事故）；触发时整个接入进程退出重启
+            from api.fault_consumer.watchdog import start_watchdog_thread
+            start_watchdog_thread(self.get_counters)
+
+    def process(self, message: UplinkMessage) -> bool:
+        status = message.device_status
+        if status is None:
+            return False
+        process_fault_status(message.specific_part, status, message.received_at)
+        return True
+
+    def stop(self) -> None:
+        from api.fault_consumer.state_machine import write_behind
+        write_behind.stop()
+
+    def get_counters(self) -> dict:
+        from api.fault_consumer.state_machine import get_counters, write_behind
+        return {**get_counters(), **self.counters, 'write_behind': write_behind.snapshot()}
+
+
+class CondensationProcessor(UplinkProcessor):
+    """结露预警状态机（见 api/condensation_consumer/state_machine.py）。"""
+
+    name = 'condensation'
+
+    def start(self, watchdog: bool = True) -> None:
+        from api.condensation_consumer.state_machine import rebuild_from_db, write_behind
+        count = rebuild_from_db()
+        logger.info('condensation 处理器状态机重建完成，活跃预警 %d 条', count)
+        write_behind.start()
+        if watchdog:
+            from api.condensation_consumer.watchdog import start_watchdog_thread
+            start_watchdog_thread(self.get_counters)
+
+    def process(self, message: UplinkMessage) -> bool:
+        status = message.device_status
+        if status is None:
+            return False
+        return process_condensation_status(message.specific_part, status, message.received_at)
+
+    def stop(self) -> None:
+        from api.condensation_consumer.state_machine import write_behind
+        write_behind.stop()
+
+    def get_counters(self) -> dict:
+        from api.condensation_consumer.state_machine import get_counters, write_behind
+        return {**get_counters(), **self.counters, 'write_behind': write_behind.snapshot()}
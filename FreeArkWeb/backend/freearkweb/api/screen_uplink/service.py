@@ -0,0 +1,113 @@
+"""
+screen_uplink/service.py — 大屏上行统一接入服务
+
+ScreenUplinkService.handle(topic, payload)：
+  1. 构造 UplinkMessage（JSON 惰性解析，整条消息最多解析一次）
+  2. 只有存在匹配该 topic 的处理器时才解析 MAC → specific_part（MacCache 全进程一份）
+  3. 依次交给匹配 topic 的处理器；单个处理器异常只计入该处理器 errors，不影响其他处理器
+
+计数：
+  service.counters   — received / unmatched（无处理器匹配）/ unknown_mac
+  processor.counters — received / processed / skipped / errors
+health_snapshot() 汇总两者，log_health() 供命令周期性输出健康日志。
+"""
+
+import logging
+import threading
+from typing import Iterable, Optional
+
+from django.utils import timezone
+
+from .message import MacCache, UplinkMessage
+from .processors import UplinkProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ScreenUplinkService:
+
+    def __init__(self, processors: Iterable[UplinkProcessor], mac_cache: Optional[MacCache] = None):
+        self.processors = list(processors)
+        self.mac_cache = mac_cache or MacCache()
+        self.counters = {'received': 0, 'unmatched': 0, 'unknown_mac': 0}
+        # paho 网络线程单线程回调；加锁只为 health_snapshot 读取一致
+        self._lock = threading.Lock()
+
+    def start(self, watchdog: bool = True) -> None:
+        """依次调用各处理器的启动钩子（重建状态机、启动看门狗）。"""
+        for processor in self.processors:
+            processor.start(watchdog=watchdog)
+            logger.info('screen_uplink: 处理器 %s 已启动（topic_filter=%s）',
+                        processor.name, processor.topic_filter or '全部')
+
+    def stop(self) -> None:
+        """依次调用各处理器的退出钩子（刷新心跳缓冲等）；单个失败不影响其他处理器。"""
+        for processor in self.processors:
+            try:
+                processor.stop()
+            except Exception as exc:
+                logger.warning('screen_uplink: 处理器 %s 停止异常: %s', processor.name, exc)
+
+    def handle(self, topic: str, payload: bytes, received_at=None) -> Optional[UplinkMessage]:
+        with self._lock:
+            self.counters['received'] += 1
+
+        targets = [p for p in self.processors if p.accepts(topic)]
+        if not targets:
+            with self._lock:
+                self.counters['unmatched'] += 1
+            return None
+
+        message = UplinkMessage(topic, payload, received_at or timezone.now())
+        mac = message.mac
+        specific_part = self.mac_cache.get_specific_part(mac) if mac else None
+        if specific_part is None:
+            if mac:
+                logger.debug('未找到 mac=%s 对应的 specific_part，跳过', mac)
+            else:
+                logger.warning('无法解析 MAC: topic=%s', topic)
+            with self._lock:
+                self.counters['unknown_mac'] += 1
+            return message
+        message.specific_part = specific_part
+
+        for processor in targets:
+            processor.counters['received'] += 1
+            try:
+                handled = processor.process(message)
+            except Exception as exc:
+                processor.counters['errors'] += 1
+                logger.exception('screen_uplink: 处理器 %s 异常: topic=%s err=%s',
+                                 processor.name, topic, exc)
+                continue
+            processor.counters['processed' if handled else 'skipped'] += 1
+        return message
+
+    def health_snapshot(self) -> dict:
+        with self._lock:
+            snap = dict(self.counters)
+        snap['processors'] = {p.name: p.get_counters() for p in self.processors}
+        return snap
+
+    def log_health(self) -> None:
+        snap = self.health_snapshot()
+        parts = []
+        for name, c in snap['processors'].items():
+            text = f"{name}[processed={c['processed']} skipped={c['skipped']} errors={c['errors']}"
+            writer = c.get('writer')
+            if writer:
+                text += (f" flushes={writer['flushes']} pending={writer['pending']}"
+                         f" oldest_pending={writer['oldest_pending_seconds']}s"
+                         f" last_flush={writer['last_flush_ms']}ms")
+            write_behind = c.get('write_behind')
+            if write_behind:
+                text += (f" flushes={write_behind['flushes']}"
+                         f" pending={write_behind['pending_inserts']}/{write_behind['pending_touches']}"
+                         f"/{write_behind['pending_recoveries']}"
+                         f" oldest_pending={write_behind['oldest_pending_seconds']}s"
+                         f" last_flush={write_behind['last_flush_ms']}ms")
+            parts.append(text + ']')
+        logger.info(
+            'screen_uplink 健康: received=%d unmatched=%d unknown_mac=%d %s',
+            snap['received'], snap['unmatched'], snap['unknown_mac'], ' '.join(parts),
+        )
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
-from .models import CustomUser, UsageQuantityDaily, UsageQuantityMonthly, PLCConnectionStatus, OwnerInfo, PLCLatestData, DeviceConfig, DeviceParamHistory
+from .models import CustomUser, UsageQuantityDaily, UsageQuantityMonthly, PLCConnectionStatus, OwnerInfo, PLCLatestData, DeviceConfig, DeviceParamHistory, DeviceParamRollup
 
 class UserSerializer(serializers.ModelSerializer):
     """用户序列化器"""
@@ -158,19 +158,48 @@ class DeviceConfigSerializer(serializers.ModelSerializer):
 
 
 class DeviceParamHistorySerializer(serializers.ModelSerializer):
-    """设备参数历史记录序列化器"""
+    """设备参数历史记录序列化器（value 输出原生数值，见 DeviceParamHistory.native_value）"""
+    value = serializers.SerializerMethodField()
     collected_at = serializers.SerializerMethodField()
 
     class Meta:
         model = DeviceParamHistory
         fields = ['id', 'param_name', 'value', 'collected_at']
 
+    def get_value(self, obj):
+        return obj.native_value
+
     def get_collected_at(self, obj):
         if obj.collected_at is None:
             return None
         return obj.collected_at.strftime('%Y-%m-%d %H:%M:%S')
 
 
+class DeviceParamRollupSerializer(serializers.ModelSerializer):
+    """设备参数汇总序列化器（与 DeviceParamHistorySerializer 字段兼容：value 为平均值，collected_at 为时间桶起点）"""
+    value = serializers.SerializerMethodField()
+    collected_at = serializers.SerializerMethodField()
+    min = serializers.IntegerField(source='min_value')
+    max = serializers.IntegerField(source='max_value')
+    avg = serializers.SerializerMethodField()
+    last = serializers.IntegerField(source='last_value')
+    count = serializers.IntegerField(source='sample_count')
+
+    class Meta:
+        model = DeviceParamRollup
+        fields = ['id', 'param_name', 'value', 'collected_at', 'min', 'max', 'avg', 'last', 'count']
+
+    def get_avg(self, obj):
+        avg = obj.avg_value
+        return None if avg is None else round(avg, 2)
+
+    def get_value(self, obj):
+        return self.get_avg(obj)
+
+    def get_collected_at(self, obj):
+        return obj.bucket_start.strftime('%Y-%m-%d %H:%M:%S')
+
+
 class PersonaSerializer(serializers.Serializer):
     """人格偏好序列化器（v1.12.0 方舟副官人格）"""
     greeting_style = serializers.CharField(max_length=50, required=False, allow_blank=True)
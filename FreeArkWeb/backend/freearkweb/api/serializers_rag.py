@@ -10,6 +10,7 @@ class RagDocumentSerializer(serializers.ModelSerializer):
     """
     RagDocument 只读序列化器：用于 list/create/retry 响应。
     uploaded_by 返回用户名字符串（用户已删则返回空串）。
+    pages_* / chunks_* 为入库进度（PDF 已解析页数、已向量化并写入的 chunk 数），前端轮询列表展示。
     """
 
     uploaded_by = serializers.SerializerMethodField()
@@ -23,6 +24,10 @@ class RagDocumentSerializer(serializers.ModelSerializer):
             'uploaded_by',
             'status',
             'chunk_count',
+            'pages_total',
+            'pages_done',
+            'chunks_total',
+            'chunks_embedded',
             'error_message',
             'created_at',
             'updated_at',
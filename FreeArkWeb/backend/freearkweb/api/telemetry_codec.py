@@ -0,0 +1,86 @@
+"""
+采集端紧凑负载（datacollection/telemetry_codec.py）的解码。
+
+datacollection 在 output_config 中设置 mqtt.payload_format='compact' 后，PLC 消息以
+0xC1 | 版本号 | 标志位 | msgpack 的形式发布（布局见采集端模块说明）。MQTTConsumer._dispatch
+凭首字节识别紧凑格式，解码为与 JSON 格式完全相同的结构后交给原有 handler：
+
+  - 单设备消息 → {device_id: device_info}
+  - 批量信封   → {"__batch__": 1, "building": ..., "seq": ..., "total": ..., "devices": {...}}
+  - delta 设备行额外带 delta=True 与 online（见采集端 DeltaTracker）
+
+首字节不是 0xC1 的消息仍按 JSON 解析，两种格式可以在同一主题上共存。
+"""
+try:
+    import msgpack
+except ImportError:  # 可选依赖：未安装时紧凑格式消息无法解码，JSON 消息不受影响
+    msgpack = None
+
+BATCH_ENVELOPE_KEY = '__batch__'
+
+COMPACT_MAGIC = b'\xc1'
+COMPACT_FLAG_ENERGY = 0x01
+# 设备行第 8 个元素（可选）：delta 设备标志位
+COMPACT_ROW_DELTA = 0x01
+COMPACT_ROW_ONLINE = 0x02
+SUPPORTED_COMPACT_VERSIONS = frozenset([1])
+_COMPACT_HEADER_SIZE = 3
+
+
+class CompactPayloadError(ValueError):
+    """紧凑负载无法解码（版本不支持、缺少 msgpack 或内容损坏）"""
+
+
+def is_compact(payload_bytes) -> bool:
+    return payload_bytes[:1] == COMPACT_MAGIC
+
+
+def is_energy(payload_bytes) -> bool:
+    """读取头部标志位，不解包即可判断是否为 energy 消息"""
+    return len(payload_bytes) >= _COMPACT_HEADER_SIZE and bool(payload_bytes[2] & COMPACT_FLAG_ENERGY)
+
+
+def decode_compact(payload_bytes):
+    """把紧凑负载还原为 JSON 格式等价的 dict"""
+    if len(payload_bytes) < _COMPACT_HEADER_SIZE:
+        raise CompactPayloadError(f"紧凑负载过短: {len(payload_bytes)}字节")
+    version = payload_bytes[1]
+    if version not in SUPPORTED_COMPACT_VERSIONS:
+        raise CompactPayloadError(f"不支持的紧凑负载版本: {version}")
+    if msgpack is None:
+        raise CompactPayloadError("未安装 msgpack，无法解码紧凑负载")
+
+    try:
+        doc = msgpack.unpackb(memoryview(payload_bytes)[_COMPACT_HEADER_SIZE:], raw=False)
+        names = doc['p']
+        devices = {}
+        for row in doc['d']:
+            device_id, plc_ip, timestamp, idx, values, failed, errors = row[:7]
+            messages = dict(errors) if errors else {}
+            keys = names if idx is None else [names[i] for i in idx]
+            data = {}
+            for pos, (name, value) in enumerate(zip(keys, values)):
+                success = not (failed[pos >> 3] >> (pos & 7)) & 1
+                data[name] = {
+                    'value': value,
+                    'success': success,
+                    'message': '读取成功' if success else messages.get(pos, ''),
+                    'timestamp': timestamp,
+                }
+            device_info = {'PLC IP地址': plc_ip, 'timestamp': timestamp, 'data': data}
+            if len(row) > 7 and row[7] & COMPACT_ROW_DELTA:
+                device_info['delta'] = True
+                device_info['online'] = bool(row[7] & COMPACT_ROW_ONLINE)
+            devices[device_id] = device_info
+    except (msgpack.exceptions.UnpackException, ValueError, KeyError, TypeError, IndexError) as e:
+        raise CompactPayloadError(f"紧凑负载内容损坏: {e}") from e
+
+    if doc.get('b') is None:
+        return devices
+    return {
+        BATCH_ENVELOPE_KEY: 1,
+        'building': doc['b'],
+        'seq': doc.get('s', 0),
+        'total': doc.get('n', 1),
+        'devices': devices,
+    }
@@ -0,0 +1,134 @@
+"""
+历史图表紧凑格式与服务端降采样测试
+
+覆盖范围：
+  - lttb：点数不超过预算、首尾点保留、尖峰被保留；预算不小于点数时原样返回，预算 1 / 2 时只留首尾点
+  - minmax：每桶保留最小 / 最大值且按时间先后
+  - GET /api/devices/param-history/?chart=true&compact=true：按参数平行数组、epoch 秒、
+    旧文本值解析、points 降采样（上限 CHART_MAX_ROWS）、汇总粒度、参数校验，响应体积明显小于逐行格式
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_chart_downsample --settings=freearkweb.test_settings
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, tag
+from rest_framework.test import APIClient
+
+from api.chart_downsample import downsample, lttb, minmax
+from api.models import DeviceParamHistory, DeviceParamRollup
+from api.tests.test_device_cards import _make_operator
+
+SP = '9-1-31-3104'
+BASE = datetime(2026, 10, 1, 0, 0)
+# Asia/Shanghai（UTC+8）下 BASE 的 epoch 秒
+BASE_EPOCH = 1790784000
+
+
+@tag('unit')
+class TestDownsampleAlgorithms(SimpleTestCase):
+
+    def setUp(self):
+        self.ts = list(range(1000))
+        self.vs = [i % 10 for i in range(1000)]
+        self.vs[500] = 999  # 尖峰
+
+    def test_lttb_keeps_endpoints_and_spike(self):
+        t, v = lttb(self.ts, self.vs, 50)
+        self.assertEqual(len(t), 50)
+        self.assertEqual((t[0], t[-1]), (0, 999))
+        self.assertIn(999, v)
+        self.assertEqual(t, sorted(t))
+
+    def test_minmax_keeps_extremes_in_time_order(self):
+        t, v = minmax(self.ts, self.vs, 100)
+        self.assertLessEqual(len(t), 100)
+        self.assertIn(999, v)
+        self.assertIn(0, v)
+        self.assertEqual(t, sorted(t))
+
+    def test_small_series_unchanged(self):
+        self.assertEqual(lttb([1, 2, 3], [4, 5, 6], 10), ([1, 2, 3], [4, 5, 6]))
+        self.assertEqual(downsample([1, 2], [3, 4], 0), ([1, 2], [3, 4]))
+
+    def test_tiny_budget_keeps_only_endpoints(self):
+        self.assertEqual(lttb(self.ts, self.vs, 2), ([0, 999], [0, 9]))
+        self.assertEqual(lttb(self.ts, self.vs, 1), ([0], [0]))
+        self.assertEqual(downsample([1, 2], [3, 4], 1, 'minmax'), ([1], [3]))
+
+
+@tag('integration')
+class TestCompactChartAPI(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        _, token = _make_operator()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def _get(self, **params):
+        params.setdefault('specific_part', SP)
+        params.setdefault('chart', 'true')
+        return self.client.get('/api/devices/param-history/', params)
+
+    def test_parallel_arrays_per_param(self):
+        DeviceParamHistory.objects.create(specific_part=SP, param_name='temp', num_value=240, collected_at=BASE)
+        DeviceParamHistory.objects.create(specific_part=SP, param_name='temp', value='26.5',
+                                          collected_at=BASE + timedelta(hours=1))
+        DeviceParamHistory.objects.create(specific_part=SP, param_name='temp', value='正常',
+                                          collected_at=BASE + timedelta(hours=2))
+        DeviceParamHistory.objects.create(specific_part=SP, param_name='hum', num_value=60, collected_at=BASE)
+
+        resp = self._get(compact='true')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['format'], 'compact')
+        self.assertIsNone(resp.data['downsample'])
+        self.assertEqual(resp.data['series']['temp'], {
+            't': [BASE_EPOCH, BASE_EPOCH + 3600], 'v': [240, 26.5], 'raw_count': 2,
+        })
+        self.assertEqual(resp.data['series']['hum']['v'], [60])
+        self.assertEqual(resp.data['count'], 3)
+
+    def test_points_budget_and_payload_size(self):
+        DeviceParamHistory.objects.bulk_create([
+            DeviceParamHistory(specific_part=SP, param_name='temp', num_value=200 + i % 50,
+                               collected_at=BASE + timedelta(minutes=i))
+            for i in range(5000)
+        ])
+        compact = self._get(compact='true', points=300)
+        series = compact.data['series']['temp']
+        self.assertEqual(len(series['t']), 300)
+        self.assertEqual(series['raw_count'], 5000)
+        self.assertEqual(compact.data['downsample'], 'lttb')
+
+        rows = self._get()
+        self.assertEqual(rows.data['count'], 5000)
+        self.assertGreater(len(rows.content), 10 * len(compact.content))
+
+        minmax_resp = self._get(compact='true', points=300, downsample='minmax')
+        self.assertLessEqual(len(minmax_resp.data['series']['temp']['t']), 300)
+
+    def test_rollup_resolution_uses_bucket_average(self):
+        DeviceParamRollup.objects.create(
+            specific_part=SP, param_name='temp', resolution='day', bucket_start=BASE,
+            sample_count=3, value_sum=700, min_value=200, max_value=260, last_value=240, last_at=BASE,
+        )
+        resp = self._get(compact='true', resolution='day')
+        self.assertEqual(resp.data['series']['temp']['v'], [233.33])
+
+    def test_invalid_params(self):
+        self.assertEqual(self._get(compact='true', points='abc').status_code, 400)
+        self.assertEqual(self._get(compact='true', downsample='avg').status_code, 400)
+        self.assertEqual(self._get(compact='true', points=2).status_code, 400)
+
+    def test_points_capped_at_chart_row_limit(self):
+        with patch('api.views.CHART_MAX_ROWS', 40), patch('api.views.CHART_DOWNSAMPLE_MAX_ROWS', 1000):
+            DeviceParamHistory.objects.bulk_create([
+                DeviceParamHistory(specific_part=SP, param_name='temp', num_value=i,
+                                   collected_at=BASE + timedelta(minutes=i))
+                for i in range(100)
+            ])
+            resp = self._get(compact='true', points=100000)
+        self.assertEqual(len(resp.data['series']['temp']['t']), 40)
+        self.assertEqual(resp.data['series']['temp']['raw_count'], 100)
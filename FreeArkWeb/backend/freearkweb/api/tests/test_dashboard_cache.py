@@ -0,0 +1,175 @@
+"""
+cache_dashboard 软 / 硬 TTL 与单飞刷新测试（LocMemCache 代替 Redis）
+
+覆盖范围：
+  - 软过期前命中缓存；软过期后立即返回旧值，并只触发一次后台刷新（刷新锁去重）
+  - 硬过期 / 冷启动：抢到锁的请求同步计算；未抢到锁的请求等待其结果而不重复计算
+  - 升级前的旧格式缓存值仍可读取
+  - 非 200 响应不缓存
+  - prewarm_dashboard_cache / dashboard_cache_prewarm 命令按 horizon 提前刷新已登记的键，
+    提前量不超过 ttl - horizon；only_read 时跳过近期无人读取的键
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_dashboard_cache --settings=freearkweb.test_settings
+"""
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings, tag
+from rest_framework.response import Response
+
+import api.views as views
+from api.views import cache_dashboard
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                      'LOCATION': 'test-dashboard-cache'}}
+
+
+class _FakeRequest:
+    def __init__(self, **params):
+        self.query_params = params
+
+
+class _Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@tag('unit')
+@override_settings(CACHES=LOCMEM)
+class TestStaleWhileRevalidate(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        self.spawned = []
+        self.clock = _Clock()
+        self.registry = dict(views.DASHBOARD_CACHE_REGISTRY)
+        patches = [
+            patch.object(views.time, 'time', self.clock.time),
+            # 后台刷新改为记录参数，由测试决定何时执行
+            patch.object(views, '_spawn_dashboard_refresh', lambda *a: self.spawned.append(a)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self._restore_registry)
+
+    def _restore_registry(self):
+        views.DASHBOARD_CACHE_REGISTRY.clear()
+        views.DASHBOARD_CACHE_REGISTRY.update(self.registry)
+
+    def _view(self, status=200, **deco):
+        @cache_dashboard(prefix='t_swr', **deco)
+        def view(request):
+            self.calls.append(dict(request.query_params.items()))
+            return Response({'n': len(self.calls)}, status=status)
+        return view
+
+    def test_stale_value_served_and_refreshed_once(self):
+        view = self._view(ttl=30, stale_ttl=90)
+        self.assertEqual(view(_FakeRequest()).data, {'n': 1})
+        self.clock.now += 10
+        self.assertEqual(view(_FakeRequest()).data, {'n': 1})
+        self.assertEqual(self.spawned, [])
+
+        # 软过期：多个并发请求都拿到旧值，只有一个抢到锁触发刷新
+        self.clock.now += 25
+        for _ in range(5):
+            self.assertEqual(view(_FakeRequest()).data, {'n': 1})
+        self.assertEqual(len(self.spawned), 1)
+        self.assertEqual(len(self.calls), 1)
+
+        views._dashboard_refresh(*self.spawned[0])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(view(_FakeRequest()).data, {'n': 2})
+        # 刷新结束已释放锁
+        self.assertIsNone(cache.get('dash:t_swr:lock'))
+
+    def test_vary_params_refresh_uses_query_params(self):
+        view = self._view(ttl=30, vary_params=True)
+        view(_FakeRequest(days='7'))
+        self.clock.now += 31
+        view(_FakeRequest(days='7'))
+        views._dashboard_refresh(*self.spawned[0])
+        self.assertEqual(self.calls, [{'days': '7'}, {'days': '7'}])
+
+    def test_cold_miss_waits_for_lock_holder(self):
+        view = self._view(ttl=30)
+        cache.add('dash:t_swr:lock', 1, 30)
+
+        def fill_on_first_poll(_seconds):
+            cache.set('dash:t_swr', {'_swr': 1, 'data': {'n': 'other'}, 'fresh_until': self.clock.now + 30})
+
+        with patch.object(views.time, 'sleep', side_effect=fill_on_first_poll):
+            self.assertEqual(view(_FakeRequest()).data, {'n': 'other'})
+        self.assertEqual(self.calls, [])
+
+    def test_cold_miss_computes_after_wait_timeout(self):
+        view = self._view(ttl=30)
+        cache.add('dash:t_swr:lock', 1, 30)
+        with patch.object(views, 'DASHBOARD_LOCK_WAIT', 0.01), patch.object(views, 'DASHBOARD_LOCK_POLL', 0.001):
+            self.assertEqual(view(_FakeRequest()).data, {'n': 1})
+
+    def test_legacy_cached_value_is_fresh(self):
+        cache.set('dash:t_swr', {'n': 'legacy'}, 30)
+        self.assertEqual(self._view()(_FakeRequest()).data, {'n': 'legacy'})
+        self.assertEqual(self.calls, [])
+
+    def test_error_response_not_cached(self):
+        view = self._view(status=500)
+        view(_FakeRequest())
+        view(_FakeRequest())
+        self.assertEqual(len(self.calls), 2)
+        self.assertIsNone(cache.get('dash:t_swr:lock'))
+
+    def test_prewarm_refreshes_missing_and_soon_stale_keys(self):
+        views.DASHBOARD_CACHE_REGISTRY.clear()
+        self._view(ttl=30)
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=10),
+                         {'refreshed': 1, 'skipped': 0, 'failed': 0})
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=10)['skipped'], 1)
+        self.clock.now += 25
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=10)['refreshed'], 1)
+        self.assertEqual(len(self.calls), 2)
+
+        # 检查间隔 20s、软 TTL 30s：提前量收紧为 10s，刷新后的下一轮（20s 后剩 10s 以上）不重算
+        self.clock.now += 19
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=20)['skipped'], 1)
+
+        out = StringIO()
+        self.clock.now += 30
+        call_command('dashboard_cache_prewarm', once=True, keys='t_swr', stdout=out)
+        self.assertIn('刷新 1', out.getvalue())
+        self.assertEqual(len(self.calls), 3)
+
+    def test_prewarm_skips_keys_nobody_reads(self):
+        views.DASHBOARD_CACHE_REGISTRY.clear()
+        views._dashboard_read_marks.clear()
+        view = self._view(ttl=30)
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=10, only_read=True)['skipped'], 1)
+        self.assertEqual(self.calls, [])
+
+        view(_FakeRequest())
+        self.clock.now += 25
+        self.assertEqual(views.prewarm_dashboard_cache(horizon=10, only_read=True)['refreshed'], 1)
+        self.assertEqual(len(self.calls), 2)
+
+
+@tag('unit')
+class TestRegisteredDashboardKeys(SimpleTestCase):
+
+    def test_dashboard_views_registered_for_prewarm(self):
+        for name in ('dashboard_summary', 'dashboard_power_status', 'dashboard_trend',
+                     'dashboard_fault_summary', 'dashboard_device_fault_summary'):
+            self.assertIn(name, views.DASHBOARD_CACHE_REGISTRY)
+        # 在线率接口直接读设备群快照（见 fleet_status），不缓存
+        for name in ('dashboard_plc_online_rate', 'dashboard_screen_online_rate'):
+            self.assertNotIn(name, views.DASHBOARD_CACHE_REGISTRY)
+        self.assertTrue(views.DASHBOARD_CACHE_REGISTRY['dashboard_trend']['vary_params'])
@@ -0,0 +1,148 @@
+"""
+设备群状态聚合测试（LocMemCache 代替 Redis）
+
+覆盖范围：
+  - 对账后的快照与看板原数据库查询口径一致（开机、模式分布、unknown、在线率、大屏在线率）
+  - ConnectionStatusHandler 状态变化、PLCLatestDataHandler upsert 增量更新聚合
+  - 未对账前不发布；快照存在时看板接口不查库，缺失时回退数据库查询
+  - 大屏阈值与看板不一致时不使用快照
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_fleet_status --settings=freearkweb.test_settings
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings, tag
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.fleet_status import (
+    PLC_FLEET_CACHE_KEY, FleetStatusPublisher, PLCFleetAggregate, ScreenFleetAggregate,
+    publish_snapshot, plc_fleet,
+)
+from api.models import CustomUser, ScreenConnectivityStatus
+from api.mqtt_handlers import ConnectionStatusHandler, PLCLatestDataHandler
+from api.tests.test_dashboard_power_status_v053 import _create_powered_on_device, _make_plc_status
+from api.tests.test_plc_latest import _make_payload
+import api.mqtt_handlers as _handlers_module
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                      'LOCATION': 'test-fleet-status'}}
+TS = '2026-10-18 10:00:00'
+
+
+def _seed_fleet():
+    _create_powered_on_device('1-1-1-101', operation_mode=1)
+    _create_powered_on_device('1-1-1-102', operation_mode=2)
+    _create_powered_on_device('1-1-1-103', operation_mode=9)   # 超范围 → unknown
+    _create_powered_on_device('1-1-1-104')                     # 无模式记录 → unknown
+    _make_plc_status('1-1-1-105', 'offline')
+    _make_plc_status('1-1-1-106', 'online')                     # 在线未开机
+
+
+@tag('integration')
+@override_settings(CACHES=LOCMEM)
+class TestFleetSnapshotMatchesDashboard(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        plc_fleet.clear()
+        self.addCleanup(plc_fleet.clear)
+        _handlers_module._conn_status_cache.clear()
+        self.client = APIClient()
+        user = CustomUser.objects.create_user(username='fleet', password='pw123456', role='admin')
+        self.client.force_authenticate(user)
+
+    def _dashboards(self):
+        return (self.client.get('/api/dashboard/power-status/').data,
+                self.client.get('/api/dashboard/plc-online-rate/').data)
+
+    def test_snapshot_same_as_db_queries(self):
+        _seed_fleet()
+        from_db = self._dashboards()
+        self.assertEqual(from_db[0]['data']['mode_distribution']['unknown'], 2)
+
+        cache.clear()  # 清掉 cache_dashboard 缓存的查库结果
+        plc_fleet.reconcile()
+        publish_snapshot(plc_fleet)
+        with self.assertNumQueries(0):
+            from_snapshot = self._dashboards()
+        self.assertEqual(from_snapshot, from_db)
+
+    def test_handlers_update_aggregate_on_transitions(self):
+        _seed_fleet()
+        plc_fleet.reconcile()
+
+        # 离线设备上线并开机（制冷）
+        ConnectionStatusHandler().handle('t', _make_payload('1-1-1-105', {'system_switch': (1, True, TS)}))
+        PLCLatestDataHandler().handle('t', _make_payload('1-1-1-105', {
+            'system_switch': (1, True, TS), 'operation_mode': (1, True, TS),
+        }))
+        # 开机设备关机
+        PLCLatestDataHandler().handle('t', _make_payload('1-1-1-101', {'system_switch': (0, True, TS)}))
+
+        snap = plc_fleet.snapshot()
+        self.assertEqual((snap['online_count'], snap['powered_on_count']), (6, 4))
+        self.assertEqual(snap['mode_distribution']['cooling'], 1)
+
+        # 与重新对账的结果一致
+        reconciled = PLCFleetAggregate()
+        reconciled.reconcile()
+        expected = reconciled.snapshot()
+        for key in ('computed_at',):
+            snap.pop(key)
+            expected.pop(key)
+        self.assertEqual(snap, expected)
+
+    def test_not_published_before_reconcile_and_db_fallback(self):
+        _seed_fleet()
+        self.assertIsNone(publish_snapshot(plc_fleet))
+        self.assertIsNone(cache.get(PLC_FLEET_CACHE_KEY))
+        with self.assertNumQueries(4):  # 回退查库：开机状况 3 条 + 在线率 1 条
+            self.assertEqual(self._dashboards()[0]['data']['powered_on_count'], 4)
+
+    def test_publisher_reconciles_on_interval(self):
+        _seed_fleet()
+        publisher = FleetStatusPublisher([plc_fleet], reconcile_seconds=60)
+        publisher.run_once(now=0)
+        _make_plc_status('1-1-1-107', 'online')  # 其他进程直接改库
+        publisher.run_once(now=30)
+        self.assertEqual(cache.get(PLC_FLEET_CACHE_KEY)['total_count'], 6)
+        publisher.run_once(now=61)
+        self.assertEqual(cache.get(PLC_FLEET_CACHE_KEY)['total_count'], 7)
+        self.assertEqual(publisher.stats['reconciles'], 2)
+
+
+@tag('integration')
+@override_settings(CACHES=LOCMEM)
+class TestScreenFleet(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = CustomUser.objects.create_user(username='fleet_s', password='pw123456', role='admin')
+        self.client.force_authenticate(user)
+        now = timezone.now()
+        ScreenConnectivityStatus.objects.create(specific_part='1-1-1-101', last_seen_at=now)
+        ScreenConnectivityStatus.objects.create(specific_part='1-1-1-102', last_seen_at=now - timedelta(hours=1))
+
+    def test_snapshot_and_touch(self):
+        from_db = self.client.get('/api/dashboard/screen-online-rate/').data
+        cache.clear()  # 清掉 cache_dashboard 缓存的查库结果
+        screens = ScreenFleetAggregate()
+        screens.reconcile()
+        publish_snapshot(screens)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/dashboard/screen-online-rate/').data, from_db)
+
+        screens.touch('1-1-1-102', timezone.now())
+        self.assertEqual(screens.snapshot()['online_count'], 2)
+
+    def test_threshold_mismatch_falls_back_to_db(self):
+        screens = ScreenFleetAggregate(threshold_minutes=120)
+        screens.reconcile()
+        publish_snapshot(screens)
+        data = self.client.get('/api/dashboard/screen-online-rate/').data['data']
+        self.assertEqual(data['online_count'], 1)
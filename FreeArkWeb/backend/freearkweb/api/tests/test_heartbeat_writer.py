@@ -0,0 +1,85 @@
+"""
+HeartbeatWriter（ScreenConnectivityStatus 心跳合并写入）测试
+
+覆盖范围：
+  - 同一大屏多次心跳只保留最新时间，一次 flush 一条 bulk upsert 写完整批
+  - 写库失败时整批放回待写表（较新的心跳优先），下一轮重试
+  - 刷新间隔超过上限（在线阈值的 1/10）时按上限处理
+  - 写入线程未启动时 touch() 同步写库；HeartbeatProcessor 健康计数包含写入统计
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_heartbeat_writer --settings=freearkweb.test_settings
+"""
+from datetime import timedelta
+from unittest.mock import PropertyMock, patch
+
+from django.test import TestCase, tag
+from django.utils import timezone
+
+from api.models import ScreenConnectivityStatus
+from api.screen_uplink.heartbeat_writer import MAX_FLUSH_SECONDS, HeartbeatWriter
+from api.screen_uplink.processors import HeartbeatProcessor
+
+
+@tag('integration')
+class TestHeartbeatWriter(TestCase):
+
+    def setUp(self):
+        # 模拟写入线程运行中：touch() 只进待写表，由测试在主线程手动 flush()
+        patcher = patch.object(HeartbeatWriter, 'running', new_callable=PropertyMock, return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = HeartbeatWriter(flush_seconds=30)
+        self.now = timezone.now()
+
+    def test_merges_heartbeats_into_one_bulk_upsert(self):
+        ScreenConnectivityStatus.objects.create(specific_part='1-1-1-101',
+                                                last_seen_at=self.now - timedelta(hours=1))
+        for seconds in (0, 5, 10):
+            self.writer.touch('1-1-1-101', self.now + timedelta(seconds=seconds))
+        self.writer.touch('2-1-1-101', self.now)
+
+        snap = self.writer.snapshot()
+        self.assertEqual((snap['heartbeats_in'], snap['heartbeats_merged'], snap['pending']), (4, 2, 2))
+        self.assertFalse(ScreenConnectivityStatus.objects.filter(specific_part='2-1-1-101').exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.writer.flush(), 2)
+
+        self.assertEqual(ScreenConnectivityStatus.objects.get(specific_part='1-1-1-101').last_seen_at,
+                         self.now + timedelta(seconds=10))
+        self.assertTrue(ScreenConnectivityStatus.objects.filter(specific_part='2-1-1-101').exists())
+        snap = self.writer.snapshot()
+        self.assertEqual((snap['flushes'], snap['rows_flushed'], snap['pending']), (1, 2, 0))
+        self.assertEqual(snap['oldest_pending_seconds'], 0.0)
+
+    def test_failed_flush_requeues_batch(self):
+        self.writer.touch('1-1-1-101', self.now)
+        with patch.object(HeartbeatWriter, '_upsert', side_effect=RuntimeError('db down')):
+            self.assertEqual(self.writer.flush(), 0)
+        # 失败期间到达更新的心跳，重试时以较新的为准
+        self.writer.touch('1-1-1-101', self.now + timedelta(seconds=20))
+
+        snap = self.writer.snapshot()
+        self.assertEqual((snap['flush_errors'], snap['pending']), (1, 1))
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(ScreenConnectivityStatus.objects.get(specific_part='1-1-1-101').last_seen_at,
+                         self.now + timedelta(seconds=20))
+
+    def test_flush_seconds_clamped_to_max(self):
+        self.assertEqual(HeartbeatWriter(flush_seconds=3600).flush_seconds, MAX_FLUSH_SECONDS)
+        self.assertEqual(HeartbeatWriter(flush_seconds=0).flush_seconds, 1)
+
+
+@tag('integration')
+class TestHeartbeatWriterSyncFallback(TestCase):
+
+    def test_touch_writes_immediately_when_not_started(self):
+        processor = HeartbeatProcessor(flush_seconds=10)
+        now = timezone.now()
+        processor.writer.touch('1-1-1-101', now)
+
+        self.assertEqual(ScreenConnectivityStatus.objects.get(specific_part='1-1-1-101').last_seen_at, now)
+        writer_stats = processor.get_counters()['writer']
+        self.assertEqual((writer_stats['flush_seconds'], writer_stats['running']), (10, False))
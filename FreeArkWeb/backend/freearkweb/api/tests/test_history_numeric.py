@@ -0,0 +1,70 @@
+"""
+DeviceParamHistory 数值存储测试
+
+覆盖范围：
+  - PLCLatestDataHandler 写历史只填 num_value（BIGINT），不再写文本 value
+  - native_value / 序列化器：num_value 优先，旧文本值能解析为数字时返回数字
+  - dph_backfill_numeric：整数文本迁入 num_value 并置空 value，非整数旧值保留，重跑幂等
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_history_numeric --settings=freearkweb.test_settings
+"""
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, tag
+
+from api.models import DeviceParamHistory
+from api.mqtt_handlers import PLCLatestDataHandler
+from api.serializers import DeviceParamHistorySerializer
+from api.tests.test_plc_latest import DEVICE, TS, _make_payload
+import api.mqtt_handlers as _handlers_module
+
+AT = datetime(2026, 4, 18, 10, 0)
+
+
+def _legacy(value, param_name='living_room_temperature'):
+    return DeviceParamHistory.objects.create(
+        specific_part=DEVICE, param_name=param_name, value=value, collected_at=AT,
+    )
+
+
+@tag('unit')
+class TestNumericHistory(TestCase):
+
+    def setUp(self):
+        _handlers_module._general_hist_last_hour.clear()
+
+    def test_handler_writes_num_value_only(self):
+        PLCLatestDataHandler().handle('t', _make_payload(DEVICE, {'indoor_temperature': (235, True, TS)}))
+        row = DeviceParamHistory.objects.get(specific_part=DEVICE, param_name='indoor_temperature')
+        self.assertEqual((row.num_value, row.value, row.native_value), (235, None, 235))
+
+    def test_native_value_and_serializer(self):
+        rows = [_legacy('245'), _legacy('26.0'), _legacy('26.5'), _legacy('正常'), _legacy(None)]
+        self.assertEqual([r.native_value for r in rows], [245, 26, 26.5, '正常', None])
+        data = DeviceParamHistorySerializer(rows[0]).data
+        self.assertEqual(data['value'], 245)
+
+    def test_backfill_converts_integral_text_and_is_idempotent(self):
+        _legacy('245')
+        _legacy('26.0')
+        _legacy('26.5')
+        _legacy('正常')
+        _legacy('99999999999999999999999')  # 超出 BIGINT 范围，保留文本
+
+        out = StringIO()
+        call_command('dph_backfill_numeric', batch_size=2, sleep_ms=0, dry_run=True, stdout=out)
+        self.assertFalse(DeviceParamHistory.objects.filter(num_value__isnull=False).exists())
+
+        call_command('dph_backfill_numeric', batch_size=2, sleep_ms=0, stdout=out)
+        self.assertEqual(
+            set(DeviceParamHistory.objects.values_list('num_value', 'value')),
+            {(245, None), (26, None), (None, '26.5'), (None, '正常'), (None, '99999999999999999999999')},
+        )
+
+        out = StringIO()
+        call_command('dph_backfill_numeric', batch_size=2, sleep_ms=0, stdout=out)
+        self.assertIn('迁移 0 行', out.getvalue())
@@ -0,0 +1,165 @@
+"""
+device_param_history 时间分区测试
+
+覆盖范围：
+  - 分区规划：按天 / 按月的分区名与 [lower, upper) 边界，TO_DAYS 换算与 MySQL 一致
+  - MySQL 后端：首次分区化、从 pmax 拆出未来分区、DROP PARTITION 的 DDL（伪游标记录 SQL）
+  - 模拟后端（SQLite）：只删除整个早于截止时间的分区，截止日所在分区保留
+  - dph_cleanup_service --mode partition 走删分区
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_history_partitions --settings=freearkweb.test_settings
+"""
+from datetime import date, datetime
+from io import StringIO
+
+from django.test import SimpleTestCase, TestCase, tag
+
+from api.history_partitions import (
+    GRANULARITY_MONTH, HistoryPartitionManager, MySQLPartitionBackend, plan_partitions, to_days,
+)
+from api.models import DeviceParamHistory
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append(sql)
+
+    def fetchall(self):
+        return self.conn.rows
+
+
+class _FakeMySQLConnection:
+    vendor = 'mysql'
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+
+def _mysql_manager(rows=(), granularity='day'):
+    manager = HistoryPartitionManager(granularity=granularity)
+    manager.backend = MySQLPartitionBackend(_FakeMySQLConnection(rows))
+    return manager
+
+
+@tag('unit')
+class TestPartitionPlan(SimpleTestCase):
+
+    def test_to_days_matches_mysql(self):
+        # MySQL: SELECT TO_DAYS('1995-05-01') = 728779
+        self.assertEqual(to_days(date(1995, 5, 1)), 728779)
+
+    def test_daily_and_monthly_plans(self):
+        self.assertEqual(plan_partitions(date(2026, 10, 30), date(2026, 11, 1), 'day'), [
+            ('p20261030', date(2026, 10, 30), date(2026, 10, 31)),
+            ('p20261031', date(2026, 10, 31), date(2026, 11, 1)),
+            ('p20261101', date(2026, 11, 1), date(2026, 11, 2)),
+        ])
+        self.assertEqual(plan_partitions(date(2026, 12, 15), date(2027, 1, 3), GRANULARITY_MONTH), [
+            ('p202612', date(2026, 12, 1), date(2027, 1, 1)),
+            ('p202701', date(2027, 1, 1), date(2027, 2, 1)),
+        ])
+
+
+@tag('unit')
+class TestMySQLPartitionBackend(SimpleTestCase):
+
+    def test_convert_rekeys_primary_key_and_partitions_by_collected_at(self):
+        manager = _mysql_manager()
+        plan = manager.convert(retention_days=2, ahead=1, today=date(2026, 10, 18))
+        self.assertEqual([name for name, _, _ in plan], ['p20261016', 'p20261017', 'p20261018', 'p20261019'])
+        pk_sql, partition_sql = manager.backend.conn.executed[-2:]
+        self.assertIn('ADD PRIMARY KEY (id, collected_at)', pk_sql)
+        self.assertIn('PARTITION BY RANGE (TO_DAYS(collected_at))', partition_sql)
+        self.assertIn(f'PARTITION phist VALUES LESS THAN ({to_days(date(2026, 10, 16))})', partition_sql)
+        self.assertIn(f'PARTITION p20261019 VALUES LESS THAN ({to_days(date(2026, 10, 20))})', partition_sql)
+        self.assertTrue(partition_sql.endswith('PARTITION pmax VALUES LESS THAN MAXVALUE)'))
+
+    def test_convert_refuses_already_partitioned_table(self):
+        manager = _mysql_manager([('pmax', 'MAXVALUE', 0)])
+        with self.assertRaises(ValueError):
+            manager.convert(retention_days=7, ahead=7)
+
+    def test_ensure_ahead_splits_pmax_from_last_bound(self):
+        rows = [
+            ('p20261017', str(to_days(date(2026, 10, 18))), 100),
+            ('p20261018', str(to_days(date(2026, 10, 19))), 50),
+            ('pmax', 'MAXVALUE', 0),
+        ]
+        manager = _mysql_manager(rows)
+        plan = manager.ensure_ahead(2, today=date(2026, 10, 18))
+        self.assertEqual([name for name, _, _ in plan], ['p20261019', 'p20261020'])
+        sql = manager.backend.conn.executed[-1]
+        self.assertIn('REORGANIZE PARTITION pmax INTO (PARTITION p20261019', sql)
+
+        # 已覆盖到目标日期时不再执行 DDL
+        executed = len(manager.backend.conn.executed)
+        self.assertEqual(manager.ensure_ahead(0, today=date(2026, 10, 18)), [])
+        self.assertEqual(len(manager.backend.conn.executed), executed + 1)  # 仅 list 查询
+
+    def test_drop_expired_only_drops_whole_partitions(self):
+        rows = [
+            ('phist', str(to_days(date(2026, 10, 10))), 1000),
+            ('p20261010', str(to_days(date(2026, 10, 11))), 100),
+            ('p20261011', str(to_days(date(2026, 10, 12))), 100),
+            ('pmax', 'MAXVALUE', 0),
+        ]
+        manager = _mysql_manager(rows)
+        expired, dropped = manager.drop_expired(datetime(2026, 10, 11, 3, 0))
+        self.assertEqual([p.name for p in expired], ['phist', 'p20261010'])
+        self.assertEqual(dropped, 1100)
+        self.assertTrue(manager.backend.conn.executed[-1].endswith('DROP PARTITION phist, p20261010'))
+
+
+@tag('unit')
+class TestEmulatedPartitions(TestCase):
+
+    def setUp(self):
+        for day in (9, 10, 11):
+            for hour in (1, 13):
+                DeviceParamHistory.objects.create(
+                    specific_part='3-1-7-702', param_name='indoor_temperature', value='235',
+                    collected_at=datetime(2026, 10, day, hour, 0),
+                )
+
+    def test_drop_expired_keeps_partition_containing_cutoff(self):
+        manager = HistoryPartitionManager()
+        self.assertFalse(manager.backend.native)
+        self.assertEqual([p.name for p in manager.list_partitions()], ['p20261009', 'p20261010', 'p20261011', 'pmax'])
+
+        expired, deleted = manager.drop_expired(datetime(2026, 10, 10, 12, 0), dry_run=True)
+        self.assertEqual([p.name for p in expired], ['p20261009'])
+        self.assertEqual(DeviceParamHistory.objects.count(), 6)
+
+        expired, deleted = manager.drop_expired(datetime(2026, 10, 10, 12, 0))
+        self.assertEqual(deleted, 2)
+        self.assertEqual(
+            sorted(DeviceParamHistory.objects.values_list('collected_at__day', flat=True).distinct()), [10, 11],
+        )
+
+    def test_cleanup_service_partition_mode(self):
+        from api.management.commands.dph_cleanup_service import Command
+
+        cmd = Command()
+        cmd.stdout = StringIO()
+        cmd.stderr = StringIO()
+        cmd._run_partition_cleanup = lambda *args: cmd.stdout.write(f'partition{args}')
+        cmd._run_cleanup(days=7, batch_size=5000, sleep_ms=0, dry_run=False, mode='partition')
+        self.assertIn('partition(7, False', cmd.stdout.getvalue())
+
+        # auto 模式下 SQLite 无原生分区 → 仍走分批 DELETE
+        self.assertFalse(cmd._use_partitions('auto', 'day'))
@@ -0,0 +1,185 @@
+"""
+设备参数小时 / 日汇总测试
+
+覆盖范围：
+  - PLCLatestDataHandler 写历史时增量合并汇总：count/sum/min/max/last，跨批次合并、乱序样本不覆盖 last
+  - 汇总基于去重前的全部样本（历史表每小时仅一条）
+  - delta 消息中未变化的参数按 PLCLatestData 当前值计入每轮样本，与全量消息口径一致
+  - dph_rollups --backfill 从历史表重算，可重复执行
+  - GET /api/devices/param-history/ 的 resolution 参数：hour/day 查汇总、auto 按窗口选粒度、非法值 400
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_history_rollups --settings=freearkweb.test_settings
+"""
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, tag
+from rest_framework.test import APIClient
+
+from api.history_rollups import choose_resolution
+from api.models import DeviceParamHistory, DeviceParamRollup
+from api.mqtt_handlers import PLCLatestDataHandler
+from api.tests.test_device_cards import _make_operator
+from api.tests.test_plc_latest import DEVICE, _make_delta, _make_payload
+import api.mqtt_handlers as _handlers_module
+
+PARAM = 'indoor_temperature'
+
+
+def _rollup(resolution, bucket):
+    return DeviceParamRollup.objects.get(
+        specific_part=DEVICE, param_name=PARAM, resolution=resolution, bucket_start=bucket,
+    )
+
+
+def _stats(row):
+    return row.sample_count, row.value_sum, row.min_value, row.max_value, row.last_value
+
+
+@tag('unit')
+class TestChooseResolution(SimpleTestCase):
+
+    def test_coarsest_resolution_for_window(self):
+        self.assertEqual(choose_resolution(None, datetime(2026, 10, 1)), 'raw')
+        self.assertEqual(choose_resolution(datetime(2026, 10, 1), datetime(2026, 10, 2, 23)), 'raw')
+        self.assertEqual(choose_resolution(datetime(2026, 10, 1), datetime(2026, 10, 20)), 'hour')
+        self.assertEqual(choose_resolution(datetime(2026, 7, 1), datetime(2026, 10, 1)), 'day')
+
+
+# 历史小时游标在事务提交后推进（_persist 的 on_commit），用例需真实提交
+@tag('unit')
+class TestIncrementalRollups(TransactionTestCase):
+
+    def setUp(self):
+        _handlers_module._general_hist_last_hour.clear()
+        self.handler = PLCLatestDataHandler()
+
+    def _send(self, value, ts):
+        self.handler.handle('t', _make_payload(DEVICE, {PARAM: (value, True, ts)}))
+
+    def test_samples_merge_into_hour_and_day_buckets(self):
+        self._send(235, '2026-10-18 10:05:00')
+        self._send(241, '2026-10-18 10:15:00')
+        self._send(229, '2026-10-18 10:25:00')
+        self._send(250, '2026-10-18 11:05:00')
+        # 历史表每小时仅保留第一条，汇总包含全部样本
+        self.assertEqual(DeviceParamHistory.objects.filter(param_name=PARAM).count(), 2)
+        # 迟到的旧样本参与 count/min/max，但不覆盖 last
+        self._send(200, '2026-10-18 10:01:00')
+
+        self.assertEqual(_stats(_rollup('hour', datetime(2026, 10, 18, 10))), (4, 905, 200, 241, 229))
+        self.assertEqual(_stats(_rollup('hour', datetime(2026, 10, 18, 11))), (1, 250, 250, 250, 250))
+        day = _rollup('day', datetime(2026, 10, 18))
+        self.assertEqual(_stats(day), (5, 1155, 200, 250, 250))
+        self.assertEqual(day.last_at, datetime(2026, 10, 18, 11, 5))
+        self.assertEqual(day.avg_value, 231)
+
+    def test_delta_frames_count_unchanged_params(self):
+        stable = 'living_room_switch'
+        self.handler.handle('t', _make_payload(DEVICE, {
+            PARAM: (235, True, '2026-10-18 10:05:00'), stable: (1, True, '2026-10-18 10:05:00'),
+        }))
+        self.handler.handle('t', _make_delta(DEVICE, {PARAM: (241, True, '2026-10-18 10:15:00')},
+                                             '2026-10-18 10:15:00'))
+        self.handler.handle('t', _make_delta(DEVICE, {}, '2026-10-18 10:25:00'))
+        # 本轮读取失败的参数不补样本
+        self.handler.handle('t', _make_delta(DEVICE, {stable: (None, False, '2026-10-18 10:35:00')},
+                                             '2026-10-18 10:35:00'))
+
+        hour = datetime(2026, 10, 18, 10)
+        self.assertEqual(_stats(_rollup('hour', hour)), (4, 958, 235, 241, 241))
+        switch = DeviceParamRollup.objects.get(
+            specific_part=DEVICE, param_name=stable, resolution='hour', bucket_start=hour,
+        )
+        self.assertEqual(_stats(switch), (3, 3, 1, 1, 1))
+        self.assertEqual(DeviceParamHistory.objects.filter(specific_part=DEVICE).count(), 2)
+
+    def test_failed_and_null_values_are_not_rolled_up(self):
+        self.handler.handle('t', _make_payload(DEVICE, {
+            PARAM: (None, True, '2026-10-18 10:05:00'),
+            'living_room_temperature': (240, False, '2026-10-18 10:05:00'),
+        }))
+        self.assertFalse(DeviceParamRollup.objects.exists())
+
+
+@tag('unit')
+class TestRollupBackfill(TestCase):
+
+    def test_backfill_rebuilds_from_history_and_is_idempotent(self):
+        for hour, value in ((9, 230), (10, 240)):
+            DeviceParamHistory.objects.create(
+                specific_part=DEVICE, param_name=PARAM, num_value=value,
+                collected_at=datetime(2026, 10, 17, hour, 0),
+            )
+        DeviceParamHistory.objects.create(
+            specific_part=DEVICE, param_name=PARAM, value='250', collected_at=datetime(2026, 10, 17, 11, 0),
+        )
+        DeviceParamHistory.objects.create(
+            specific_part=DEVICE, param_name=PARAM, value='正常', collected_at=datetime(2026, 10, 17, 12, 0),
+        )
+
+        for _ in range(2):
+            out = StringIO()
+            call_command('dph_rollups', backfill=True, start='2026-10-17', end='2026-10-17', stdout=out)
+            self.assertIn('写入汇总 4 行', out.getvalue())
+        self.assertEqual(DeviceParamRollup.objects.filter(resolution='hour').count(), 3)
+        self.assertEqual(_stats(_rollup('day', datetime(2026, 10, 17))), (3, 720, 230, 250, 250))
+
+    def test_prune_hourly_keeps_daily(self):
+        for resolution in ('hour', 'day'):
+            DeviceParamRollup.objects.create(
+                specific_part=DEVICE, param_name=PARAM, resolution=resolution,
+                bucket_start=datetime(2020, 1, 1), sample_count=1, value_sum=1,
+            )
+        call_command('dph_rollups', prune_hourly_days=90, stdout=StringIO())
+        self.assertEqual(list(DeviceParamRollup.objects.values_list('resolution', flat=True)), ['day'])
+
+
+# 历史小时游标在事务提交后推进（_persist 的 on_commit），用例需真实提交
+@tag('integration')
+class TestHistoryResolutionAPI(TransactionTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        _, token = _make_operator()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        _handlers_module._general_hist_last_hour.clear()
+        handler = PLCLatestDataHandler()
+        for ts, value in (('2026-09-01 10:05:00', 230), ('2026-09-01 10:35:00', 240),
+                          ('2026-09-20 08:00:00', 250)):
+            handler.handle('t', _make_payload(DEVICE, {PARAM: (value, True, ts)}))
+
+    def _get(self, **params):
+        params.setdefault('specific_part', DEVICE)
+        params.setdefault('chart', 'true')
+        return self.client.get('/api/devices/param-history/', params)
+
+    def test_hour_resolution_returns_rollups(self):
+        resp = self._get(resolution='hour', start_time='2026-09-01 10:30:00', end_time='2026-09-30')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['resolution'], 'hour')
+        first = resp.data['results'][0]
+        # start_time 落在 10 点桶内，该桶仍返回
+        self.assertEqual(first['collected_at'], '2026-09-01 10:00:00')
+        self.assertEqual((first['value'], first['min'], first['max'], first['last'], first['count']),
+                         (235, 230, 240, 240, 2))
+        self.assertEqual(resp.data['count'], 2)
+
+    def test_auto_picks_coarsest_for_window(self):
+        resp = self._get(resolution='auto', start_time='2026-08-01', end_time='2026-10-01')
+        self.assertEqual(resp.data['resolution'], 'day')
+        self.assertEqual([r['collected_at'] for r in resp.data['results']],
+                         ['2026-09-01 00:00:00', '2026-09-20 00:00:00'])
+
+        resp = self._get(resolution='auto', start_time='2026-09-01', end_time='2026-09-02')
+        self.assertEqual(resp.data['resolution'], 'raw')
+        self.assertEqual(resp.data['count'], 1)
+
+    def test_default_and_invalid_resolution(self):
+        resp = self._get()
+        self.assertEqual(resp.data['resolution'], 'raw')
+        self.assertEqual([r['value'] for r in resp.data['results']], [230, 250])
+        self.assertEqual(self._get(resolution='week').status_code, 400)
@@ -0,0 +1,231 @@
+"""
+LatestDataWriter（PLCLatestData 合并写入阶段）测试
+
+覆盖范围：
+  - 按 (specific_part, param_name) 去重，delta 设备按 specific_part 去重
+  - 达到 batch_size 立即刷新、不足时按 flush_ms 刷新、stop 时刷新剩余记录
+  - 连接类错误重建连接后重试一次；其他错误按设备二分重试，只丢弃出错设备的记录
+  - PLCLatestDataHandler(writer=...) 只提交不写库；写入线程未启动时同步写库
+  - 重试时失败的尝试整体回滚：汇总不重复合并，游标与推送只在提交后生效
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_latest_data_writer --settings=freearkweb.test_settings
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, tag
+
+from api.latest_data_writer import LatestDataWriter
+import api.mqtt_handlers as _handlers_module
+from api.models import DeviceParamHistory, DeviceParamRollup, PLCLatestData
+from api.mqtt_handlers import PLCLatestDataHandler
+from api.tests.test_plc_latest import DEVICE, TS, _make_payload
+
+
+class _RecordingHandler:
+    """记录每次 _persist 调用的替身 handler，可注入失败"""
+
+    def __init__(self, errors=(), bad_parts=()):
+        self.calls = []
+        self.errors = list(errors)
+        self.bad_parts = set(bad_parts)
+        self.persisted = threading.Event()
+
+    def _persist(self, records, delta_devices):
+        if self.errors:
+            raise self.errors.pop(0)
+        if any(r['specific_part'] in self.bad_parts for r in records):
+            raise ValueError('bad value')
+        self.calls.append((records, delta_devices))
+        self.persisted.set()
+
+
+def _rec(specific_part, param_name, value):
+    return {'specific_part': specific_part, 'param_name': param_name, 'value': value}
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@tag('unit')
+class TestLatestDataWriter(SimpleTestCase):
+
+    def _started(self, handler, **kwargs):
+        writer = LatestDataWriter(handler, **kwargs)
+        writer.start()
+        self.addCleanup(writer.stop)
+        return writer
+
+    def test_merges_duplicate_keys_keeping_latest(self):
+        handler = _RecordingHandler()
+        writer = self._started(handler, batch_size=100, flush_ms=60000)
+
+        writer.submit([_rec('A', 'p1', 1), _rec('A', 'p2', 1)])
+        writer.submit([_rec('A', 'p1', 2), _rec('B', 'p1', 3)], [('A', None, frozenset())])
+        writer.submit([], [('A', None, frozenset(['p2']))])
+        self.assertEqual(writer.flush(), 3)
+
+        records, delta_devices = handler.calls[0]
+        self.assertEqual(
+            sorted((r['specific_part'], r['param_name'], r['value']) for r in records),
+            [('A', 'p1', 2), ('A', 'p2', 1), ('B', 'p1', 3)],
+        )
+        self.assertEqual(delta_devices, [('A', None, frozenset(['p2']))])
+        snap = writer.snapshot()
+        self.assertEqual((snap['records_in'], snap['records_merged'], snap['records_flushed']), (4, 1, 3))
+        self.assertEqual(snap['pending'], 0)
+
+    def test_flushes_when_batch_size_reached(self):
+        handler = _RecordingHandler()
+        writer = self._started(handler, batch_size=3, flush_ms=60000)
+
+        writer.submit([_rec('A', 'p1', 1), _rec('A', 'p2', 1)])
+        self.assertFalse(handler.persisted.wait(0.1))
+        writer.submit([_rec('A', 'p3', 1)])
+        self.assertTrue(handler.persisted.wait(2))
+        self.assertEqual(len(handler.calls[0][0]), 3)
+
+    def test_flushes_after_flush_ms(self):
+        handler = _RecordingHandler()
+        writer = self._started(handler, batch_size=1000, flush_ms=50)
+
+        t_submit = time.monotonic()
+        writer.submit([_rec('A', 'p1', 1)])
+        self.assertTrue(handler.persisted.wait(2))
+        self.assertGreaterEqual(time.monotonic() - t_submit, 0.04)
+        self.assertTrue(_wait_for(lambda: writer.snapshot()['flushes'] == 1))
+        snap = writer.snapshot()
+        self.assertEqual((snap['last_batch_size'], snap['avg_batch_size'], snap['max_batch_size']), (1, 1.0, 1))
+        self.assertIn('last_flush_ms', snap)
+        self.assertIn('avg_flush_ms', snap)
+
+    def test_stop_flushes_pending_records(self):
+        handler = _RecordingHandler()
+        writer = LatestDataWriter(handler, batch_size=1000, flush_ms=60000)
+        writer.start()
+        writer.submit([_rec('A', 'p1', 1)])
+        writer.stop()
+        self.assertEqual(len(handler.calls), 1)
+        self.assertFalse(writer.snapshot()['running'])
+
+    def test_connection_error_reconnects_and_retries_once(self):
+        reconnects = []
+        handler = _RecordingHandler(errors=[ConnectionResetError('reset')])
+        writer = LatestDataWriter(
+            handler, is_connection_error=lambda e: isinstance(e, ConnectionResetError),
+            reconnect=lambda: reconnects.append(1),
+        )
+        writer.start()
+        self.addCleanup(writer.stop)
+        writer.submit([_rec('A', 'p1', 1)])
+        writer.flush()
+        self.assertEqual(reconnects, [1])
+        self.assertEqual(len(handler.calls), 1)
+        self.assertEqual(writer.snapshot()['flush_errors'], 0)
+
+    def test_other_errors_drop_only_bad_device(self):
+        handler = _RecordingHandler(bad_parts={'C'})
+        writer = self._started(handler, flush_ms=60000)
+        writer.submit([_rec(sp, p, 1) for sp in 'ABCD' for p in ('p1', 'p2')],
+                      [('B', None, frozenset()), ('C', None, frozenset())])
+        writer.flush()
+
+        written = [(r['specific_part'], r['param_name']) for records, _ in handler.calls for r in records]
+        self.assertEqual(sorted(written), [(sp, p) for sp in 'ABD' for p in ('p1', 'p2')])
+        self.assertEqual(sorted(d[0] for _, deltas in handler.calls for d in deltas), ['B'])
+        snap = writer.snapshot()
+        self.assertEqual((snap['flush_errors'], snap['records_dropped'], snap['records_flushed']), (1, 2, 6))
+
+    def test_connection_error_after_retry_drops_batch(self):
+        handler = _RecordingHandler(errors=[ConnectionResetError('reset'), ConnectionResetError('reset')])
+        writer = LatestDataWriter(
+            handler, is_connection_error=lambda e: isinstance(e, ConnectionResetError), reconnect=lambda: None,
+        )
+        writer.start()
+        self.addCleanup(writer.stop)
+        writer.submit([_rec('A', 'p1', 1), _rec('B', 'p1', 1)])
+        writer.flush()
+        snap = writer.snapshot()
+        self.assertEqual((snap['flush_errors'], snap['records_dropped'], snap['flushes']), (1, 2, 0))
+        self.assertEqual(handler.calls, [])
+
+
+@tag('unit')
+class TestHandlerWithWriter(TestCase):
+
+    def test_handler_submits_instead_of_writing(self):
+        handler = _RecordingHandler()
+        writer = LatestDataWriter(handler, flush_ms=60000)
+        writer.start()
+        self.addCleanup(writer.stop)
+
+        PLCLatestDataHandler(writer=writer).handle('t', _make_payload(DEVICE, {
+            'indoor_temperature': (235, True, TS),
+            'indoor_humidity': (55, False, TS),
+        }))
+        self.assertFalse(PLCLatestData.objects.exists())
+        self.assertEqual(writer.snapshot()['pending'], 1)
+
+    def test_writer_not_running_writes_synchronously(self):
+        writer = LatestDataWriter(PLCLatestDataHandler())
+        PLCLatestDataHandler(writer=writer).handle('t', _make_payload(DEVICE, {
+            'indoor_temperature': (235, True, TS),
+        }))
+        self.assertEqual(PLCLatestData.objects.get(specific_part=DEVICE).value, 235)
+
+
+class _CapturingWriter:
+    """只收集 handler 提交的记录，由测试直接调用 LatestDataWriter._write"""
+
+    def __init__(self):
+        self.records, self.delta_devices = [], []
+
+    def submit(self, records, delta_devices=()):
+        self.records.extend(records)
+        self.delta_devices.extend(delta_devices)
+
+
+@tag('integration')
+class TestRetryIsTransactional(TransactionTestCase):
+    """重试 / 二分重跑 _persist 时，失败的尝试整体回滚：汇总不重复合并、游标与推送只在提交后生效"""
+
+    def setUp(self):
+        _handlers_module._general_hist_last_hour.clear()
+        self.addCleanup(_handlers_module._general_hist_last_hour.clear)
+
+    def test_history_failure_rolls_back_rollups_before_retry(self):
+        capture = _CapturingWriter()
+        handler = PLCLatestDataHandler(writer=capture)
+        for device in ('1-1-1-101', 'BAD'):
+            handler.handle('t', _make_payload(device, {'indoor_temperature': (235, True, TS)}))
+
+        original = DeviceParamHistory.objects.bulk_create
+
+        def failing_bulk_create(objs, *args, **kwargs):
+            if any(obj.specific_part == 'BAD' for obj in objs):
+                raise IntegrityError('bad history row')
+            return original(objs, *args, **kwargs)
+
+        writer = LatestDataWriter(PLCLatestDataHandler())
+        with patch.object(DeviceParamHistory.objects, 'bulk_create', side_effect=failing_bulk_create), \
+                patch('api.mqtt_handlers.realtime_publisher') as publisher:
+            writer._write(capture.records, capture.delta_devices)
+
+        rollup = DeviceParamRollup.objects.get(specific_part='1-1-1-101', resolution='hour')
+        self.assertEqual(rollup.sample_count, 1)
+        self.assertFalse(DeviceParamRollup.objects.filter(specific_part='BAD').exists())
+        self.assertFalse(PLCLatestData.objects.filter(specific_part='BAD').exists())
+        self.assertEqual(DeviceParamHistory.objects.filter(specific_part='1-1-1-101').count(), 1)
+        # 失败的尝试不推进历史游标、不推送
+        self.assertNotIn(('BAD', 'indoor_temperature'), _handlers_module._general_hist_last_hour)
+        pushed = [r['specific_part'] for call in publisher.publish.call_args_list for r in call.args[0]]
+        self.assertEqual(pushed, ['1-1-1-101'])
+        self.assertEqual(writer.snapshot()['records_dropped'], 1)
@@ -0,0 +1,98 @@
+"""
+MQTT 批量信封测试套件
+
+背景：
+  datacollection 在 output_config 中开启 mqtt.publish_mode='batch' 后，每个楼栋的采集结果
+  按大小上限打包为多设备信封，发布到 {prefix}batch/{energy|general}/{楼栋}：
+    {"__batch__": 1, "building": ..., "seq": i, "total": n, "devices": {device_id: device_info, ...}}
+
+覆盖：
+  - on_message 按主题中的 batch/energy、batch/general 路由队列（不按大小判断）
+  - process_message 识别信封，调用各 handler 的 handle_batch（整批入库）
+  - 非信封消息仍走 handle（单设备格式不受影响）
+  - 紧凑格式（0xC1 头）按 energy 标志位路由，_dispatch 解码后走同一 handler 流程
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_mqtt_batch_envelope --verbosity=2
+"""
+from unittest.mock import MagicMock
+
+import msgpack
+from django.test import SimpleTestCase, tag
+
+from api.mqtt_consumer import MQTTConsumer, _batch_devices
+
+PREFIX = '/datacollection/plc/to/collector/'
+DEVICES = {
+    '3-1-7-702': {'data': {'total_hot_quantity': {'value': 1, 'success': True}}},
+    '3-1-7-703': {'data': {'total_hot_quantity': {'value': 2, 'success': True}}},
+}
+ENVELOPE = {'__batch__': 1, 'building': 'all', 'seq': 0, 'total': 1, 'devices': DEVICES}
+
+
+def _msg(topic, payload=b'{}'):
+    msg = MagicMock()
+    msg.topic = topic
+    msg.payload = payload
+    msg.qos = 0
+    return msg
+
+
+@tag('unit')
+class TestBatchEnvelopeRouting(SimpleTestCase):
+
+    def test_batch_topics_route_by_kind_not_size(self):
+        consumer = MQTTConsumer()
+        big = b'x' * 100000
+        consumer.on_message(None, None, _msg(PREFIX + 'batch/energy/all', big))
+        consumer.on_message(None, None, _msg(PREFIX + 'batch/general/all', b'{}'))
+        self.assertEqual(consumer._energy_queue.qsize(), 1)
+        self.assertEqual(consumer._general_queue.qsize(), 1)
+        self.assertEqual(consumer._energy_queue.get_nowait()[0], PREFIX + 'batch/energy/all')
+
+    def test_compact_payload_routes_by_energy_flag(self):
+        consumer = MQTTConsumer()
+        consumer.on_message(None, None, _msg(PREFIX + '3-1-7-702', b'\xc1\x01\x01' + b'x' * 5000))
+        consumer.on_message(None, None, _msg(PREFIX + '3-1-7-702', b'\xc1\x01\x00'))
+        self.assertEqual(consumer._energy_queue.qsize(), 1)
+        self.assertEqual(consumer._general_queue.qsize(), 1)
+
+    def test_batch_devices_detection(self):
+        self.assertEqual(_batch_devices(ENVELOPE), DEVICES)
+        self.assertIsNone(_batch_devices({'3-1-7-702': DEVICES['3-1-7-702']}))
+        self.assertIsNone(_batch_devices([1, 2]))
+
+
+@tag('unit')
+class TestBatchEnvelopeDispatch(SimpleTestCase):
+
+    def _consumer_with_mock_handlers(self):
+        consumer = MQTTConsumer()
+        handlers = [MagicMock(), MagicMock()]
+        consumer.energy_handlers = handlers
+        return consumer, handlers
+
+    def test_envelope_goes_to_handle_batch(self):
+        consumer, handlers = self._consumer_with_mock_handlers()
+        consumer.process_message(PREFIX + 'batch/energy/all', ENVELOPE)
+        for handler in handlers:
+            handler.handle_batch.assert_called_once_with(PREFIX + 'batch/energy/all', DEVICES, 'all')
+            handler.handle.assert_not_called()
+
+    def test_compact_envelope_dispatched_to_handle_batch(self):
+        consumer, handlers = self._consumer_with_mock_handlers()
+        doc = {'v': 1, 'b': 'all', 's': 0, 'n': 1, 'p': ['total_hot_quantity'],
+               'd': [['3-1-7-702', 'ip', 'ts', None, [1], b'\x00', []]]}
+        payload = b'\xc1\x01\x01' + msgpack.packb(doc, use_bin_type=True)
+        consumer._dispatch(PREFIX + 'batch/energy/all', payload)
+        devices = handlers[0].handle_batch.call_args.args[1]
+        self.assertEqual(devices['3-1-7-702']['data']['total_hot_quantity']['value'], 1)
+
+    def test_single_device_payload_still_uses_handle(self):
+        consumer, handlers = self._consumer_with_mock_handlers()
+        payload = {'3-1-7-702': DEVICES['3-1-7-702']}
+        consumer.process_message(PREFIX + '3-1-7-702', payload)
+        for handler in handlers:
+            handler.handle.assert_called_once()
+            handler.handle_batch.assert_not_called()
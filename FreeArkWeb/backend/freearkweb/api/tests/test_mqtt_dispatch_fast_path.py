@@ -0,0 +1,83 @@
+"""
+MQTTConsumer._dispatch 解析快速路径测试
+
+覆盖：
+  - JSON 直接从 bytes 解析（orjson / 未安装时标准库 json），结果与原文本路径一致
+  - 非 UTF-8、格式错误的负载回退到文本解码 + _safe_json_parse 修复
+  - payload 摘要只在 DEBUG 开启时生成
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_mqtt_dispatch_fast_path --verbosity=2
+"""
+import json
+import logging
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, tag
+
+import api.mqtt_consumer as consumer_module
+from api.mqtt_consumer import MQTTConsumer
+
+TOPIC = '/datacollection/plc/to/collector/3-1'
+PAYLOAD = {
+    '3-1-7-702': {
+        'PLC IP地址': '192.168.7.83',
+        'timestamp': '2026-04-18 10:42:55',
+        'data': {
+            'total_hot_quantity': {'value': 12, 'success': True, 'message': '读取成功',
+                                   'timestamp': '2026-04-18 10:42:55'},
+            'indoor_temperature': {'value': None, 'success': False, 'message': '读取失败',
+                                   'timestamp': '2026-04-18 10:42:55'},
+        },
+    }
+}
+
+
+@tag('unit')
+class TestDispatchFastPath(SimpleTestCase):
+
+    def setUp(self):
+        self.consumer = MQTTConsumer()
+        self.handler = MagicMock()
+        self.consumer.energy_handlers = [self.handler]
+
+    def _dispatched_payload(self, payload_bytes):
+        self.consumer._dispatch(TOPIC, payload_bytes)
+        self.handler.handle.assert_called_once()
+        return self.handler.handle.call_args.args[1]
+
+    def test_bytes_parsed_directly(self):
+        payload_bytes = json.dumps(PAYLOAD, ensure_ascii=False).encode('utf-8')
+        self.assertEqual(self._dispatched_payload(payload_bytes), PAYLOAD)
+
+    def test_stdlib_json_when_orjson_missing(self):
+        payload_bytes = json.dumps(PAYLOAD, ensure_ascii=False).encode('utf-8')
+        with patch.object(consumer_module, 'orjson', None):
+            self.assertEqual(self._dispatched_payload(payload_bytes), PAYLOAD)
+
+    def test_non_utf8_payload_falls_back_to_latin1(self):
+        payload_bytes = b'{"3-1-7-702": {"PLC IP\xe5": "x", "data": {}}}'
+        self.assertIn('3-1-7-702', self._dispatched_payload(payload_bytes))
+
+    def test_malformed_json_uses_manual_repair(self):
+        payload_bytes = (b'{"3-1-7-702": {"PLC IP\xe5\x9c\xb0\xe5\x9d\x80": "192.168.7.83", '
+                         b'"data": {"total_hot_quantity": {"value": 12, "success": true, '
+                         b'"message": "ok" "timestamp": "2026-04-18 10:42:55"}}}')
+        payload = self._dispatched_payload(payload_bytes)
+        self.assertEqual(payload['3-1-7-702']['data']['total_hot_quantity']['value'], 12)
+
+    def test_unparseable_payload_is_dropped(self):
+        self.consumer._dispatch(TOPIC, b'not json at all')
+        self.handler.handle.assert_not_called()
+
+    def test_summary_only_built_when_debug_enabled(self):
+        payload_bytes = json.dumps(PAYLOAD).encode('utf-8')
+        with patch.object(consumer_module, '_log_payload_summary') as summary:
+            with patch.object(consumer_module.logger, 'isEnabledFor', return_value=False):
+                self.consumer._dispatch(TOPIC, payload_bytes)
+            summary.assert_not_called()
+            with patch.object(consumer_module.logger, 'isEnabledFor',
+                              side_effect=lambda level: level >= logging.DEBUG):
+                self.consumer._dispatch(TOPIC, payload_bytes)
+            summary.assert_called_once()
@@ -3,6 +3,8 @@ PLCLatestData 功能测试套件
 
 覆盖范围：
   - PLCLatestDataHandler.handle()：单元测试
+  - PLCLatestDataHandler / PLCDataHandler.handle_batch()：批量信封整批入库
+  - delta 消息：只 upsert 变化参数，刷新未变化参数的采集时间，跨小时补写历史
   - GET /api/plc-latest/ API：集成测试
 
 运行方式：
@@ -10,14 +12,15 @@ PLCLatestData 功能测试套件
     python manage.py test api.tests.test_plc_latest --verbosity=2
 """
 from datetime import datetime
+from unittest.mock import patch
 
-from django.test import TestCase, tag
+from django.test import TestCase, TransactionTestCase, tag
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
-from api.models import PLCLatestData, DeviceParamHistory, CustomUser
-from api.mqtt_handlers import PLCLatestDataHandler
+from api.models import PLCData, PLCLatestData, DeviceParamHistory, CustomUser
+from api.mqtt_handlers import PLCDataHandler, PLCLatestDataHandler
 import api.mqtt_handlers as _handlers_module
 
 
@@ -216,8 +219,9 @@ TS_H10B = '2026-04-18 10:15:00'  # 10点第二次（同小时）
 TS_H11  = '2026-04-18 11:05:00'  # 11点（新小时）
 
 
+# 历史小时游标在事务提交后推进（_persist 的 on_commit），用例需真实提交
 @tag('unit')
-class TestHistoryHourlyDedup(TestCase):
+class TestHistoryHourlyDedup(TransactionTestCase):
     """验证 _write_history 对 general 与 energy 参数的每小时去重逻辑（energy 自 v0.5.4 P1-1 起）"""
 
     def setUp(self):
@@ -313,6 +317,119 @@ class TestHistoryHourlyDedup(TestCase):
             specific_part=DEVICE, param_name='living_room_temperature').count(), 1)
 
 
+# ---------------------------------------------------------------------------
+# 单元测试：批量信封 handle_batch
+# ---------------------------------------------------------------------------
+
+def _make_devices(*device_params):
+    """把多个 _make_payload 结果合并成批量信封的 devices 字典"""
+    devices = {}
+    for device_id, params in device_params:
+        devices.update(_make_payload(device_id, params))
+    return devices
+
+
+@tag('unit')
+class TestHandleBatch(TestCase):
+    """批量信封中的多设备数据整批 upsert / 整批保存"""
+
+    def setUp(self):
+        _handlers_module._general_hist_last_hour.clear()
+        _handlers_module._energy_hist_last_hour.clear()
+
+    def test_latest_handler_upserts_all_devices_once(self):
+        devices = _make_devices(
+            ('3-1-7-702', {'living_room_temperature': (245, True, TS), 'living_room_switch': (1, True, TS)}),
+            ('3-1-7-703', {'living_room_temperature': (230, True, TS), 'living_room_switch': (None, False, TS)}),
+            ('3-1-7-704', {'living_room_temperature': (None, False, TS)}),
+        )
+        handler = PLCLatestDataHandler()
+        with patch.object(handler, '_bulk_upsert', wraps=handler._bulk_upsert) as upsert:
+            handler.handle_batch('/datacollection/plc/to/collector/batch/general/all', devices)
+
+        upsert.assert_called_once()
+        self.assertEqual(PLCLatestData.objects.count(), 3)
+        self.assertEqual(
+            PLCLatestData.objects.get(specific_part='3-1-7-703', param_name='living_room_temperature').value, 230
+        )
+        self.assertEqual(DeviceParamHistory.objects.count(), 3)
+
+    def test_energy_handler_saves_all_devices_once(self):
+        devices = _make_devices(
+            ('3-1-7-702', {'total_hot_quantity': (1000, True, TS), 'total_cold_quantity': (2000, True, TS)}),
+            ('3-1-7-703', {'total_hot_quantity': (1500, True, TS), 'total_cold_quantity': (None, False, TS)}),
+        )
+        handler = PLCDataHandler()
+        with patch.object(handler, 'batch_save_plc_data', wraps=handler.batch_save_plc_data) as save:
+            handler.handle_batch('/datacollection/plc/to/collector/batch/energy/all', devices, 'all')
+
+        save.assert_called_once()
+        self.assertEqual(PLCData.objects.count(), 3)
+        self.assertEqual(PLCData.objects.get(specific_part='3-1-7-703', energy_mode='制热').value, 1500)
+
+
+# ---------------------------------------------------------------------------
+# 单元测试：delta 消息
+# ---------------------------------------------------------------------------
+
+def _make_delta(device_id, params, ts, online=True):
+    payload = _make_payload(device_id, params)
+    payload[device_id].update({'timestamp': ts, 'delta': True, 'online': online})
+    return payload
+
+
+# 历史小时游标在事务提交后推进（_persist 的 on_commit），用例需真实提交
+@tag('unit')
+class TestDeltaApply(TransactionTestCase):
+    """delta 消息只含变化参数与失败参数，未出现的参数视为未变化"""
+
+    def setUp(self):
+        _handlers_module._general_hist_last_hour.clear()
+        _handlers_module._energy_hist_last_hour.clear()
+        self.handler = PLCLatestDataHandler()
+        self.handler.handle('/topic/' + DEVICE, _make_payload(DEVICE, {
+            'living_room_temperature': (245, True, TS_H10A),
+            'living_room_switch': (1, True, TS_H10A),
+            'bedroom_temperature': (230, True, TS_H10A),
+        }))
+
+    def _row(self, param_name):
+        return PLCLatestData.objects.get(specific_part=DEVICE, param_name=param_name)
+
+    def test_delta_updates_changed_and_refreshes_unchanged(self):
+        self.handler.handle('/topic/' + DEVICE, _make_delta(DEVICE, {
+            'living_room_temperature': (250, True, TS_H10B),
+            'bedroom_temperature': (None, False, TS_H10B),
+        }, TS_H10B))
+
+        self.assertEqual(self._row('living_room_temperature').value, 250)
+        # 未出现的参数：值不变，采集时间刷新
+        switch = self._row('living_room_switch')
+        self.assertEqual(switch.value, 1)
+        self.assertEqual(switch.collected_at, datetime(2026, 4, 18, 10, 15))
+        # 本轮失败的参数：值与采集时间都不变
+        bedroom = self._row('bedroom_temperature')
+        self.assertEqual(bedroom.value, 230)
+        self.assertEqual(bedroom.collected_at, datetime(2026, 4, 18, 10, 5))
+
+    def test_delta_in_new_hour_carries_unchanged_history_forward(self):
+        self.handler.handle('/topic/' + DEVICE, _make_delta(DEVICE, {
+            'living_room_temperature': (250, True, TS_H11),
+        }, TS_H11))
+
+        hour_11 = DeviceParamHistory.objects.filter(
+            specific_part=DEVICE, collected_at=datetime(2026, 4, 18, 11, 5)
+        )
+        self.assertEqual(
+            dict(hour_11.values_list('param_name', 'num_value')),
+            {'living_room_temperature': 250, 'living_room_switch': 1, 'bedroom_temperature': 230},
+        )
+
+        # 同一小时的下一条 delta 不再补写
+        self.handler.handle('/topic/' + DEVICE, _make_delta(DEVICE, {}, '2026-04-18 11:15:00'))
+        self.assertEqual(DeviceParamHistory.objects.filter(specific_part=DEVICE).count(), 6)
+
+
 # ---------------------------------------------------------------------------
 # 集成测试：GET /api/plc-latest/
 # ---------------------------------------------------------------------------
@@ -0,0 +1,167 @@
+"""
+查询向量服务（api/query_embedding.py）测试
+
+覆盖范围：
+  - 归一化文本（全角 / 多余空白）命中同一缓存条目，只 embed 一次
+  - 同一文本的并发请求合并为一次远端调用
+  - 不同文本的并发请求在窗口期内合并为一次 embed_texts（微批）；
+    后端无批量端点（supports_batch=False，如 doubao 多模态）时各请求逐条 embed_query，不进微批
+  - 语义路由与 search_rag 同一问题共用一次 embedding
+  - RAG_EMBEDDING_API_STYLE='fake' 离线伪向量：确定性、字面相近则余弦更高
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_query_embedding --settings=freearkweb.test_settings
+"""
+import threading
+from unittest.mock import patch
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings, tag
+
+from api import query_embedding
+from api.query_embedding import QueryEmbeddingService, normalize_query
+from api.rag_service import RagEmbedder, _HashingEmbeddings
+
+
+class _CountingEmbedder:
+    """离线 embedder：记录远端调用（embed_query / embed_texts），可选阻塞以制造并发。"""
+
+    def __init__(self, gate=None, supports_batch=True):
+        self.supports_batch = supports_batch
+        self._fake = _HashingEmbeddings(dim=64)
+        self.query_calls = []
+        self.batch_calls = []
+        self._gate = gate
+
+    def embed_query(self, text):
+        if self._gate is not None:
+            self._gate.wait(5)
+        self.query_calls.append(text)
+        return np.array(self._fake.embed_query(text), dtype=np.float32)
+
+    def embed_texts(self, texts):
+        self.batch_calls.append(list(texts))
+        return [np.array(v, dtype=np.float32) for v in self._fake.embed_documents(texts)]
+
+
+def _run_concurrently(fn, args_list):
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(i, args):
+        barrier.wait(5)
+        results[i] = fn(*args)
+
+    threads = [threading.Thread(target=worker, args=(i, a)) for i, a in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results
+
+
+@tag('unit')
+class TestQueryEmbeddingService(SimpleTestCase):
+
+    def test_normalized_text_shares_cache_entry(self):
+        embedder = _CountingEmbedder()
+        service = QueryEmbeddingService(embedder=embedder, persist=False, batch_window_ms=0)
+        a = service.embed_query('  能耗   查询 ')
+        b = service.embed_query('能耗 查询')
+        c = service.embed_query('能耗　查询')   # 全角空格经 NFKC 归一
+
+        self.assertEqual(normalize_query(' ＡＢ  c '), 'AB c')
+        self.assertEqual(embedder.query_calls, ['能耗 查询'])
+        np.testing.assert_array_equal(a, b)
+        np.testing.assert_array_equal(a, c)
+        self.assertEqual(service.snapshot()['remote_texts'], 1)
+
+    def test_concurrent_identical_queries_coalesce(self):
+        gate = threading.Event()
+        embedder = _CountingEmbedder(gate=gate)
+        service = QueryEmbeddingService(embedder=embedder, persist=False, batch_window_ms=0)
+        threading.Timer(0.2, gate.set).start()
+
+        results = _run_concurrently(service.embed_query, [('同一个问题',)] * 4)
+
+        self.assertEqual(len(embedder.query_calls), 1)
+        for v in results[1:]:
+            np.testing.assert_array_equal(v, results[0])
+
+    def test_concurrent_distinct_queries_micro_batched(self):
+        embedder = _CountingEmbedder()
+        service = QueryEmbeddingService(embedder=embedder, persist=False, batch_window_ms=200)
+        texts = [f'问题{i}' for i in range(5)]
+
+        results = _run_concurrently(service.embed_query, [(t,) for t in texts])
+
+        self.assertEqual(embedder.query_calls, [])
+        self.assertEqual(len(embedder.batch_calls), 1)
+        self.assertEqual(sorted(embedder.batch_calls[0]), texts)
+        fake = _HashingEmbeddings(dim=64)
+        for text, vec in zip(texts, results):
+            np.testing.assert_allclose(vec, fake.embed_query(text), rtol=1e-6)
+
+    def test_no_batch_endpoint_embeds_each_query_without_batcher(self):
+        embedder = _CountingEmbedder(supports_batch=False)
+        service = QueryEmbeddingService(embedder=embedder, persist=False, batch_window_ms=200)
+        texts = [f'问题{i}' for i in range(5)]
+
+        results = _run_concurrently(service.embed_query, [(t,) for t in texts])
+
+        self.assertEqual(embedder.batch_calls, [])
+        self.assertEqual(sorted(embedder.query_calls), texts)
+        self.assertEqual(service.snapshot()['batcher']['batches'], 0)
+        fake = _HashingEmbeddings(dim=64)
+        for text, vec in zip(texts, results):
+            np.testing.assert_allclose(vec, fake.embed_query(text), rtol=1e-6)
+
+    def test_embed_error_propagates_and_is_not_cached(self):
+        embedder = _CountingEmbedder()
+        service = QueryEmbeddingService(embedder=embedder, persist=False, batch_window_ms=0)
+        with patch.object(embedder, 'embed_query', side_effect=RuntimeError('embed down')):
+            with self.assertRaises(RuntimeError):
+                service.embed_query('问题')
+        service.embed_query('问题')
+        self.assertEqual(embedder.query_calls, ['问题'])
+
+
+@tag('unit')
+class TestSharedAcrossRouterAndSearch(SimpleTestCase):
+
+    def test_router_and_search_embed_once(self):
+        from api.langgraph_chat.semantic_router import SemanticRouter
+        from api.rag_service import search_rag
+
+        service = QueryEmbeddingService(persist=False, batch_window_ms=0)
+        router = SemanticRouter()
+        router._exemplars = {'energy': np.ones((1, 4), dtype=np.float32) / 2}
+        router._loaded = True
+        with patch.object(query_embedding, '_service', service), \
+                patch.object(RagEmbedder, 'embed_query', return_value=np.ones(4, dtype=np.float32)) as m, \
+                patch('api.rag_service.rag_vector_cache.search', return_value=[]):
+            self.assertEqual(router._route_sync('本月能耗是多少'), 'energy')
+            self.assertFalse(search_rag('本月能耗是多少')['degraded'])
+        m.assert_called_once_with('本月能耗是多少')
+
+
+@tag('unit')
+class TestFakeEmbeddingStyle(SimpleTestCase):
+
+    @override_settings(RAG_EMBEDDING_API_STYLE='fake')
+    def test_fake_style_is_deterministic_and_offline(self):
+        embedder = RagEmbedder()
+        base = embedder.embed_query('冷凝水管道漏水')
+        self.assertEqual(base.shape, (1024,))
+        np.testing.assert_array_equal(base, RagEmbedder().embed_query('冷凝水管道漏水'))
+
+        near, far = embedder.embed_texts(['冷凝水管道', '本月电费账单'])
+        self.assertGreater(float(base @ near), float(base @ far))
+
+    def test_supports_batch_by_style(self):
+        with override_settings(RAG_EMBEDDING_API_STYLE='fake'):
+            self.assertTrue(RagEmbedder().supports_batch)
+        with override_settings(RAG_EMBEDDING_API_STYLE='doubao_multimodal',
+                               RAG_EMBEDDING_BASE_URL='http://127.0.0.1:9'):
+            self.assertFalse(RagEmbedder().supports_batch)
@@ -0,0 +1,97 @@
+"""
+RAG 混合检索（api/rag_lexical_index.py + RagVectorCache.search / lexical_lookup）测试
+
+覆盖范围：
+  - 分词：E-12 / E12 / e_12 互相命中；代码型标记识别（纯数字、纯英文不算）
+  - BM25：稀有词排前；墓碑行不入倒排；增量重建复用未变 chunk 的分词结果
+  - search_rag 字面短路：故障码精确命中时不调 embedding；未命中时照常 embed
+  - 混合融合：字面命中把余弦略低的 chunk 提前；无 query_text 时结果与纯向量一致
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_rag_hybrid_search --settings=freearkweb.test_settings
+"""
+from unittest.mock import patch
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+
+from api.models_rag import RagChunk, RagDocument
+from api.rag_lexical_index import LexicalIndex, code_tokens, tokenize
+from api.rag_service import RagEmbedder, RagVectorCache, search_rag
+
+
+@tag('unit')
+class TestLexicalIndex(SimpleTestCase):
+
+    def test_code_variants_share_tokens(self):
+        self.assertIn('e12', tokenize('故障E-12：通讯异常'))
+        self.assertIn('e12', tokenize('ｅ_12'))
+        self.assertEqual(code_tokens('E-12 和 indoor_temperature 是什么，26 度 pm'),
+                         {'e12', 'indoortemperature'})
+        self.assertEqual(tokenize('温度 26.5'), ['26.5', '温度'])
+
+    def test_bm25_ranking_and_tombstones(self):
+        texts = ['E12 室外机通讯故障', '室外机 E13 过流保护', '室外机维护保养说明', 'E12 E12 复位方法']
+        index = LexicalIndex.build([1, 2, 3, 4], texts)
+        rows = [r for r, _ in index.search('E12', 10)]
+        self.assertEqual(sorted(rows), [0, 3])
+        self.assertEqual(index.rows_with_codes({'e12'}).tolist(), [0, 3])
+
+        alive = np.array([False, True, True, True])
+        pruned = LexicalIndex.build([1, 2, 3, 4], texts, alive, previous=index)
+        self.assertEqual([r for r, _ in pruned.search('E12', 10)], [3])
+        self.assertIs(pruned.docs[4][1], index.docs[4][1])   # 分词结果复用，未重新分词
+
+
+def _add_chunks(name, rows):
+    doc = RagDocument.objects.create(file_name=name, file_size=1, status='indexed')
+    RagChunk.objects.bulk_create([
+        RagChunk(document=doc, chunk_index=i, content=text,
+                 embedding=np.asarray(vec, dtype=np.float32).tobytes(), page_or_section=f'第{i + 1}段')
+        for i, (text, vec) in enumerate(rows)
+    ])
+
+
+@tag('integration')
+@override_settings(RAG_LEXICAL_WEIGHT=0.3, RAG_LEXICAL_SHORT_CIRCUIT=True)
+class TestHybridSearch(TestCase):
+
+    def setUp(self):
+        eye = np.eye(4, dtype=np.float32)
+        _add_chunks('fault_codes.docx', [
+            ('故障代码 E12：室外机与室内机通讯故障，检查通讯线', eye[0]),
+            ('故障代码 E13：压缩机过流保护', eye[1]),
+            ('新风机滤网每季度清洗一次', eye[0] * 0.95 + eye[2] * 0.05),
+        ])
+        self.cache = RagVectorCache()
+        self.cache.load()
+
+    def test_exact_code_short_circuits_embedding(self):
+        with patch('api.rag_service.rag_vector_cache', self.cache), \
+                patch.object(RagEmbedder, 'embed_query') as embed:
+            result = search_rag('E-12 是什么故障')
+        embed.assert_not_called()
+        self.assertFalse(result['degraded'])
+        self.assertEqual(len(result['chunks']), 1)
+        self.assertIn('E12', result['chunks'][0]['content'])
+        self.assertEqual(result['chunks'][0]['score'], 1.0)
+
+    def test_unmatched_code_falls_back_to_embedding(self):
+        with patch('api.rag_service.rag_vector_cache', self.cache), \
+                patch('api.query_embedding.embed_query', return_value=np.eye(4, dtype=np.float32)[1]) as embed:
+            result = search_rag('E99 故障')
+        embed.assert_called_once_with('E99 故障')
+        self.assertIn('E13', result['chunks'][0]['content'])
+        self.assertIsNone(self.cache.lexical_lookup('E99 故障'))
+
+    def test_lexical_hit_promotes_close_vector_match(self):
+        query = np.eye(4, dtype=np.float32)[0]
+        plain = self.cache.search(query, k=2, threshold=0.0)
+        self.assertIn('E12', plain[0]['content'])
+
+        hybrid = self.cache.search(query, k=2, threshold=0.0, query_text='滤网清洗周期')
+        self.assertIn('滤网', hybrid[0]['content'])
+        self.assertGreater(hybrid[0]['score'], 1.0)
+        self.assertEqual([r['content'] for r in self.cache.search(query, k=2, threshold=0.0)],
+                         [r['content'] for r in plain])
@@ -0,0 +1,180 @@
+"""
+RAG 分阶段入库流水线（RagIngestor + api/rag_ingest.py 检查点）测试
+
+覆盖范围：
+  - 向量化中途失败：已完成批次已落库、进度已记录、检查点保留；续跑不再解析、只补做剩余批次
+  - embedding 批次并发调用（RAG_INGEST_EMBED_CONCURRENCY）
+  - PDF 进程池逐页解析：结果按页序、逐页写检查点与进度；已解析页跳过
+  - retry 未附文件时从检查点续跑
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_rag_ingest_pipeline --settings=freearkweb.test_settings
+"""
+import io
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models_rag import RagChunk, RagDocument, RagImage
+from api.rag_ingest import IngestCheckpoint, resumable_document_ids
+from api.rag_service import ParsedChunk, RagIngestor, RagParser, resume_ingest
+
+_DOCX_BYTES = b"PK\x03\x04" + b"\x00" * 100
+
+
+def _vectors(texts):
+    return [np.full(4, len(t), dtype=np.float32) for t in texts]
+
+
+def _pdf_bytes(pages):
+    import fitz
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((50, 100), text)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+@tag('integration')
+class TestIngestCheckpointResume(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.work_dir = tmp.name
+        patcher = patch('api.rag_service.rag_vector_cache')
+        self.mock_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        png = b"\x89PNG\r\n\x1a\n" + b"\x01" * 64
+        self.parsed = [ParsedChunk(content=f'段落内容 {i}', page_or_section=f'段落 {i}') for i in range(45)]
+        self.parsed[3].img_bytes, self.parsed[3].img_size = png, len(png)
+
+    def test_failed_embedding_resumes_remaining_batches(self):
+        doc = RagDocument.objects.create(file_name='manual.docx', file_size=len(_DOCX_BYTES))
+
+        def second_batch_fails(texts):
+            if '段落内容 20' in texts:
+                raise RuntimeError('embedding 超时')
+            return _vectors(texts)
+
+        with override_settings(RAG_INGEST_WORK_DIR=self.work_dir, RAG_INGEST_EMBED_CONCURRENCY=1), \
+                patch('api.rag_service.RagParser.parse_docx', return_value=self.parsed) as parse, \
+                patch('api.rag_service.RagEmbedder.embed_texts', side_effect=second_batch_fails):
+            RagIngestor().ingest(doc.id, _DOCX_BYTES, '.docx')
+
+            doc.refresh_from_db()
+            self.assertEqual(doc.status, 'failed')
+            self.assertIn('批次 2', doc.error_message)
+            self.assertEqual((doc.chunks_total, doc.chunks_embedded), (45, 20))
+            self.assertEqual(RagChunk.objects.filter(document=doc).count(), 20)
+            self.assertEqual(resumable_document_ids(), [doc.id])
+
+        with override_settings(RAG_INGEST_WORK_DIR=self.work_dir), \
+                patch('api.rag_service.RagParser.parse_docx') as parse_again, \
+                patch('api.rag_service.RagEmbedder.embed_texts', side_effect=_vectors) as embed:
+            self.assertTrue(resume_ingest(doc.id, background=False))
+
+            parse_again.assert_not_called()   # 复用检查点中的解析结果
+            self.assertEqual(sorted(len(c.args[0]) for c in embed.call_args_list), [5, 20])
+            self.assertEqual(resumable_document_ids(), [])   # 成功后删除检查点
+
+        parse.assert_called_once()
+        doc.refresh_from_db()
+        self.assertEqual((doc.status, doc.chunk_count, doc.chunks_embedded), ('indexed', 45, 45))
+        indexes = list(RagChunk.objects.filter(document=doc).order_by('chunk_index')
+                       .values_list('chunk_index', flat=True))
+        self.assertEqual(indexes, list(range(45)))
+        self.assertEqual(RagImage.objects.filter(document=doc).count(), 1)   # 续跑复用已写图片
+        self.assertEqual(RagChunk.objects.get(document=doc, chunk_index=3).image_id,
+                         RagImage.objects.get(document=doc).id)
+        self.mock_cache.refresh.assert_called_once()
+
+    def test_embedding_batches_run_concurrently(self):
+        doc = RagDocument.objects.create(file_name='manual.docx', file_size=len(_DOCX_BYTES))
+        barrier = threading.Barrier(3, timeout=5)   # 三批必须同时在途才能通过
+
+        def gated(texts):
+            barrier.wait()
+            return _vectors(texts)
+
+        with override_settings(RAG_INGEST_EMBED_CONCURRENCY=3), \
+                patch('api.rag_service.RagParser.parse_docx', return_value=self.parsed), \
+                patch('api.rag_service.RagEmbedder.embed_texts', side_effect=gated):
+            RagIngestor().ingest(doc.id, _DOCX_BYTES, '.docx')
+
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'indexed', doc.error_message)
+        self.assertEqual(doc.chunk_count, 45)
+
+
+@tag('integration')
+class TestRetryResumesFromCheckpoint(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.work_dir = tmp.name
+        admin = get_user_model().objects.create_user(username='rag_admin', password='x', role='admin')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=admin).key)
+
+    @patch('api.views_rag.transaction.on_commit')
+    @patch('api.views_rag.resume_ingest')
+    def test_retry_without_file_uses_checkpoint(self, mock_resume, mock_commit):
+        mock_commit.side_effect = lambda fn: fn()
+        doc = RagDocument.objects.create(file_name='manual.pdf', file_size=1, status='failed',
+                                         error_message='embedding 超时')
+        with override_settings(RAG_INGEST_WORK_DIR=self.work_dir):
+            IngestCheckpoint.for_document(doc.id).save_source(b'%PDF-1.4', '.pdf')
+            resp = self.client.post(f'/api/rag/documents/{doc.id}/retry/')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['status'], 'pending')
+        self.assertIn('chunks_embedded', resp.data)
+        mock_resume.assert_called_once_with(doc.id)
+
+
+@tag('unit')
+class TestParallelPdfParse(SimpleTestCase):
+
+    def setUp(self):
+        try:
+            import fitz  # noqa: F401
+        except ImportError:
+            self.skipTest("PyMuPDF 未安装")
+
+    def test_process_pool_keeps_page_order(self):
+        pages = [f'page {i} content' for i in range(4)]
+        seen = []
+        chunks = RagParser().parse_pdf(_pdf_bytes(pages), workers=2,
+                                       on_page=lambda p, c, n: seen.append((p, n)))
+        self.assertEqual([c.content for c in chunks], pages)
+        self.assertEqual(sorted(seen), [(i, 4) for i in range(4)])
+
+    def test_done_pages_are_not_reparsed(self):
+        cached = [ParsedChunk(content='from checkpoint', page_or_section='第 1 页')]
+        seen = []
+        chunks = RagParser().parse_pdf(_pdf_bytes(['a', 'b']), done_pages={0: cached},
+                                       on_page=lambda p, c, n: seen.append(p))
+        self.assertEqual([c.content for c in chunks], ['from checkpoint', 'b'])
+        self.assertEqual(seen, [1])
+
+    def test_checkpoint_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cp = IngestCheckpoint(tmp, 7)
+            cp.save_source(b'%PDF', '.pdf')
+            cp.save_page(2, [ParsedChunk(content='x', page_or_section='第 3 页')])
+            self.assertEqual(cp.load_source(), (b'%PDF', '.pdf'))
+            self.assertEqual(cp.load_pages()[2][0].content, 'x')
+            cp.clear()
+            self.assertFalse(os.path.exists(cp.path))
+            self.assertIsNone(IngestCheckpoint('', 7).load_source())
@@ -0,0 +1,171 @@
+"""
+RAG 向量索引（api/rag_vector_index.py + RagVectorCache）测试
+
+覆盖范围：
+  - argpartition top-k 与全量排序一致；float16 / int8 量化后 top-1 不变、分数误差有界
+  - 墓碑行不参与检索；墓碑占比超过阈值时压缩
+  - 持久化往返：manifest + mmap 映射；仅墓碑变化时复用上一代向量文件
+  - 多进程共用目录：上一代文件被其他进程清理后不再复用；目录锁串行化写入与清理
+  - IVF 近似检索：聚类数据上查询已有行可召回自身
+  - RagVectorCache 增量同步：新 indexed 文档追加、删除文档打墓碑；
+    已有索引文件的新进程启动时只查一次 chunk id，不全量解码
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_rag_vector_index --settings=freearkweb.test_settings
+"""
+import os
+import tempfile
+import threading
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings, tag
+
+from api.models_rag import RagChunk, RagDocument
+from api.rag_service import RagVectorCache
+from api.rag_vector_index import VectorIndex, _dir_lock, fcntl, normalize_rows
+
+
+def _random_index(n=200, dim=32, dtype='float32', seed=0):
+    rng = np.random.default_rng(seed)
+    raw = rng.normal(size=(n, dim)).astype(np.float32)
+    meta = [{'content': f'c{i}'} for i in range(n)]
+    return raw, VectorIndex.from_raw(raw, np.arange(100, 100 + n), meta, dtype)
+
+
+@tag('unit')
+class TestVectorIndex(SimpleTestCase):
+
+    def test_top_k_matches_full_sort(self):
+        raw, index = _random_index()
+        query = normalize_rows(raw[:1])[0]
+        expected = np.argsort(normalize_rows(raw) @ query)[::-1][:5]
+        hits = index.top_k(query, 5)
+        self.assertEqual([i for i, _ in hits], expected.tolist())
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+
+    def test_quantized_dtypes_keep_ranking(self):
+        raw, exact = _random_index()
+        query = normalize_rows(raw[7:8])[0]
+        for dtype, tol in (('float16', 1e-2), ('int8', 5e-2)):
+            _, index = _random_index(dtype=dtype)
+            self.assertEqual(index.dtype, dtype)
+            hits = index.top_k(query, 3)
+            self.assertEqual(hits[0][0], 7)
+            self.assertAlmostEqual(hits[1][1], exact.top_k(query, 3)[1][1], delta=tol)
+
+    def test_tombstones_skipped_then_compacted(self):
+        raw, index = _random_index(n=20)
+        query = normalize_rows(raw[:1])[0]
+        index = index.with_changes({100}, None)   # chunk id 100 即第 0 行
+        self.assertEqual(index.rows, 20)
+        self.assertNotIn(0, [i for i, _ in index.top_k(query, 20)])
+        self.assertEqual(len(index.top_k(query, 20)), 19)
+
+        index = index.with_changes({101, 102, 103, 104, 105}, None)   # 6/20 > 25% → 压缩
+        self.assertEqual((index.rows, index.live_rows), (14, 14))
+        self.assertIsNone(index.alive)
+        self.assertEqual(index.meta[0]['content'], 'c6')
+
+    def test_save_open_roundtrip_with_mmap(self):
+        raw, index = _random_index(n=50, dtype='float16')
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = index.save(tmp)
+            opened, _ = VectorIndex.open(tmp)
+            self.assertIsInstance(opened.vectors, np.memmap)
+            self.assertEqual(opened.dtype, 'float16')
+            np.testing.assert_array_equal(opened.chunk_ids, index.chunk_ids)
+
+            # 仅墓碑变化：复用同一向量文件，manifest 记录墓碑
+            manifest2 = opened.with_changes({110}, None).save(tmp, manifest)
+            self.assertEqual(manifest2['vectors'], manifest['vectors'])
+            reopened, _ = VectorIndex.open(tmp)
+            self.assertEqual(reopened.live_rows, 49)
+            self.assertEqual(sorted(n for n in os.listdir(tmp) if n != '.lock'),
+                             sorted([manifest['vectors'], manifest['meta'], 'manifest.json']))
+
+    def test_reuse_skipped_when_other_process_cleaned_previous_files(self):
+        _, index_a = _random_index(n=20, seed=1)
+        _, index_b = _random_index(n=20, seed=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest_a = index_a.save(tmp)
+            self.assertIsInstance(index_a.vectors, np.memmap)
+            index_b.save(tmp)   # 另一进程写入新一代并清理掉 A 的文件
+
+            manifest = index_a.with_changes({100}, None).save(tmp, manifest_a)
+            self.assertNotEqual(manifest['vectors'], manifest_a['vectors'])
+            reopened, _ = VectorIndex.open(tmp)
+            self.assertEqual(reopened.live_rows, 19)
+            np.testing.assert_array_equal(np.asarray(reopened.vectors), np.asarray(index_a.vectors))
+
+    def test_save_waits_for_directory_lock(self):
+        if fcntl is None:
+            self.skipTest('平台无 fcntl')
+        _, index = _random_index(n=10)
+        with tempfile.TemporaryDirectory() as tmp:
+            with _dir_lock(tmp):
+                writer = threading.Thread(target=index.save, args=(tmp,))
+                writer.start()
+                writer.join(0.2)
+                self.assertTrue(writer.is_alive())
+                self.assertFalse(os.path.exists(os.path.join(tmp, 'manifest.json')))
+            writer.join(5)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'manifest.json')))
+
+    def test_ivf_recalls_existing_rows(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(8, 32)).astype(np.float32)
+        raw = np.repeat(centers, 50, axis=0) + 0.05 * rng.normal(size=(400, 32)).astype(np.float32)
+        index = VectorIndex.from_raw(raw, np.arange(400), [{}] * 400).with_ann(min_rows=100, nprobe=2)
+        self.assertIsNotNone(index.ivf)
+        for row in (0, 123, 399):
+            self.assertEqual(index.top_k(normalize_rows(raw[row:row + 1])[0], 1)[0][0], row)
+        self.assertIsNone(VectorIndex.from_raw(raw, np.arange(400), [{}] * 400).with_ann(0, 2).ivf)
+
+
+def _add_doc(name, vectors, status='indexed'):
+    doc = RagDocument.objects.create(file_name=name, file_size=1, status=status)
+    RagChunk.objects.bulk_create([
+        RagChunk(document=doc, chunk_index=i, content=f'{name}-{i}',
+                 embedding=np.asarray(v, dtype=np.float32).tobytes(), page_or_section=f'第{i + 1}段')
+        for i, v in enumerate(vectors)
+    ])
+    return doc
+
+
+@tag('integration')
+class TestRagVectorCacheSync(TestCase):
+
+    def setUp(self):
+        self.eye = np.eye(4, dtype=np.float32)
+
+    def test_incremental_sync_appends_and_tombstones(self):
+        doc_a = _add_doc('a.docx', [self.eye[0] * 3, self.eye[1]])
+        cache = RagVectorCache()
+        cache.load()
+        self.assertEqual(cache.search(self.eye[0], k=1)[0]['content'], 'a.docx-0')
+
+        _add_doc('b.docx', [self.eye[2]])
+        _add_doc('pending.docx', [self.eye[3]], status='parsing')
+        cache.sync()
+        self.assertEqual(cache._index.rows, 3)
+        self.assertEqual(cache.search(self.eye[2], k=1)[0]['source'], 'b.docx · 第1段')
+        self.assertEqual(cache.search(self.eye[3], k=1, threshold=0.5), [])
+
+        doc_a.delete()
+        cache.sync()
+        self.assertEqual(cache._index.live_rows, 1)
+        self.assertEqual([r['content'] for r in cache.search(self.eye[0], k=5, threshold=-1)], ['b.docx-0'])
+
+    def test_restart_maps_index_file_without_full_decode(self):
+        _add_doc('a.docx', [self.eye[0], self.eye[1]])
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(RAG_VECTOR_INDEX_DIR=tmp, RAG_VECTOR_INDEX_DTYPE='int8'):
+            RagVectorCache().load()
+
+            restarted = RagVectorCache()
+            with self.assertNumQueries(1):   # 只取 chunk id 做差量对齐
+                restarted.load()
+            self.assertIsInstance(restarted._vectors, np.memmap)
+            self.assertEqual(restarted._vectors.dtype, np.int8)
+            self.assertAlmostEqual(restarted.search(self.eye[1], k=1)[0]['score'], 1.0, places=2)
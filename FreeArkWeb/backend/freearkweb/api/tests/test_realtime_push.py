@@ -0,0 +1,199 @@
+"""
+实时参数推送测试（InMemoryChannelLayer，无需 Redis）
+
+覆盖范围：
+  - build_room_diffs / RealtimeParamsPublisher：按户聚合、批内去重、未变化参数不重复推送；
+    发送线程合并积压批次、队列满时丢弃并清空记忆
+  - /ws/devices/realtime/：无 token 拒绝；订阅下发当前全量值；PLCLatestDataHandler 写库后推送增量；
+    退订后不再推送；业主只能订阅 active 绑定的专有部分
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_realtime_push --settings=freearkweb.test_settings
+"""
+import asyncio
+import threading
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, tag
+from rest_framework.authtoken.models import Token
+
+from api.models import OwnerUserBinding, PLCLatestData
+from api.mqtt_handlers import PLCLatestDataHandler
+from api.realtime_push import RealtimeParamsPublisher, build_room_diffs, group_name, realtime_publisher
+from api.tests.test_owner_sprint2 import _make_owner
+from api.tests.test_plc_latest import _make_payload
+
+try:
+    from channels.testing import WebsocketCommunicator
+    from api.consumers import RealtimeParamsConsumer
+    _CHANNELS_AVAILABLE = True
+except ImportError:
+    _CHANNELS_AVAILABLE = False
+
+User = get_user_model()
+TS = '2026-10-18 10:00:00'
+AT = datetime(2026, 10, 18, 10, 0, 0)
+
+
+def _rec(specific_part, param_name, value):
+    return {'specific_part': specific_part, 'param_name': param_name, 'value': value, 'collected_at': AT}
+
+
+@tag('unit')
+class TestRoomDiffs(SimpleTestCase):
+
+    def test_grouped_by_room_last_wins(self):
+        diffs = build_room_diffs([
+            _rec('1-1-1-101', 'room_temp', 250), _rec('1-1-1-102', 'room_temp', 260),
+            _rec('1-1-1-101', 'room_temp', 251),
+        ])
+        self.assertEqual(diffs['1-1-1-101'], [
+            {'param_name': 'room_temp', 'value': 251, 'collected_at': '2026-10-18 10:00:00'},
+        ])
+        self.assertEqual(set(diffs), {'1-1-1-101', '1-1-1-102'})
+
+    def test_publisher_skips_unchanged_values(self):
+        publisher = RealtimeParamsPublisher()
+        self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 250)]), 1)
+        self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 250)]), 0)
+        self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 251)]), 1)
+        self.assertEqual(publisher.stats['messages'], 2)
+
+    def test_sender_thread_coalesces_batches_off_write_path(self):
+        from unittest.mock import AsyncMock, patch
+
+        layer = AsyncMock()
+        publisher = RealtimeParamsPublisher()
+        with patch('channels.layers.get_channel_layer', return_value=layer):
+            publisher.start()
+            self.addCleanup(publisher.stop)
+            self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 250),
+                                                _rec('1-1-1-102', 'room_temp', 260)]), 2)
+            self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 251)]), 1)
+            publisher.stop()
+
+        sent = {call.args[0]: call.args[1]['params'] for call in layer.group_send.call_args_list}
+        self.assertEqual(sent[group_name('1-1-1-101')][-1]['value'], 251)
+        self.assertEqual(set(sent), {group_name('1-1-1-101'), group_name('1-1-1-102')})
+        self.assertEqual(publisher.snapshot()['pending'], 0)
+
+    def test_full_queue_drops_batch_and_resets_memory(self):
+        publisher = RealtimeParamsPublisher(queue_size=1)
+        publisher._thread = threading.current_thread()   # 视为发送线程已启动但未消费
+        self.addCleanup(setattr, publisher, '_thread', None)
+        self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 250)]), 1)
+        self.assertEqual(publisher.publish([_rec('1-1-1-101', 'room_temp', 251)]), 0)
+        self.assertEqual(publisher.stats['dropped'], 1)
+        self.assertEqual(publisher._last_values, {})
+
+    def test_group_name_is_channel_safe(self):
+        self.assertEqual(group_name('9-1-31-3104'), 'plc_rt.9-1-31-3104')
+        self.assertEqual(group_name('成都-1'), 'plc_rt.__-1')
+
+
+def _make_ws_app():
+    from channels.routing import URLRouter
+    from django.urls import re_path
+    return URLRouter([re_path(r'^ws/devices/realtime/$', RealtimeParamsConsumer.as_asgi())])
+
+
+_REALTIME_WS_LOOP = None
+
+
+def _run(coro):
+    # 进程级 loop，按需懒建并复用（与 test_miniapp_consumer_connected 同款）
+    global _REALTIME_WS_LOOP
+    if _REALTIME_WS_LOOP is None or _REALTIME_WS_LOOP.is_closed():
+        _REALTIME_WS_LOOP = asyncio.new_event_loop()
+        asyncio.set_event_loop(_REALTIME_WS_LOOP)
+    return _REALTIME_WS_LOOP.run_until_complete(coro)
+
+
+async def _open(token_key):
+    communicator = WebsocketCommunicator(_make_ws_app(), f'/ws/devices/realtime/?token={token_key}')
+    connected, _ = await communicator.connect()
+    assert connected
+    assert (await communicator.receive_json_from(timeout=3))['type'] == 'connected'
+    return communicator
+
+
+def _ingest(specific_part, params):
+    PLCLatestDataHandler().handle('t', _make_payload(specific_part, params))
+
+
+@tag('integration')
+class TestRealtimeParamsConsumer(TransactionTestCase):
+
+    def setUp(self):
+        if not _CHANNELS_AVAILABLE:
+            self.skipTest('channels.testing 不可用，跳过 WS 集成测试')
+        realtime_publisher.reset()
+        self.addCleanup(realtime_publisher.reset)
+        operator = User.objects.create_user(username='rt_operator', password='pass', role='operator')
+        self.operator_token = Token.objects.create(user=operator).key
+        owner_user = User.objects.create_user(username='rt_owner', password='pass', role='user')
+        self.owner_token = Token.objects.create(user=owner_user).key
+        OwnerUserBinding.objects.create(user=owner_user, owner=_make_owner('1-1-2-201'), active=True)
+        _ingest('1-1-2-201', {'room_temp': (250, True, TS)})
+
+    def test_rejects_missing_token(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(_make_ws_app(), '/ws/devices/realtime/')
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+        self.assertEqual(_run(scenario()), (False, 4001))
+
+    def test_subscribe_snapshot_then_diffs(self):
+        async def scenario():
+            ws = await _open(self.operator_token)
+            await ws.send_json_to({'type': 'subscribe', 'specific_part': '1-1-2-201'})
+            subscribed = await ws.receive_json_from(timeout=3)
+
+            await sync_to_async(_ingest)('1-1-2-201', {
+                'room_temp': (251, True, TS), 'system_switch': (1, True, TS),
+            })
+            update = await ws.receive_json_from(timeout=3)
+            # 其他户的变化不推给本连接
+            await sync_to_async(_ingest)('1-1-2-202', {'room_temp': (300, True, TS)})
+            # 值未变化的参数不推送
+            await sync_to_async(_ingest)('1-1-2-201', {'room_temp': (251, True, TS)})
+            idle = await ws.receive_nothing(timeout=0.2)
+
+            await ws.send_json_to({'type': 'unsubscribe', 'specific_part': '1-1-2-201'})
+            await asyncio.sleep(0.05)
+            await sync_to_async(_ingest)('1-1-2-201', {'room_temp': (252, True, TS)})
+            after_unsubscribe = await ws.receive_nothing(timeout=0.2)
+            await ws.disconnect()
+            return subscribed, update, idle, after_unsubscribe
+
+        subscribed, update, idle, after_unsubscribe = _run(scenario())
+        self.assertEqual(subscribed['type'], 'subscribed')
+        self.assertEqual(subscribed['params'], [
+            {'param_name': 'room_temp', 'value': 250, 'collected_at': TS},
+        ])
+        self.assertEqual(update['type'], 'params_update')
+        self.assertEqual(update['specific_part'], '1-1-2-201')
+        self.assertEqual({p['param_name']: p['value'] for p in update['params']},
+                         {'room_temp': 251, 'system_switch': 1})
+        self.assertTrue(idle)
+        self.assertTrue(after_unsubscribe)
+        self.assertEqual(PLCLatestData.objects.get(specific_part='1-1-2-201', param_name='room_temp').value, 252)
+
+    def test_owner_limited_to_bound_parts(self):
+        async def scenario():
+            ws = await _open(self.owner_token)
+            await ws.send_json_to({'type': 'subscribe', 'specific_part': '1-1-2-202'})
+            denied = await ws.receive_json_from(timeout=3)
+            await ws.send_json_to({'type': 'subscribe', 'specific_part': '1-1-2-201'})
+            allowed = await ws.receive_json_from(timeout=3)
+            await ws.disconnect()
+            return denied, allowed
+
+        denied, allowed = _run(scenario())
+        self.assertEqual((denied['type'], denied['code']), ('error', 'FORBIDDEN'))
+        self.assertEqual(allowed['type'], 'subscribed')
+        self.assertEqual(len(allowed['params']), 1)
@@ -0,0 +1,119 @@
+"""
+大屏上行统一接入服务测试（api/screen_uplink/）
+
+覆盖范围：
+  - 一条 DeviceStatusUpdate 同时驱动心跳 / 故障 / 结露三个处理器，JSON 只解析一次、MAC 只解析一次
+  - 处理器按 topic 过滤器分发（心跳 #，故障 / 结露 +）
+  - 单个处理器异常只计入自身 errors，不影响其他处理器
+  - 未知 MAC 整条跳过；处理器计数与状态机计数合并输出
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_screen_uplink --settings=freearkweb.test_settings
+"""
+import json
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, tag
+
+import api.condensation_consumer.state_machine as cw_state_machine
+import api.fault_consumer.state_machine as fault_state_machine
+import api.screen_uplink.message as message_module
+from api.models import CondensationWarningEvent, FaultEvent, ScreenConnectivityStatus
+from api.screen_uplink.processors import (
+    CondensationProcessor, FaultProcessor, HeartbeatProcessor, UplinkProcessor,
+)
+from api.screen_uplink.service import ScreenUplinkService
+
+HEARTBEAT_TOPIC = '/screen/upload/screen/to/cloud/#'
+DEVICE_STATUS_TOPIC = '/screen/upload/screen/to/cloud/+'
+TOPIC = '/screen/upload/screen/to/cloud/aabbccddeeff'
+
+
+def _payload(items, name='DeviceStatusUpdate'):
+    return json.dumps({
+        'header': {'name': name, 'screenMac': 'aabbccddeeff'},
+        'payload': {'data': {'deviceSn': '22554', 'productCode': '260001', 'items': items}},
+    }).encode('utf-8')
+
+
+class _FailingProcessor(UplinkProcessor):
+    name = 'failing'
+
+    def process(self, message):
+        raise RuntimeError('boom')
+
+
+@tag('integration')
+class TestScreenUplinkService(TestCase):
+
+    def setUp(self):
+        fault_state_machine._state_machine.clear()
+        cw_state_machine._cw_state_machine.clear()
+        self.addCleanup(fault_state_machine._state_machine.clear)
+        self.addCleanup(cw_state_machine._cw_state_machine.clear)
+        self.mac_cache = MagicMock()
+        self.mac_cache.get_specific_part.return_value = '3-1-7-702'
+
+    def _service(self, *extra):
+        return ScreenUplinkService([
+            HeartbeatProcessor(HEARTBEAT_TOPIC),
+            FaultProcessor(DEVICE_STATUS_TOPIC),
+            CondensationProcessor(DEVICE_STATUS_TOPIC),
+            *extra,
+        ], mac_cache=self.mac_cache)
+
+    def test_one_message_fans_out_parsed_once(self):
+        service = self._service()
+        items = [
+            {'attrTag': 'error_1', 'attrValue': '1'},
+            {'attrTag': 'condensation_alarm', 'attrValue': '1'},
+            {'attrTag': 'dew_point_temp', 'attrValue': '12.5'},
+        ]
+        with patch.object(message_module.json, 'loads', wraps=json.loads) as loads:
+            service.handle(TOPIC, _payload(items))
+
+        self.assertEqual(loads.call_count, 1)
+        self.mac_cache.get_specific_part.assert_called_once_with('aabbccddeeff')
+        self.assertTrue(ScreenConnectivityStatus.objects.filter(specific_part='3-1-7-702').exists())
+        self.assertTrue(FaultEvent.objects.filter(specific_part='3-1-7-702', fault_code='error_1',
+                                                  is_active=True).exists())
+        self.assertEqual(CondensationWarningEvent.objects.get(specific_part='3-1-7-702').dew_point_temp, '12.5')
+
+        snap = service.health_snapshot()
+        self.assertEqual(snap['received'], 1)
+        for name in ('heartbeat', 'fault', 'condensation'):
+            self.assertEqual(snap['processors'][name]['processed'], 1, name)
+        self.assertEqual(snap['processors']['fault']['t1_success'], fault_state_machine.get_counters()['t1_success'])
+
+    def test_topic_filters_and_non_status_messages(self):
+        service = self._service()
+        # 深层 topic：只有心跳订阅 # 匹配
+        service.handle(TOPIC + '/extra', _payload([{'attrTag': 'error_1', 'attrValue': '1'}]))
+        # 非 DeviceStatusUpdate：心跳照常写入，故障 / 结露跳过
+        service.handle(TOPIC, _payload([], name='OtherMessage'))
+
+        counters = service.health_snapshot()['processors']
+        self.assertEqual(counters['heartbeat']['processed'], 2)
+        self.assertEqual((counters['fault']['received'], counters['fault']['skipped']), (1, 1))
+        self.assertEqual(counters['condensation']['skipped'], 1)
+        self.assertEqual(FaultEvent.objects.count(), 0)
+
+    def test_processor_errors_isolated(self):
+        service = self._service(_FailingProcessor())
+        service.handle(TOPIC, b'not json')
+
+        counters = service.health_snapshot()['processors']
+        self.assertEqual(counters['failing']['errors'], 1)
+        self.assertEqual(counters['heartbeat']['processed'], 1)
+        self.assertEqual(counters['fault']['skipped'], 1)
+
+    def test_unknown_mac_skips_all_processors(self):
+        self.mac_cache.get_specific_part.return_value = None
+        service = self._service()
+        service.handle(TOPIC, _payload([{'attrTag': 'condensation_alarm', 'attrValue': '1'}]))
+
+        snap = service.health_snapshot()
+        self.assertEqual(snap['unknown_mac'], 1)
+        self.assertEqual(snap['processors']['heartbeat']['received'], 0)
+        self.assertFalse(ScreenConnectivityStatus.objects.exists())
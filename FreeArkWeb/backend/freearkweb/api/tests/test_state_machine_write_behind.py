@@ -0,0 +1,159 @@
+"""
+故障 / 结露状态机批量落库（api/fault_consumer/write_behind.py）测试
+
+覆盖范围：
+  - 写入线程运行时 process_fault_field / process_condensation_alarm 不执行任何 DB 操作
+  - 故障风暴：一批 T1 一次 bulk_create（room 反查合并为一次查询），回填 event_id
+  - 同批内 T1 后的 T3 并入 INSERT（直接插入已恢复行）；跨批 T2 合并为一条 UPDATE，T3 在 INSERT 之后落库
+  - bulk_create 撞唯一约束 → 逐条写入，冲突行绑定已有活跃行
+  - 连接错误 → 计入 t1_db_error，内存状态丢弃，下一条故障报文重新 T1
+  - 结露 T1 的 system_switch 兜底在刷新时执行
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_state_machine_write_behind --settings=freearkweb.test_settings
+"""
+from datetime import timedelta
+from unittest.mock import PropertyMock, patch
+
+from django.db import OperationalError
+from django.test import TestCase, tag
+from django.utils import timezone
+
+import api.condensation_consumer.state_machine as cw_sm
+import api.fault_consumer.state_machine as fault_sm
+from api.fault_consumer.write_behind import EventWriteBehind
+from api.models import CondensationWarningEvent, FaultEvent, PLCLatestData
+
+
+def _fault(fault_code, active, at, specific_part='3-1-7-702', device_sn='22554'):
+    fault_sm.process_fault_field(
+        specific_part=specific_part,
+        device_sn=device_sn,
+        product_code='260001',
+        fault_code=fault_code,
+        fault_type='comm',
+        severity='error',
+        fault_message=f'{fault_code} 故障',
+        is_active_now=active,
+        received_at=at,
+    )
+
+
+class _WriteBehindTestMixin:
+
+    def setUp(self):
+        # 模拟写入线程运行中：状态机只入队，由测试在主线程手动 flush()
+        patcher = patch.object(EventWriteBehind, 'running', new_callable=PropertyMock, return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for module, machine in ((fault_sm, fault_sm._state_machine), (cw_sm, cw_sm._cw_state_machine)):
+            machine.clear()
+            module.reset_counters()
+            self.addCleanup(machine.clear)
+            self.addCleanup(module.reset_counters)
+        self.now = timezone.now()
+
+
+@tag('integration')
+class TestFaultWriteBehind(_WriteBehindTestMixin, TestCase):
+
+    def test_fault_storm_single_bulk_insert(self):
+        with self.assertNumQueries(0):
+            for i in range(50):
+                _fault(f'error_{i}', True, self.now)
+        self.assertEqual(FaultEvent.objects.count(), 0)
+        self.assertEqual(fault_sm.write_behind.snapshot()['pending_inserts'], 50)
+
+        # room 反查 1 条 + bulk_create 1 条（外加事务保存点）
+        with self.assertNumQueries(4):
+            self.assertEqual(fault_sm.write_behind.flush(), 50)
+
+        self.assertEqual(FaultEvent.objects.filter(is_active=True).count(), 50)
+        self.assertEqual(fault_sm.get_counters()['t1_success'], 50)
+        state = fault_sm.get_state(('3-1-7-702', '22554', 'error_7'))
+        self.assertEqual(state.event_id, FaultEvent.objects.get(fault_code='error_7').id)
+
+    def test_recovery_in_same_batch_folds_into_insert(self):
+        _fault('error_1', True, self.now)
+        _fault('error_1', False, self.now + timedelta(seconds=2))
+        fault_sm.write_behind.flush()
+
+        event = FaultEvent.objects.get()
+        self.assertFalse(event.is_active)
+        self.assertEqual(event.recovered_at, self.now + timedelta(seconds=2))
+        snap = fault_sm.write_behind.snapshot()
+        self.assertEqual((snap['folded'], snap['recoveries_flushed']), (1, 0))
+
+    def test_touches_and_recoveries_after_insert(self):
+        for code in ('error_1', 'error_2', 'error_3'):
+            _fault(code, True, self.now)
+        fault_sm.write_behind.flush()
+
+        with patch.object(fault_sm, '_T2_PERSIST_THROTTLE_SECONDS', 0):
+            for code in ('error_1', 'error_2', 'error_3'):
+                _fault(code, True, self.now + timedelta(seconds=30))
+        _fault('error_3', False, self.now + timedelta(seconds=40))
+        # T2 一条 UPDATE + T3 一条 UPDATE（error_3 的 T2 被 T3 覆盖）
+        with self.assertNumQueries(2):
+            fault_sm.write_behind.flush()
+
+        seen = dict(FaultEvent.objects.values_list('fault_code', 'last_seen_at'))
+        self.assertEqual(seen['error_1'], self.now + timedelta(seconds=30))
+        recovered = FaultEvent.objects.get(fault_code='error_3')
+        self.assertEqual((recovered.is_active, recovered.recovered_at), (False, self.now + timedelta(seconds=40)))
+        self.assertEqual(recovered.last_seen_at, self.now + timedelta(seconds=30))
+        counters = fault_sm.get_counters()
+        self.assertEqual((counters['t2_persist'], counters['t3_recover']), (2, 1))
+
+    def test_integrity_error_falls_back_to_row_by_row(self):
+        existing = FaultEvent.objects.create(
+            specific_part='3-1-7-702', device_sn='22554', product_code='260001',
+            fault_code='error_1', fault_type='comm', severity='error',
+            first_seen_at=self.now, last_seen_at=self.now, is_active=True,
+        )
+        _fault('error_1', True, self.now)
+        _fault('error_2', True, self.now)
+        fault_sm.write_behind.flush()
+
+        self.assertEqual(FaultEvent.objects.count(), 2)
+        self.assertEqual(fault_sm.get_state(('3-1-7-702', '22554', 'error_1')).event_id, existing.id)
+        counters = fault_sm.get_counters()
+        self.assertEqual((counters['t1_integrity'], counters['t1_success']), (1, 1))
+
+    def test_db_error_discards_state_for_retry(self):
+        _fault('error_1', True, self.now)
+        with patch.object(FaultEvent.objects, 'bulk_create', side_effect=OperationalError('gone away')):
+            fault_sm.write_behind.flush()
+
+        self.assertIsNone(fault_sm.get_state(('3-1-7-702', '22554', 'error_1')))
+        self.assertEqual(fault_sm.get_counters()['t1_db_error'], 1)
+        # 下一条故障报文重新走 T1
+        _fault('error_1', True, self.now + timedelta(seconds=5))
+        fault_sm.write_behind.flush()
+        self.assertEqual(FaultEvent.objects.filter(is_active=True).count(), 1)
+
+
+@tag('integration')
+class TestCondensationWriteBehind(_WriteBehindTestMixin, TestCase):
+
+    def test_t1_resolves_system_switch_at_flush(self):
+        PLCLatestData.objects.create(specific_part='3-1-7-702', param_name='system_switch', value=0)
+        with self.assertNumQueries(0):
+            cw_sm.process_condensation_alarm(
+                specific_part='3-1-7-702', device_sn='22554', product_code='260001',
+                is_active_now=True, received_at=self.now, condensation_alarm_value='1',
+            )
+        cw_sm.write_behind.flush()
+
+        event = CondensationWarningEvent.objects.get()
+        self.assertEqual((event.system_switch, event.is_active), ('off', True))
+        self.assertEqual(cw_sm.get_state(('3-1-7-702', '22554')).event_id, event.id)
+
+        cw_sm.process_condensation_alarm(
+            specific_part='3-1-7-702', device_sn='22554', product_code='260001',
+            is_active_now=False, received_at=self.now + timedelta(minutes=1),
+        )
+        cw_sm.write_behind.flush()
+        event.refresh_from_db()
+        self.assertEqual((event.is_active, event.recovered_at), (False, self.now + timedelta(minutes=1)))
@@ -0,0 +1,79 @@
+"""
+采集端紧凑负载解码测试套件（api/telemetry_codec.py）
+
+覆盖：
+  - 单设备紧凑消息还原为 {device_id: device_info}，与 JSON 格式字段一致
+  - 参数下标列表 / 失败位图 / 失败消息还原
+  - 带楼栋的紧凑消息还原为批量信封
+  - 版本不支持、内容损坏时抛 CompactPayloadError
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_telemetry_codec --verbosity=2
+"""
+import msgpack
+from django.test import SimpleTestCase, tag
+
+from api.telemetry_codec import (
+    BATCH_ENVELOPE_KEY, CompactPayloadError, decode_compact, is_compact, is_energy,
+)
+
+TS = '2026-04-18 10:42:55'
+
+
+def _pack(doc, version=1, flags=0):
+    """按 v1 布局构造紧凑负载：0xC1 | 版本 | 标志位 | msgpack"""
+    return b'\xc1' + bytes((version, flags)) + msgpack.packb(doc, use_bin_type=True)
+
+
+def _doc(rows, names, building=None):
+    return {'v': 1, 'b': building, 's': 0, 'n': 1, 'p': names, 'd': rows}
+
+
+@tag('unit')
+class TestDecodeCompact(SimpleTestCase):
+
+    def test_single_device_round_trip(self):
+        payload = _pack(_doc(
+            [['3-1-7-702', '192.168.7.83', TS, None, [1000, None], b'\x02', [[1, '连接失败']]]],
+            ['total_hot_quantity', 'total_cold_quantity'],
+        ), flags=1)
+
+        self.assertTrue(is_compact(payload))
+        self.assertTrue(is_energy(payload))
+        self.assertEqual(decode_compact(payload), {
+            '3-1-7-702': {
+                'PLC IP地址': '192.168.7.83',
+                'timestamp': TS,
+                'data': {
+                    'total_hot_quantity': {'value': 1000, 'success': True, 'message': '读取成功', 'timestamp': TS},
+                    'total_cold_quantity': {'value': None, 'success': False, 'message': '连接失败', 'timestamp': TS},
+                },
+            }
+        })
+
+    def test_index_list_and_batch_envelope(self):
+        payload = _pack(_doc(
+            [['a', 'ip', TS, None, [1, 2, 3], b'\x00', []],
+             ['b', 'ip', TS, [2, 0], [30, 10], b'\x00', []]],
+            ['p1', 'p2', 'p3'], building='all_owner',
+        ))
+        decoded = decode_compact(payload)
+
+        self.assertEqual(decoded[BATCH_ENVELOPE_KEY], 1)
+        self.assertEqual(decoded['building'], 'all_owner')
+        data_b = decoded['devices']['b']['data']
+        self.assertEqual(list(data_b), ['p3', 'p1'])
+        self.assertEqual(data_b['p3']['value'], 30)
+        self.assertFalse(is_energy(payload))
+
+    def test_json_payload_is_not_compact(self):
+        self.assertFalse(is_compact('{"a": 1}'.encode('utf-8')))
+
+    def test_bad_payloads_raise(self):
+        with self.assertRaises(CompactPayloadError):
+            decode_compact(_pack(_doc([], []), version=9))
+        with self.assertRaises(CompactPayloadError):
+            decode_compact(b'\xc1\x01\x00\xff\xff')
+        with self.assertRaises(CompactPayloadError):
+            decode_compact(_pack({'v': 1}))
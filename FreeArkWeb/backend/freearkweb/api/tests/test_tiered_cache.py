@@ -0,0 +1,158 @@
+"""
+两级缓存（api/tiered_cache.py）测试
+
+覆盖范围：
+  - L1 命中零加载；超出 max_entries 按 LRU 淘汰
+  - get_many：L1 / L2 命中之外的 key 合并为一次 loader 调用，结果回填两级
+  - 并发未命中同一 key 只触发一次 loader（single-flight）
+  - invalidate 删除 L2 并广播，订阅同一 namespace 的实例丢弃 L1
+  - L2 为 DummyCache 时使用 L2 的实例直查不缓存
+  - note_fault_values：仅故障字段取值变化的专有部分失效
+
+运行方式：
+    cd FreeArkWeb/backend/freearkweb
+    python manage.py test api.tests.test_tiered_cache --settings=freearkweb.test_settings
+"""
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings, tag
+
+from api import fault_utils
+from api.tiered_cache import TieredCache
+
+_LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-test'}}
+
+
+class _Loader:
+    """记录调用参数的批量 loader：key -> key * 10"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, keys):
+        self.calls.append(sorted(keys))
+        return {k: k * 10 for k in keys}
+
+
+@tag('unit')
+class TestTieredCacheLocal(SimpleTestCase):
+
+    def test_l1_hit_and_lru_eviction(self):
+        cache = TieredCache('t_lru', ttl=60, max_entries=2, l2=False)
+        loader = _Loader()
+        self.assertEqual(cache.get_many([1, 2], loader), {1: 10, 2: 20})
+        self.assertEqual(cache.get(1, lambda k: -1), 10)   # L1 命中，1 变为最近使用
+        cache.get_many([3], loader)                         # 淘汰最久未用的 2
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache)
+        self.assertEqual(loader.calls, [[1, 2], [3]])
+        self.assertEqual(cache.snapshot()['l1_hits'], 1)
+
+    def test_none_cached_only_when_enabled(self):
+        plain = TieredCache('t_none_a', ttl=60, l2=False)
+        keeps_none = TieredCache('t_none_b', ttl=60, l2=False, cache_none=True)
+        for cache in (plain, keeps_none):
+            self.assertIsNone(cache.get('x', lambda k: None))
+        self.assertNotIn('x', plain)
+        self.assertIn('x', keeps_none)
+
+    def test_loader_error_not_cached(self):
+        cache = TieredCache('t_err', ttl=60, l2=False)
+
+        def broken(keys):
+            raise RuntimeError('db down')
+
+        with self.assertRaises(RuntimeError):
+            cache.get_many(['a'], broken)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.get('a', lambda k: 1), 1)
+
+    def test_single_flight(self):
+        cache = TieredCache('t_flight', ttl=60, l2=False)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow(keys):
+            calls.append(keys)
+            started.set()
+            release.wait(5)
+            return {k: 'v' for k in keys}
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(cache.get_many(['k'], slow)))
+        first.start()
+        started.wait(5)
+        # 第一个线程加载中：第二个线程不再调用 loader，等待其结果
+        second = threading.Thread(target=lambda: results.append(cache.get_many(['k'], slow)))
+        second.start()
+        for _ in range(500):
+            if cache.snapshot()['coalesced']:
+                break
+            time.sleep(0.01)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'k': 'v'}, {'k': 'v'}])
+        self.assertEqual(cache.snapshot()['coalesced'], 1)
+
+    def test_invalidate_broadcasts_to_namespace(self):
+        # 同 namespace 的两个实例模拟两个进程的 L1（本进程广播直接派发）
+        a = TieredCache('t_bus', ttl=60, l2=False)
+        b = TieredCache('t_bus', ttl=60, l2=False)
+        for cache in (a, b):
+            cache.get_many(['x', 'y'], _Loader())
+        a.invalidate(['x'])
+        self.assertNotIn('x', b)
+        self.assertIn('y', b)
+        a.invalidate()
+        self.assertNotIn('y', b)
+
+
+@tag('unit')
+class TestTieredCacheL2(SimpleTestCase):
+
+    @override_settings(CACHES=_LOCMEM)
+    def test_get_many_reads_l2_once_and_loads_rest(self):
+        caches['default'].clear()
+        writer = TieredCache('t_l2', ttl=60)
+        writer.set_many({1: 'from-l2'})
+
+        reader = TieredCache('t_l2', ttl=60)   # 模拟另一进程：L1 为空，共享同一 L2
+        loader = _Loader()
+        self.assertEqual(reader.get_many([1, 2, 3], loader), {1: 'from-l2', 2: 20, 3: 30})
+        self.assertEqual(loader.calls, [[2, 3]])
+        self.assertEqual(caches['default'].get('tc:t_l2:2'), 20)
+
+        writer.invalidate([1])
+        self.assertIsNone(caches['default'].get('tc:t_l2:1'))
+
+    def test_dummy_l2_disables_caching(self):
+        cache = TieredCache('t_dummy', ttl=60)
+        loader = _Loader()
+        cache.get(1, lambda k: loader([k])[k])
+        cache.get(1, lambda k: loader([k])[k])
+        self.assertEqual(len(loader.calls), 2)
+
+
+@tag('unit')
+class TestNoteFaultValues(SimpleTestCase):
+
+    def setUp(self):
+        fault_utils._last_fault_values.clear()
+        self.addCleanup(fault_utils._last_fault_values.clear)
+
+    def test_only_changed_fault_values_invalidate(self):
+        records = [
+            {'specific_part': '1-1-1-101', 'param_name': 'error_1', 'value': 0},
+            {'specific_part': '1-1-1-101', 'param_name': 'indoor_temperature', 'value': 25},
+            {'specific_part': '2-1-1-101', 'param_name': 'fresh_air_fault_status', 'value': 0},
+        ]
+        self.assertEqual(fault_utils.note_fault_values(records), {'1-1-1-101', '2-1-1-101'})
+        self.assertEqual(fault_utils.note_fault_values(records), set())
+
+        records[0]['value'] = 1
+        self.assertEqual(fault_utils.note_fault_values(records), {'1-1-1-101'})
@@ -164,6 +164,9 @@ class TestMqttConsumerHealthMonitor(TestCase):
         # 都是 int（含 0），不该是 None
         for k in ('energy_qsize', 'general_qsize', 'ondemand_qsize'):
             self.assertIsInstance(snap[k], int)
+        # 合并写入统计：未 start 时写入线程未运行、无待写记录
+        self.assertFalse(snap['latest_writer']['running'])
+        self.assertEqual(snap['latest_writer']['pending'], 0)
 
     def test_monitor_service_suicide_on_sustained_silence(self):
         """连续 3 轮（默认 SILENCE_SUICIDE_CONSECUTIVE_ROUNDS）静默失聪 → sys.exit(3)。"""
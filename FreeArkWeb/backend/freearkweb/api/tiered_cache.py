@@ -0,0 +1,375 @@
+"""
+tiered_cache.py — 两级缓存（L1 进程内 LRU + L2 Django cache / Redis）与失效广播
+
+此前各模块各自维护缓存（utils_room_filter 的 dict+TTL、fault_utils 的逐 key Redis GET、
+device_name_cache、大屏消费者的 MacCache），TTL 与加锁方式各不相同，过期后整表重查，
+主动失效只作用于处理同步请求的那一个 worker 进程。本模块统一为：
+
+  TieredCache(namespace, ttl, ...)
+    - L1：进程内 LRU（max_entries 上限，按 l1_ttl 过期），命中零 IO；
+    - L2：Django 默认缓存（生产为 Redis db=1），get_many / set_many 各一次往返；
+    - get(key, loader) / get_many(keys, loader)：L1 → L2 → loader，
+      同一 key 的并发未命中只触发一次 loader（single-flight），其余线程等待结果；
+    - invalidate(keys=None)：删除 L2 条目并广播失效，所有进程丢弃对应 L1 条目。
+
+  失效广播（publish_invalidation / subscribe）：
+    - 本进程订阅者立即执行；
+    - 生产（RedisCache）经 Redis pub/sub 频道 {KEY_PREFIX}:tiered_cache:invalidate 通知其他进程
+      （web worker、MQTT 消费者），监听线程在首次读缓存时惰性启动；
+    - pub/sub 至多一次投递：监听断线重连后清空全部 L1，L1 TTL 兜底最大陈旧时间。
+
+降级口径沿用原 fault_utils 的 Redis 兜底：L2 读失败视为未命中，写/删失败静默忽略，只记 WARNING。
+L2 为 DummyCache（测试 / 关闭缓存）时，使用 L2 的实例同时关闭 L1（缓存关闭即直查）；
+l2=False 的纯进程内实例（如房型过滤）不受影响。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# single-flight 等待其他线程加载结果的最长时间（秒），超时后自行加载
+_SINGLE_FLIGHT_WAIT_SECONDS = 10
+
+# 本进程标识：广播时带上，监听线程据此跳过自己发出的消息
+_ORIGIN = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+# ---------------------------------------------------------------------------
+# 失效广播
+# ---------------------------------------------------------------------------
+
+# namespace -> [callback(keys or None)]
+_subscribers: dict = {}
+_subscribers_lock = threading.Lock()
+
+_listener_thread = None
+_listener_lock = threading.Lock()
+_publisher = None
+
+
+def subscribe(namespace: str, callback) -> None:
+    """订阅 namespace 的失效事件；callback(keys) 中 keys 为 None 表示整个 namespace 失效。"""
+    with _subscribers_lock:
+        _subscribers.setdefault(namespace, []).append(callback)
+
+
+def publish_invalidation(namespace: str, keys=None) -> None:
+    """广播失效：本进程订阅者立即执行，其他进程经 Redis pub/sub 通知。"""
+    keys = None if keys is None else list(keys)
+    _dispatch(namespace, keys)
+    client = _get_publisher()
+    if client is None:
+        return
+    payload = {'origin': _ORIGIN, 'ns': namespace, 'keys': None if keys is None else [str(k) for k in keys]}
+    try:
+        client.publish(_channel(), json.dumps(payload))
+    except Exception as exc:
+        logger.warning('tiered_cache: 失效广播发送失败（其他进程依赖 L1 TTL 兜底）: %s', exc)
+
+
+def _dispatch(namespace: str, keys) -> None:
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(namespace, ()))
+    for callback in callbacks:
+        try:
+            callback(keys)
+        except Exception as exc:
+            logger.warning('tiered_cache: 失效回调异常 namespace=%s: %s', namespace, exc)
+
+
+def _dispatch_all() -> None:
+    """监听断线期间可能漏收消息：全部订阅者整体失效。"""
+    with _subscribers_lock:
+        namespaces = list(_subscribers)
+    for namespace in namespaces:
+        _dispatch(namespace, None)
+
+
+def _redis_url():
+    """默认缓存为 RedisCache 时返回其 LOCATION，否则 None（测试 / 本地不广播）。"""
+    cfg = settings.CACHES.get('default', {})
+    if not cfg.get('BACKEND', '').endswith('RedisCache'):
+        return None
+    location = cfg.get('LOCATION')
+    return location[0] if isinstance(location, (list, tuple)) else location
+
+
+def _channel() -> str:
+    prefix = settings.CACHES.get('default', {}).get('KEY_PREFIX', '')
+    return f'{prefix}:tiered_cache:invalidate'
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        url = _redis_url()
+        if url is None:
+            return None
+        import redis
+        _publisher = redis.Redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+    return _publisher
+
+
+def ensure_listener() -> None:
+    """惰性启动本进程的失效监听线程（仅 RedisCache；重复调用无副作用）。"""
+    global _listener_thread
+    if _listener_thread is not None:
+        return
+    url = _redis_url()
+    if url is None:
+        return
+    with _listener_lock:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(
+                target=_listen, args=(url,), name='tiered-cache-invalidation', daemon=True,
+            )
+            _listener_thread.start()
+
+
+def _listen(url) -> None:
+    import redis
+
+    first = True
+    while True:
+        pubsub = None
+        try:
+            client = redis.Redis.from_url(url, socket_connect_timeout=1)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_channel())
+            if not first:
+                _dispatch_all()
+                logger.info('tiered_cache: 失效监听已重连，已清空全部 L1')
+            first = False
+            for message in pubsub.listen():
+                try:
+                    data = json.loads(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                if data.get('origin') != _ORIGIN:
+                    _dispatch(data.get('ns'), data.get('keys'))
+        except Exception as exc:
+            logger.warning('tiered_cache: 失效监听断开，5 秒后重连: %s', exc)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        time.sleep(5)
+
+
+# ---------------------------------------------------------------------------
+# 两级缓存
+# ---------------------------------------------------------------------------
+
+class _Flight:
+    __slots__ = ('event', 'values')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.values = {}
+
+
+class TieredCache:
+    """L1 进程内 LRU + L2 Django cache 的两级缓存。
+
+    Args:
+        namespace: 缓存命名空间（L2 key 前缀 tc:{namespace}:，失效广播按此订阅）
+        ttl: L2 过期秒数；l2=False 时即 L1 过期秒数
+        l1_ttl: L1 过期秒数（默认同 ttl）；越短，跨进程失效消息丢失时的陈旧窗口越小
+        max_entries: L1 条目上限，超出按 LRU 淘汰
+        l2: 是否使用 L2（False 为纯进程内缓存）
+        cache_none: loader 返回 None 时是否缓存（只缓存在 L1）
+    """
+
+    def __init__(self, namespace, ttl, l1_ttl=None, max_entries=10000, l2=True, cache_none=False):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.l1_ttl = ttl if l1_ttl is None else min(l1_ttl, ttl)
+        self.max_entries = max_entries
+        self.l2 = l2
+        self.cache_none = cache_none
+
+        self._lock = threading.Lock()
+        # key -> (value, expires_at)
+        self._l1 = OrderedDict()
+        self._inflight = {}
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'loads': 0, 'coalesced': 0, 'invalidations': 0}
+        subscribe(namespace, self._drop_local)
+
+    # ------------------------------------------------------------------
+    # 读
+    # ------------------------------------------------------------------
+
+    def get(self, key, loader=None, default=None):
+        """读单个 key；loader(key) 在 L1/L2 均未命中时调用（single-flight）。"""
+        wrapped = None if loader is None else (lambda keys: {keys[0]: loader(keys[0])})
+        return self.get_many([key], wrapped).get(key, default)
+
+    def get_many(self, keys, loader=None) -> dict:
+        """批量读：L1 → 一次 L2 get_many → 一次 loader(缺失 keys)；返回 {key: value}（未命中且无 loader 的 key 不出现）。"""
+        ensure_listener()
+        result = {}
+        enabled = self._enabled()
+        missing = self._l1_get_many(keys, result) if enabled else list(dict.fromkeys(keys))
+
+        if missing and enabled and self.l2:
+            found = self._l2_get_many(missing)
+            if found:
+                self.stats['l2_hits'] += len(found)
+                self._l1_set_many(found)
+                result.update(found)
+                missing = [k for k in missing if k not in found]
+
+        if missing and loader is not None:
+            result.update(self._load(missing, loader, enabled))
+        return result
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    # ------------------------------------------------------------------
+    # 写 / 失效
+    # ------------------------------------------------------------------
+
+    def set(self, key, value) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, mapping: dict) -> None:
+        if not self._enabled():
+            return
+        mapping = {k: v for k, v in mapping.items() if v is not None or self.cache_none}
+        self._l1_set_many(mapping)
+        if self.l2:
+            self._l2_set_many({k: v for k, v in mapping.items() if v is not None})
+
+    def invalidate(self, keys=None) -> None:
+        """删除 L2 条目并广播失效（keys=None 表示整个 namespace 的 L1；L2 条目靠 TTL 过期）。"""
+        keys = None if keys is None else list(keys)
+        if keys and self.l2:
+            self._l2_delete_many(keys)
+        publish_invalidation(self.namespace, keys)
+
+    def clear_local(self) -> None:
+        """只清空本进程 L1（测试 / 调试用）。"""
+        self._drop_local(None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, 'l1_size': len(self._l1)}
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+
+    def _enabled(self) -> bool:
+        if not self.l2:
+            return True
+        from django.core.cache.backends.dummy import DummyCache
+        return not isinstance(caches['default'], DummyCache)
+
+    def _l2_key(self, key) -> str:
+        return f'tc:{self.namespace}:{key}'
+
+    def _drop_local(self, keys) -> None:
+        with self._lock:
+            if keys is None:
+                self._l1.clear()
+            else:
+                for key in keys:
+                    self._l1.pop(key, None)
+            self.stats['invalidations'] += 1
+
+    def _l1_get_many(self, keys, result) -> list:
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._l1.get(key)
+                if entry is not None and entry[1] > now:
+                    self._l1.move_to_end(key)
+                    result[key] = entry[0]
+                    self.stats['l1_hits'] += 1
+                else:
+                    if entry is not None:
+                        del self._l1[key]
+                    missing.append(key)
+        return missing
+
+    def _l1_set_many(self, mapping: dict) -> None:
+        expires_at = time.monotonic() + self.l1_ttl
+        with self._lock:
+            for key, value in mapping.items():
+                self._l1[key] = (value, expires_at)
+                self._l1.move_to_end(key)
+            while len(self._l1) > self.max_entries:
+                self._l1.popitem(last=False)
+
+    def _load(self, keys, loader, enabled) -> dict:
+        with self._lock:
+            mine = [k for k in keys if k not in self._inflight]
+            theirs = {k: self._inflight[k] for k in keys if k in self._inflight}
+            flight = _Flight()
+            for key in mine:
+                self._inflight[key] = flight
+
+        result = {}
+        if mine:
+            try:
+                self.stats['loads'] += 1
+                loaded = loader(mine)
+                flight.values = loaded
+                if enabled:
+                    self.set_many(loaded)
+                result.update(loaded)
+            finally:
+                with self._lock:
+                    for key in mine:
+                        if self._inflight.get(key) is flight:
+                            del self._inflight[key]
+                flight.event.set()
+
+        if theirs:
+            self.stats['coalesced'] += len(theirs)
+            retry = []
+            for key, other in theirs.items():
+                if other.event.wait(_SINGLE_FLIGHT_WAIT_SECONDS) and key in other.values:
+                    result[key] = other.values[key]
+                else:
+                    retry.append(key)
+            if retry:
+                result.update(loader(retry))
+        return result
+
+    def _l2_get_many(self, keys) -> dict:
+        try:
+            found = caches['default'].get_many([self._l2_key(k) for k in keys])
+        except Exception as exc:
+            logger.warning('tiered_cache: L2 get_many 失败（降级为加载）namespace=%s: %s', self.namespace, exc)
+            return {}
+        return {k: found[self._l2_key(k)] for k in keys if self._l2_key(k) in found}
+
+    def _l2_set_many(self, mapping: dict) -> None:
+        if not mapping:
+            return
+        try:
+            caches['default'].set_many({self._l2_key(k): v for k, v in mapping.items()}, self.ttl)
+        except Exception as exc:
+            logger.warning('tiered_cache: L2 set_many 失败（忽略）namespace=%s: %s', self.namespace, exc)
+
+    def _l2_delete_many(self, keys) -> None:
+        try:
+            caches['default'].delete_many([self._l2_key(k) for k in keys])
+        except Exception as exc:
+            logger.warning('tiered_cache: L2 delete_many 失败（忽略）namespace=%s: %s', self.namespace, exc)
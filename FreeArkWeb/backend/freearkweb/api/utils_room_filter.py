@@ -7,11 +7,11 @@ utils_room_filter.py — FreeArk v0.5.7
 模块 M1（module_design_v0.5.7.md）
 """
 
-import threading
-import time
 import logging
 from typing import Optional
 
+from .tiered_cache import TieredCache
+
 logger = logging.getLogger(__name__)
 
 # ── 温控面板 sub_type → 房间关键词映射 ──────────────────────────────────────
@@ -95,12 +95,12 @@ HOUSE_TYPE_FOUR: str = 'four'
 _ORDER_FALLBACK: int = 99
 
 # ── 进程内缓存 ────────────────────────────────────────────────────────────────
-# 格式：{specific_part: (available_sub_types: frozenset, cached_at: float)}
-_room_filter_cache: dict = {}
-# 格式：{specific_part: (house_type: str|None, cached_at: float)}
-_house_type_cache: dict = {}
-_cache_lock = threading.Lock()
+# 房间信息只随设备树同步变化，不经 Redis（l2=False）；同步后失效广播到所有进程
 _CACHE_TTL_SECONDS: int = 300  # 5 分钟
+# specific_part -> available_sub_types: frozenset
+_room_filter_cache = TieredCache('room_filter', ttl=_CACHE_TTL_SECONDS, l2=False)
+# specific_part -> house_type: str|None（None 亦缓存，避免未同步户反复查询）
+_house_type_cache = TieredCache('house_type', ttl=_CACHE_TTL_SECONDS, l2=False, cache_none=True)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -119,72 +119,31 @@ def get_available_sub_types(specific_part: str) -> frozenset:
           仅返回 SYSTEM_LEVEL_SUB_TYPES（降级策略方案 B，PM OQ-v0.5.7-02 锁定）。
 
     缓存：
-        TTL = 300s，线程安全（_cache_lock 保护读写）。
-        设备树同步后调用 invalidate_room_filter_cache(specific_part) 主动清除。
+        TTL = 300s，进程内 TieredCache（线程安全，并发未命中只查一次库）。
+        设备树同步后调用 invalidate_room_filter_cache(specific_part) 主动清除（广播到所有进程）。
+    """
+    return get_available_sub_types_many([specific_part])[specific_part]
+
+
+def get_available_sub_types_many(specific_parts) -> dict:
+    """
+    批量版 get_available_sub_types：缓存未命中的专有部分合并为一次 DeviceFloor 查询。
+
+    返回：{specific_part: frozenset[str]}；查询异常时未命中部分降级为仅系统级，不缓存。
     """
-    # 1. 检查缓存
-    now = time.monotonic()
-    with _cache_lock:
-        cached = _room_filter_cache.get(specific_part)
-        if cached is not None:
-            available_sub_types, cached_at = cached
-            if (now - cached_at) < _CACHE_TTL_SECONDS:
-                logger.debug(
-                    'utils_room_filter: 命中缓存 specific_part=%s, sub_types=%s',
-                    specific_part, available_sub_types,
-                )
-                return available_sub_types
-
-    # 2. 查询 device_room（延迟导入，避免循环依赖）
-    from .models import DeviceFloor  # noqa: PLC0415
     try:
-        floors = list(
-            DeviceFloor.objects.filter(
-                owner__specific_part=specific_part
-            ).prefetch_related('rooms')
-        )
+        return _room_filter_cache.get_many(specific_parts, _load_available_sub_types)
     except Exception as e:
         logger.error(
-            'utils_room_filter: 查询 DeviceFloor 失败 specific_part=%s: %s',
-            specific_part, e,
+            'utils_room_filter: 查询 DeviceFloor 失败 specific_parts=%s: %s',
+            list(specific_parts)[:10], e,
         )
         # 查询异常时返回仅系统级（安全降级），不缓存（下次再尝试查询）
-        return SYSTEM_LEVEL_SUB_TYPES
-
-    # 3. 收集所有 ori_room_name
-    all_ori_room_names: list = []
-    for floor in floors:
-        for room in floor.rooms.all():
-            if room.ori_room_name:
-                all_ori_room_names.append(room.ori_room_name)
-
-    logger.debug(
-        'utils_room_filter: specific_part=%s, 共 %d 个房间: %s',
-        specific_part, len(all_ori_room_names), all_ori_room_names,
-    )
-
-    # 4. 若设备树未同步（floors 为空），降级为仅系统级面板（方案 B）
-    if not floors:
-        logger.info(
-            'utils_room_filter: specific_part=%s 设备树未同步，降级为仅系统级面板（方案B）',
-            specific_part,
-        )
-        result = SYSTEM_LEVEL_SUB_TYPES
-        _update_cache(specific_part, result, now)
+        result = _room_filter_cache.get_many(specific_parts)
+        for sp in specific_parts:
+            result.setdefault(sp, SYSTEM_LEVEL_SUB_TYPES)
         return result
 
-    # 5. 通过关键词匹配确定可用的 panel sub_type
-    available_panels = _match_panel_sub_types(all_ori_room_names)
-    result = SYSTEM_LEVEL_SUB_TYPES | available_panels
-
-    logger.info(
-        'utils_room_filter: specific_part=%s → available_sub_types=%s',
-        specific_part, result,
-    )
-
-    _update_cache(specific_part, result, now)
-    return result
-
 
 def get_house_type(specific_part: str) -> Optional[str]:
     """判定该专有部分的户型，返回 HOUSE_TYPE_THREE / HOUSE_TYPE_FOUR / None。
@@ -200,26 +159,10 @@ def get_house_type(specific_part: str) -> Optional[str]:
     返回 None 的情形：设备树未同步、无面板、或面板数既非 3 也非 4。
         调用方应据此回退到全局默认标签（保持既有行为，不做臆测）。
 
-    缓存：TTL 300s，与 get_available_sub_types 共用锁与失效入口。
+    缓存：TTL 300s，与 get_available_sub_types 共用失效入口。
     """
-    now = time.monotonic()
-    with _cache_lock:
-        cached = _house_type_cache.get(specific_part)
-        if cached is not None:
-            house_type, cached_at = cached
-            if (now - cached_at) < _CACHE_TTL_SECONDS:
-                return house_type
-
-    from .models import DeviceNode  # noqa: PLC0415
     try:
-        rooms = list(
-            DeviceNode.objects
-            .filter(
-                room__floor__owner__specific_part=specific_part,
-                product_code=_PANEL_PRODUCT_CODE,
-            )
-            .values_list('room__ori_room_name', flat=True)
-        )
+        return _house_type_cache.get(specific_part, _load_house_type)
     except Exception as e:
         logger.error(
             'utils_room_filter: get_house_type 查询失败 specific_part=%s: %s',
@@ -227,36 +170,6 @@ def get_house_type(specific_part: str) -> Optional[str]:
         )
         return None  # 异常不缓存，下次重试
 
-    panel_count = len(rooms)
-    if panel_count == 4:
-        house_type = HOUSE_TYPE_FOUR
-    elif panel_count == 3:
-        house_type = HOUSE_TYPE_THREE
-    else:
-        house_type = None
-        if panel_count:
-            logger.warning(
-                'utils_room_filter: specific_part=%s 面板数=%d（既非3也非4），'
-                '户型无法判定，回退全局默认标签。房间=%s',
-                specific_part, panel_count, rooms,
-            )
-
-    # 交叉校验：含"书房"应为四房
-    has_study = any(r and '书房' in r for r in rooms)
-    if house_type is not None:
-        expected = HOUSE_TYPE_FOUR if has_study else HOUSE_TYPE_THREE
-        if expected != house_type:
-            logger.warning(
-                'utils_room_filter: specific_part=%s 户型判据冲突——'
-                '面板计数=%d→%s，但房间名%s"书房"→%s。以面板计数为准。房间=%s',
-                specific_part, panel_count, house_type,
-                '含' if has_study else '不含', expected, rooms,
-            )
-
-    with _cache_lock:
-        _house_type_cache[specific_part] = (house_type, now)
-    return house_type
-
 
 def resolve_panel_room(specific_part: str, sub_type: str) -> Optional[str]:
     """按户型解析温控面板 sub_type 的**真实房间名**（PANEL_ROOM_TABLE 实测真值）。
@@ -411,18 +324,17 @@ def invalidate_room_filter_cache(specific_part: str = None) -> None:
 
     调用时机：设备树同步成功后（device_tree_sync.py 中的 sync_one_specific_part
               以及批量同步完成回调）。
+    失效经 tiered_cache 广播，web worker 与 MQTT 消费者进程同时生效。
     """
-    with _cache_lock:
-        if specific_part is None:
-            _room_filter_cache.clear()
-            _house_type_cache.clear()
-            logger.info('utils_room_filter: 已清除全部房型过滤缓存与户型缓存')
-        else:
-            _room_filter_cache.pop(specific_part, None)
-            _house_type_cache.pop(specific_part, None)
-            logger.info(
-                'utils_room_filter: 已清除 %s 的房型过滤缓存与户型缓存', specific_part
-            )
+    keys = None if specific_part is None else [specific_part]
+    _room_filter_cache.invalidate(keys)
+    _house_type_cache.invalidate(keys)
+    if specific_part is None:
+        logger.info('utils_room_filter: 已清除全部房型过滤缓存与户型缓存')
+    else:
+        logger.info(
+            'utils_room_filter: 已清除 %s 的房型过滤缓存与户型缓存', specific_part
+        )
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -476,7 +388,81 @@ def _match_panel_sub_types(ori_room_names: list) -> frozenset:
     return frozenset(available)
 
 
-def _update_cache(specific_part: str, result: frozenset, timestamp: float) -> None:
-    """线程安全地更新缓存。"""
-    with _cache_lock:
-        _room_filter_cache[specific_part] = (result, timestamp)
+def _load_available_sub_types(specific_parts: list) -> dict:
+    """缓存未命中的专有部分一次查询 DeviceFloor（含房间），查询异常向上抛出（不缓存）。"""
+    from .models import DeviceFloor  # noqa: PLC0415
+    floors = list(
+        DeviceFloor.objects.filter(
+            owner__specific_part__in=specific_parts
+        ).select_related('owner').prefetch_related('rooms')
+    )
+
+    room_names: dict = {}
+    for floor in floors:
+        names = room_names.setdefault(floor.owner.specific_part, [])
+        for room in floor.rooms.all():
+            if room.ori_room_name:
+                names.append(room.ori_room_name)
+
+    result = {}
+    for sp in specific_parts:
+        if sp not in room_names:
+            # 设备树未同步（floors 为空），降级为仅系统级面板（方案 B）
+            logger.info(
+                'utils_room_filter: specific_part=%s 设备树未同步，降级为仅系统级面板（方案B）',
+                sp,
+            )
+            result[sp] = SYSTEM_LEVEL_SUB_TYPES
+            continue
+        logger.debug(
+            'utils_room_filter: specific_part=%s, 共 %d 个房间: %s',
+            sp, len(room_names[sp]), room_names[sp],
+        )
+        # 通过关键词匹配确定可用的 panel sub_type
+        result[sp] = SYSTEM_LEVEL_SUB_TYPES | _match_panel_sub_types(room_names[sp])
+        logger.info(
+            'utils_room_filter: specific_part=%s → available_sub_types=%s',
+            sp, result[sp],
+        )
+    return result
+
+
+def _load_house_type(specific_part: str) -> Optional[str]:
+    """按温控面板数判定户型（判据见 get_house_type），查询异常向上抛出（不缓存）。"""
+    from .models import DeviceNode  # noqa: PLC0415
+    rooms = list(
+        DeviceNode.objects
+        .filter(
+            room__floor__owner__specific_part=specific_part,
+            product_code=_PANEL_PRODUCT_CODE,
+        )
+        .values_list('room__ori_room_name', flat=True)
+    )
+
+    panel_count = len(rooms)
+    if panel_count == 4:
+        house_type = HOUSE_TYPE_FOUR
+    elif panel_count == 3:
+        house_type = HOUSE_TYPE_THREE
+    else:
+        house_type = None
+        if panel_count:
+            logger.warning(
+                'utils_room_filter: specific_part=%s 面板数=%d（既非3也非4），'
+                '户型无法判定，回退全局默认标签。房间=%s',
+                specific_part, panel_count, rooms,
+            )
+
+    # 交叉校验：含"书房"应为四房
+    has_study = any(r and '书房' in r for r in rooms)
+    if house_type is not None:
+        expected = HOUSE_TYPE_FOUR if has_study else HOUSE_TYPE_THREE
+        if expected != house_type:
+            logger.warning(
+                'utils_room_filter: specific_part=%s 户型判据冲突——'
+                '面板计数=%d→%s，但房间名%s"书房"→%s。以面板计数为准。房间=%s',
+                specific_part, panel_count, house_type,
+                '含' if has_study else '不含', expected, rooms,
+            )
+
+    return house_type
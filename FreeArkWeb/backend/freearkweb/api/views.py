@@ -1,7 +1,7 @@
 import calendar
 import logging
 import subprocess
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from django.utils.timezone import now as django_now
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
@@ -13,7 +13,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
-from .models import CustomUser, UsageQuantityDaily, UsageQuantityMonthly, PLCConnectionStatus, PLCStatusChangeHistory, OwnerInfo, PLCLatestData, DeviceConfig, DeviceParamHistory, ScreenConnectivityStatus, TokenActivity
+from .models import CustomUser, UsageQuantityDaily, UsageQuantityMonthly, PLCConnectionStatus, PLCStatusChangeHistory, OwnerInfo, PLCLatestData, DeviceConfig, DeviceParamHistory, DeviceParamRollup, ScreenConnectivityStatus, TokenActivity, parse_history_value
 from .utils_room_filter import (  # v0.5.7: 房型过滤工具
     get_available_sub_types,
     get_allowed_param_names,
@@ -22,13 +22,18 @@ from .utils_room_filter import (  # v0.5.7: 房型过滤工具
     resolve_panel_display,  # v1.14.0: 面板标签按户型解析实测真值
     get_panel_order,        # v1.14.0: 面板展示序
 )
+from .chart_downsample import DOWNSAMPLE_LTTB, DOWNSAMPLE_METHODS, downsample
+from .fleet_status import PLC_FLEET_CACHE_KEY, SCREEN_FLEET_CACHE_KEY, read_fleet_snapshot
+from .history_rollups import (
+    RESOLUTION_AUTO, RESOLUTION_RAW, RESOLUTIONS, bucket_start, choose_resolution,
+)
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer, UserLoginSerializer, UserCreateSerializer,
     UsageQuantityDailySerializer, UsageQuantityMonthlySerializer,
     PLCConnectionStatusSerializer, OwnerInfoSerializer,
     PLCLatestDataParamSerializer,
-    DeviceParamHistorySerializer,
+    DeviceParamHistorySerializer, DeviceParamRollupSerializer,
 )
 
 # 获取logger实例
@@ -49,43 +54,229 @@ logger = logging.getLogger(__name__)
 #   因此在装饰器层对 cache.get/set 加 try/except 捕获所有 Redis 异常。
 #   Redis 不可用时：get 返回 None（缓存未命中），set 静默忽略，接口正常返回。
 #   不会因 Redis 故障导致 HTTP 500，看板退化为无缓存直查模式。
+# 软 / 硬双 TTL + 单飞刷新（stale-while-revalidate）：
+#   原先 30s 到期瞬间所有并发轮询（墙面大屏 + 多个浏览器）同时未命中、同时重算同一组聚合，
+#   造成 DB 尖刺。现缓存值带软过期时间 fresh_until，Redis 键以硬 TTL（ttl + stale_ttl）保存：
+#   - 未软过期：直接返回；
+#   - 已软过期未硬过期：立即返回旧值，抢到刷新锁（cache.add → Redis SET NX EX）的请求
+#     在后台线程重算并回写，同一个键同一时刻只有一个刷新；
+#   - 完全未命中（冷启动 / 硬过期）：抢到锁的请求同步计算，其余请求最多等待
+#     DASHBOARD_LOCK_WAIT 秒读取其结果，超时再自行计算。
+#   后台刷新与预热用只含查询参数的合成请求调用视图（缓存键只由 prefix 与查询参数决定），
+#   dashboard_cache_prewarm 服务按固定间隔提前刷新已登记且近期有人读取的看板键，轮询基本只命中新鲜值；
+#   读取记录写在 <key>:read（每进程每键最多 DASHBOARD_READ_MARK_INTERVAL 秒写一次），
+#   DASHBOARD_IDLE_SECONDS 内无人读取的键不预热。
+#   锁与缓存读写同样受降级兜底保护：Redis 不可用时视为抢锁成功，退化为直查。
 import functools
+import threading
+import time
 from urllib.parse import urlencode
 from django.core.cache import cache
+from django.db import connections as _db_connections
+from django.http import HttpRequest, QueryDict
+from rest_framework.request import Request as _DRFRequest
 
 _cache_logger = logging.getLogger(__name__)  # logging 已在文件顶部导入
 
+# 软过期后仍可返回旧值的秒数（硬 TTL = ttl + stale_ttl）
+DASHBOARD_STALE_TTL = 90
+# 刷新锁的过期秒数（刷新线程异常退出时锁自动释放）
+DASHBOARD_LOCK_TTL = 30
+# 冷启动时未抢到锁的请求等待首个结果的秒数与轮询间隔
+DASHBOARD_LOCK_WAIT = 2.0
+DASHBOARD_LOCK_POLL = 0.05
+
+# 预热服务只刷新该秒数内被读取过的键；读取记录的进程内写入节流秒数
+DASHBOARD_IDLE_SECONDS = 300
+DASHBOARD_READ_MARK_INTERVAL = 30
+
+# 已登记的看板缓存：prefix → {'view_fn', 'ttl', 'stale_ttl', 'vary_params'}（供预热服务使用）
+DASHBOARD_CACHE_REGISTRY = {}
+# 本进程最近一次写读取记录的时间：key → time.monotonic()
+_dashboard_read_marks = {}
+
+
+def _dashboard_cache_key(prefix, params=None):
+    key = 'dash:' + prefix
+    if params is not None:
+        key += ':' + urlencode(sorted(params.items()))
+    return key
+
+
+def _dashboard_cache_get(key):
+    """读取缓存条目 → {'data', 'fresh_until'} 或 None；兼容升级前直接存 resp.data 的旧格式"""
+    # perf-P2：Redis 降级兜底 — get 失败视为缓存未命中，不中断请求
+    try:
+        cached = cache.get(key)
+    except Exception as _cache_exc:
+        _cache_logger.warning(
+            'cache_dashboard: Redis get 失败（降级为直查）: %s', _cache_exc
+        )
+        return None
+    if cached is None:
+        return None
+    if isinstance(cached, dict) and cached.get('_swr'):
+        return cached
+    return {'data': cached, 'fresh_until': float('inf')}
+
+
+def _dashboard_cache_set(key, data, ttl, stale_ttl):
+    # perf-P2：Redis 降级兜底 — set 失败静默忽略，不影响响应
+    try:
+        cache.set(key, {'_swr': 1, 'data': data, 'fresh_until': time.time() + ttl}, ttl + stale_ttl)
+    except Exception as _cache_exc:
+        _cache_logger.warning(
+            'cache_dashboard: Redis set 失败（降级为无缓存）: %s', _cache_exc
+        )
+
+
+def _dashboard_mark_read(key):
+    """记录键近期被读取（供预热服务判断是否有人在看）；写入按进程节流，失败静默忽略"""
+    now = time.monotonic()
+    if now - _dashboard_read_marks.get(key, float('-inf')) < DASHBOARD_READ_MARK_INTERVAL:
+        return
+    _dashboard_read_marks[key] = now
+    try:
+        cache.set(key + ':read', 1, DASHBOARD_IDLE_SECONDS)
+    except Exception as _cache_exc:
+        _cache_logger.warning('cache_dashboard: Redis 写读取记录失败（忽略）: %s', _cache_exc)
+
+
+def _dashboard_recently_read(key):
+    try:
+        return cache.get(key + ':read') is not None
+    except Exception as _cache_exc:
+        _cache_logger.warning('cache_dashboard: Redis 读取记录查询失败（按有人读取处理）: %s', _cache_exc)
+        return True
+
+
+def _dashboard_lock_acquire(key):
+    try:
+        return bool(cache.add(key + ':lock', 1, DASHBOARD_LOCK_TTL))
+    except Exception as _cache_exc:
+        _cache_logger.warning('cache_dashboard: Redis 加锁失败（降级为直查）: %s', _cache_exc)
+        return True
+
+
+def _dashboard_lock_release(key):
+    try:
+        cache.delete(key + ':lock')
+    except Exception as _cache_exc:
+        _cache_logger.warning('cache_dashboard: Redis 解锁失败（等待锁过期）: %s', _cache_exc)
+
+
+def _dashboard_refresh_request(params):
+    """后台刷新 / 预热用的合成 GET 请求（只带查询参数）"""
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for name, value in (params or {}).items():
+        http_request.GET[name] = value
+    return _DRFRequest(http_request)
+
+
+def _dashboard_compute(view_fn, request, args, kwargs, key, ttl, stale_ttl):
+    resp = view_fn(request, *args, **kwargs)
+    if getattr(resp, 'status_code', None) == 200:
+        _dashboard_cache_set(key, resp.data, ttl, stale_ttl)
+    return resp
+
+
+def _dashboard_refresh(view_fn, params, args, kwargs, key, ttl, stale_ttl):
+    """重算一个看板键并回写；调用方须已持有刷新锁，本函数负责释放。返回是否成功"""
+    try:
+        resp = _dashboard_compute(view_fn, _dashboard_refresh_request(params), args, kwargs, key, ttl, stale_ttl)
+        return getattr(resp, 'status_code', None) == 200
+    except Exception as exc:
+        _cache_logger.error('cache_dashboard: 刷新 %s 失败: %s', key, exc, exc_info=True)
+        return False
+    finally:
+        _dashboard_lock_release(key)
+
+
+def _spawn_dashboard_refresh(*refresh_args):
+    """后台线程执行 _dashboard_refresh，结束后关闭该线程的数据库连接"""
+    def _run():
+        try:
+            _dashboard_refresh(*refresh_args)
+        finally:
+            _db_connections.close_all()
+
+    threading.Thread(target=_run, name='dashboard-cache-refresh', daemon=True).start()
+
+
+def _dashboard_wait_for_entry(key):
+    deadline = time.monotonic() + DASHBOARD_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(DASHBOARD_LOCK_POLL)
+        entry = _dashboard_cache_get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cache_dashboard(ttl=30, prefix=None, vary_params=False, stale_ttl=None):
+    """看板接口缓存装饰器：ttl 为软过期秒数，stale_ttl 为软过期后仍可返回旧值的秒数"""
+    stale_ttl = DASHBOARD_STALE_TTL if stale_ttl is None else stale_ttl
 
-def cache_dashboard(ttl=30, prefix=None, vary_params=False):
     def decorator(view_fn):
+        name = prefix or view_fn.__name__
+        DASHBOARD_CACHE_REGISTRY[name] = {
+            'view_fn': view_fn, 'ttl': ttl, 'stale_ttl': stale_ttl, 'vary_params': vary_params,
+        }
+
         @functools.wraps(view_fn)
         def wrapper(request, *args, **kwargs):
-            key = 'dash:' + (prefix or view_fn.__name__)
-            if vary_params:
-                key += ':' + urlencode(sorted(request.query_params.items()))
-            # perf-P2：Redis 降级兜底 — get 失败视为缓存未命中，不中断请求
-            try:
-                cached = cache.get(key)
-            except Exception as _cache_exc:
-                _cache_logger.warning(
-                    'cache_dashboard: Redis get 失败（降级为直查）: %s', _cache_exc
-                )
-                cached = None
-            if cached is not None:
-                return Response(cached)
-            resp = view_fn(request, *args, **kwargs)
-            if getattr(resp, 'status_code', None) == 200:
-                # perf-P2：Redis 降级兜底 — set 失败静默忽略，不影响响应
+            params = dict(request.query_params.items()) if vary_params else None
+            key = _dashboard_cache_key(name, params)
+            _dashboard_mark_read(key)
+            entry = _dashboard_cache_get(key)
+            if entry is not None:
+                if time.time() >= entry['fresh_until'] and _dashboard_lock_acquire(key):
+                    _spawn_dashboard_refresh(view_fn, params, args, kwargs, key, ttl, stale_ttl)
+                return Response(entry['data'])
+
+            if _dashboard_lock_acquire(key):
                 try:
-                    cache.set(key, resp.data, ttl)
-                except Exception as _cache_exc:
-                    _cache_logger.warning(
-                        'cache_dashboard: Redis set 失败（降级为无缓存）: %s', _cache_exc
-                    )
-            return resp
+                    return _dashboard_compute(view_fn, request, args, kwargs, key, ttl, stale_ttl)
+                finally:
+                    _dashboard_lock_release(key)
+            entry = _dashboard_wait_for_entry(key)
+            if entry is not None:
+                return Response(entry['data'])
+            return _dashboard_compute(view_fn, request, args, kwargs, key, ttl, stale_ttl)
         return wrapper
     return decorator
 
+
+def prewarm_dashboard_cache(names=None, horizon=0, only_read=False):
+    """预热已登记的看板缓存：条目缺失或将在 horizon 秒内软过期时重算
+
+    常驻服务以检查间隔作为 horizon：每个键的 horizon 不超过 ttl - horizon，刚刷新的键下一轮不会
+    再次重算（刷新频率不高于软 TTL）；only_read=True 时跳过 DASHBOARD_IDLE_SECONDS 内无人读取的键。
+    vary_params 的接口按无查询参数（看板默认请求）预热。返回 {'refreshed', 'skipped', 'failed'}。
+    """
+    stats = {'refreshed': 0, 'skipped': 0, 'failed': 0}
+    for name, spec in DASHBOARD_CACHE_REGISTRY.items():
+        if names and name not in names:
+            continue
+        params = {} if spec['vary_params'] else None
+        key = _dashboard_cache_key(name, params)
+        if only_read and not _dashboard_recently_read(key):
+            stats['skipped'] += 1
+            continue
+        entry = _dashboard_cache_get(key)
+        key_horizon = min(horizon, max(0, spec['ttl'] - horizon))
+        if entry is not None and entry['fresh_until'] - time.time() > key_horizon:
+            stats['skipped'] += 1
+            continue
+        if not _dashboard_lock_acquire(key):
+            stats['skipped'] += 1  # 其他进程正在刷新
+            continue
+        ok = _dashboard_refresh(spec['view_fn'], params, (), {}, key, spec['ttl'], spec['stale_ttl'])
+        stats['refreshed' if ok else 'failed'] += 1
+    return stats
+
 # 获取CSRF token的视图函数
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
@@ -962,6 +1153,7 @@ def dashboard_total_energy(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cache_dashboard(ttl=30)
 def dashboard_summary(request):
     """
     看板 API 2：今日/本月累计用电量
@@ -998,7 +1190,20 @@ def dashboard_plc_online_rate(request):
     看板 API 3：PLC 系统运行率
     GET /api/dashboard/plc-online-rate/
     返回 online_count, total_count, rate（百分比，0-100）
+    优先读取 MQTT 消费者发布的设备群计数快照（api.fleet_status），缺失时查库。
     """
+    snap = read_fleet_snapshot(PLC_FLEET_CACHE_KEY)
+    if snap is not None:
+        return Response({
+            'success': True,
+            'data': {
+                'online_count': snap['online_count'],
+                'offline_count': snap['offline_count'],
+                'total_count': snap['total_count'],
+                'rate': snap['online_rate'],
+            }
+        })
+
     stats = PLCConnectionStatus.objects.aggregate(
         total_count=Count('id'),
         online_count=Count(Case(When(connection_status='online', then=1), output_field=IntegerField())),
@@ -1030,7 +1235,20 @@ def dashboard_power_status(request):
               AND PLCLatestData(param_name='system_switch').value IS NOT NULL AND != 0
     运行模式：PLCLatestData(param_name='operation_mode').value，1=制冷/2=制热/3=通风/4=除湿
     未知模式：powered_on_count - sum(mode 1-4)，包含无记录/value=0/null/超范围（OQ-002）
+    优先读取 MQTT 消费者发布的设备群计数快照（api.fleet_status，口径相同），缺失时查库。
     """
+    snap = read_fleet_snapshot(PLC_FLEET_CACHE_KEY)
+    if snap is not None:
+        return Response({
+            'success': True,
+            'data': {
+                'powered_on_count': snap['powered_on_count'],
+                'total_count': snap['total_count'],
+                'power_on_rate': snap['power_on_rate'],
+                'mode_distribution': dict(snap['mode_distribution']),
+            }
+        })
+
     # Query 1：总台数（与 dashboard_plc_online_rate 口径一致，OQ-001）
     total_count = PLCConnectionStatus.objects.count()
 
@@ -1095,7 +1313,19 @@ def dashboard_screen_online_rate(request):
     GET /api/dashboard/screen-online-rate/
     返回 online_count, total_count, rate（百分比，0-100）
     在线标准：last_seen_at 距今 <= ONLINE_THRESHOLD_MINUTES 分钟
+    优先读取大屏心跳消费者发布的计数快照（api.fleet_status，阈值一致时），缺失时查库。
     """
+    snap = read_fleet_snapshot(SCREEN_FLEET_CACHE_KEY)
+    if snap is not None and snap.get('threshold_minutes') == ONLINE_THRESHOLD_MINUTES:
+        return Response({
+            'success': True,
+            'data': {
+                'online_count': snap['online_count'],
+                'total_count': snap['total_count'],
+                'rate': snap['rate'],
+            }
+        })
+
     online_cutoff = timezone.now() - timedelta(minutes=ONLINE_THRESHOLD_MINUTES)
     stats = ScreenConnectivityStatus.objects.aggregate(
         total_count=Count('id'),
@@ -1117,6 +1347,7 @@ def dashboard_screen_online_rate(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cache_dashboard(ttl=30, vary_params=True)
 def dashboard_trend(request):
     """
     看板 API 4：近 N 天用电量趋势
@@ -1921,6 +2152,57 @@ def get_device_realtime_params(request):
 # 非专有部分设备历史参数查询 API  (REQ-FUNC-034)
 # ===========================================================================
 
+def _parse_history_time(text):
+    """start_time / end_time 查询参数 → datetime；空串或格式不符返回 None"""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+# 紧凑图表格式的扫描行数上限：不降采样时与逐行格式一致（10000），降采样时允许扫描更长窗口
+CHART_MAX_ROWS = 10000
+CHART_DOWNSAMPLE_MAX_ROWS = 200000
+
+
+def _compact_chart_series(qs, resolution, points, method):
+    """按时间升序的历史 / 汇总查询集 → ({param_name: {t, v, raw_count}}, 是否触及扫描上限)
+
+    时间戳按 settings.TIME_ZONE 解释为 epoch 秒；原始历史中无法解析为数值的旧文本值跳过，
+    汇总的 v 为时间桶平均值。
+    """
+    limit = CHART_DOWNSAMPLE_MAX_ROWS if points else CHART_MAX_ROWS
+    if resolution == RESOLUTION_RAW:
+        rows = qs.values_list('param_name', 'collected_at', 'num_value', 'value')
+    else:
+        rows = qs.values_list('param_name', 'bucket_start', 'value_sum', 'sample_count')
+
+    tz = timezone.get_default_timezone()
+    grouped = {}
+    scanned = 0
+    for param, at, num_or_sum, text_or_count in rows[:limit].iterator(chunk_size=5000):
+        scanned += 1
+        if resolution == RESOLUTION_RAW:
+            value = num_or_sum if num_or_sum is not None else parse_history_value(text_or_count)
+            if not isinstance(value, (int, float)):
+                continue
+        else:
+            if not text_or_count:
+                continue
+            value = round(num_or_sum / text_or_count, 2)
+        ts_list, v_list = grouped.setdefault(param, ([], []))
+        ts_list.append(int(at.replace(tzinfo=tz).timestamp()))
+        v_list.append(value)
+
+    series = {}
+    for param, (ts_list, v_list) in grouped.items():
+        t_out, v_out = downsample(ts_list, v_list, points, method)
+        series[param] = {'t': t_out, 'v': v_out, 'raw_count': len(ts_list)}
+    return series, scanned >= limit
+
+
 @api_view(['GET'])
 @permission_classes([IsOperatorOrAbove])  # v1.6.0: 仅 admin/operator（匿名与业主均拒，OQ/AC-4.4）
 def get_device_param_history(request):
@@ -1934,6 +2216,16 @@ def get_device_param_history(request):
       param_name    (str, optional)  — 精确过滤单个参数名称
       start_time    (str, optional)  — 开始时间 YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD
       end_time      (str, optional)  — 结束时间 YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD
+      compact       (str, optional)  — chart=true 时传 true：按参数返回平行数组
+                                       series={param: {t:[epoch 秒], v:[数值], raw_count}}，
+                                       直接从 values_list 读取，不实例化模型、不走序列化器
+                                       （不用 format= 命名：DRF 保留该参数用于选择渲染器）
+      points        (int, optional)  — compact 格式的每条曲线点数预算（3 ~ 10000），超出时服务端降采样
+      downsample    (str, default lttb) — lttb | minmax（见 api.chart_downsample）
+      resolution    (str, default raw) — raw | hour | day | auto
+                                       hour/day 查询小时 / 日汇总（device_param_rollup），每行额外含
+                                       min/max/avg/last/count，value 为平均值、collected_at 为时间桶起点；
+                                       auto 按 start_time~end_time 窗口选最粗的可用粒度（见 api.history_rollups）
       page          (int, default 1)
       page_size     (int, default 50)
     """
@@ -1950,6 +2242,14 @@ def get_device_param_history(request):
     start_time = request.GET.get('start_time', '').strip()
     end_time = request.GET.get('end_time', '').strip()
     is_chart = request.GET.get('chart', '').lower() == 'true'
+    resolution = request.GET.get('resolution', '').strip().lower() or RESOLUTION_RAW
+    if resolution not in RESOLUTIONS:
+        return Response(
+            {'success': False, 'error': f'resolution 仅支持 {", ".join(RESOLUTIONS)}'},
+            status=400,
+        )
+    if resolution == RESOLUTION_AUTO:
+        resolution = choose_resolution(_parse_history_time(start_time), _parse_history_time(end_time))
 
     try:
         page = max(1, int(request.GET.get('page', 1)))
@@ -1960,7 +2260,12 @@ def get_device_param_history(request):
     except (ValueError, TypeError):
         page_size = 50
 
-    qs = DeviceParamHistory.objects.filter(specific_part=specific_part)
+    if resolution == RESOLUTION_RAW:
+        qs = DeviceParamHistory.objects.filter(specific_part=specific_part)
+        time_field, serializer_class = 'collected_at', DeviceParamHistorySerializer
+    else:
+        qs = DeviceParamRollup.objects.filter(specific_part=specific_part, resolution=resolution)
+        time_field, serializer_class = 'bucket_start', DeviceParamRollupSerializer
 
     if param_name:
         qs = qs.filter(param_name=param_name)
@@ -1979,33 +2284,66 @@ def get_device_param_history(request):
             qs = qs.none()
 
     if start_time:
-        qs = qs.filter(collected_at__gte=start_time)
+        start_dt = _parse_history_time(start_time)
+        if resolution != RESOLUTION_RAW and start_dt is not None:
+            # 包含 start_time 所在的时间桶
+            start_time = bucket_start(start_dt, resolution)
+        qs = qs.filter(**{f'{time_field}__gte': start_time})
     if end_time:
-        qs = qs.filter(collected_at__lte=end_time)
+        qs = qs.filter(**{f'{time_field}__lte': end_time})
+
+    if is_chart and request.GET.get('compact', '').lower() == 'true':
+        try:
+            points = max(0, int(request.GET.get('points') or 0))
+        except (TypeError, ValueError):
+            return Response({'success': False, 'error': 'points 必须为整数'}, status=400)
+        if 0 < points < 3:
+            return Response({'success': False, 'error': 'points 不能小于 3'}, status=400)
+        # 每条曲线的点数预算不超过未降采样时的行数上限
+        points = min(points, CHART_MAX_ROWS)
+        method = request.GET.get('downsample', '').strip().lower() or DOWNSAMPLE_LTTB
+        if method not in DOWNSAMPLE_METHODS:
+            return Response(
+                {'success': False, 'error': f'downsample 仅支持 {", ".join(DOWNSAMPLE_METHODS)}'},
+                status=400,
+            )
+        series, truncated = _compact_chart_series(qs.order_by(time_field), resolution, points, method)
+        return Response({
+            'success': True,
+            'specific_part': specific_part,
+            'resolution': resolution,
+            'format': 'compact',
+            'downsample': method if points else None,
+            'count': sum(len(s['t']) for s in series.values()),
+            'truncated': truncated,
+            'series': series,
+        })
 
     # 图表模式：返回全量数据（按时间正序，上限 10000 条），不分页
     if is_chart:
-        qs = qs.order_by('collected_at')
+        qs = qs.order_by(time_field)
         results = list(qs[:10000])
-        serializer = DeviceParamHistorySerializer(results, many=True)
+        serializer = serializer_class(results, many=True)
         return Response({
             'success': True,
             'specific_part': specific_part,
+            'resolution': resolution,
             'count': len(results),
             'results': serializer.data,
         })
 
-    qs = qs.order_by('-collected_at')
+    qs = qs.order_by(f'-{time_field}')
 
     total = qs.count()
     start = (page - 1) * page_size
     end = start + page_size
     page_qs = qs[start:end]
 
-    serializer = DeviceParamHistorySerializer(page_qs, many=True)
+    serializer = serializer_class(page_qs, many=True)
     return Response({
         'success': True,
         'specific_part': specific_part,
+        'resolution': resolution,
         'count': total,
         'page': page,
         'page_size': page_size,
@@ -5,14 +5,15 @@ api.views_rag — RAG 知识库 API 视图（v1.4.1_rag_image_citation）
   GET  /api/rag/documents/              列出所有文档（管理员）
   POST /api/rag/documents/              上传文档（管理员，异步入库）
   DELETE /api/rag/documents/{id}/       删除文档+向量（管理员）
-  POST /api/rag/documents/{id}/retry/   失败文档重试（管理员）
+  POST /api/rag/documents/{id}/retry/   失败文档重试（管理员；未附文件时从入库检查点续跑）
   GET  /api/rag/images/{image_id}/      取图（所有已登录用户，v1.4.1 新增）
 
 权限：
   文档管理端点：IsAdminUser（本项目自定义，校验 role=='admin'；非 DRF 内置的 is_staff）。
   取图端点：    IsAuthenticated（Bearer Token，所有已登录用户，REQ-NFR-004）。
 
-安全：文件双重校验（扩展名 + 文件头字节签名）；原始文件不落盘。
+安全：文件双重校验（扩展名 + 文件头字节签名）；原始文件仅在入库期间保存在
+      RAG_INGEST_WORK_DIR 检查点中（入库成功后删除，失败时保留供续跑）。
 
 @module MOD-141-08（RagImageView）
 @implements IFC-141-801
@@ -38,7 +39,8 @@ from rest_framework.views import APIView
 # 本平台 admin 概念 = User.role=='admin'，与设备写授权/工单审批保持一致。
 from .views import IsAdminUser
 from .models_rag import RagDocument
-from .rag_service import rag_vector_cache, start_ingest_thread
+from .rag_ingest import IngestCheckpoint
+from .rag_service import rag_vector_cache, resume_ingest, start_ingest_thread
 from .serializers_rag import RagDocumentSerializer
 
 logger = logging.getLogger("api.views_rag")
@@ -103,7 +105,7 @@ class RagDocumentViewSet(viewsets.GenericViewSet):
     def create(self, request):
         """
         上传文档：校验→创建 RagDocument(pending)→异步启动入库线程→立即返回 201。
-        原始文件读入内存后释放，不落盘。
+        入库进度见列表接口的 pages_* / chunks_* 字段。
         """
         f = request.FILES.get('file')
         if f is None:
@@ -155,6 +157,7 @@ class RagDocumentViewSet(viewsets.GenericViewSet):
 
         doc_name = doc.file_name
         doc.delete()
+        IngestCheckpoint.for_document(pk).clear()   # 失败文档残留的入库检查点一并删除
         # 缓存刷新（异步，不阻塞响应）
         rag_vector_cache.refresh()
         logger.info("views_rag: 文档 %s（id=%s）已删除，缓存刷新中", doc_name, pk)
@@ -165,8 +168,8 @@ class RagDocumentViewSet(viewsets.GenericViewSet):
     def retry(self, request, pk=None):
         """
         重试失败文档：仅 status=failed 可重试，重置为 pending，重新启动入库线程。
-        注意：重试需重新上传文件（原始文件未落盘）。
-        若请求中包含 file 字段，使用新文件；否则返回 400 提示重新上传。
+        若请求中包含 file 字段，使用新文件从头入库；否则从入库检查点续跑
+        （已解析的页、已写入的 chunk 不再重复处理），无检查点时返回 400 提示重新上传。
         """
         try:
             doc = RagDocument.objects.get(pk=pk)
@@ -179,13 +182,21 @@ class RagDocumentViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # 重试需要重新提供文件（原始文件不持久化，见 OQ-03 决策）
         f = request.FILES.get('file')
         if f is None:
-            return Response(
-                {"error": "重试需要重新上传文件（原始文件未保存），请在重试时附带 file 字段"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            # 未附文件：从入库检查点续跑（保留已写入的 chunk / 图片，只补做未完成部分）
+            if IngestCheckpoint.for_document(doc.id).source_path() is None:
+                return Response(
+                    {"error": "重试需要重新上传文件（无可续跑的入库检查点），请在重试时附带 file 字段"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            doc.status = RagDocument.STATUS_PENDING
+            doc.error_message = ''
+            doc.save(update_fields=['status', 'error_message', 'updated_at'])
+            doc_id = doc.id
+            transaction.on_commit(lambda: resume_ingest(doc_id))
+            logger.info("views_rag: 文档 %s（id=%s）从检查点续跑", doc.file_name, doc.id)
+            return Response(self.get_serializer(doc).data, status=status.HTTP_200_OK)
 
         try:
             file_ext = _validate_upload_file(f)
@@ -377,13 +377,25 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # ---------------------------------------------------------------------------
 # Django Channels 配置（WebSocket 支持，见 ADR-001）
 # ---------------------------------------------------------------------------
-# 使用 InMemoryChannelLayer：单进程场景，无需 Redis
-# 注意：Uvicorn 必须以 --workers 1 启动（InMemoryChannelLayer 不支持多进程）
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# 测试：InMemoryChannelLayer（单进程，无需 redis-server）。
+# 生产：channels_redis（db=0，与缓存 db=1 隔离）。实时参数推送（api/realtime_push.py）由
+#   MQTT 消费者进程 group_send、ASGI 进程内的 RealtimeParamsConsumer 接收，必须跨进程共享信道层。
+# 回滚：改回 InMemoryChannelLayer 即可，聊天 WS 不受影响，实时参数推送退化为无推送（客户端轮询兜底）。
+if _RUNNING_TESTS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [os.environ.get('CHANNEL_REDIS_URL', 'redis://127.0.0.1:6379/0')],
+            },
+        }
     }
-}
 
 # ---------------------------------------------------------------------------
 # OpenClaw Gateway 集成配置已于 v1.7.0 退役移除
@@ -699,12 +711,42 @@ RAG_EMBEDDING_BASE_URL = os.environ.get('RAG_EMBEDDING_BASE_URL', '')
 RAG_EMBEDDING_MODEL = os.environ.get('RAG_EMBEDDING_MODEL', 'BAAI/bge-m3')
 RAG_EMBEDDING_API_KEY = os.environ.get('RAG_EMBEDDING_API_KEY', '')
 # embedding 后端风格：'openai'（标准 /embeddings，支持批量）|
-# 'doubao_multimodal'（火山方舟 doubao-embedding-vision 多模态 /embeddings/multimodal，逐条）
+# 'doubao_multimodal'（火山方舟 doubao-embedding-vision 多模态 /embeddings/multimodal，逐条）| 'fake'（离线哈希伪向量）
 RAG_EMBEDDING_API_STYLE = os.environ.get('RAG_EMBEDDING_API_STYLE', 'openai')
 RAG_TOP_K = int(os.environ.get('RAG_TOP_K', '5'))
 RAG_SCORE_THRESHOLD = float(os.environ.get('RAG_SCORE_THRESHOLD', '0.3'))
 RAG_CHUNK_SIZE = int(os.environ.get('RAG_CHUNK_SIZE', '500'))
 RAG_CHUNK_OVERLAP = int(os.environ.get('RAG_CHUNK_OVERLAP', '50'))
+# 查询向量服务（api/query_embedding.py）：语义路由与 search_rag 共用
+#   CACHE_SIZE：进程内 LRU 条目数；CACHE_TTL：秒，PERSIST=True 时写 Redis 跨进程/重启复用
+#   BATCH_WINDOW_MS：并发查询合并为一次 embed_texts 的等待窗口；MAX_BATCH：单批文本上限
+RAG_QUERY_EMBED_CACHE_SIZE = int(os.environ.get('RAG_QUERY_EMBED_CACHE_SIZE', '2048'))
+RAG_QUERY_EMBED_CACHE_TTL = int(os.environ.get('RAG_QUERY_EMBED_CACHE_TTL', str(7 * 86400)))
+RAG_QUERY_EMBED_PERSIST = os.environ.get('RAG_QUERY_EMBED_PERSIST', 'True') == 'True'
+RAG_QUERY_EMBED_BATCH_WINDOW_MS = int(os.environ.get('RAG_QUERY_EMBED_BATCH_WINDOW_MS', '5'))
+RAG_QUERY_EMBED_MAX_BATCH = int(os.environ.get('RAG_QUERY_EMBED_MAX_BATCH', '16'))
+# 向量索引（api/rag_vector_index.py）：
+#   INDEX_DIR：持久化目录（预归一化矩阵 mmap + 元数据），空串关闭；测试不落盘
+#   INDEX_DTYPE：float32 | float16 | int8（量化省内存，余弦误差约 1e-3 / 1e-2）
+#   ANN_MIN_ROWS：chunk 数达到该值启用 IVF 近似检索（0 关闭）；ANN_NPROBE：每次查询扫描的簇数
+RAG_VECTOR_INDEX_DIR = '' if _RUNNING_TESTS else os.environ.get(
+    'RAG_VECTOR_INDEX_DIR', os.path.join(BASE_DIR, 'rag_index'))
+RAG_VECTOR_INDEX_DTYPE = os.environ.get('RAG_VECTOR_INDEX_DTYPE', 'float32')
+RAG_VECTOR_ANN_MIN_ROWS = int(os.environ.get('RAG_VECTOR_ANN_MIN_ROWS', '20000'))
+RAG_VECTOR_ANN_NPROBE = int(os.environ.get('RAG_VECTOR_ANN_NPROBE', '8'))
+# 混合检索（api/rag_lexical_index.py，BM25 倒排与向量索引同步构建）：
+#   LEXICAL_WEIGHT：BM25（按本次最高分归一化）叠加到余弦分上的权重，0 关闭融合
+#   LEXICAL_SHORT_CIRCUIT：查询中的故障码 / 参数名被 chunk 精确包含时直接返回字面结果，不调 embedding
+RAG_LEXICAL_WEIGHT = float(os.environ.get('RAG_LEXICAL_WEIGHT', '0.3'))
+RAG_LEXICAL_SHORT_CIRCUIT = os.environ.get('RAG_LEXICAL_SHORT_CIRCUIT', 'True') == 'True'
+# 入库流水线（RagIngestor）：
+#   WORK_DIR：检查点目录（原始文件 + 逐页解析结果，入库成功后删除），空串关闭续跑；测试不落盘
+#   PARSE_WORKERS：PDF 逐页解析 / OCR 进程数（<=1 在入库线程内顺序解析）
+#   EMBED_CONCURRENCY：同时在途的 embedding 批次数
+RAG_INGEST_WORK_DIR = '' if _RUNNING_TESTS else os.environ.get(
+    'RAG_INGEST_WORK_DIR', os.path.join(BASE_DIR, 'rag_ingest'))
+RAG_INGEST_PARSE_WORKERS = int(os.environ.get('RAG_INGEST_PARSE_WORKERS', str(min(4, os.cpu_count() or 1))))
+RAG_INGEST_EMBED_CONCURRENCY = int(os.environ.get('RAG_INGEST_EMBED_CONCURRENCY', '4'))
 
 # ===========================================================================
 # v1.5.0 多模态提问：doubao-vision VLM 配置（MOD-MQ-07）
@@ -0,0 +1,256 @@
+"""
+asyncio PLC 采集引擎（ImprovedDataCollectionManager 的 engine='asyncio' 模式）
+
+线程池模式下每个 PLC IP 占用一个 ThreadPoolExecutor 工作线程直到 future.result 超时，
+一台慢 PLC 或掉线 PLC 会长期占住一个名额，后面的 PLC 只能排队。本引擎改为：
+
+  - 一个常驻后台事件循环，所有采集轮次（各调度分组线程并发调用 read_all）共用；
+  - 每个 PLC 一个会话协程，全局并发由 asyncio.Semaphore(max_concurrency) 约束；
+  - 会话从执行器线程开始运行会话函数起计时（排队等线程的时间不计入），超过 plc_deadline
+    立即让出名额并判定超时，同时中止该 PLC 的底层连接，使仍阻塞在 snap7 调用里的线程尽快返回；
+  - 超时会话让出名额后其线程可能仍在运行，执行器在并发上限之外预留 overdue_allowance 个线程，
+    新会话不必等这些线程返回；
+  - 单轮超过 round_deadline 时取消所有未完成会话，已完成的结果照常返回；
+  - 超时会话的线程尚未真正返回前，该 PLC 在后续轮次直接判失败、不再占用名额。
+
+snap7 本身是阻塞库，会话内的连接和块读仍在专用执行器线程中完成；
+事件循环只负责调度、计时与取消。
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from datacollection.log_config_manager import get_logger
+
+logger = get_logger('async_collection_engine')
+
+# 全局同时在途的 PLC 会话上限（所有调度分组共享）
+DEFAULT_MAX_CONCURRENCY = 256
+# 单个 PLC 会话（连接 + 全部块读）的截止时间（秒），从拿到并发名额起计时
+DEFAULT_PLC_DEADLINE = 15.0
+# 单轮采集（一次 read_all 涉及的全部 PLC）的截止时间（秒）
+DEFAULT_ROUND_DEADLINE = 60.0
+# 执行器在并发上限之外为“已超时但线程未返回”的会话预留的线程数（默认与并发上限相同）
+DEFAULT_OVERDUE_ALLOWANCE = None
+
+# 会话函数：(plc_ip, configs) -> 结果列表（阻塞调用，在执行器线程中运行）
+SessionFn = Callable[[str, List[Dict]], List[Dict]]
+# 失败结果构造函数：(plc_ip, configs, message) -> 结果列表
+FailureFn = Callable[[str, List[Dict], str], List[Dict]]
+
+
+class AsyncCollectionEngine:
+    """基于 asyncio 的 PLC 会话调度器，对外提供同步的 read_all 供调度线程直接调用。
+
+    Args:
+        max_concurrency: 全局同时在途的 PLC 会话上限
+        plc_deadline: 单个 PLC 会话截止时间（秒）
+        round_deadline: 单轮采集截止时间（秒）
+        abort_fn: 会话超时或被取消时调用的中止钩子 (plc_ip) -> None，用于断开底层连接
+        overdue_allowance: 执行器在 max_concurrency 之外预留的线程数，None 表示与 max_concurrency 相同
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 plc_deadline: float = DEFAULT_PLC_DEADLINE,
+                 round_deadline: float = DEFAULT_ROUND_DEADLINE,
+                 abort_fn: Optional[Callable[[str], None]] = None,
+                 overdue_allowance: Optional[int] = DEFAULT_OVERDUE_ALLOWANCE):
+        self.max_concurrency = max_concurrency
+        self.overdue_allowance = max_concurrency if overdue_allowance is None else max(0, overdue_allowance)
+        self.plc_deadline = plc_deadline
+        self.round_deadline = round_deadline
+        self.abort_fn = abort_fn
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+
+        # 已超时但执行线程尚未返回的 PLC（仅在事件循环线程内读写）
+        self._overdue = set()
+        self._active_sessions = 0
+        self.stats = {
+            'rounds': 0,
+            'sessions': 0,
+            'timeouts': 0,
+            'cancelled': 0,
+            'skipped_overdue': 0,
+            'errors': 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def start(self) -> None:
+        """启动后台事件循环线程（重复调用无副作用）"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrency + self.overdue_allowance, thread_name_prefix="PLCSession"
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_loop, args=(ready,), name="PLCAsyncEngine", daemon=True
+            )
+            self._thread.start()
+            ready.wait(timeout=5)
+        logger.info(f"✅ asyncio 采集引擎已启动，并发上限：{self.max_concurrency}，"
+                    f"单PLC截止：{self.plc_deadline}秒，单轮截止：{self.round_deadline}秒")
+
+    def _run_loop(self, ready: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def stop(self) -> None:
+        """取消所有在途会话并停止事件循环"""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            loop, thread, executor = self._loop, self._thread, self._executor
+            if loop.is_running():
+                try:
+                    asyncio.run_coroutine_threadsafe(self._cancel_all(), loop).result(timeout=5)
+                except Exception as e:
+                    logger.warning(f"⚠️  取消在途PLC会话失败：{str(e)}")
+                loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=5)
+            loop.close()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._loop = self._thread = self._executor = self._semaphore = None
+        logger.info("✅ asyncio 采集引擎已停止")
+
+    async def _cancel_all(self) -> None:
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # 采集
+    # ------------------------------------------------------------------
+
+    def read_all(self, ip_to_configs: Dict[str, List[Dict]], session_fn: SessionFn,
+                 failure_fn: FailureFn) -> List[Dict]:
+        """同步入口：在事件循环中并发执行所有 PLC 会话，阻塞等待本轮结束后返回扁平结果列表"""
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self._collect(ip_to_configs, session_fn, failure_fn), self._loop
+        )
+        return future.result()
+
+    async def _collect(self, ip_to_configs: Dict[str, List[Dict]], session_fn: SessionFn,
+                       failure_fn: FailureFn) -> List[Dict]:
+        start_time = time.time()
+        self.stats['rounds'] += 1
+        tasks = {
+            asyncio.ensure_future(self._session(plc_ip, configs, session_fn, failure_fn)): plc_ip
+            for plc_ip, configs in ip_to_configs.items()
+        }
+        if not tasks:
+            return []
+
+        _, pending = await asyncio.wait(tasks, timeout=self.round_deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.error(f"❌ 采集轮次超时（{self.round_deadline}秒），已取消{len(pending)}个未完成的PLC会话")
+
+        results = []
+        for task, plc_ip in tasks.items():
+            if task.cancelled():
+                self.stats['cancelled'] += 1
+                results.extend(failure_fn(
+                    plc_ip, ip_to_configs[plc_ip], f"采集轮次超时（{self.round_deadline}秒），会话已取消"
+                ))
+            else:
+                results.extend(task.result())
+
+        logger.info(f"✅ asyncio 采集轮次完成 - PLC数: {len(tasks)}, 耗时: {time.time() - start_time:.2f}秒, "
+                    f"超时: {self.stats['timeouts']}, 取消: {self.stats['cancelled']}（累计）")
+        return results
+
+    async def _session(self, plc_ip: str, configs: List[Dict], session_fn: SessionFn,
+                       failure_fn: FailureFn) -> List[Dict]:
+        """单个 PLC 会话：排队拿并发名额 → 在执行器线程中读取 → 从线程开始运行起按截止时间判超时"""
+        if plc_ip in self._overdue:
+            self.stats['skipped_overdue'] += 1
+            return failure_fn(plc_ip, configs, "上一轮会话超时后尚未结束，本轮跳过")
+
+        async with self._semaphore:
+            self.stats['sessions'] += 1
+            self._active_sessions += 1
+            started = asyncio.Event()
+            running = threading.Event()
+            abandoned = threading.Event()
+
+            def run():
+                running.set()
+                if abandoned.is_set():
+                    return failure_fn(plc_ip, configs, "会话已取消")
+                self._loop.call_soon_threadsafe(started.set)
+                return session_fn(plc_ip, configs)
+
+            future = self._loop.run_in_executor(self._executor, run)
+            try:
+                # 执行器线程全被占用时会话在执行器队列中等待，截止时间从线程开始运行起算
+                waiter = asyncio.ensure_future(started.wait())
+                try:
+                    await asyncio.wait({waiter, future}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                # shield：截止或取消时只放弃等待，执行线程由中止钩子断开连接后自行结束
+                return await asyncio.wait_for(asyncio.shield(future), timeout=self.plc_deadline)
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                self._mark_overdue(plc_ip, future)
+                logger.error(f"❌ PLC会话超时：{plc_ip}, 截止时间{self.plc_deadline}秒，已中止连接")
+                return failure_fn(plc_ip, configs, f"PLC会话超时（{self.plc_deadline}秒）")
+            except asyncio.CancelledError:
+                abandoned.set()
+                if running.is_set():
+                    self._mark_overdue(plc_ip, future)
+                else:
+                    future.cancel()  # 尚未开始运行：撤出执行器队列，不算超时未返回
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.info(f"❌ PLC任务执行异常：{plc_ip} - {str(e)}")
+                return failure_fn(plc_ip, configs, f"任务执行异常：{str(e)}")
+            finally:
+                self._active_sessions -= 1
+
+    def _mark_overdue(self, plc_ip: str, future: asyncio.Future) -> None:
+        """记录仍在执行的超时会话并调用中止钩子；执行线程返回后自动解除"""
+        if future.done():
+            return
+        self._overdue.add(plc_ip)
+        future.add_done_callback(lambda _f: self._overdue.discard(plc_ip))
+        if self.abort_fn is not None:
+            try:
+                self.abort_fn(plc_ip)
+            except Exception as e:
+                logger.warning(f"⚠️  中止PLC会话失败：{plc_ip} - {str(e)}")
+
+    def snapshot(self) -> Dict:
+        """引擎运行统计（累计计数 + 当前在途/超时未结束的会话数）"""
+        snapshot = dict(self.stats)
+        snapshot['active_sessions'] = self._active_sessions
+        snapshot['overdue_plcs'] = len(self._overdue)
+        return snapshot
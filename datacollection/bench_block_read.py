@@ -0,0 +1,160 @@
+"""
+PLC 块读合并基准：逐参数 db_read vs plan_block_reads 合并块读 vs 块读 + 多变量读（read_multi_vars）
+
+在本机起若干个 reference/s7_simulator.py 模拟 PLC（每个一个端口），按
+datacollection/resource/plc_config.json 的全部参数各读一轮，统计每个 PLC 的
+网络往返次数（模拟器收到的 S7 作业数）与读取墙钟耗时，并校验三种方式读出的值一致。
+
+跑法（从项目根目录，无需真实 PLC）：
+    python datacollection/bench_block_read.py
+    python datacollection/bench_block_read.py --plcs 8 --latency-ms 10 --gap 64
+    python datacollection/bench_block_read.py --dbs 6 --gap -1 --pdu 480
+
+--latency-ms 模拟现场网络单次往返时延；楼宇内网实测一般在 3~15ms。
+--dbs 把参数轮流分散到多个 DB（模拟参数跨 DB 分布的 PLC 程序），多变量读的收益主要体现在这种场景。
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+FREEARK_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FREEARK_ROOT)
+sys.path.insert(0, os.path.join(FREEARK_ROOT, 'reference'))
+
+from s7_simulator import S7Simulator  # noqa: E402
+from datacollection.multi_thread_plc_handler import (  # noqa: E402
+    DEFAULT_PDU_LENGTH, PLCReadWriter, READ_GAP_TOLERANCE,
+    max_block_bytes_for_pdu, pack_multi_var_requests, plan_block_reads,
+)
+
+_RANDOM_PACK = {
+    'byte': lambda: struct.pack('>B', random.randint(0, 255)),
+    'int8': lambda: struct.pack('>b', random.randint(-128, 127)),
+    'uint16': lambda: struct.pack('>H', random.randint(0, 65535)),
+    'int16': lambda: struct.pack('>h', random.randint(-32768, 32767)),
+    'uint32': lambda: struct.pack('>I', random.randint(0, 2 ** 32 - 1)),
+    'int32': lambda: struct.pack('>i', random.randint(-2 ** 31, 2 ** 31 - 1)),
+    'float32': lambda: struct.pack('>f', random.uniform(-1000, 1000)),
+    'float64': lambda: struct.pack('>d', random.uniform(-1000, 1000)),
+}
+
+
+def _load_requests(db_spread: int = 1):
+    config_path = os.path.join(FREEARK_ROOT, 'datacollection', 'resource', 'plc_config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        params = json.load(f)['parameters']
+    return [
+        {'db_num': p['db_num'] + i % db_spread, 'offset': p['offset'], 'length': p['length'], 'data_type': p['data_type']}
+        for i, p in enumerate(params.values())
+    ]
+
+
+def _fill_simulator(sim: S7Simulator, requests):
+    for req in requests:
+        pack = _RANDOM_PACK.get(req['data_type'])
+        raw = pack() if pack else b''
+        # 长度与类型不符的参数（如 4 字节的 byte）填随机字节，两种读法都会按解析失败处理
+        if len(raw) != req['length']:
+            raw = bytes(random.randint(0, 255) for _ in range(req['length']))
+        sim.set_db_bytes(req['db_num'], req['offset'], raw)
+
+
+def _connect(port: int) -> PLCReadWriter:
+    reader = PLCReadWriter('127.0.0.1')
+    reader.client.connect = functools.partial(reader.client.connect, tcp_port=port)
+    if not reader.connect():
+        raise RuntimeError(f"无法连接模拟器 127.0.0.1:{port}")
+    return reader
+
+
+def _read_per_param(reader: PLCReadWriter, requests):
+    """基线：改造前 read_multi 的逐参数读取"""
+    return [reader.read_db_data(r['db_num'], r['offset'], r['length'], r['data_type']) for r in requests]
+
+
+def _read_blocks_only(reader: PLCReadWriter, requests, gap: int):
+    """仅块读合并：关闭多变量读，每块一次 db_read（相当于不支持 read_multi_vars 的旧版 snap7）"""
+    mode, reader.multi_var_mode = reader.multi_var_mode, None
+    try:
+        return reader.read_multi(requests, gap_tolerance=gap)
+    finally:
+        reader.multi_var_mode = mode
+
+
+def _measure(sim: S7Simulator, read_fn):
+    sim.reset_stats()
+    start = time.perf_counter()
+    results = read_fn()
+    return results, time.perf_counter() - start, sim.request_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PLC 块读合并基准（基于 reference/s7_simulator.py）')
+    parser.add_argument('--plcs', type=int, default=4, help='模拟 PLC 数量')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='模拟器单次往返时延（毫秒）')
+    parser.add_argument('--gap', type=int, default=READ_GAP_TOLERANCE, help='块读合并空洞容忍度（字节）')
+    parser.add_argument('--base-port', type=int, default=11020, help='模拟器起始端口')
+    parser.add_argument('--dbs', type=int, default=1, help='把参数轮流分散到的 DB 数量')
+    parser.add_argument('--pdu', type=int, default=DEFAULT_PDU_LENGTH, help='模拟器支持的最大 PDU 长度')
+    args = parser.parse_args()
+
+    requests = _load_requests(max(args.dbs, 1))
+    blocks = plan_block_reads(requests, gap_tolerance=args.gap, max_block_bytes=max_block_bytes_for_pdu(args.pdu))
+    batches = pack_multi_var_requests(blocks, args.pdu)
+    print(f"\n=== PLC 块读合并基准：{len(requests)} 个参数 → {len(blocks)} 个块 → {len(batches)} 个多变量读请求，"
+          f"gap={args.gap}B，DB 数={args.dbs}，PDU={args.pdu}，模拟时延={args.latency_ms}ms，PLC 数={args.plcs} ===\n")
+
+    simulators = []
+    for i in range(args.plcs):
+        sim = S7Simulator(ip='127.0.0.1', port=args.base_port + i, pdu_length=args.pdu, latency_ms=args.latency_ms)
+        _fill_simulator(sim, requests)
+        sim.start_in_background()
+        simulators.append(sim)
+
+    header = (f"{'PLC':<18} {'逐参数往返':>10} {'逐参数耗时(ms)':>14} {'块读往返':>8} {'块读耗时(ms)':>12} "
+              f"{'多变量往返':>10} {'多变量耗时(ms)':>14} {'加速比':>7} {'结果一致':>8}")
+    print(header)
+    print('-' * len(header))
+
+    totals = [0, 0.0, 0, 0.0, 0, 0.0]
+    try:
+        for sim in simulators:
+            reader = _connect(sim.port)
+            try:
+                legacy, legacy_time, legacy_trips = _measure(sim, lambda: _read_per_param(reader, requests))
+                coalesced, block_time, block_trips = _measure(
+                    sim, lambda: _read_blocks_only(reader, requests, args.gap)
+                )
+                packed, multi_time, multi_trips = _measure(
+                    sim, lambda: reader.read_multi(requests, gap_tolerance=args.gap)
+                )
+            finally:
+                reader.disconnect()
+
+            baseline = [(s, v) for s, _, v in legacy]
+            same = baseline == [(s, v) for s, _, v in coalesced] == [(s, v) for s, _, v in packed]
+            speedup = legacy_time / multi_time if multi_time > 0 else float('inf')
+            print(f"127.0.0.1:{sim.port:<8} {legacy_trips:>10} {legacy_time * 1000:>14.1f} "
+                  f"{block_trips:>8} {block_time * 1000:>12.1f} "
+                  f"{multi_trips:>10} {multi_time * 1000:>14.1f} {speedup:>6.1f}x {'✅' if same else '❌':>7}")
+            for k, v in enumerate((legacy_trips, legacy_time, block_trips, block_time, multi_trips, multi_time)):
+                totals[k] += v
+    finally:
+        for sim in simulators:
+            sim.stop()
+
+    n = max(len(simulators), 1)
+    print('-' * len(header))
+    print(f"{'平均/PLC':<18} {totals[0] / n:>10.1f} {totals[1] * 1000 / n:>14.1f} "
+          f"{totals[2] / n:>8.1f} {totals[3] * 1000 / n:>12.1f} "
+          f"{totals[4] / n:>10.1f} {totals[5] * 1000 / n:>14.1f} "
+          f"{(totals[1] / totals[5]) if totals[5] else float('inf'):>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
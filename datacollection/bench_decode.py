@@ -0,0 +1,105 @@
+"""
+PLC 块解码基准：逐参数 _parse_data vs 预编译 BlockDecoder 整块解码
+
+按 datacollection/resource/plc_config.json 的全部参数规划块读，用随机字节填充各块缓冲区，
+分别以改造前 read_multi 的方式（逐参数切片 + _parse_data 字符串分派）和 CompiledReadPlan
+预编译的 struct 布局解码，对比每轮（--rooms 个 PLC 各解码一次）的 CPU 耗时，并校验结果一致。
+不涉及网络，纯测采集机上的解码热循环。
+
+跑法（从项目根目录）：
+    python datacollection/bench_decode.py
+    python datacollection/bench_decode.py --rooms 500 --rounds 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+FREEARK_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FREEARK_ROOT)
+
+from datacollection.multi_thread_plc_handler import (  # noqa: E402
+    CompiledReadPlan, PLCReadWriter, READ_GAP_TOLERANCE,
+)
+
+
+def _load_requests():
+    config_path = os.path.join(FREEARK_ROOT, 'datacollection', 'resource', 'plc_config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        params = json.load(f)['parameters']
+    return [
+        {'db_num': p['db_num'], 'offset': p['offset'], 'length': p['length'], 'data_type': p['data_type']}
+        for p in params.values()
+    ]
+
+
+def _decode_per_param(reader: PLCReadWriter, plan: CompiledReadPlan, requests, raw_blocks):
+    """基线：改造前 read_multi 的逐参数切片 + _parse_data"""
+    results = [None] * len(requests)
+    for block, raw_block in zip(plan.blocks, raw_blocks):
+        for i in block['indices']:
+            req = requests[i]
+            rel = req['offset'] - block['start']
+            value = reader._parse_data(raw_block[rel:rel + req['length']], req['data_type'])
+            if value is None:
+                results[i] = (False, f"数据类型解析失败：{req['data_type']}", None)
+            else:
+                results[i] = (True, "读取成功", value)
+    return results
+
+
+def _decode_compiled(plan: CompiledReadPlan, requests, raw_blocks):
+    results = [None] * len(requests)
+    for decoder, raw_block in zip(plan.decoders, raw_blocks):
+        decoder.decode(raw_block, results)
+    return results
+
+
+def _time_rounds(fn, rounds: int, rooms: int) -> float:
+    """返回单轮（rooms 个 PLC 各解码一次）的最佳耗时（秒）"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(rooms):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PLC 块解码基准（_parse_data vs 预编译 struct 布局）')
+    parser.add_argument('--rooms', type=int, default=300, help='每轮解码的 PLC（房间）数量')
+    parser.add_argument('--rounds', type=int, default=10, help='重复轮数，取最佳值')
+    parser.add_argument('--gap', type=int, default=READ_GAP_TOLERANCE, help='块读合并空洞容忍度（字节）')
+    args = parser.parse_args()
+
+    # 只用到解析方法，绕过 __init__ 避免依赖 snap7 客户端
+    reader = PLCReadWriter.__new__(PLCReadWriter)
+    requests = _load_requests()
+
+    compile_start = time.perf_counter()
+    plan = CompiledReadPlan(requests, gap_tolerance=args.gap)
+    compile_time = time.perf_counter() - compile_start
+
+    rng = random.Random(42)
+    raw_blocks = [bytes(rng.randrange(256) for _ in range(block['length'])) for block in plan.blocks]
+
+    legacy = _decode_per_param(reader, plan, requests, raw_blocks)
+    compiled = _decode_compiled(plan, requests, raw_blocks)
+    same = legacy == compiled
+
+    legacy_time = _time_rounds(lambda: _decode_per_param(reader, plan, requests, raw_blocks), args.rounds, args.rooms)
+    compiled_time = _time_rounds(lambda: _decode_compiled(plan, requests, raw_blocks), args.rounds, args.rooms)
+
+    print(f"\n=== PLC 块解码基准：{len(requests)} 个参数 / {len(plan.blocks)} 个块 / PLC，"
+          f"每轮 {args.rooms} 个 PLC，取 {args.rounds} 轮最佳 ===\n")
+    print(f"读取计划编译耗时（每个 PLC 仅一次）：{compile_time * 1000:.3f} ms")
+    print(f"逐参数 _parse_data：{legacy_time * 1000:8.2f} ms/轮  ({legacy_time / args.rooms * 1e6:7.1f} µs/PLC)")
+    print(f"预编译整块解码：    {compiled_time * 1000:8.2f} ms/轮  ({compiled_time / args.rooms * 1e6:7.1f} µs/PLC)")
+    print(f"加速比：{legacy_time / compiled_time if compiled_time else float('inf'):.1f}x，结果一致：{'✅' if same else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
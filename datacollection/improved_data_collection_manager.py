@@ -1,8 +1,9 @@
 import os
 import sys
 import json
+import logging
 import time
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 import concurrent.futures
 import pandas as pd
 import copy
@@ -26,9 +27,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from datacollection.log_config_manager import get_logger
 
 # 导入PLC读取相关类
-from datacollection.multi_thread_plc_handler import PLCReadWriter, PLCManager
+from datacollection.multi_thread_plc_handler import PLCReadWriter, PLCManager, READ_GAP_TOLERANCE
+from datacollection.async_collection_engine import (
+    AsyncCollectionEngine, DEFAULT_MAX_CONCURRENCY, DEFAULT_PLC_DEADLINE, DEFAULT_ROUND_DEADLINE,
+)
 # 导入MQTT客户端
 from datacollection.mqtt_client import MQTTClient
+from datacollection.telemetry_codec import (
+    DEFAULT_BATCH_MAX_BYTES, DEFAULT_KEYFRAME_INTERVAL, PAYLOAD_FORMAT_COMPACT, PAYLOAD_FORMAT_JSON,
+    DeltaTracker, batch_kind, build_batch_envelopes, build_compact_envelopes, compact_available, encode_compact,
+)
 
 # 获取logger，日志级别从配置文件读取
 logger = get_logger('improved_data_collection')
@@ -71,10 +79,35 @@ class ImprovedDataCollectionManager:
         import tempfile
         return tempfile.gettempdir()
         
-    def __init__(self, max_workers: int = 10):
-        """初始化改进的数据收集管理器"""
+    def __init__(self, max_workers: int = 10, read_gap_tolerance: int = READ_GAP_TOLERANCE,
+                 engine: str = 'thread', async_max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 plc_deadline: float = DEFAULT_PLC_DEADLINE, round_deadline: float = DEFAULT_ROUND_DEADLINE,
+                 breaker_config: Dict[str, Any] = None):
+        """初始化改进的数据收集管理器
+
+        Args:
+            max_workers: PLC 读取线程池大小
+            read_gap_tolerance: 块读合并的空洞容忍度（字节），见 multi_thread_plc_handler.READ_GAP_TOLERANCE
+            engine: 采集引擎，'thread' 为按 IP 提交线程池（默认），'asyncio' 为 AsyncCollectionEngine
+            async_max_concurrency: asyncio 引擎全局同时在途的 PLC 会话上限
+            plc_deadline: asyncio 引擎单个 PLC 会话截止时间（秒）
+            round_deadline: asyncio 引擎单轮采集截止时间（秒）
+            breaker_config: 按 PLC IP 的熔断参数，见 PLCManager / PLCCircuitBreaker
+        """
+        if engine not in ('thread', 'asyncio'):
+            raise ValueError(f"不支持的采集引擎：{engine}（可选 'thread' / 'asyncio'）")
         self.max_workers = max_workers
-        self.plc_manager = PLCManager(max_workers=max_workers)
+        self.engine = engine
+        self.plc_manager = PLCManager(max_workers=max_workers, read_gap_tolerance=read_gap_tolerance,
+                                      breaker_config=breaker_config)
+        self.async_engine = None
+        if engine == 'asyncio':
+            self.async_engine = AsyncCollectionEngine(
+                max_concurrency=async_max_concurrency,
+                plc_deadline=plc_deadline,
+                round_deadline=round_deadline,
+                abort_fn=self.plc_manager.abort_reader,
+            )
         # 使用辅助方法获取目录
         self.resource_dir = self._get_resource_dir()
         self.output_dir = self._get_output_dir()
@@ -85,11 +118,15 @@ class ImprovedDataCollectionManager:
             except:
                 pass
         self.results = {}
+        # delta 发布的基准值（output_config 中 mqtt.delta.enabled 开启时使用）
+        self.delta_tracker = DeltaTracker()
 
     def start(self):
         """启动数据收集管理器"""
         self.plc_manager.start()
-        logger.info(f"✅ 改进版数据收集管理器已启动，线程池大小：{self.max_workers}")
+        if self.async_engine is not None:
+            self.async_engine.start()
+        logger.info(f"✅ 改进版数据收集管理器已启动，采集引擎：{self.engine}，线程池大小：{self.max_workers}")
         self._start_plc_write_subscriber()
         self._start_ondemand_collect_subscriber()  # v0.5.6: 按需采集订阅器
 
@@ -123,6 +160,8 @@ class ImprovedDataCollectionManager:
 
     def stop(self):
         """停止数据收集管理器"""
+        if self.async_engine is not None:
+            self.async_engine.stop()
         self.plc_manager.stop()
         logger.info("✅ 改进版数据收集管理器已停止")
     
@@ -414,7 +453,10 @@ class ImprovedDataCollectionManager:
         return organized_results
 
     def _read_all_plc_data(self, plc_read_configs: List[Dict]) -> List[Dict]:
-        """读取所有PLC数据，按IP分组后并行提交线程池，各IP内部分块批量读取"""
+        """读取所有PLC数据，按IP分组后并行读取，各IP内部块读合并。
+
+        engine='thread' 时每个IP提交一个线程池任务；engine='asyncio' 时交给
+        AsyncCollectionEngine，按单PLC截止时间与全局并发上限调度。"""
         # 按PLC IP地址对参数配置进行分组
         ip_to_configs = {}
         for config in plc_read_configs:
@@ -423,6 +465,11 @@ class ImprovedDataCollectionManager:
                 ip_to_configs[plc_ip] = []
             ip_to_configs[plc_ip].append(config)
 
+        if self.async_engine is not None:
+            return self.async_engine.read_all(
+                ip_to_configs, self._read_single_plc_with_multiple_params, self._failed_results
+            )
+
         # 通过 PLCManager 线程池提交任务（每个IP一个任务，内部分块+连接复用）
         future_to_ip = {}
         for plc_ip, configs in ip_to_configs.items():
@@ -440,35 +487,34 @@ class ImprovedDataCollectionManager:
                 results.extend(ip_results)
             except concurrent.futures.TimeoutError:
                 logger.info(f"❌ PLC任务超时（60s）：{plc_ip}")
-                for config in ip_to_configs.get(plc_ip, []):
-                    results.append({
-                        'ip': config['ip'],
-                        'device_id': config.get('device_id'),
-                        'param_key': config.get('param_key'),
-                        'success': False,
-                        'message': "任务执行超时（60秒）",
-                        'value': None
-                    })
+                results.extend(self._failed_results(plc_ip, ip_to_configs.get(plc_ip, []), "任务执行超时（60秒）"))
             except Exception as e:
                 logger.info(f"❌ PLC任务执行异常：{plc_ip} - {str(e)}")
-                for config in ip_to_configs.get(plc_ip, []):
-                    results.append({
-                        'ip': config['ip'],
-                        'device_id': config.get('device_id'),
-                        'param_key': config.get('param_key'),
-                        'success': False,
-                        'message': f"任务执行异常：{str(e)}",
-                        'value': None
-                    })
+                results.extend(self._failed_results(plc_ip, ip_to_configs.get(plc_ip, []), f"任务执行异常：{str(e)}"))
 
         return results
 
+    @staticmethod
+    def _failed_results(plc_ip: str, configs: List[Dict], message: str) -> List[Dict]:
+        """为某个PLC的全部参数构造失败结果（格式与 _read_single_plc_with_multiple_params 一致）"""
+        return [
+            {
+                'ip': config['ip'],
+                'device_id': config.get('device_id'),
+                'param_key': config.get('param_key'),
+                'success': False,
+                'message': message,
+                'value': None
+            }
+            for config in configs
+        ]
+
     def _read_single_plc_with_multiple_params(self, plc_ip: str, configs: List[Dict]) -> List[Dict]:
         """读取单个PLC的多个参数——委托给 PLCManager 以复用连接并进行分块批量读取。
 
         PLCManager._read_single_plc_multiple_params 已实现：
           - clients_cache 连接复用（同一 IP 跨轮次不断开）
-          - PDU_CHUNK_SIZE 分块（≤12 参数/请求）
+          - 块读合并（相邻参数按 PDU 大小合并为一次 db_read）
         本方法额外将 PLCManager 结果格式转换为包含 device_id / param_key 的格式。
         """
         # PLCManager 方法返回的结果键为 db_num/offset，不含 device_id/param_key
@@ -659,7 +705,11 @@ class ImprovedDataCollectionManager:
             return False
     
     def send_results_to_mqtt(self, building_file: str, results_data: dict = None) -> bool:
-        """通过MQTT发送结果数据，为每条记录单独发送消息"""
+        """通过MQTT发送结果数据。
+
+        publish_mode='per_device'（默认）为每条记录单独发送消息；
+        publish_mode='batch' 按 batch_max_bytes 打包为多设备批量信封发送。
+        """
         # 获取输出配置
         output_config = self.load_output_config()
         mqtt_config = output_config['output'].get('mqtt', {})
@@ -692,13 +742,35 @@ class ImprovedDataCollectionManager:
         qos = mqtt_config.get('qos', 1)
         retain = mqtt_config.get('retain', False)
         publish_interval = mqtt_config.get('publish_interval_ms', 0) / 1000.0
+        publish_mode = mqtt_config.get('publish_mode', 'per_device')
+        batch_max_bytes = mqtt_config.get('batch_max_bytes', DEFAULT_BATCH_MAX_BYTES)
+        payload_format = mqtt_config.get('payload_format', PAYLOAD_FORMAT_JSON)
+        if payload_format == PAYLOAD_FORMAT_COMPACT and not compact_available():
+            logger.warning("⚠️  未安装 msgpack，紧凑格式不可用，回退为 JSON")
+            payload_format = PAYLOAD_FORMAT_JSON
+        compact = payload_format == PAYLOAD_FORMAT_COMPACT
+        delta_config = mqtt_config.get('delta', {})
+        delta_key = None
+        delta_baseline = None
         
         try:
             # 获取结果数据：优先使用调用方传入的 results_data（避免竞争条件）
+            # 发送过程只读不改，无需深拷贝
             results = results_data if results_data is not None else self.results[building_file]
+            # 批次类型须在 delta 过滤前判断（未变化的 general 设备 data 可能为空）
+            kind = batch_kind(results)
 
-            # 深拷贝结果数据，避免修改原始数据
-            results_copy = copy.deepcopy(results)
+            # delta 基准值只在本轮全部发送成功后提交（见 _settle_delta_baseline）
+            delta_key = (building_file, kind)
+            if delta_config.get('enabled', False):
+                self.delta_tracker.keyframe_interval = delta_config.get('keyframe_interval', DEFAULT_KEYFRAME_INTERVAL)
+                full_count = sum(len(info.get('data', {})) for info in results.values())
+                results, keyframe, delta_baseline = self.delta_tracker.filter(delta_key, results)
+                if keyframe:
+                    logger.info(f"📦 delta 模式：楼栋 {building_file}（{kind}）本轮发送关键帧，共 {full_count} 个参数")
+                else:
+                    sent_count = sum(len(info.get('data', {})) for info in results.values())
+                    logger.info(f"📦 delta 模式：楼栋 {building_file}（{kind}）本轮发送 {sent_count}/{full_count} 个参数")
             
             # 创建连接池配置
             pool_config = {
@@ -719,15 +791,23 @@ class ImprovedDataCollectionManager:
             mqtt_manager = MQTTClientManager.get_instance(pool_config)
             
             mqtt_client = None
-            total_records = len(results_copy)
+            total_records = len(results)
             success_count = 0
             
             try:
                 # 从连接池获取客户端
                 mqtt_client = mqtt_manager.get_client()
+
+                if publish_mode == 'batch':
+                    sent, total = self._publish_batches(
+                        mqtt_client, building_file, results, topic_prefix,
+                        qos, retain, publish_interval, batch_max_bytes, compact, kind
+                    )
+                    self._settle_delta_baseline(delta_key, delta_baseline, sent == total)
+                    return sent == total or sent > 0
                 
                 # 遍历每条记录，单独发送MQTT消息
-                for device_id, device_info in results_copy.items():
+                for device_id, device_info in results.items():
                     # 获取当前记录的唯一标识符
                     unique_identifier = device_info.get('唯一标识符', '')
                     
@@ -742,19 +822,21 @@ class ImprovedDataCollectionManager:
                     # 创建只包含当前设备信息的消息数据
                     single_record = {device_id: device_info}
                     
-                    # 发布前记录 DEBUG 信息
-                    payload_bytes = len(json.dumps(single_record, ensure_ascii=False).encode('utf-8'))
-                    dev_params = device_info.get('data', {})
-                    dev_success_params = sum(1 for p in dev_params.values() if isinstance(p, dict) and p.get('success'))
-                    dev_fail_params = len(dev_params) - dev_success_params
-                    logger.debug(
-                        f"[send_results_to_mqtt] 准备发布: device_id={device_id}, "
-                        f"unique_identifier={unique_identifier}, payload_size={payload_bytes}bytes, "
-                        f"success_params={dev_success_params}, failed_params={dev_fail_params}"
-                    )
+                    # 发布前记录 DEBUG 信息（仅在 DEBUG 级别计算，避免为日志额外编码一次）
+                    if logger.isEnabledFor(logging.DEBUG):
+                        payload_bytes = len(json.dumps(single_record, ensure_ascii=False).encode('utf-8'))
+                        dev_params = device_info.get('data', {})
+                        dev_success_params = sum(1 for p in dev_params.values() if isinstance(p, dict) and p.get('success'))
+                        dev_fail_params = len(dev_params) - dev_success_params
+                        logger.debug(
+                            f"[send_results_to_mqtt] 准备发布: device_id={device_id}, "
+                            f"unique_identifier={unique_identifier}, payload_size={payload_bytes}bytes, "
+                            f"success_params={dev_success_params}, failed_params={dev_fail_params}"
+                        )
 
                     # 发送数据
-                    success = mqtt_client.publish(mqtt_topic, single_record, qos=qos, retain=retain)
+                    payload = encode_compact(single_record, kind) if compact else single_record
+                    success = mqtt_client.publish(mqtt_topic, payload, qos=qos, retain=retain)
                     if publish_interval > 0:
                         time.sleep(publish_interval)
 
@@ -763,11 +845,12 @@ class ImprovedDataCollectionManager:
                         logger.info(f"✅ 设备 {device_id} 数据已成功发送到MQTT主题: {mqtt_topic}")
                     else:
                         logger.warning(
-                            f"[send_results_to_mqtt] 发布失败: device_id={device_id}, "
-                            f"topic={mqtt_topic}, payload_size={payload_bytes}bytes"
+                            f"[send_results_to_mqtt] 发布失败: device_id={device_id}, topic={mqtt_topic}"
                         )
                         logger.info(f"❌ 设备 {device_id} 数据发送到MQTT主题失败: {mqtt_topic}")
                 
+                self._settle_delta_baseline(delta_key, delta_baseline, success_count == total_records)
+
                 # 返回整体发送结果
                 if success_count == total_records:
                     logger.info(f"✅ 所有 {total_records} 条记录均已成功发送到MQTT")
@@ -784,7 +867,54 @@ class ImprovedDataCollectionManager:
                     mqtt_manager.return_client(mqtt_client)
         except Exception as e:
             logger.info(f"❌ 通过MQTT发送数据异常: {str(e)}")
+            if delta_baseline is not None:
+                self.delta_tracker.reset(delta_key)
             return False
+
+    def _settle_delta_baseline(self, stream_key, baseline, all_sent: bool) -> None:
+        """delta 模式：全部发送成功才提交基准值；否则丢弃基准，下一轮发关键帧补发丢失的变化值。"""
+        if baseline is None:
+            return
+        if all_sent:
+            self.delta_tracker.commit(stream_key, baseline)
+        else:
+            logger.warning(f"⚠️  楼栋 {stream_key[0]}（{stream_key[1]}）本轮未全部发送成功，下一轮改发关键帧")
+            self.delta_tracker.reset(stream_key)
+
+    def _publish_batches(self, mqtt_client, building_file: str, results: Dict[str, Dict], topic_prefix: str,
+                         qos: int, retain: bool, publish_interval: float, batch_max_bytes: int,
+                         compact: bool = False, kind: str = None) -> Tuple[int, int]:
+        """批量模式：编码一次、按大小分包，发布到 {prefix}batch/{energy|general}/{楼栋}
+
+        返回 (发送成功的信封数, 信封总数)。
+        """
+        building = os.path.splitext(os.path.basename(building_file))[0]
+        kind = kind or batch_kind(results)
+        mqtt_topic = f"{topic_prefix}batch/{kind}/{building}"
+        if compact:
+            envelopes = build_compact_envelopes(building, results, batch_max_bytes, kind)
+        else:
+            envelopes = build_batch_envelopes(building, results, batch_max_bytes)
+
+        success_count = 0
+        for seq, envelope in enumerate(envelopes):
+            if mqtt_client.publish(mqtt_topic, envelope, qos=qos, retain=retain):
+                success_count += 1
+            else:
+                logger.warning(
+                    f"[send_results_to_mqtt] 批量发布失败: topic={mqtt_topic}, "
+                    f"seq={seq}/{len(envelopes)}, payload_size={len(envelope)}bytes"
+                )
+            if publish_interval > 0:
+                time.sleep(publish_interval)
+
+        if success_count == len(envelopes):
+            logger.info(f"✅ {len(results)} 台设备已打包为 {len(envelopes)} 个批量消息发送到MQTT主题: {mqtt_topic}")
+        elif success_count > 0:
+            logger.info(f"⚠️  批量消息部分发送成功: {success_count}/{len(envelopes)}")
+        else:
+            logger.info(f"❌ 所有 {len(envelopes)} 个批量消息发送失败: {mqtt_topic}")
+        return success_count, len(envelopes)
     
     def save_results_to_excel(self, building_file: str) -> bool:
         """保存结果到Excel文件，将成功结果输出到success工作表，失败结果输出到failure工作表"""
@@ -153,7 +153,7 @@ class MQTTClient:
         
         参数:
         - topic: 主题名称
-        - payload: 消息负载，可以是字符串、字典或列表
+        - payload: 消息负载，可以是字符串、字节串、字典或列表（字节串视为已编码，原样发送）
         - qos: 服务质量，可选值为0、1、2
         - retain: 是否保留消息
         
@@ -168,6 +168,8 @@ class MQTTClient:
             # 如果payload是字典或列表，转换为JSON字符串
             if isinstance(payload, (dict, list)):
                 payload_str = json.dumps(payload, ensure_ascii=False)
+            elif isinstance(payload, (bytes, bytearray)):
+                payload_str = payload
             else:
                 payload_str = str(payload)
             
@@ -1,3 +1,4 @@
+import ctypes
 import struct
 import sys
 import time
@@ -5,6 +6,7 @@ import threading
 from typing import Optional, List, Dict, Tuple, Any
 import concurrent.futures
 import os
+import random
 from collections import defaultdict
 
 # 添加FreeArk目录到Python路径，确保模块可以正确导入
@@ -18,8 +20,17 @@ try:
     import snap7
     import sys
     snap7_available = True
+    # 多变量读的数据项结构：2.x 起位于 snap7.type，1.x 位于 snap7.types；更老的版本没有多变量读
+    try:
+        from snap7.type import S7DataItem
+    except ImportError:
+        try:
+            from snap7.types import S7DataItem
+        except ImportError:
+            S7DataItem = None
 except ImportError:
     snap7_available = False
+    S7DataItem = None
     # 导入必要模块
     import logging
     
@@ -30,6 +41,222 @@ logger = get_logger('multi_thread_plc_handler')
 if not snap7_available:
     logger.warning("❌ snap7模块未找到，PLC读取功能将不可用")
 
+# 块读合并：同一 DB 内两个参数区间之间的空洞不超过该字节数时并入同一次 db_read。
+# 空洞字节随块一起读回后直接丢弃，代价只是几十字节带宽，换来的是省掉一次网络往返。
+# 取负值（如 -1）时只合并互相重叠的区间，近似退化为每个参数一次 db_read。
+READ_GAP_TOLERANCE = 32
+
+# S7 读变量报文的固定开销（字节），用于按协商 PDU 长度推算单次请求的容量：
+#   请求：10 字节 S7 作业头 + 2 字节参数区（功能码 + 数据项数），每个数据项 12 字节寻址描述；
+#   响应：12 字节 S7 应答头 + 2 字节参数区，每个数据项 4 字节项头（返回码/传输类型/位长）+ 数据（奇数长度补 1 字节）。
+S7_READ_REQUEST_OVERHEAD = 12
+S7_READ_ITEM_REQUEST_BYTES = 12
+S7_READ_RESPONSE_OVERHEAD = 14
+S7_READ_ITEM_HEADER_BYTES = 4
+
+# PLC 未返回协商结果时按 S7-1200 默认 PDU 240 字节处理；snap7 单次多变量读最多 20 个数据项
+DEFAULT_PDU_LENGTH = 240
+S7_MAX_VARS = 20
+
+
+def max_block_bytes_for_pdu(pdu_length: int) -> int:
+    """单个数据项在一个 PDU 内最多能承载的数据字节数（PDU 240 时为 222）"""
+    return pdu_length - S7_READ_RESPONSE_OVERHEAD - S7_READ_ITEM_HEADER_BYTES
+
+
+# 单次块读的最大字节数：按默认 PDU 240 字节计算为 222 字节。
+# 块读不超过该值即可保证一次 db_read 恰好对应一次 PDU 往返（snap7 不会在内部再拆包）；
+# 连接建立后 PLCReadWriter 会改用 PLC 实际协商的 PDU 长度重新推算。
+MAX_BLOCK_READ_BYTES = max_block_bytes_for_pdu(DEFAULT_PDU_LENGTH)
+
+
+def plan_block_reads(requests: List[Dict], gap_tolerance: int = READ_GAP_TOLERANCE,
+                     max_block_bytes: int = MAX_BLOCK_READ_BYTES) -> List[Dict]:
+    """把参数读取请求规划为尽量少的连续块读。
+
+    按 (db_num, offset) 排序后从左到右贪心合并：下一个参数与当前块同 DB、
+    与块尾的空洞不超过 gap_tolerance，且合并后块长不超过 max_block_bytes 时并入当前块，
+    否则另起一块。单个参数本身超过 max_block_bytes 时独占一块。
+
+    Args:
+        requests: 读取请求列表，每项至少包含 db_num / offset / length
+        gap_tolerance: 允许并入同一块的最大空洞字节数，负值时只合并互相重叠的区间
+        max_block_bytes: 单块最大字节数
+
+    Returns:
+        块列表，每块为 {'db_num', 'start', 'length', 'indices'}，
+        indices 为该块覆盖的请求在 requests 中的下标（按偏移升序）
+    """
+    order = sorted(range(len(requests)), key=lambda i: (requests[i]['db_num'], requests[i]['offset']))
+
+    blocks: List[Dict] = []
+    current = None
+    for i in order:
+        req = requests[i]
+        db_num, offset, length = req['db_num'], req['offset'], req['length']
+        end = offset + length
+
+        if current is not None and current['db_num'] == db_num:
+            block_end = current['start'] + current['length']
+            gap = offset - block_end
+            merged_length = max(block_end, end) - current['start']
+            if gap <= gap_tolerance and merged_length <= max_block_bytes:
+                current['length'] = merged_length
+                current['indices'].append(i)
+                continue
+
+        current = {'db_num': db_num, 'start': offset, 'length': length, 'indices': [i]}
+        blocks.append(current)
+
+    return blocks
+
+
+def pack_multi_var_requests(blocks: List[Dict], pdu_length: int = DEFAULT_PDU_LENGTH,
+                            max_vars: int = S7_MAX_VARS) -> List[List[int]]:
+    """把块读打包为尽量少的 S7 多变量读请求（read_multi_vars）。
+
+    按 blocks 原顺序贪心装箱：每个请求的数据项数同时受 max_vars 与请求报文长度限制，
+    且响应报文（各数据项的项头 + 数据 + 补齐字节）不超过 pdu_length。
+
+    Args:
+        blocks: plan_block_reads 返回的块列表（每块至少包含 length）
+        pdu_length: 与 PLC 协商的 PDU 长度
+        max_vars: 单个请求的最大数据项数
+
+    Returns:
+        请求列表，每个请求为其包含的块在 blocks 中的下标
+    """
+    item_limit = max(1, min(max_vars, (pdu_length - S7_READ_REQUEST_OVERHEAD) // S7_READ_ITEM_REQUEST_BYTES))
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    response_bytes = S7_READ_RESPONSE_OVERHEAD
+    for idx, block in enumerate(blocks):
+        item_bytes = S7_READ_ITEM_HEADER_BYTES + block['length'] + block['length'] % 2
+        if current and (len(current) >= item_limit or response_bytes + item_bytes > pdu_length):
+            batches.append(current)
+            current = []
+            response_bytes = S7_READ_RESPONSE_OVERHEAD
+        current.append(idx)
+        response_bytes += item_bytes
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+# 数据类型 → (struct 格式字符, 字节数, 浮点结果保留的小数位)，与 _parse_data 的解析规则一致（大端）
+DATA_TYPE_LAYOUTS: Dict[str, Tuple[str, int, Optional[int]]] = {
+    'byte': ('B', 1, None),
+    'int8': ('b', 1, None),
+    'uint16': ('H', 2, None),
+    'int16': ('h', 2, None),
+    'uint32': ('I', 4, None),
+    'int32': ('i', 4, None),
+    'float32': ('f', 4, 4),
+    'float64': ('d', 8, 6),
+}
+# 单个读取器缓存的读取计划上限：正常只有各采集频率组的几份参数表，超出说明参数表在变化，清空后重建
+MAX_CACHED_READ_PLANS = 32
+
+_SCALAR_STRUCTS = {data_type: struct.Struct('>' + code) for data_type, (code, _, _) in DATA_TYPE_LAYOUTS.items()}
+
+
+class BlockDecoder:
+    """单个块读的预编译解码布局。
+
+    把块内参数按偏移编译成一个 struct.Struct（参数间的空洞用填充字节 'x' 跳过），
+    每轮采集对整块缓冲区只做一次 unpack_from，不再逐参数比较 data_type 字符串。
+    与前一个参数重叠的参数单独用标量 Struct 解码；类型未知或长度与类型不符的参数
+    在编译期即确定为解析失败。
+    """
+
+    __slots__ = ('struct', 'targets', 'rounding', 'overlaps', 'failures')
+
+    def __init__(self, block: Dict, requests: List[Dict]):
+        fmt = ['>']
+        cursor = block['start']
+        self.targets: List[int] = []  # 按 struct 字段顺序排列的请求下标
+        self.rounding: List[Tuple[int, int]] = []  # (字段位置, 小数位)
+        self.overlaps: List[Tuple[int, struct.Struct, int, Optional[int]]] = []
+        self.failures: List[Tuple[int, Tuple[bool, str, any]]] = []
+
+        for i in block['indices']:
+            req = requests[i]
+            data_type = req['data_type']
+            layout = DATA_TYPE_LAYOUTS.get(data_type)
+            if layout is None or layout[1] != req['length']:
+                if layout is None:
+                    logger.error(f"❌ 不支持的数据类型：{data_type}")
+                self.failures.append((i, (False, f"数据类型解析失败：{data_type}", None)))
+                continue
+
+            code, size, digits = layout
+            if req['offset'] < cursor:
+                self.overlaps.append((i, _SCALAR_STRUCTS[data_type], req['offset'] - block['start'], digits))
+                continue
+            if req['offset'] > cursor:
+                fmt.append(f"{req['offset'] - cursor}x")
+            fmt.append(code)
+            cursor = req['offset'] + size
+            if digits is not None:
+                self.rounding.append((len(self.targets), digits))
+            self.targets.append(i)
+
+        self.struct = struct.Struct(''.join(fmt))
+
+    def decode(self, raw_block: bytes, results: List) -> None:
+        """解码整块缓冲区，把各参数的 (success, message, value) 写入 results 对应下标"""
+        values = self.struct.unpack_from(raw_block)
+        if self.rounding:
+            values = list(values)
+            for pos, digits in self.rounding:
+                values[pos] = round(values[pos], digits)
+        for i, value in zip(self.targets, values):
+            results[i] = (True, "读取成功", value)
+
+        for i, scalar, rel, digits in self.overlaps:
+            value = scalar.unpack_from(raw_block, rel)[0]
+            results[i] = (True, "读取成功", value if digits is None else round(value, digits))
+
+        for i, failure in self.failures:
+            results[i] = failure
+
+
+class CompiledReadPlan:
+    """一组参数读取请求的预编译结果：越界参数、块读规划与每块的 BlockDecoder。
+
+    PLC 的参数表在运行期不变，PLCReadWriter 按请求签名缓存本计划，
+    只在首轮采集时编译一次，之后每轮直接复用。blocks 中的 indices 为 requests 原始下标。
+    """
+
+    __slots__ = ('size', 'fixed_results', 'blocks', 'decoders')
+
+    def __init__(self, requests: List[Dict], gap_tolerance: int = READ_GAP_TOLERANCE,
+                 max_block_bytes: int = MAX_BLOCK_READ_BYTES):
+        self.size = len(requests)
+        self.fixed_results: List[Tuple[int, Tuple[bool, str, any]]] = []
+
+        # 越界参数不参与规划，避免把整块拖成越界读
+        valid_indices = []
+        for i, req in enumerate(requests):
+            if req['offset'] + req['length'] - 1 > 65535:
+                self.fixed_results.append((i, (False, f"读取范围越界（最大允许偏移量+长度≤65535）", None)))
+            else:
+                valid_indices.append(i)
+
+        self.blocks = plan_block_reads([requests[i] for i in valid_indices], gap_tolerance=gap_tolerance,
+                                       max_block_bytes=max_block_bytes)
+        for block in self.blocks:
+            block['indices'] = [valid_indices[j] for j in block['indices']]
+        self.decoders = [BlockDecoder(block, requests) for block in self.blocks]
+
+    @staticmethod
+    def signature(requests: List[Dict]) -> Tuple:
+        """请求列表的缓存键：参数表相同（顺序、地址、类型均一致）即可复用同一计划"""
+        return tuple((r['db_num'], r['offset'], r['length'], r['data_type']) for r in requests)
+
+
 class PLCReadWriter:
     def __init__(self, plc_ip: str, rack: int = 0, slot: int = 1):
         """初始化PLC读取器 - 线程安全版本"""
@@ -53,6 +280,31 @@ class PLCReadWriter:
         self.connected = False
         self.connect_time = 0  # 连接建立时间
         self.lock = threading.RLock()  # 使用可重入锁保证线程安全
+        self.pdu_length = DEFAULT_PDU_LENGTH  # 连接后更新为 PLC 实际协商的 PDU 长度
+        self.multi_var_mode = self._detect_multi_var_mode()
+        self.plan_cache: Dict[Tuple, CompiledReadPlan] = {}  # 预编译的读取计划，按参数表签名缓存
+
+    def _detect_multi_var_mode(self) -> Optional[str]:
+        """探测 snap7 客户端的多变量读接口形态：
+        'dict' 为 python-snap7 3.x 纯 Python 客户端（数据项用 dict 描述），
+        'ctypes' 为 1.x/2.x 基于原生库的客户端（数据项用 S7DataItem 数组描述），
+        None 表示不支持多变量读，读取时回退为逐块 db_read。"""
+        if not hasattr(self.client, 'read_multi_vars'):
+            return None
+        if hasattr(self.client, 'use_optimizer'):
+            return 'dict'
+        return 'ctypes' if S7DataItem is not None else None
+
+    def _negotiated_pdu_length(self) -> int:
+        """读取本次连接协商得到的 PDU 长度，取不到或数值异常时使用默认值"""
+        try:
+            pdu_length = self.client.get_pdu_length()
+        except Exception as e:
+            logger.debug(f"🔧 PLC {self.plc_ip} 获取协商PDU长度失败，使用默认值{DEFAULT_PDU_LENGTH}：{str(e)}")
+            return DEFAULT_PDU_LENGTH
+        if not isinstance(pdu_length, int) or pdu_length <= S7_READ_RESPONSE_OVERHEAD + S7_READ_ITEM_HEADER_BYTES:
+            return DEFAULT_PDU_LENGTH
+        return pdu_length
 
     def connect(self) -> bool:
         """连接到PLC - 线程安全版本，增强日志记录"""
@@ -75,8 +327,9 @@ class PLCReadWriter:
                 if self.client.get_connected():
                     self.connected = True
                     self.connect_time = time.time()
+                    self.pdu_length = self._negotiated_pdu_length()
                     connect_duration = self.connect_time - start_time
-                    logger.info(f"✅ 成功连接PLC：{self.plc_ip}, Rack: {self.rack}, Slot: {self.slot}, 连接耗时: {connect_duration:.3f}秒")
+                    logger.info(f"✅ 成功连接PLC：{self.plc_ip}, Rack: {self.rack}, Slot: {self.slot}, PDU: {self.pdu_length}, 连接耗时: {connect_duration:.3f}秒")
                     return True
                 else:
                     logger.error(f"❌ PLC连接失败：{self.plc_ip}（未建立连接）, Rack: {self.rack}, Slot: {self.slot}")
@@ -112,8 +365,31 @@ class PLCReadWriter:
             self.connected = False
             self.connect_time = 0
 
+    def abort(self) -> None:
+        """从其他线程中止在途会话：不取 self.lock（可能正被阻塞中的读/连接持有），
+        直接断开底层 socket，使阻塞在 snap7 调用里的线程尽快出错返回，下一轮重新建连。"""
+        self.connected = False
+        self.connect_time = 0
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
     def read_db_data(self, db_num: int, offset: int, length: int, data_type: str, max_retries: int = 2) -> Optional[Tuple[bool, str, any]]:
         """读取指定DB块、偏移量、长度和类型的数据，支持重试"""
+        success, message, raw_data = self._read_raw(db_num, offset, length, max_retries)
+        if not success:
+            return False, message, None
+
+        # 根据数据类型解析
+        parsed_value = self._parse_data(raw_data, data_type)
+        if parsed_value is None:
+            return False, f"数据类型解析失败：{data_type}", None
+
+        return True, "读取成功", parsed_value
+
+    def _read_raw(self, db_num: int, offset: int, length: int, max_retries: int = 2) -> Tuple[bool, str, Optional[bytes]]:
+        """读取指定DB块的原始字节，支持重试；重试耗尽后弃连。返回 (success, message, raw_data)"""
         retries = 0
         while retries <= max_retries:
             try:
@@ -130,12 +406,7 @@ class PLCReadWriter:
                 if len(raw_data) != length:
                     return False, f"数据长度不匹配（预期{length}字节，实际{len(raw_data)}字节）", None
 
-                # 根据数据类型解析
-                parsed_value = self._parse_data(raw_data, data_type)
-                if parsed_value is None:
-                    return False, f"数据类型解析失败：{data_type}", None
-
-                return True, "读取成功", parsed_value
+                return True, "读取成功", bytes(raw_data)
             except Exception as e:
                 retries += 1
                 if retries > max_retries:
@@ -267,35 +538,239 @@ class PLCReadWriter:
                 results.append(result)
         return results
 
-    def read_multi(self, requests: List[Dict], max_retries: int = 2) -> List[Tuple[bool, str, any]]:
-        """顺序读取多个参数，兼容所有 snap7 版本"""
+    def read_multi(self, requests: List[Dict], max_retries: int = 2,
+                   gap_tolerance: int = READ_GAP_TOLERANCE) -> List[Tuple[bool, str, any]]:
+        """块读合并读取多个参数：按预编译的 CompiledReadPlan 把参数规划为连续块（块长由协商 PDU 推算），
+        由 _read_blocks 尽量打包为多变量读请求，再由各块的 BlockDecoder 一次解码整块缓冲区。
+        结果顺序与 requests 一致。"""
         if not self.connected:
             return [(False, "未连接到PLC", None) for _ in requests]
 
+        plan = self._compiled_plan(requests, gap_tolerance)
+        results: List[Optional[Tuple[bool, str, any]]] = [None] * plan.size
+        for i, result in plan.fixed_results:
+            results[i] = result
+        logger.debug(f"🔧 PLC {self.plc_ip}: {len(requests)}个参数合并为{len(plan.blocks)}次块读")
+
+        block_results = self._read_blocks(plan.blocks, max_retries)
+        for block, decoder, (success, message, raw_block) in zip(plan.blocks, plan.decoders, block_results):
+            if not success:
+                failure = (False, message, None)
+                for i in block['indices']:
+                    results[i] = failure
+                continue
+            decoder.decode(raw_block, results)
+
+        return results
+
+    def _compiled_plan(self, requests: List[Dict], gap_tolerance: int) -> CompiledReadPlan:
+        """取（必要时编译）requests 对应的读取计划；协商 PDU 变化后自动重新编译"""
+        max_block_bytes = max_block_bytes_for_pdu(self.pdu_length)
+        key = (gap_tolerance, max_block_bytes, CompiledReadPlan.signature(requests))
+        plan = self.plan_cache.get(key)
+        if plan is None:
+            if len(self.plan_cache) >= MAX_CACHED_READ_PLANS:
+                self.plan_cache.clear()
+            plan = CompiledReadPlan(requests, gap_tolerance=gap_tolerance, max_block_bytes=max_block_bytes)
+            self.plan_cache[key] = plan
+            logger.debug(f"🔧 PLC {self.plc_ip}: 编译读取计划，{len(requests)}个参数 → {len(plan.blocks)}个块")
+        return plan
+
+    def _read_blocks(self, blocks: List[Dict], max_retries: int = 2) -> List[Tuple[bool, str, Optional[bytes]]]:
+        """读取一组块，返回与 blocks 一一对应的 (success, message, raw_data)。
+
+        客户端支持多变量读时按 pack_multi_var_requests 把多个块装进同一个 S7 读请求；
+        单块请求、不支持多变量读的旧版 snap7，或多变量读整体异常时，回退为逐块 _read_raw。"""
+        block_results: List[Optional[Tuple[bool, str, Optional[bytes]]]] = [None] * len(blocks)
+        if self.multi_var_mode is None:
+            batches = [[k] for k in range(len(blocks))]
+        else:
+            batches = pack_multi_var_requests(blocks, self.pdu_length)
+
+        for batch in batches:
+            batch_results = None
+            if len(batch) > 1 and self.connected:
+                try:
+                    batch_results = self._read_multi_vars([blocks[k] for k in batch])
+                except Exception as e:
+                    logger.warning(f"⚠️  PLC {self.plc_ip} 多变量读失败（{len(batch)}个数据项），回退逐块读取：{str(e)}")
+            if batch_results is None:
+                batch_results = [
+                    self._read_raw(blocks[k]['db_num'], blocks[k]['start'], blocks[k]['length'], max_retries)
+                    for k in batch
+                ]
+            for k, result in zip(batch, batch_results):
+                block_results[k] = result
+
+        return block_results
+
+    def _read_multi_vars(self, blocks: List[Dict]) -> List[Tuple[bool, str, Optional[bytes]]]:
+        """用一次 read_multi_vars 读取多个块，按数据项返回 (success, message, raw_data)。
+        整个请求失败时直接抛出异常，由调用方回退逐块读取。"""
+        if self.multi_var_mode == 'dict':
+            from snap7.type import Area
+            items = [
+                {'area': Area.DB, 'db_number': b['db_num'], 'start': b['start'], 'size': b['length']}
+                for b in blocks
+            ]
+            with self.lock:
+                _, data = self.client.read_multi_vars(items)
+            return [self._check_item_data(block, raw) for block, raw in zip(blocks, data)]
+
+        items = (S7DataItem * len(blocks))()
+        buffers = []
+        for item, block in zip(items, blocks):
+            buffer = (ctypes.c_uint8 * block['length'])()
+            buffers.append(buffer)
+            item.Area = 0x84  # S7AreaDB
+            item.WordLen = 0x02  # S7WLByte
+            item.Result = 0
+            item.DBNumber = block['db_num']
+            item.Start = block['start']
+            item.Amount = block['length']
+            item.pData = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
+
+        with self.lock:
+            self.client.read_multi_vars(items)
+
         results = []
-        for req in requests:
-            result = self.read_db_data(
-                req['db_num'], req['offset'], req['length'], req['data_type'], max_retries
-            )
-            if result is None:
-                results.append((False, "读取返回None", None))
+        for item, block, buffer in zip(items, blocks, buffers):
+            if item.Result != 0:
+                results.append((False, f"数据项读取失败：{self._item_error_text(item.Result)}", None))
             else:
-                results.append(result)
+                results.append(self._check_item_data(block, bytes(buffer)))
         return results
 
-# S7 PDU 限制：单次 read_multi 请求最多携带的参数数量
-# 每个请求项约占 12 字节请求头 + 数据长度；保守取 12 个参数/请求确保不超 240 字节有效载荷
-PDU_CHUNK_SIZE = 12
+    @staticmethod
+    def _check_item_data(block: Dict, raw_data) -> Tuple[bool, str, Optional[bytes]]:
+        """校验多变量读单个数据项的返回长度"""
+        if raw_data is None or len(raw_data) != block['length']:
+            actual = 0 if raw_data is None else len(raw_data)
+            return False, f"数据长度不匹配（预期{block['length']}字节，实际{actual}字节）", None
+        return True, "读取成功", bytes(raw_data)
+
+    @staticmethod
+    def _item_error_text(code: int) -> str:
+        """把 snap7 数据项错误码转为可读文本，取不到文本时返回十六进制错误码"""
+        try:
+            try:
+                from snap7.common import error_text  # python-snap7 1.x/2.x
+            except ImportError:
+                from snap7.error import error_text  # python-snap7 3.x
+            return f"{error_text(code)}（0x{code:08X}）"
+        except Exception:
+            return f"错误码 0x{code:08X}"
+
+# 熔断器默认参数：连续失败 3 次熔断；熔断时长从 30 秒起指数增长，封顶 10 分钟，叠加 ±20% 抖动
+# 使大量同时掉线的房间错开探测时刻，避免所有半开探测挤在同一轮采集里。
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_BASE_BACKOFF = 30.0
+BREAKER_MAX_BACKOFF = 600.0
+BREAKER_JITTER = 0.2
+
+
+class PLCCircuitBreaker:
+    """单个 PLC IP 的健康状态机（closed / open / half-open）。
+
+    - closed：正常读取；连续失败达到 failure_threshold 次后转为 open。
+    - open：在退避时长内直接跳过，不再建连；退避时长为
+      base_backoff * 2^(熔断次数-1)，封顶 max_backoff，并乘以 [1-jitter, 1+jitter] 的随机系数。
+    - half-open：退避到期后放行一次探测（同一时刻只放行一个），探测成功回到 closed，
+      失败则以更长的退避重新 open。
+
+    线程安全；clock 可注入以便测试。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 base_backoff: float = BREAKER_BASE_BACKOFF, max_backoff: float = BREAKER_MAX_BACKOFF,
+                 jitter: float = BREAKER_JITTER, clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0  # 自上次恢复以来的连续熔断次数，决定退避时长
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.skipped = 0  # 累计跳过的采集次数
+
+    def allow_request(self) -> Tuple[bool, bool]:
+        """判断本轮是否放行，返回 (allowed, is_probe)"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.OPEN and self.clock() >= self.open_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True, True
+            self.skipped += 1
+            return False, False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.open_count = 0
+            self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.open_count += 1
+                backoff = min(self.max_backoff, self.base_backoff * (2 ** (self.open_count - 1)))
+                backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                self.state = self.OPEN
+                self.open_until = self.clock() + backoff
+            self.probe_in_flight = False
+
+    def retry_in(self) -> float:
+        """距离下一次探测的剩余秒数（非 open 状态为 0）"""
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.open_until - self.clock())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'open_count': self.open_count,
+                'skipped': self.skipped,
+            }
 
 
 class PLCManager:
-    def __init__(self, max_workers: int = 5):
-        """初始化PLC管理器，配置线程池大小"""
+    def __init__(self, max_workers: int = 5, read_gap_tolerance: int = READ_GAP_TOLERANCE,
+                 breaker_config: Optional[Dict[str, Any]] = None):
+        """初始化PLC管理器，配置线程池大小、块读合并的空洞容忍度（字节）与按IP熔断参数。
+
+        breaker_config 可包含 failure_threshold / base_backoff / max_backoff / jitter，
+        缺省取 BREAKER_* 常量；enabled 为 False 时关闭熔断（每轮都尝试连接所有PLC）。
+        """
         self.max_workers = max_workers
+        self.read_gap_tolerance = read_gap_tolerance
+        breaker_config = dict(breaker_config or {})
+        self.breaker_enabled = breaker_config.pop('enabled', True)
+        self.breaker_config = breaker_config
+        self.breakers: Dict[str, PLCCircuitBreaker] = {}  # 按IP的熔断器
         self.thread_pool = None
         self.clients_cache = {}  # 客户端缓存，按IP存储
-        self.clients_lock = threading.RLock()  # 用于保护clients_cache的锁
-        self.connection_stats = defaultdict(lambda: {'total_connections': 0, 'active_connections': 0})  # 连接统计
+        self.clients_lock = threading.RLock()  # 用于保护clients_cache与breakers的锁
+        self.connection_stats = defaultdict(lambda: {
+            'total_connections': 0, 'active_connections': 0,
+            'state': PLCCircuitBreaker.CLOSED, 'consecutive_failures': 0, 'open_count': 0, 'skipped': 0,
+        })  # 连接统计（含熔断器健康状态）
         self.stats_lock = threading.Lock()  # 用于保护统计数据的锁
         self.start_time = 0  # 管理器启动时间
 
@@ -387,6 +862,29 @@ class PLCManager:
             
         return reader
 
+    def _get_breaker(self, plc_ip: str) -> PLCCircuitBreaker:
+        with self.clients_lock:
+            breaker = self.breakers.get(plc_ip)
+            if breaker is None:
+                breaker = PLCCircuitBreaker(**self.breaker_config)
+                self.breakers[plc_ip] = breaker
+            return breaker
+
+    def _sync_breaker_stats(self, plc_ip: str, breaker: PLCCircuitBreaker) -> None:
+        """把熔断器状态同步到 connection_stats"""
+        snapshot = breaker.snapshot()
+        with self.stats_lock:
+            self.connection_stats[plc_ip].update(snapshot)
+
+    def abort_reader(self, plc_ip: str) -> None:
+        """中止指定 PLC 的在途会话（供 asyncio 采集引擎在会话超时/取消时调用）"""
+        with self.clients_lock:
+            reader = self.clients_cache.get(plc_ip)
+        if reader is not None:
+            reader.abort()
+            with self.stats_lock:
+                self.connection_stats[plc_ip]['active_connections'] = 0
+
     def read_multiple_plcs(self, plc_configs: List[Dict]) -> List[Dict]:
         """
         读取多个PLC的数据 - 优化版，使用线程安全的客户端缓存
@@ -467,17 +965,56 @@ class PLCManager:
             
             logger.info("\n📊 PLC连接统计信息")
             logger.info("=" * 60)
-            logger.info(f"{'IP地址':<15} {'总连接次数':<12} {'活跃连接数':<12}")
+            logger.info(f"{'IP地址':<15} {'总连接次数':<12} {'活跃连接数':<12} {'健康状态':<10} {'熔断跳过':<8}")
             logger.info("-" * 60)
             
             for ip, stats in self.connection_stats.items():
                 active_count = 1 if ip in self.clients_cache and self.clients_cache[ip].connected else 0
-                logger.info(f"{ip:<15} {stats['total_connections']:<12} {active_count:<12}")
+                logger.info(f"{ip:<15} {stats['total_connections']:<12} {active_count:<12} "
+                            f"{stats['state']:<10} {stats['skipped']:<8}")
             
             logger.info("=" * 60)
 
     def _read_single_plc_multiple_params(self, plc_ip: str, configs: List[Dict]) -> List[Dict]:
-        """读取单个PLC的多个参数 - 使用线程安全的客户端缓存，分块批量读取以遵守S7 PDU限制"""
+        """读取单个PLC的多个参数 - 使用线程安全的客户端缓存，相邻参数合并块读以减少网络往返。
+
+        熔断中的PLC直接返回失败结果，不建连；半开探测只读一次、不重试。"""
+        if not self.breaker_enabled:
+            return self._read_plc_params(plc_ip, configs)
+
+        breaker = self._get_breaker(plc_ip)
+        allowed, is_probe = breaker.allow_request()
+        if not allowed:
+            self._sync_breaker_stats(plc_ip, breaker)
+            message = f"PLC熔断中，{breaker.retry_in():.0f}秒后探测"
+            return [{
+                'ip': plc_ip,
+                'db_num': config['db_num'],
+                'offset': config['offset'],
+                'success': False,
+                'message': message,
+                'value': None,
+                'read_time': 0
+            } for config in configs]
+
+        results = []
+        try:
+            results = self._read_plc_params(plc_ip, configs, max_retries=0 if is_probe else 2)
+        finally:
+            if not configs or any(r['success'] for r in results):
+                breaker.record_success()
+                if is_probe:
+                    logger.info(f"✅ PLC {plc_ip} 半开探测成功，恢复正常采集")
+            else:
+                breaker.record_failure()
+                if breaker.state == PLCCircuitBreaker.OPEN:
+                    logger.warning(f"⚠️  PLC {plc_ip} 熔断（第{breaker.open_count}次），"
+                                   f"{breaker.retry_in():.0f}秒内跳过采集")
+            self._sync_breaker_stats(plc_ip, breaker)
+        return results
+
+    def _read_plc_params(self, plc_ip: str, configs: List[Dict], max_retries: int = 2) -> List[Dict]:
+        """连接（复用缓存的读取器）并块读合并读取单个PLC的全部参数"""
         results = []
 
         # 获取或创建PLC读取器（连接复用）
@@ -502,23 +1039,15 @@ class PLCManager:
             with self.stats_lock:
                 self.connection_stats[plc_ip]['active_connections'] = 1
 
-            # 将参数列表分成若干块，每块不超过 PDU_CHUNK_SIZE 个参数
-            chunks = [configs[i:i + PDU_CHUNK_SIZE] for i in range(0, len(configs), PDU_CHUNK_SIZE)]
-            logger.debug(f"🔧 PLC {plc_ip}: 共{len(configs)}个参数，分{len(chunks)}块读取（每块≤{PDU_CHUNK_SIZE}个）")
-
+            # 整个 PLC 的参数一次交给 read_multi，由其按 (db_num, offset) 合并为最少的块读
             start_read_time = time.time()
-            all_read_results: List[Tuple[bool, str, any]] = []
-
-            for chunk_idx, chunk in enumerate(chunks):
-                try:
-                    chunk_results = reader.read_multi(chunk)
-                    all_read_results.extend(chunk_results)
-                    logger.debug(f"🔧 PLC {plc_ip}: 第{chunk_idx + 1}/{len(chunks)}块读取完成，{len(chunk)}个参数")
-                except Exception as chunk_err:
-                    logger.info(f"❌ PLC {plc_ip} 第{chunk_idx + 1}块读取异常：{str(chunk_err)}")
-                    # 该块所有参数标记失败，继续下一块
-                    for _ in chunk:
-                        all_read_results.append((False, f"分块读取异常：{str(chunk_err)}", None))
+            try:
+                all_read_results: List[Tuple[bool, str, any]] = reader.read_multi(
+                    configs, max_retries=max_retries, gap_tolerance=self.read_gap_tolerance
+                )
+            except Exception as read_err:
+                logger.info(f"❌ PLC {plc_ip} 块读异常：{str(read_err)}")
+                all_read_results = [(False, f"块读异常：{str(read_err)}", None) for _ in configs]
 
             total_read_time = time.time() - start_read_time
             read_duration_per_param = total_read_time / len(configs) if configs else 0
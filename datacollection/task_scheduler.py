@@ -26,6 +26,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from datacollection.log_config_manager import get_logger
 # 导入改进的数据收集管理器
 from datacollection.improved_data_collection_manager import ImprovedDataCollectionManager
+from datacollection.multi_thread_plc_handler import READ_GAP_TOLERANCE
+from datacollection.async_collection_engine import (
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_PLC_DEADLINE, DEFAULT_ROUND_DEADLINE,
+)
 # MOD-DC-01: 大屏连通性 ICMP 探测任务已停用。
 # 新方案改为由 freeark-screen-heartbeat.service 独立订阅 MQTT 心跳实现。
 # from datacollection.screen_connectivity_checker import ScreenConnectivityTask
@@ -262,7 +266,16 @@ class TaskScheduler:
         # 初始化数据收集管理器
         sched = self.config.get('scheduler', {})
         pool_size = sched.get('thread_pool_size', 10)
-        self.data_collection_manager = ImprovedDataCollectionManager(max_workers=pool_size)
+        read_gap_tolerance = sched.get('read_gap_tolerance', READ_GAP_TOLERANCE)
+        self.data_collection_manager = ImprovedDataCollectionManager(
+            max_workers=pool_size,
+            read_gap_tolerance=read_gap_tolerance,
+            engine=sched.get('collection_engine', 'thread'),
+            async_max_concurrency=sched.get('async_max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            plc_deadline=sched.get('plc_deadline_seconds', DEFAULT_PLC_DEADLINE),
+            round_deadline=sched.get('round_deadline_seconds', DEFAULT_ROUND_DEADLINE),
+            breaker_config=sched.get('circuit_breaker'),
+        )
         self.data_collection_manager.start()
 
         # 解析调度分组（需在 data_collection_manager 初始化后调用，以便读取 plc_config）
@@ -0,0 +1,306 @@
+"""
+采集结果 → MQTT 负载编码（send_results_to_mqtt 使用）
+
+三个相互独立的维度，均由 output_config.json 的 mqtt 配置控制：
+
+  - publish_mode：per_device（每设备一条消息）/ batch（按 batch_max_bytes 打包的多设备信封，
+    发布到 {prefix}batch/{energy|general}/{楼栋}）
+  - payload_format：json（默认，与历史格式一致）/ compact（带版本头的 msgpack 紧凑格式）
+  - delta：只发送相对上次发布有变化的参数，每 keyframe_interval 轮发一次全量关键帧（见 DeltaTracker）
+
+紧凑格式 v1 布局：
+
+    0xC1 | 版本号(1) | 标志位(bit0=energy) | msgpack map
+        {"v": 1, "b": 楼栋或 None, "s": seq, "n": total,
+         "p": [参数名, ...],                       # 参数索引字典，整条消息共享
+         "d": [[device_id, plc_ip, timestamp,      # 每设备一个时间戳
+                idx,                               # 该设备参数在 "p" 中的下标；与 "p" 完全一致时为 None
+                values,                            # 与 idx 对齐的参数值
+                failed,                            # 失败位图（bytes，第 i 位对应第 i 个参数）
+                errors,                            # 失败参数的 [位置, 消息] 列表，成功消息不传
+                flags], ...]}                      # 可选：delta 设备的标志位（bit0=delta，bit1=online）
+
+0xC1 在 UTF-8 和 msgpack 中都不会作为首字节出现，后端凭首字节区分紧凑格式与 JSON，
+标志位让后端不解包就能按 energy/general 路由队列。紧凑格式只携带后端入库需要的字段
+（设备ID、PLC IP、时间戳、参数值/成败/失败消息），楼栋 JSON 中的其余设备描述字段不传。
+未安装 msgpack 时自动回退 JSON。
+"""
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖：未安装时 compact 格式回退为 JSON
+    msgpack = None
+
+from datacollection.log_config_manager import get_logger
+
+logger = get_logger('telemetry_codec')
+
+BATCH_ENVELOPE_KEY = '__batch__'
+DEFAULT_BATCH_MAX_BYTES = 256 * 1024
+# 仅含这些参数的批次视为 energy 批次（后端据此路由到 energy 队列并更新连接状态）
+ENERGY_PARAM_NAMES = frozenset(['total_hot_quantity', 'total_cold_quantity'])
+# seq/total 按 6 位数预留信封头长度
+_BATCH_HEADER_FORMAT = '{"%s": 1, "building": %s, "seq": %d, "total": %d, "devices": {'
+_BATCH_FOOTER = b'}}'
+
+PAYLOAD_FORMAT_JSON = 'json'
+PAYLOAD_FORMAT_COMPACT = 'compact'
+COMPACT_MAGIC = b'\xc1'
+COMPACT_VERSION = 1
+COMPACT_FLAG_ENERGY = 0x01
+COMPACT_ROW_DELTA = 0x01
+COMPACT_ROW_ONLINE = 0x02
+# 紧凑信封除 "d" 外的固定字段数（v/b/s/n/p）+ "d"
+_COMPACT_MAP_SIZE = 6
+
+# delta 模式默认每 6 轮一个关键帧（general 10 分钟一轮 → 每小时一次全量）
+DEFAULT_KEYFRAME_INTERVAL = 6
+
+
+def compact_available() -> bool:
+    return msgpack is not None
+
+
+def batch_kind(results: Dict[str, Dict]) -> str:
+    """判断批次类型：全部参数都是能耗参数时为 energy，否则为 general"""
+    for device_info in results.values():
+        data = device_info.get('data') if isinstance(device_info, dict) else None
+        if isinstance(data, dict) and not ENERGY_PARAM_NAMES.issuperset(data):
+            return 'general'
+    return 'energy'
+
+
+def _chunk_fragments(fragments: Iterable[Tuple[str, bytes]], budget: int, separator: int,
+                     max_bytes: int) -> List[List[bytes]]:
+    """按字节预算把已编码的设备片段分组；单个片段超过预算时独立成组（不拆分设备）"""
+    chunks = []
+    current = []
+    current_size = 0
+    for device_id, fragment in fragments:
+        added = len(fragment) + (separator if current else 0)
+        if current and current_size + added > budget:
+            chunks.append(current)
+            current, current_size, added = [], 0, len(fragment)
+        if len(fragment) > budget:
+            logger.warning(f"⚠️  设备 {device_id} 数据 {len(fragment)} 字节超过批量上限 {max_bytes} 字节，单独成包")
+        current.append(fragment)
+        current_size += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def build_batch_envelopes(building: str, results: Dict[str, Dict],
+                          max_bytes: int = DEFAULT_BATCH_MAX_BYTES) -> List[bytes]:
+    """把 {device_id: device_info} 编码为若干个 UTF-8 JSON 批量信封，每个信封不超过 max_bytes。
+
+    每个设备片段只 json.dumps 一次，信封靠字节拼接组装。
+    """
+    building_json = json.dumps(building, ensure_ascii=False)
+    overhead = len((_BATCH_HEADER_FORMAT % (BATCH_ENVELOPE_KEY, building_json, 999999, 999999)).encode('utf-8'))
+    overhead += len(_BATCH_FOOTER)
+
+    fragments = (
+        (device_id, (json.dumps(device_id, ensure_ascii=False) + ': '
+                     + json.dumps(device_info, ensure_ascii=False)).encode('utf-8'))
+        for device_id, device_info in results.items()
+    )
+    chunks = _chunk_fragments(fragments, max(max_bytes - overhead, 1), 1, max_bytes)
+
+    total = len(chunks)
+    return [
+        (_BATCH_HEADER_FORMAT % (BATCH_ENVELOPE_KEY, building_json, seq, total)).encode('utf-8')
+        + b','.join(chunk) + _BATCH_FOOTER
+        for seq, chunk in enumerate(chunks)
+    ]
+
+
+# ----------------------------------------------------------------------
+# 紧凑格式（msgpack）
+# ----------------------------------------------------------------------
+
+def _param_dictionary(results: Dict[str, Dict]) -> Dict[str, int]:
+    """按首次出现顺序为所有参数名编号"""
+    index = {}
+    for device_info in results.values():
+        data = device_info.get('data') if isinstance(device_info, dict) else None
+        if isinstance(data, dict):
+            for name in data:
+                if name not in index:
+                    index[name] = len(index)
+    return index
+
+
+def _compact_device_row(device_id: str, device_info: Dict, param_index: Dict[str, int]) -> list:
+    data = device_info.get('data')
+    if not isinstance(data, dict):
+        data = {}
+    timestamp = device_info.get('timestamp')
+    idx = []
+    values = []
+    failed = bytearray((len(data) + 7) // 8)
+    errors = []
+    for pos, (name, param) in enumerate(data.items()):
+        idx.append(param_index[name])
+        if not isinstance(param, dict):
+            param = {'value': None, 'success': False, 'message': ''}
+        values.append(param.get('value'))
+        if not param.get('success'):
+            failed[pos >> 3] |= 1 << (pos & 7)
+            if param.get('message'):
+                errors.append([pos, param['message']])
+        if timestamp is None:
+            timestamp = param.get('timestamp')
+
+    plc_ip = device_info.get('PLC IP地址', '') or device_info.get('IP地址', '')
+    if idx == list(range(len(param_index))):
+        idx = None
+    row = [device_id, plc_ip, timestamp, idx, values, bytes(failed), errors]
+    if device_info.get('delta'):
+        row.append(COMPACT_ROW_DELTA | (COMPACT_ROW_ONLINE if device_info.get('online') else 0))
+    return row
+
+
+def _compact_header(kind: str) -> bytes:
+    flags = COMPACT_FLAG_ENERGY if kind == 'energy' else 0
+    return COMPACT_MAGIC + bytes((COMPACT_VERSION, flags))
+
+
+def _compact_prefix(packer, building: Optional[str], seq: int, total: int, names: List[str],
+                    device_count: int) -> bytes:
+    parts = [packer.pack_map_header(_COMPACT_MAP_SIZE)]
+    for key, value in (('v', COMPACT_VERSION), ('b', building), ('s', seq), ('n', total), ('p', names)):
+        parts.append(packer.pack(key))
+        parts.append(packer.pack(value))
+    parts.append(packer.pack('d'))
+    parts.append(packer.pack_array_header(device_count))
+    return b''.join(parts)
+
+
+def encode_compact(results: Dict[str, Dict], kind: Optional[str] = None) -> bytes:
+    """把 {device_id: device_info}（通常为单设备）编码为一条紧凑格式消息。
+
+    kind 缺省时按 results 判断；delta 结果应传入过滤前判断的类型。
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    param_index = _param_dictionary(results)
+    rows = [packer.pack(_compact_device_row(device_id, info, param_index))
+            for device_id, info in results.items()]
+    return (_compact_header(kind or batch_kind(results))
+            + _compact_prefix(packer, None, 0, 1, list(param_index), len(rows))
+            + b''.join(rows))
+
+
+def build_compact_envelopes(building: str, results: Dict[str, Dict],
+                            max_bytes: int = DEFAULT_BATCH_MAX_BYTES, kind: Optional[str] = None) -> List[bytes]:
+    """紧凑格式的批量信封：设备行各自 msgpack 编码一次，按 max_bytes 分包拼接。
+
+    msgpack 数组 = 数组头 + 元素编码直接拼接，因此与 JSON 批量信封一样无需二次编码。
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    param_index = _param_dictionary(results)
+    names = list(param_index)
+    header = _compact_header(kind or batch_kind(results))
+    # 数组头最长 5 字节，seq/total 按 uint32 预留
+    overhead = len(header) + len(_compact_prefix(packer, building, 2 ** 32 - 1, 2 ** 32 - 1, names, 2 ** 16))
+
+    fragments = (
+        (device_id, packer.pack(_compact_device_row(device_id, info, param_index)))
+        for device_id, info in results.items()
+    )
+    chunks = _chunk_fragments(fragments, max(max_bytes - overhead, 1), 0, max_bytes)
+
+    total = len(chunks)
+    return [
+        header + _compact_prefix(packer, building, seq, total, names, len(chunk)) + b''.join(chunk)
+        for seq, chunk in enumerate(chunks)
+    ]
+
+
+# ----------------------------------------------------------------------
+# delta 发布
+# ----------------------------------------------------------------------
+
+class DeltaTracker:
+    """记录每个 (楼栋, 批次类型) 上次发布的参数值，生成只含变化参数的 delta 结果。
+
+    - 每 keyframe_interval 轮（含首轮）发一次全量关键帧，并以关键帧重建基准值；
+    - 非关键帧轮次，每个设备保留：值有变化的成功参数、全部失败参数（后端据此不刷新其采集时间）、
+      以及始终发送的能耗累计量参数（PLCData 按日建行，不能因读数不变而缺日）；
+    - delta 设备带 delta=True 与 online（本轮是否有任一参数读取成功），
+      未变化的设备也照常发送（data 可能为空），后端据此刷新采集时间与连接状态；
+    - 基准值两阶段更新：filter() 只给出候选基准，发送全部成功后 commit()，失败则 reset() 改发关键帧。
+    """
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.Lock()
+        # stream_key -> {'cycle': int, 'last': {device_id: {param: value}}}
+        self._streams: Dict[Tuple[str, str], Dict] = {}
+
+    def reset(self, stream_key: Optional[Tuple[str, str]] = None) -> None:
+        """丢弃基准值，下一轮强制发关键帧（如后端重启后需要全量同步）"""
+        with self._lock:
+            if stream_key is None:
+                self._streams.clear()
+            else:
+                self._streams.pop(stream_key, None)
+
+    def filter(self, stream_key: Tuple[str, str],
+               results: Dict[str, Dict]) -> Tuple[Dict[str, Dict], bool, Dict[str, Dict]]:
+        """返回 (本轮要发布的结果, 是否关键帧, 候选基准值)；关键帧时原样返回 results。
+
+        候选基准值 {device_id: {param: value}} 不会自动生效：调用方确认本轮全部发送成功后
+        commit()，发送失败则 reset()，避免丢失的变化值直到下个关键帧才补发。
+        """
+        with self._lock:
+            stream = self._streams.setdefault(stream_key, {'cycle': 0, 'last': {}})
+            cycle = stream['cycle']
+            stream['cycle'] = cycle + 1
+            keyframe = self.keyframe_interval <= 1 or cycle % self.keyframe_interval == 0
+            last = stream['last']
+            baseline: Dict[str, Dict] = {}
+
+            if keyframe:
+                for device_id, device_info in results.items():
+                    data = device_info.get('data') if isinstance(device_info, dict) else None
+                    if isinstance(data, dict):
+                        baseline[device_id] = {
+                            name: p.get('value') for name, p in data.items()
+                            if isinstance(p, dict) and p.get('success')
+                        }
+                return results, True, baseline
+
+            delta = {}
+            for device_id, device_info in results.items():
+                data = device_info.get('data') if isinstance(device_info, dict) else None
+                if not isinstance(data, dict):
+                    delta[device_id] = device_info
+                    continue
+                device_last = last.get(device_id, {})
+                changed = {}
+                updates = {}
+                online = False
+                for name, param in data.items():
+                    if not isinstance(param, dict) or not param.get('success'):
+                        changed[name] = param
+                        continue
+                    online = True
+                    value = param.get('value')
+                    if name in ENERGY_PARAM_NAMES or name not in device_last or device_last[name] != value:
+                        changed[name] = param
+                        updates[name] = value
+                if updates:
+                    baseline[device_id] = {**device_last, **updates}
+                delta[device_id] = {**device_info, 'data': changed, 'delta': True, 'online': online}
+            return delta, False, baseline
+
+    def commit(self, stream_key: Tuple[str, str], baseline: Dict[str, Dict]) -> None:
+        """本轮发送全部成功后提交 filter() 返回的候选基准值；期间被 reset() 的流不再提交"""
+        with self._lock:
+            stream = self._streams.get(stream_key)
+            if stream is not None:
+                stream['last'].update(baseline)
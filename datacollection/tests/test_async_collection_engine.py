@@ -0,0 +1,171 @@
+"""
+AsyncCollectionEngine 单元测试：并发上限、单 PLC 截止、超时会话跳过、单轮截止取消，
+以及 ImprovedDataCollectionManager(engine='asyncio') 的接入。
+
+会话函数用 threading.Event 控制阻塞时长，不依赖 snap7 / 真实 PLC。
+"""
+import threading
+import time
+
+import pytest
+
+from datacollection.async_collection_engine import AsyncCollectionEngine
+
+
+def _failure(plc_ip, configs, message):
+    return [{'ip': plc_ip, 'success': False, 'message': message, 'value': None} for _ in configs]
+
+
+def _ok(plc_ip, configs):
+    return [{'ip': plc_ip, 'success': True, 'message': '读取成功', 'value': 1} for _ in configs]
+
+
+@pytest.fixture
+def engine_factory():
+    engines = []
+
+    def make(**kwargs):
+        engine = AsyncCollectionEngine(**kwargs)
+        engine.start()
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.stop()
+
+
+def test_read_all_bounds_global_concurrency(engine_factory):
+    engine = engine_factory(max_concurrency=3, plc_deadline=5)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def session(plc_ip, configs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return _ok(plc_ip, configs)
+
+    ip_to_configs = {f'10.0.0.{i}': [{}, {}] for i in range(12)}
+    results = engine.read_all(ip_to_configs, session, _failure)
+
+    assert len(results) == 24 and all(r['success'] for r in results)
+    assert peak[0] == 3
+    assert engine.snapshot()['sessions'] == 12
+
+
+def test_slow_plc_hits_deadline_without_holding_up_others(engine_factory):
+    aborted = []
+    release = threading.Event()
+    engine = engine_factory(max_concurrency=2, plc_deadline=0.2, abort_fn=aborted.append)
+
+    def session(plc_ip, configs):
+        if plc_ip == 'dead':
+            release.wait(5)  # 模拟阻塞在 snap7 调用里的会话，中止钩子触发后才返回
+        return _ok(plc_ip, configs)
+
+    start = time.time()
+    results = engine.read_all({'dead': [{}], 'a': [{}], 'b': [{}], 'c': [{}]}, session, _failure)
+    elapsed = time.time() - start
+
+    by_ip = {r['ip']: r for r in results}
+    assert elapsed < 1.0
+    assert by_ip['dead']['success'] is False and '会话超时' in by_ip['dead']['message']
+    assert all(by_ip[ip]['success'] for ip in ('a', 'b', 'c'))
+    assert aborted == ['dead']
+
+    # 执行线程仍未返回：下一轮直接跳过，不占并发名额
+    results = engine.read_all({'dead': [{}]}, session, _failure)
+    assert '尚未结束' in results[0]['message']
+    assert engine.snapshot()['overdue_plcs'] == 1
+
+    release.set()
+    deadline = time.time() + 2
+    while engine.snapshot()['overdue_plcs'] and time.time() < deadline:
+        time.sleep(0.01)
+    results = engine.read_all({'dead': [{}]}, session, _failure)
+    assert results[0]['success'] is True
+
+
+@pytest.mark.parametrize('overdue_allowance', [None, 0])
+def test_hung_session_does_not_expire_next_session_deadline(engine_factory, overdue_allowance):
+    release = threading.Event()
+    engine = engine_factory(max_concurrency=1, plc_deadline=0.2, overdue_allowance=overdue_allowance)
+
+    def session(plc_ip, configs):
+        if plc_ip == 'hung':
+            release.wait(5)  # 中止钩子不生效：线程在超时后仍被占用
+        return _ok(plc_ip, configs)
+
+    # 无预留线程时 'ok' 只能等 'hung' 的线程返回，但排队时间不计入它的截止时间
+    timer = threading.Timer(0.5, release.set)
+    timer.start()
+    try:
+        results = engine.read_all({'hung': [{}], 'ok': [{}]}, session, _failure)
+    finally:
+        release.set()
+        timer.cancel()
+
+    by_ip = {r['ip']: r for r in results}
+    assert by_ip['hung']['success'] is False and '会话超时' in by_ip['hung']['message']
+    assert by_ip['ok']['success'] is True
+
+
+def test_round_deadline_cancels_queued_sessions(engine_factory):
+    release = threading.Event()
+    engine = engine_factory(max_concurrency=1, plc_deadline=5, round_deadline=0.2)
+
+    def session(plc_ip, configs):
+        release.wait(5)
+        return _ok(plc_ip, configs)
+
+    try:
+        results = engine.read_all({'a': [{}], 'b': [{}]}, session, _failure)
+    finally:
+        release.set()
+
+    assert all(r['success'] is False and '会话已取消' in r['message'] for r in results)
+    assert engine.snapshot()['cancelled'] == 2
+
+
+def test_session_exception_becomes_failure_results(engine_factory):
+    engine = engine_factory(max_concurrency=2)
+
+    def session(plc_ip, configs):
+        raise RuntimeError('boom')
+
+    results = engine.read_all({'a': [{}, {}]}, session, _failure)
+    assert [r['message'] for r in results] == ['任务执行异常：boom'] * 2
+
+
+def test_manager_routes_reads_through_async_engine():
+    from datacollection.improved_data_collection_manager import ImprovedDataCollectionManager
+
+    with pytest.raises(ValueError):
+        ImprovedDataCollectionManager(engine='gevent')
+
+    manager = ImprovedDataCollectionManager(max_workers=2, engine='asyncio', plc_deadline=1)
+    manager.async_engine.start()
+    try:
+        seen = []
+
+        def fake_session(plc_ip, configs):
+            seen.append((plc_ip, len(configs)))
+            return [{'ip': plc_ip, 'device_id': c['device_id'], 'param_key': c['param_key'],
+                     'success': True, 'message': '读取成功', 'value': 0} for c in configs]
+
+        manager._read_single_plc_with_multiple_params = fake_session
+        configs = [
+            {'ip': ip, 'device_id': f'd{i}', 'param_key': 'p', 'db_num': 14, 'offset': 0}
+            for i, ip in enumerate(['10.0.0.1', '10.0.0.1', '10.0.0.2'])
+        ]
+        results = manager._read_all_plc_data(configs)
+    finally:
+        manager.async_engine.stop()
+
+    assert sorted(seen) == [('10.0.0.1', 2), ('10.0.0.2', 1)]
+    assert len(results) == 3 and all(r['success'] for r in results)
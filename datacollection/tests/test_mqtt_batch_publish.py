@@ -0,0 +1,51 @@
+"""
+MQTT 批量发布信封（build_batch_envelopes / batch_kind）单元测试：大小上限、设备完整性、信封结构。
+"""
+import json
+
+from datacollection.telemetry_codec import (
+    BATCH_ENVELOPE_KEY, batch_kind, build_batch_envelopes,
+)
+
+
+def _results(count, params=('living_room_temperature', 'total_hot_quantity')):
+    return {
+        f'3-1-7-{700 + i}': {
+            '唯一标识符': f'3-1-7-{700 + i}',
+            'PLC IP地址': '192.168.7.83',
+            'data': {p: {'value': i, 'success': True, 'message': '读取成功',
+                         'timestamp': '2026-04-18 10:42:55'} for p in params},
+        }
+        for i in range(count)
+    }
+
+
+def test_envelopes_respect_size_limit_and_keep_every_device():
+    results = _results(40)
+    envelopes = build_batch_envelopes('all_owner', results, max_bytes=2048)
+
+    assert len(envelopes) > 1
+    assert all(len(e) <= 2048 for e in envelopes)
+
+    decoded = [json.loads(e.decode('utf-8')) for e in envelopes]
+    merged = {}
+    for seq, env in enumerate(decoded):
+        assert env[BATCH_ENVELOPE_KEY] == 1
+        assert env['building'] == 'all_owner'
+        assert env['seq'] == seq and env['total'] == len(envelopes)
+        merged.update(env['devices'])
+    assert merged == results
+
+
+def test_oversized_device_gets_its_own_envelope():
+    results = _results(3)
+    results['3-1-7-700']['data']['备注'] = {'value': '长' * 2000, 'success': True}
+    envelopes = build_batch_envelopes('b', results, max_bytes=1024)
+    devices = [list(json.loads(e)['devices']) for e in envelopes]
+    assert ['3-1-7-700'] in devices
+    assert sum(len(d) for d in devices) == 3
+
+
+def test_batch_kind():
+    assert batch_kind(_results(2, params=('total_hot_quantity', 'total_cold_quantity'))) == 'energy'
+    assert batch_kind(_results(2)) == 'general'
@@ -38,6 +38,9 @@ def _make_reader(connected=False):
     r.connected = connected
     r.connect_time = 0.0
     r.lock = threading.RLock()
+    r.pdu_length = 240
+    r.multi_var_mode = None
+    r.plan_cache = {}
     return r
 
 
@@ -86,3 +89,242 @@ def test_mark_broken_is_idempotent_and_safe():
 
     assert r.connected is False
     assert r.connect_time == 0
+
+
+# ---------------------------------------------------------------------------
+# 块读合并：plan_block_reads + read_multi
+# ---------------------------------------------------------------------------
+
+from datacollection.multi_thread_plc_handler import plan_block_reads  # noqa: E402
+
+
+def _req(offset, length=2, data_type='int16', db_num=14):
+    return {'db_num': db_num, 'offset': offset, 'length': length, 'data_type': data_type}
+
+
+def test_plan_merges_adjacent_and_near_ranges_within_gap():
+    reqs = [_req(10), _req(0), _req(2), _req(40)]  # 乱序输入
+    blocks = plan_block_reads(reqs, gap_tolerance=32)
+
+    assert len(blocks) == 1
+    assert blocks[0]['start'] == 0 and blocks[0]['length'] == 42
+    assert blocks[0]['indices'] == [1, 2, 0, 3]  # 按偏移升序
+
+
+def test_plan_splits_on_gap_db_and_block_size():
+    reqs = [_req(0), _req(100), _req(0, db_num=15), _req(102, length=4)]
+    blocks = plan_block_reads(reqs, gap_tolerance=32, max_block_bytes=222)
+    assert [(b['db_num'], b['start'], b['length']) for b in blocks] == [(14, 0, 2), (14, 100, 6), (15, 0, 2)]
+
+    # 块长上限：两个参数合并后 12 字节 > 10 → 拆开
+    blocks = plan_block_reads([_req(0, 4), _req(8, 4)], gap_tolerance=32, max_block_bytes=10)
+    assert len(blocks) == 2
+
+
+def test_plan_negative_gap_disables_merging():
+    blocks = plan_block_reads([_req(0), _req(2), _req(4)], gap_tolerance=-1)
+    assert len(blocks) == 3
+
+
+def test_read_multi_slices_block_and_issues_one_db_read_per_block():
+    """三个参数落在同一块 → 只调用一次 db_read，并按偏移切片解析；越界参数单独报错。"""
+    r = _make_reader(connected=True)
+    buf = bytearray(112)
+    buf[100:102] = (-5).to_bytes(2, 'big', signed=True)
+    buf[104] = 7
+    buf[108:112] = (123456).to_bytes(4, 'big', signed=True)
+    r.client.db_read.side_effect = lambda db, start, size: buf[start:start + size]
+
+    reqs = [
+        _req(108, 4, 'int32'),
+        _req(100, 2, 'int16'),
+        _req(104, 1, 'byte'),
+        _req(65535, 2, 'int16'),
+    ]
+
+    results = r.read_multi(reqs)
+
+    assert results[0] == (True, "读取成功", 123456)
+    assert results[1] == (True, "读取成功", -5)
+    assert results[2] == (True, "读取成功", 7)
+    assert results[3][0] is False and '越界' in results[3][1]
+    r.client.db_read.assert_called_once_with(14, 100, 12)
+
+
+def test_read_multi_block_failure_fails_members_and_marks_broken():
+    r = _make_reader(connected=True)
+    r.client.db_read.side_effect = RuntimeError('TCP : connection reset')
+
+    with patch('datacollection.multi_thread_plc_handler.time.sleep'):
+        results = r.read_multi([_req(0), _req(2), _req(500)])
+
+    assert all(success is False for success, _, _ in results)
+    assert '已重试' in results[0][1] and '已重试' in results[1][1]
+    # 第一块失败后已弃连，后续块不再发起读取
+    assert '未连接' in results[2][1]
+    assert r.connected is False
+
+
+# ---------------------------------------------------------------------------
+# 多变量读（read_multi_vars）+ PDU 协商
+# ---------------------------------------------------------------------------
+
+from datacollection.multi_thread_plc_handler import (  # noqa: E402
+    S7DataItem, max_block_bytes_for_pdu, pack_multi_var_requests,
+)
+
+
+def _block(length, db_num=14, start=0):
+    return {'db_num': db_num, 'start': start, 'length': length, 'indices': []}
+
+
+def test_pack_multi_var_limits_item_count_by_request_pdu():
+    """PDU 240：请求报文最多容纳 (240-12)/12 = 19 个数据项。"""
+    batches = pack_multi_var_requests([_block(2) for _ in range(45)], pdu_length=240)
+    assert [len(b) for b in batches] == [19, 19, 7]
+    assert [k for b in batches for k in b] == list(range(45))
+
+
+def test_pack_multi_var_limits_response_bytes_and_pads_odd_items():
+    # 14 + (4+100) + (4+100) = 222；再加一个 (4+15+1) 会超过 240
+    batches = pack_multi_var_requests([_block(100), _block(100), _block(15), _block(15)], pdu_length=240)
+    assert batches == [[0, 1], [2, 3]]
+    assert max_block_bytes_for_pdu(480) == 462
+
+
+def test_connect_records_negotiated_pdu_length():
+    r = _make_reader(connected=False)
+    r.client.get_connected.return_value = True
+    r.client.get_pdu_length.return_value = 480
+
+    assert r.connect() is True
+    assert r.pdu_length == 480
+
+
+def test_detect_multi_var_mode_falls_back_for_old_snap7():
+    r = _make_reader()
+    r.client = MagicMock(spec=['connect', 'db_read', 'get_connected'])
+    assert r._detect_multi_var_mode() is None
+
+
+def test_read_multi_packs_blocks_across_dbs_into_one_multi_var_request():
+    """dict 形态（python-snap7 3.x）：跨 DB 的多个块只发一次 read_multi_vars，不再逐块 db_read。"""
+    r = _make_reader(connected=True)
+    r.multi_var_mode = 'dict'
+    dbs = {14: bytearray(16), 15: bytearray(16), 16: bytearray(16)}
+    dbs[14][0:2] = (1).to_bytes(2, 'big')
+    dbs[15][4:6] = (2).to_bytes(2, 'big')
+    dbs[16][8:12] = (-3).to_bytes(4, 'big', signed=True)
+    r.client.read_multi_vars.side_effect = lambda items: (
+        0, [dbs[it['db_number']][it['start']:it['start'] + it['size']] for it in items]
+    )
+
+    results = r.read_multi([_req(0, db_num=14), _req(4, db_num=15), _req(8, 4, 'int32', db_num=16)])
+
+    assert results == [(True, "读取成功", 1), (True, "读取成功", 2), (True, "读取成功", -3)]
+    r.client.read_multi_vars.assert_called_once()
+    r.client.db_read.assert_not_called()
+
+
+@pytest.mark.skipif(S7DataItem is None, reason='snap7 未提供 S7DataItem')
+def test_read_multi_maps_per_item_errors_in_ctypes_mode():
+    """ctypes 形态（原生 snap7 1.x/2.x）：单个数据项失败只影响该块的参数，不弃连。"""
+    r = _make_reader(connected=True)
+    r.multi_var_mode = 'ctypes'
+
+    def fake_read_multi_vars(items):
+        for item in items:
+            if item.DBNumber == 15:
+                item.Result = 0x00C00000  # errCliItemNotAvailable
+                continue
+            for i in range(item.Amount):
+                item.pData[i] = item.DBNumber
+        return 0, items
+
+    r.client.read_multi_vars.side_effect = fake_read_multi_vars
+
+    results = r.read_multi([_req(0, 1, 'byte', db_num=14), _req(0, 1, 'byte', db_num=15)])
+
+    assert results[0] == (True, "读取成功", 14)
+    assert results[1][0] is False and '数据项读取失败' in results[1][1] and '0x00C00000' in results[1][1]
+    assert r.connected is True
+    r.client.db_read.assert_not_called()
+
+
+def test_read_multi_falls_back_to_db_read_when_multi_var_request_fails():
+    r = _make_reader(connected=True)
+    r.multi_var_mode = 'dict'
+    r.client.read_multi_vars.side_effect = RuntimeError('function not supported')
+    r.client.db_read.side_effect = lambda db, start, size: bytearray([0, db])[:size] if size == 2 else bytearray(size)
+
+    results = r.read_multi([_req(0, db_num=14), _req(0, db_num=15)])
+
+    assert results == [(True, "读取成功", 14), (True, "读取成功", 15)]
+    assert r.client.db_read.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# 预编译块解码（CompiledReadPlan / BlockDecoder）
+# ---------------------------------------------------------------------------
+
+import random  # noqa: E402
+import struct  # noqa: E402
+
+from datacollection.multi_thread_plc_handler import CompiledReadPlan  # noqa: E402
+
+
+def test_compiled_decoder_matches_parse_data_for_every_type():
+    """每种类型、带空洞/重叠/长度不符的参数：整块解码结果与逐参数 _parse_data 完全一致。"""
+    reqs = [
+        _req(0, 1, 'byte'), _req(1, 1, 'int8'), _req(2, 2, 'uint16'), _req(6, 2, 'int16'),
+        _req(8, 4, 'uint32'), _req(12, 4, 'int32'), _req(20, 4, 'float32'), _req(24, 8, 'float64'),
+        _req(24, 4, 'float32'),  # 与 float64 重叠
+        _req(40, 4, 'byte'),     # 长度与类型不符
+        _req(44, 2, 'bool'),     # 不支持的类型
+    ]
+    rng = random.Random(7)
+    raw = bytes(rng.randrange(256) for _ in range(46))
+    raw = raw[:20] + struct.pack('>f', 3.14159) + struct.pack('>d', -2.718281828) + raw[32:]
+
+    plan = CompiledReadPlan(reqs, gap_tolerance=32)
+    assert len(plan.blocks) == 1
+    results = [None] * len(reqs)
+    plan.decoders[0].decode(raw, results)
+
+    r = _make_reader()
+    for req, result in zip(reqs, results):
+        expected = r._parse_data(raw[req['offset']:req['offset'] + req['length']], req['data_type'])
+        if expected is None:
+            assert result == (False, f"数据类型解析失败：{req['data_type']}", None)
+        else:
+            assert result == (True, "读取成功", expected)
+
+
+def test_read_multi_compiles_plan_once_and_recompiles_on_pdu_change():
+    r = _make_reader(connected=True)
+    r.client.db_read.side_effect = lambda db, start, size: bytearray(size)
+    reqs = [_req(0), _req(4), _req(8)]
+
+    with patch('datacollection.multi_thread_plc_handler.CompiledReadPlan',
+               wraps=CompiledReadPlan) as compiled:
+        compiled.signature = CompiledReadPlan.signature
+        r.read_multi(reqs)
+        r.read_multi([dict(q) for q in reqs])
+        assert compiled.call_count == 1
+        r.pdu_length = 480
+        r.read_multi(reqs)
+        assert compiled.call_count == 2
+
+
+def test_abort_disconnects_without_taking_reader_lock():
+    """abort() 供其他线程中止阻塞中的会话：读线程持锁期间也能立即断开底层连接。"""
+    r = _make_reader(connected=True)
+    r.lock.acquire()
+    try:
+        done = threading.Event()
+        threading.Thread(target=lambda: (r.abort(), done.set())).start()
+        assert done.wait(1)
+    finally:
+        r.lock.release()
+    r.client.disconnect.assert_called_once()
+    assert r.connected is False
@@ -0,0 +1,125 @@
+"""
+PLCCircuitBreaker 状态机与 PLCManager 按 IP 熔断的单元测试。
+
+时钟通过 clock 注入，读取器用 MagicMock 替身，不依赖 snap7 / 真实 PLC。
+"""
+from unittest.mock import MagicMock
+
+from datacollection.multi_thread_plc_handler import PLCCircuitBreaker, PLCManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock, **kwargs):
+    params = dict(failure_threshold=2, base_backoff=10, max_backoff=35, jitter=0, clock=clock)
+    params.update(kwargs)
+    return PLCCircuitBreaker(**params)
+
+
+def test_opens_after_threshold_and_skips_until_backoff_expires():
+    clock = FakeClock()
+    b = _breaker(clock)
+
+    b.record_failure()
+    assert b.state == PLCCircuitBreaker.CLOSED
+    b.record_failure()
+    assert b.state == PLCCircuitBreaker.OPEN
+    assert b.retry_in() == 10
+
+    assert b.allow_request() == (False, False)
+    clock.now += 10
+    assert b.allow_request() == (True, True)
+    assert b.state == PLCCircuitBreaker.HALF_OPEN
+    # 半开期间只放行一个探测
+    assert b.allow_request() == (False, False)
+    assert b.snapshot()['skipped'] == 2
+
+
+def test_failed_probe_doubles_backoff_up_to_cap_and_success_resets():
+    clock = FakeClock()
+    b = _breaker(clock)
+    b.record_failure()
+    b.record_failure()
+
+    backoffs = []
+    for _ in range(3):
+        clock.now += b.retry_in()
+        assert b.allow_request() == (True, True)
+        b.record_failure()
+        backoffs.append(b.retry_in())
+    assert backoffs == [20, 35, 35]
+
+    clock.now += b.retry_in()
+    b.allow_request()
+    b.record_success()
+    assert b.snapshot() == {'state': 'closed', 'consecutive_failures': 0, 'open_count': 0, 'skipped': 0}
+
+
+def test_jitter_stays_within_bounds():
+    clock = FakeClock()
+    for _ in range(50):
+        b = _breaker(clock, failure_threshold=1, base_backoff=100, max_backoff=1000, jitter=0.2)
+        b.record_failure()
+        assert 80 <= b.retry_in() <= 120
+
+
+def _offline_manager(clock):
+    manager = PLCManager(max_workers=1, breaker_config={
+        'failure_threshold': 2, 'base_backoff': 30, 'max_backoff': 600, 'jitter': 0, 'clock': clock,
+    })
+    offline = MagicMock()
+    offline.connect.return_value = False
+    online = MagicMock()
+    online.connect.return_value = True
+    online.read_multi.side_effect = lambda configs, **kw: [(True, "读取成功", 1) for _ in configs]
+    readers = {'10.0.0.1': offline, '10.0.0.2': online}
+    manager._get_or_create_reader = lambda ip: readers[ip]
+    return manager, offline, online
+
+
+def _configs(ip):
+    return [{'ip': ip, 'db_num': 14, 'offset': 0, 'length': 2, 'data_type': 'int16'}]
+
+
+def test_manager_skips_offline_plc_until_probe_and_reports_stats():
+    clock = FakeClock()
+    manager, offline, online = _offline_manager(clock)
+
+    for _ in range(5):
+        manager._read_single_plc_multiple_params('10.0.0.1', _configs('10.0.0.1'))
+        manager._read_single_plc_multiple_params('10.0.0.2', _configs('10.0.0.2'))
+
+    # 两次连接失败后熔断，后三轮不再建连；在线 PLC 不受影响
+    assert offline.connect.call_count == 2
+    assert online.read_multi.call_count == 5
+    stats = manager.connection_stats['10.0.0.1']
+    assert stats['state'] == 'open' and stats['skipped'] == 3
+    assert manager.connection_stats['10.0.0.2']['state'] == 'closed'
+
+    skipped = manager._read_single_plc_multiple_params('10.0.0.1', _configs('10.0.0.1'))
+    assert skipped[0]['success'] is False and '熔断' in skipped[0]['message']
+
+    # 退避到期：PLC 恢复在线，半开探测只读一次（不重试）后恢复 closed
+    clock.now += 30
+    offline.connect.return_value = True
+    offline.read_multi.side_effect = lambda configs, **kw: [(True, "读取成功", 7) for _ in configs]
+    results = manager._read_single_plc_multiple_params('10.0.0.1', _configs('10.0.0.1'))
+    assert results[0]['value'] == 7
+    assert offline.read_multi.call_args.kwargs['max_retries'] == 0
+    assert manager.connection_stats['10.0.0.1']['state'] == 'closed'
+
+
+def test_breaker_can_be_disabled():
+    clock = FakeClock()
+    manager, offline, _ = _offline_manager(clock)
+    manager.breaker_enabled = False
+
+    for _ in range(5):
+        manager._read_single_plc_multiple_params('10.0.0.1', _configs('10.0.0.1'))
+    assert offline.connect.call_count == 5
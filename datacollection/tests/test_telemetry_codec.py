@@ -0,0 +1,160 @@
+"""
+紧凑负载编码（telemetry_codec 的 msgpack 格式）单元测试：头部、参数索引字典、失败位图、批量分包，
+以及 DeltaTracker 的 delta / 关键帧生成。
+"""
+import msgpack
+
+from datacollection.telemetry_codec import (
+    COMPACT_FLAG_ENERGY, COMPACT_MAGIC, COMPACT_VERSION, DeltaTracker, build_compact_envelopes, encode_compact,
+)
+
+TS = '2026-04-18 10:42:55'
+
+
+def _device(values, failed=()):
+    return {
+        '唯一标识符': 'x',
+        'PLC IP地址': '192.168.7.83',
+        'timestamp': TS,
+        'data': {
+            name: {'value': None if name in failed else value, 'success': name not in failed,
+                   'message': '连接失败' if name in failed else '读取成功', 'timestamp': TS}
+            for name, value in values.items()
+        },
+    }
+
+
+def _unpack(payload):
+    assert payload[:1] == COMPACT_MAGIC and payload[1] == COMPACT_VERSION
+    return payload[2], msgpack.unpackb(payload[3:], raw=False)
+
+
+def test_single_device_layout():
+    results = {'3-1-7-702': _device({'total_hot_quantity': 1000, 'total_cold_quantity': 0},
+                                    failed=('total_cold_quantity',))}
+    flags, doc = _unpack(encode_compact(results))
+
+    assert flags & COMPACT_FLAG_ENERGY
+    assert doc['b'] is None and doc['p'] == ['total_hot_quantity', 'total_cold_quantity']
+    device_id, plc_ip, ts, idx, values, failed, errors = doc['d'][0]
+    assert (device_id, plc_ip, ts, idx) == ('3-1-7-702', '192.168.7.83', TS, None)
+    assert values == [1000, None]
+    assert failed == b'\x02' and errors == [[1, '连接失败']]
+
+
+def test_devices_with_different_params_use_index_list():
+    results = {
+        'a': _device({'p1': 1, 'p2': 2, 'p3': 3}),
+        'b': _device({'p3': 30, 'p1': 10}),
+    }
+    flags, doc = _unpack(encode_compact(results))
+    assert not flags & COMPACT_FLAG_ENERGY
+    assert doc['p'] == ['p1', 'p2', 'p3']
+    assert doc['d'][0][3] is None
+    assert doc['d'][1][3] == [2, 0] and doc['d'][1][4] == [30, 10]
+
+
+def test_compact_envelopes_are_bounded_and_much_smaller_than_json():
+    import json
+    params = {f'param_{i}': i for i in range(89)}
+    results = {f'3-1-7-{700 + i}': _device(params) for i in range(30)}
+
+    envelopes = build_compact_envelopes('all_owner', results, max_bytes=4096)
+    assert len(envelopes) > 1 and all(len(e) <= 4096 for e in envelopes)
+
+    docs = [_unpack(e)[1] for e in envelopes]
+    assert [d['s'] for d in docs] == list(range(len(envelopes)))
+    assert all(d['b'] == 'all_owner' and d['n'] == len(envelopes) for d in docs)
+    assert sum(len(d['d']) for d in docs) == 30
+
+    json_size = len(json.dumps(results, ensure_ascii=False).encode('utf-8'))
+    assert sum(len(e) for e in envelopes) * 4 < json_size
+
+
+def _publish(tracker, key, results):
+    """模拟一轮全部发送成功：filter 后提交候选基准值"""
+    published, keyframe, baseline = tracker.filter(key, results)
+    tracker.commit(key, baseline)
+    return published, keyframe
+
+
+def test_delta_tracker_sends_changes_failures_and_energy_between_keyframes():
+    tracker = DeltaTracker(keyframe_interval=3)
+    key = ('all_owner.json', 'general')
+    base = {'t': 1, 'm': 2, 'total_hot_quantity': 100}
+
+    published, keyframe = _publish(tracker, key, {'a': _device(base)})
+    assert keyframe and set(published['a']['data']) == set(base)
+
+    published, keyframe = _publish(tracker, key, {'a': _device({**base, 't': 5, 'm': 0}, failed=('m',))})
+    device = published['a']
+    assert not keyframe and device['delta'] is True and device['online'] is True
+    assert set(device['data']) == {'t', 'm', 'total_hot_quantity'}
+
+    # 失败不更新基准：m 恢复为旧值 2 时不算变化
+    published, _ = _publish(tracker, key, {'a': _device(base)})
+    assert set(published['a']['data']) == {'t', 'total_hot_quantity'}
+
+    published, keyframe = _publish(tracker, key, {'a': _device(base)})
+    assert keyframe and 'delta' not in published['a']
+
+
+def test_delta_tracker_marks_offline_device_and_compact_row_flags():
+    tracker = DeltaTracker(keyframe_interval=10)
+    key = ('b', 'general')
+    _publish(tracker, key, {'a': _device({'t': 1})})
+    published, _ = _publish(tracker, key, {'a': _device({'t': 1}, failed=('t',))})
+    assert published['a']['online'] is False
+
+    published, _ = _publish(tracker, key, {'a': _device({'t': 1})})
+    assert published['a']['data'] == {} and published['a']['online'] is True
+    _, doc = _unpack(encode_compact(published, kind='general'))
+    assert doc['d'][0][7] == 0x03
+
+
+def test_delta_tracker_uncommitted_baseline_resends_change():
+    tracker = DeltaTracker(keyframe_interval=10)
+    key = ('b', 'general')
+    _publish(tracker, key, {'a': _device({'t': 1})})
+
+    # 本轮发送失败：不提交候选基准，下一轮仍把 t=5 当作变化发送
+    published, _, _ = tracker.filter(key, {'a': _device({'t': 5})})
+    assert set(published['a']['data']) == {'t'}
+    published, _ = _publish(tracker, key, {'a': _device({'t': 5})})
+    assert set(published['a']['data']) == {'t'}
+    published, _ = _publish(tracker, key, {'a': _device({'t': 5})})
+    assert published['a']['data'] == {}
+
+
+def test_send_results_failure_resets_delta_stream(monkeypatch):
+    from unittest.mock import MagicMock
+
+    from datacollection import mqtt_client_pool
+    from datacollection.improved_data_collection_manager import ImprovedDataCollectionManager
+
+    client = MagicMock()
+    client.publish.return_value = True
+    manager_pool = MagicMock()
+    manager_pool.get_client.return_value = client
+    monkeypatch.setattr(mqtt_client_pool.MQTTClientManager, 'get_instance', lambda config: manager_pool)
+
+    manager = ImprovedDataCollectionManager(max_workers=1)
+    config = {'output': {'mqtt': {'enabled': True, 'publish_mode': 'per_device',
+                                  'delta': {'enabled': True, 'keyframe_interval': 10}}}}
+    monkeypatch.setattr(manager, 'load_output_config', lambda: config)
+
+    def sent_params():
+        payload = client.publish.call_args.args[1]
+        return set(payload['a']['data'])
+
+    assert manager.send_results_to_mqtt('b.json', {'a': _device({'t': 1, 'm': 2})})
+    assert manager.send_results_to_mqtt('b.json', {'a': _device({'t': 1, 'm': 2})})
+    assert sent_params() == set()
+
+    # t 变化的这一轮发布失败：基准被丢弃，下一轮改发关键帧补发 t
+    client.publish.return_value = False
+    assert not manager.send_results_to_mqtt('b.json', {'a': _device({'t': 5, 'm': 2})})
+    client.publish.return_value = True
+    assert manager.send_results_to_mqtt('b.json', {'a': _device({'t': 5, 'm': 2})})
+    payload = client.publish.call_args.args[1]
+    assert 'delta' not in payload['a'] and sent_params() == {'t', 'm'}
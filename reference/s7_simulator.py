@@ -1,210 +1,250 @@
 import socket
 import struct
 import threading
-from typing import Dict, Tuple
+import time
+from typing import Dict, List, Tuple
 
 
 class S7Simulator:
-    def __init__(self, ip: str = "0.0.0.0", port: int = 102):
+    """S7-1200 最小协议模拟器：COTP 握手 + Setup Communication + 读/写变量（支持多数据项）。
+
+    DB 数据按 DB 号存为连续的 bytearray，读请求按 (DB, 起始字节, 长度) 做区间切片，
+    因此与 snap7 客户端的 db_read / 多变量读都能直接对接。
+
+    Args:
+        ip: 监听地址
+        port: 监听端口（S7 默认 102，非 root 环境可用高位端口）
+        pdu_length: 本端支持的最大 PDU 长度，Setup Communication 时与客户端取较小值
+        latency_ms: 每个 S7 作业请求的人为应答延迟（毫秒），用于模拟现场网络往返时延
+    """
+
+    DB_SIZE = 2048  # 每个 DB 的模拟容量（字节）
+
+    def __init__(self, ip: str = "0.0.0.0", port: int = 102, pdu_length: int = 240, latency_ms: float = 0):
         self.ip = ip
         self.port = port
+        self.pdu_length = pdu_length
+        self.latency_ms = latency_ms
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.running = False
 
+        # 往返统计：每处理一个 S7 作业请求（读/写/Setup）计一次
+        self.request_count = 0
+        self.read_item_count = 0
+        self.stats_lock = threading.Lock()
+
         # 模拟DB块数据（DB1.100=1234.56, DB1.104=7890.12，32位浮点数）
-        self.db_data: Dict[Tuple[int, int], bytes] = {
-            (1, 100): struct.pack('>f', 1234.56),  # 累计制冷量
-            (1, 104): struct.pack('>f', 7890.12),  # 累计制热量
-        }
+        self.db_data: Dict[int, bytearray] = {}
+        self.set_db_bytes(1, 100, struct.pack('>f', 1234.56))  # 累计制冷量
+        self.set_db_bytes(1, 104, struct.pack('>f', 7890.12))  # 累计制热量
 
-        # 协议常量（修正COTP数据传输帧类型）
+        # 协议常量
         self.TPKT_VERSION = 0x03
-        self.COTP_CR = 0x0E  # 连接请求
-        self.COTP_CC = 0x0F  # 连接确认
-        self.COTP_DT = 0x02  # 数据传输（关键修正：原0x0F与CC冲突）
-        self.S7_PDU_TYPE_DATA = 0x03
+        self.COTP_CR = 0xE0  # 连接请求
+        self.COTP_CC = 0xD0  # 连接确认
+        self.COTP_DT = 0xF0  # 数据传输
+        self.S7_PROTOCOL_ID = 0x32
+        self.S7_ROSCTR_JOB = 0x01
+        self.S7_ROSCTR_ACK_DATA = 0x03
+        self.FUNCTION_SETUP = 0xF0  # Setup Communication
         self.FUNCTION_READ = 0x04  # 读取变量
         self.FUNCTION_WRITE = 0x05  # 写入变量
-        self.ERROR_NONE = 0x00
+        self.AREA_DB = 0x84
+        self.RET_OK = 0xFF
+        self.RET_OBJECT_NOT_EXIST = 0x0A
+        self.RET_OUT_OF_RANGE = 0x05
+
+    # ------------------------------------------------------------------
+    # 数据区
+    # ------------------------------------------------------------------
+
+    def set_db_bytes(self, db_number: int, offset: int, data: bytes) -> None:
+        """写入模拟 DB 数据（DB 不存在时自动创建）"""
+        db = self.db_data.setdefault(db_number, bytearray(self.DB_SIZE))
+        db[offset:offset + len(data)] = data
+
+    def reset_stats(self) -> None:
+        with self.stats_lock:
+            self.request_count = 0
+            self.read_item_count = 0
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
 
     def start(self):
         self.socket.bind((self.ip, self.port))
         self.socket.listen(5)
         self.running = True
-        print(f"✅ S7-1200模拟器启动，监听 {self.ip}:{self.port}")
+        print(f"✅ S7-1200模拟器启动，监听 {self.ip}:{self.port}，PDU={self.pdu_length}，延迟={self.latency_ms}ms")
 
         while self.running:
-            client_socket, addr = self.socket.accept()
-            print(f"📞 新连接：{addr}")
-            client_thread = threading.Thread(target=self.handle_client, args=(client_socket,))
+            try:
+                client_socket, addr = self.socket.accept()
+            except OSError:
+                break  # stop() 关闭监听 socket
+            client_thread = threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True)
             client_thread.start()
 
+    def start_in_background(self) -> threading.Thread:
+        """在后台守护线程中启动模拟器（供基准测试/联调脚本使用）"""
+        thread = threading.Thread(target=self.start, daemon=True)
+        thread.start()
+        deadline = time.time() + 5
+        while not self.running and time.time() < deadline:
+            time.sleep(0.01)
+        return thread
+
     def stop(self):
         self.running = False
         self.socket.close()
         print("\n❌ 模拟器已停止")
 
-    def handle_cotp_connect(self, data: bytes) -> bytes:
-        """处理COTP连接请求（CR），返回连接确认（CC）"""
-        if len(data) < 5:
-            return b''  # 无效CR帧
-
-        # 提取源参考和构建目标参考
-        src_ref = data[3:5]
-        dst_ref = b'\x00\x01'  # 服务器标识
-
-        # 解析TSAP信息（客户端与服务器的TSAP匹配）
-        options = data[7:]
-        src_tsap = b'\x01\x00'  # 客户端TSAP默认值
-        dst_tsap = b'\x03\x01'  # 服务器TSAP（机架0+槽位1）
-
-        i = 0
-        while i < len(options):
-            opt_type = options[i]
-            opt_len = options[i + 1]
-            opt_data = options[i + 2:i + 2 + opt_len]
-            if opt_type == 0xC0:  # TSAP选项
-                if opt_len == 4:
-                    src_tsap = opt_data[:2]
-                    dst_tsap = opt_data[2:]
-            i += 2 + opt_len
-
-        # 构建COTP连接确认帧
-        cotp_cc = (
-            b'\x0F'  # 类型：CC
-            b'\x0C'  # 长度
-            + dst_ref
-            + src_ref
-            + b'\xC0'  # TSAP选项类型
-            + b'\x04'  # 选项长度
-            + src_tsap
-            + dst_tsap
-            + b'\x00'  # 结束标记
-        )
-
-        # 封装TPKT头部
-        tpkt_length = 4 + len(cotp_cc)
-        tpkt = struct.pack('>BBH', self.TPKT_VERSION, 0x00, tpkt_length)
-        return tpkt + cotp_cc
-
-    def parse_s7_request(self, data: bytes) -> Tuple[int, int, int, int, int]:
-        """解析S7数据请求，返回（功能码, DB号, 偏移量, 长度, 错误码）"""
-        try:
-            # 最小帧长度检查（TPKT(4) + COTP(2) + S7 PDU(至少4)）
-            if len(data) < 10:
-                return (0, 0, 0, 0, 0xFE)
-
-            # 解析COTP数据传输帧头部
-            cotp_type = data[4]
-            if cotp_type != self.COTP_DT:
-                return (0, 0, 0, 0, 0xFD)  # 非数据传输帧
-
-            # 计算COTP头部长度（处理可选长度字段）
-            cotp_header_len = 2  # 基础长度（类型+保留位）
-            if data[5] & 0x80:  # 存在长度字段
-                cotp_header_len += 2
-
-            # 提取S7 PDU（跳过TPKT和COTP头部）
-            s7_pdu_start = 4 + cotp_header_len
-            s7_pdu = data[s7_pdu_start:]
-            if len(s7_pdu) < 10:
-                return (0, 0, 0, 0, 0xFE)
-
-            # 解析功能码（S7 PDU第3字节）
-            function = s7_pdu[2]
-            print(f"📌 解析到功能码：0x{function:02X}")
-
-            if function not in [self.FUNCTION_READ, self.FUNCTION_WRITE]:
-                return (function, 0, 0, 0, 0x01)
-
-            # 解析DB块信息（适配snap7的db_get请求格式）
-            db_number = struct.unpack('>H', s7_pdu[16:18])[0] & 0x7FFF  # 15位DB号
-            start_offset = struct.unpack('>H', s7_pdu[18:20])[0]
-            data_length = struct.unpack('>H', s7_pdu[20:22])[0]
-
-            return (function, db_number, start_offset, data_length, self.ERROR_NONE)
-
-        except Exception as e:
-            print(f"❌ 请求解析失败：{str(e)}，原始数据：{data.hex()}")
-            return (0, 0, 0, 0, 0xFF)
-
-    def build_s7_response(self, function: int, db_number: int, start_offset: int, data_length: int) -> bytes:
-        """构建S7响应帧"""
-        if function == self.FUNCTION_READ:
-            # 处理读取请求
-            key = (db_number, start_offset)
-            if key in self.db_data and len(self.db_data[key]) >= data_length:
-                # 成功响应：包含数据
-                data = self.db_data[key][:data_length]
-                response_pdu = (
-                    struct.pack('>BB', self.S7_PDU_TYPE_DATA, self.ERROR_NONE)
-                    + b'\x00\x00\x00'  # 预留字段
-                    + struct.pack('>H', data_length)  # 数据长度
-                    + data  # 实际数据
-                )
+    # ------------------------------------------------------------------
+    # 帧收发
+    # ------------------------------------------------------------------
+
+    def _recv_exact(self, sock: socket.socket, size: int) -> bytes:
+        buf = b''
+        while len(buf) < size:
+            chunk = sock.recv(size - len(buf))
+            if not chunk:
+                return b''
+            buf += chunk
+        return buf
+
+    def _recv_tpkt(self, sock: socket.socket) -> bytes:
+        """按 TPKT 头部长度读取一整帧，返回 TPKT 负载（COTP + S7）"""
+        header = self._recv_exact(sock, 4)
+        if not header or header[0] != self.TPKT_VERSION:
+            return b''
+        length = struct.unpack('>H', header[2:4])[0]
+        return self._recv_exact(sock, length - 4)
+
+    def _send_tpkt(self, sock: socket.socket, payload: bytes) -> None:
+        sock.sendall(struct.pack('>BBH', self.TPKT_VERSION, 0x00, 4 + len(payload)) + payload)
+
+    def handle_cotp_connect(self, cotp: bytes) -> bytes:
+        """处理COTP连接请求（CR），返回连接确认（CC）负载，原样回传客户端的参数（TSAP/TPDU 大小）"""
+        if len(cotp) < 7:
+            return b''
+        src_ref = cotp[4:6]
+        params = cotp[7:]
+        body = bytes([self.COTP_CC]) + src_ref + b'\x00\x01' + b'\x00' + params
+        return bytes([len(body)]) + body
+
+    # ------------------------------------------------------------------
+    # S7 作业处理
+    # ------------------------------------------------------------------
+
+    def _ack_data(self, pdu_ref: int, params: bytes, data: bytes = b'', error_class: int = 0, error_code: int = 0) -> bytes:
+        header = struct.pack('>BBHHHHBB', self.S7_PROTOCOL_ID, self.S7_ROSCTR_ACK_DATA, 0, pdu_ref,
+                             len(params), len(data), error_class, error_code)
+        return header + params + data
+
+    def _handle_setup(self, pdu_ref: int, params: bytes) -> bytes:
+        _, _, amq_calling, amq_called, client_pdu = struct.unpack('>BBHHH', params[:8])
+        negotiated = min(client_pdu, self.pdu_length)
+        return self._ack_data(pdu_ref, struct.pack('>BBHHH', self.FUNCTION_SETUP, 0, amq_calling, amq_called, negotiated))
+
+    def _parse_items(self, params: bytes) -> List[Tuple[int, int, int, int]]:
+        """解析读/写请求的变量项，返回 [(area, db_number, byte_offset, byte_length)]"""
+        count = params[1]
+        items = []
+        pos = 2
+        for _ in range(count):
+            item = params[pos:pos + 12]
+            transport, length, db_number, area = struct.unpack('>BHHB', item[3:9])
+            address = int.from_bytes(item[9:12], 'big')
+            # transport 0x02=BYTE；其它字长按字节数换算（WORD=2, DWORD/REAL=4）
+            unit = {0x01: 1, 0x02: 1, 0x03: 1, 0x04: 2, 0x05: 2, 0x06: 4, 0x07: 4, 0x08: 4}.get(transport, 1)
+            items.append((area, db_number, address >> 3, length * unit))
+            pos += 12
+        return items
+
+    def _handle_read(self, pdu_ref: int, params: bytes) -> bytes:
+        items = self._parse_items(params)
+        data = b''
+        for idx, (area, db_number, offset, length) in enumerate(items):
+            db = self.db_data.get(db_number) if area == self.AREA_DB else None
+            if db is None:
+                item = struct.pack('>BBH', self.RET_OBJECT_NOT_EXIST, 0x00, 0)
+            elif offset + length > len(db):
+                item = struct.pack('>BBH', self.RET_OUT_OF_RANGE, 0x00, 0)
             else:
-                # 地址错误响应
-                response_pdu = struct.pack('>BB', self.S7_PDU_TYPE_DATA, 0x05)
-
-        elif function == self.FUNCTION_WRITE:
-            # 处理写入请求（简化实现）
-            response_pdu = struct.pack('>BB', self.S7_PDU_TYPE_DATA, self.ERROR_NONE)
-
-        else:
-            # 不支持的功能码
-            response_pdu = struct.pack('>BB', self.S7_PDU_TYPE_DATA, 0x01)
-
-        # 构建COTP DT头部（类型0x02 + 保留位0x00）
-        cotp_dt = b'\x02\x00'
-        # 封装TPKT头部（总长度=4+2+PDU长度）
-        total_length = 4 + len(cotp_dt) + len(response_pdu)
-        tpkt = struct.pack('>BBH', self.TPKT_VERSION, 0x00, total_length)
-
-        return tpkt + cotp_dt + response_pdu
+                payload = bytes(db[offset:offset + length])
+                item = struct.pack('>BBH', self.RET_OK, 0x04, length * 8) + payload
+            # 多数据项时，除最后一项外奇数长度需补齐到偶数字节
+            if idx < len(items) - 1 and len(item) % 2:
+                item += b'\x00'
+            data += item
+        with self.stats_lock:
+            self.read_item_count += len(items)
+        return self._ack_data(pdu_ref, bytes([self.FUNCTION_READ, len(items)]), data)
+
+    def _handle_write(self, pdu_ref: int, params: bytes, data: bytes) -> bytes:
+        items = self._parse_items(params)
+        pos = 0
+        codes = b''
+        for area, db_number, offset, _ in items:
+            _, _, bit_len = struct.unpack('>BBH', data[pos:pos + 4])
+            transport = data[pos + 1]
+            byte_len = bit_len if transport in (0x03, 0x09) else bit_len // 8
+            payload = data[pos + 4:pos + 4 + byte_len]
+            pos += 4 + byte_len + (byte_len % 2)
+            if area != self.AREA_DB:
+                codes += bytes([self.RET_OBJECT_NOT_EXIST])
+                continue
+            self.set_db_bytes(db_number, offset, payload)
+            codes += bytes([self.RET_OK])
+        return self._ack_data(pdu_ref, bytes([self.FUNCTION_WRITE, len(items)]), codes)
+
+    def handle_s7_job(self, pdu: bytes) -> bytes:
+        """处理一个 S7 作业 PDU，返回应答 PDU"""
+        if len(pdu) < 10 or pdu[0] != self.S7_PROTOCOL_ID or pdu[1] != self.S7_ROSCTR_JOB:
+            return b''
+        pdu_ref, param_len, data_len = struct.unpack('>HHH', pdu[4:10])
+        params = pdu[10:10 + param_len]
+        data = pdu[10 + param_len:10 + param_len + data_len]
+        function = params[0] if params else 0
+
+        with self.stats_lock:
+            self.request_count += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+        if function == self.FUNCTION_SETUP:
+            return self._handle_setup(pdu_ref, params)
+        if function == self.FUNCTION_READ:
+            return self._handle_read(pdu_ref, params)
+        if function == self.FUNCTION_WRITE:
+            return self._handle_write(pdu_ref, params, data)
+        # 不支持的功能码：返回错误类 0x81（应用关系错误）
+        return self._ack_data(pdu_ref, bytes([function]), error_class=0x81, error_code=0x04)
 
     def handle_client(self, client_socket: socket.socket):
         """处理客户端连接生命周期"""
         try:
-            # 阶段1：处理COTP连接
-            data = client_socket.recv(1024)
-            if not data:
-                return
-
-            # 验证TPKT版本
-            tpkt_version = data[0]
-            if tpkt_version != self.TPKT_VERSION:
-                print("❌ TPKT版本错误")
-                return
-
-            # 处理连接请求
-            cotp_type = data[4]
-            if cotp_type == self.COTP_CR:
-                cc_response = self.handle_cotp_connect(data[4:])
-                client_socket.sendall(cc_response)
-                print(f"📤 发送连接确认（CC），数据：{cc_response.hex()}")
-
-            # 阶段2：处理数据传输
             while True:
-                data = client_socket.recv(1024)
-                if not data:
+                payload = self._recv_tpkt(client_socket)
+                if not payload:
                     break
-                print(f"📥 接收到数据帧：{data.hex()}")
-
-                # 解析请求并生成响应
-                function, db_num, offset, length, error = self.parse_s7_request(data)
-                if error != self.ERROR_NONE:
-                    print(f"❌ 请求错误（错误码：{error}）")
-                    continue
-
-                response = self.build_s7_response(function, db_num, offset, length)
-                client_socket.sendall(response)
-                print(f"📤 发送响应帧：{response.hex()}（功能码：0x{function:02X}）")
 
+                cotp_type = payload[1]
+                if cotp_type == self.COTP_CR:
+                    self._send_tpkt(client_socket, self.handle_cotp_connect(payload))
+                elif cotp_type == self.COTP_DT:
+                    cotp_len = payload[0] + 1
+                    response = self.handle_s7_job(payload[cotp_len:])
+                    if response:
+                        self._send_tpkt(client_socket, b'\x02\xF0\x80' + response)
+                else:
+                    break  # 断开请求或不支持的 COTP 帧
         except Exception as e:
             print(f"❌ 客户端处理异常：{str(e)}")
         finally:
             client_socket.close()
-            print("🔌 连接已关闭")
 
 
 if __name__ == "__main__":
@@ -212,4 +252,4 @@ if __name__ == "__main__":
     try:
         simulator.start()
     except KeyboardInterrupt:
-        simulator.stop()
\ No newline at end of file
+        simulator.stop()
@@ -4,7 +4,7 @@ Unit tests for the dual-frequency datacollection refactor.
 Covers:
   - IntervalGroup wildcard expansion (TaskScheduler._resolve_interval_groups)
   - param_filter propagation in ImprovedDataCollectionManager.collect_data_for_building
-  - PDU_CHUNK_SIZE chunking in PLCManager._read_single_plc_multiple_params
+  - PLCManager._read_single_plc_multiple_params hands all params to one block-coalescing read_multi
   - byte data_type parsing in PLCReadWriter._parse_data
   - Connection reuse: PLCManager.clients_cache is used across calls
 
@@ -54,7 +54,7 @@ if 'snap7' not in sys.modules:
 # ---------------------------------------------------------------------------
 # Now safe to import project modules
 # ---------------------------------------------------------------------------
-from datacollection.multi_thread_plc_handler import PLCReadWriter, PLCManager, PDU_CHUNK_SIZE
+from datacollection.multi_thread_plc_handler import PLCReadWriter, PLCManager
 from datacollection.task_scheduler import IntervalGroup, TaskScheduler
 
 
@@ -92,7 +92,7 @@ class TestPLCReadWriterParseByte(unittest.TestCase):
 
 
 # ---------------------------------------------------------------------------
-# Test: PDU chunking in PLCManager._read_single_plc_multiple_params
+# Test: PLCManager._read_single_plc_multiple_params → read_multi
 # ---------------------------------------------------------------------------
 
 class TestPLCManagerChunking(unittest.TestCase):
@@ -110,14 +110,11 @@ class TestPLCManagerChunking(unittest.TestCase):
             for i in range(count)
         ]
 
-    def test_chunk_size_constant_is_12(self):
-        self.assertEqual(PDU_CHUNK_SIZE, 12)
-
-    def test_single_chunk_when_params_lte_chunk_size(self):
-        configs = self._make_configs(PDU_CHUNK_SIZE)  # exactly 12
+    def test_single_read_multi_call_for_small_param_set(self):
+        configs = self._make_configs(12)
         read_multi_calls = []
 
-        def fake_read_multi(self_rw, requests, max_retries=2):
+        def fake_read_multi(self_rw, requests, max_retries=2, **kwargs):
             read_multi_calls.append(len(requests))
             return [(True, "读取成功", 0)] * len(requests)
 
@@ -125,50 +122,39 @@ class TestPLCManagerChunking(unittest.TestCase):
             results = self.manager._read_single_plc_multiple_params('10.0.0.1', configs)
 
         self.assertEqual(len(read_multi_calls), 1,
-                         "Should issue exactly 1 read_multi call for <= CHUNK_SIZE params")
-        self.assertEqual(len(results), PDU_CHUNK_SIZE)
+                         "Should issue exactly 1 read_multi call")
+        self.assertEqual(len(results), 12)
 
-    def test_multiple_chunks_when_params_gt_chunk_size(self):
-        param_count = PDU_CHUNK_SIZE * 2 + 3  # 27
+    def test_all_params_handed_to_one_read_multi_call(self):
+        """Block coalescing and PDU packing live in read_multi, so PLCManager never pre-chunks."""
+        param_count = 27
         configs = self._make_configs(param_count)
         read_multi_calls = []
 
-        def fake_read_multi(self_rw, requests, max_retries=2):
-            read_multi_calls.append(len(requests))
+        def fake_read_multi(self_rw, requests, max_retries=2, **kwargs):
+            read_multi_calls.append((len(requests), kwargs.get('gap_tolerance')))
             return [(True, "读取成功", 0)] * len(requests)
 
         with patch.object(PLCReadWriter, 'read_multi', fake_read_multi):
             results = self.manager._read_single_plc_multiple_params('10.0.0.1', configs)
 
-        expected_chunks = 3  # ceil(27 / 12) = 3
-        self.assertEqual(len(read_multi_calls), expected_chunks,
-                         f"Expected {expected_chunks} chunks for {param_count} params")
+        self.assertEqual(read_multi_calls, [(param_count, self.manager.read_gap_tolerance)])
         self.assertEqual(len(results), param_count)
-        # First two chunks are full, last has the remainder
-        self.assertEqual(read_multi_calls[0], PDU_CHUNK_SIZE)
-        self.assertEqual(read_multi_calls[1], PDU_CHUNK_SIZE)
-        self.assertEqual(read_multi_calls[2], 3)
 
-    def test_chunk_failure_does_not_abort_other_chunks(self):
-        """A single chunk failure should mark those params as failed but not stop other chunks."""
-        configs = self._make_configs(PDU_CHUNK_SIZE + 1)  # 13 params → 2 chunks
-        call_count = [0]
+    def test_read_multi_failure_marks_all_params_failed(self):
+        """An exception from read_multi should mark every param failed instead of raising."""
+        configs = self._make_configs(13)
 
-        def fake_read_multi(self_rw, requests, max_retries=2):
-            call_count[0] += 1
-            if call_count[0] == 1:
-                raise RuntimeError("simulated PDU error")
-            return [(True, "读取成功", 0)] * len(requests)
+        def fake_read_multi(self_rw, requests, max_retries=2, **kwargs):
+            raise RuntimeError("simulated PDU error")
 
         with patch.object(PLCReadWriter, 'read_multi', fake_read_multi):
             results = self.manager._read_single_plc_multiple_params('10.0.0.1', configs)
 
-        self.assertEqual(len(results), PDU_CHUNK_SIZE + 1)
-        # First chunk (12 items) should be failures
-        for r in results[:PDU_CHUNK_SIZE]:
+        self.assertEqual(len(results), 13)
+        for r in results:
             self.assertFalse(r['success'])
-        # Second chunk (1 item) should succeed
-        self.assertTrue(results[PDU_CHUNK_SIZE]['success'])
+            self.assertIn('simulated PDU error', r['message'])
 
 
 # ---------------------------------------------------------------------------